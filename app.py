@@ -2,15 +2,21 @@
 vLLM Ascend Playground - A web interface for managing vLLM on Ascend NPU
 """
 import asyncio
+import gzip
 import json
 import logging
 import os
+import shlex
+import time
+import uuid
+from dataclasses import asdict
 from datetime import datetime
-from typing import Optional, List, Dict, Any, Literal
+from typing import Optional, List, Dict, Any, Literal, Tuple, Union
+from urllib.parse import urlparse
 from pathlib import Path
 
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException, Request
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, PlainTextResponse, Response
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from pydantic import BaseModel
@@ -22,18 +28,46 @@ logger = logging.getLogger(__name__)
 from container_manager import AscendContainerManager
 from model_manager import ModelManager
 from benchmark_manager import BenchmarkManager
+from benchmark_store import BenchmarkStore
 from service_manager import ServiceManager
-from service_manager import ServiceManager
+from npu_monitor import NPUMonitor
+from npu_allocator import NPUAllocator, NPUAllocationError
+from container_pool import WarmContainerPool
+from image_puller import ImagePuller
+from service_store import ServiceStore
+from vllm_metrics import MetricsScraper
+from gateway import Gateway, GatewayError
+from autoscaler import Autoscaler
+from rolling_restart import RollingRestarter
+from weight_prewarm import WeightPrewarmer
 
 app = FastAPI(title="vLLM Ascend Playground", version="1.0.0")
 BASE_DIR = Path(__file__).parent
+PRESETS_FILE = BASE_DIR / "config" / "presets.json"
+# mock vLLM 可执行文件 (mock_vllm.py)，命令行与 vllm serve 相同
+MOCK_VLLM = BASE_DIR / "scripts" / "mock" / "vllm"
+
+def load_presets() -> Dict[str, Any]:
+    if PRESETS_FILE.exists():
+        with open(PRESETS_FILE) as f:
+            return json.load(f)
+    return {}
+
 app.mount("/static", StaticFiles(directory=str(BASE_DIR / "static")), name="static")
 templates = Jinja2Templates(directory=str(BASE_DIR / "templates"))
 
 container_manager = AscendContainerManager()
 model_manager = ModelManager()
-benchmark_manager = BenchmarkManager()
-service_manager = ServiceManager(container_manager)
+benchmark_manager = BenchmarkManager(BenchmarkStore())
+service_manager = ServiceManager(container_manager, NPUAllocator(load_presets().get("npu_topology")),
+                                 load_presets().get("startup_timeout"), ServiceStore())
+npu_monitor = NPUMonitor(container_manager)
+gateway = Gateway(service_manager)
+metrics_scraper = MetricsScraper(service_manager)
+autoscaler = Autoscaler(service_manager, metrics_scraper, gateway, npu_monitor, load_presets().get("autoscaler"))
+image_puller = ImagePuller(container_manager)
+container_pool = WarmContainerPool(container_manager, load_presets().get("container_images"))
+weight_prewarmer = WeightPrewarmer()
 
 vllm_running: bool = False
 current_container: Optional[str] = None
@@ -53,8 +87,10 @@ class VLLMConfig(BaseModel):
     max_model_len: Optional[int] = None
     trust_remote_code: bool = True
     dtype: str = "auto"
-    npu_devices: List[int] = [0]
+    npu_devices: Union[List[int], Literal["auto"]] = [0]
+    estimated_memory_mb: Optional[int] = None  # npu_devices="auto" 时用于按剩余 HBM 筛选
     additional_args: Optional[str] = None
+    mock: bool = False  # 用 mock vLLM 代替 vllm serve (无 NPU 时测试；--mock-* 参数放在 additional_args)
 
 class ContainerConfig(BaseModel):
     container_name: str
@@ -64,7 +100,7 @@ class ContainerConfig(BaseModel):
     shm_size: str = "60g"
 
 class BenchmarkConfig(BaseModel):
-    benchmark_type: Literal["evalscope", "vllm_bench"] = "evalscope"
+    benchmark_type: Literal["evalscope", "vllm_bench", "native"] = "evalscope"
     url: str = "http://localhost:8000/v1/chat/completions"
     model_name: str = "default-model"
     parallel: int = 1
@@ -76,6 +112,65 @@ class BenchmarkConfig(BaseModel):
     num_prompts: int = 5
     random_input_len: int = 1024
     random_output_len: int = 1024
+    # native: 内置负载生成器的到达过程 (request_rate <= 0 时全部立即发出)
+    arrival: Literal["poisson", "constant", "burst"] = "poisson"
+    burst_size: int = 8
+    seed: Optional[int] = None
+    template: Optional[str] = None  # 使用的测试模板名，用于历史筛选
+
+class RollingRestartConfig(BaseModel):
+    model: str  # served_model_name
+    image: Optional[str] = None
+    flags: Dict[str, Optional[str]] = {}  # "--flag": "值" 设置，"" 为开关，null 删除
+    drain_timeout: Optional[float] = None
+
+class ScalingPolicyConfig(BaseModel):
+    enabled: bool = True
+    min_replicas: int = 1
+    max_replicas: int = 4
+    up_waiting: float = 4.0
+    up_kv_cache: float = 0.9
+    up_ttft_p95: Optional[float] = None
+    down_waiting: float = 0.0
+    down_kv_cache: float = 0.3
+    down_running: float = 1.0
+    up_sustain: float = 30.0
+    down_sustain: float = 300.0
+    up_cooldown: float = 180.0
+    down_cooldown: float = 300.0
+    drain_timeout: float = 120.0
+
+@app.on_event("startup")
+async def on_startup():
+    global vllm_running, current_container
+    npu_monitor.start()
+    container_manager.inventory.start()
+    # 从服务注册表恢复重启前启动的服务，并与实际运行的进程对账
+    await service_manager.restore()
+    active = [s for s in service_manager.services.values() if s.status in ("starting", "running")]
+    vllm_running = bool(active)
+    current_container = active[-1].container_name if active else None
+    service_manager.start()
+    metrics_scraper.start()
+    autoscaler.start()
+    # 预热池在后台创建容器，不阻塞启动
+    asyncio.create_task(container_pool.start(in_use={s.container_name for s in service_manager.services.values()}))
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    await npu_monitor.stop()
+    await container_pool.stop()
+    await autoscaler.stop()
+    await rolling_restarter.close()
+    await metrics_scraper.stop()
+    await benchmark_manager.close()
+    await service_manager.close()
+    weight_prewarmer.close()
+    await gateway.close()
+    service_manager.store.close()
+    benchmark_manager.store.close()
+    await container_manager.inventory.stop()
+    await container_manager.close()
 
 @app.get("/", response_class=HTMLResponse)
 async def get_index(request: Request):
@@ -83,12 +178,12 @@ async def get_index(request: Request):
 
 @app.get("/api/status")
 async def get_status():
-    # 并行获取容器和 NPU 状态
-    import asyncio
+    # NPU 状态来自后台采样快照，不随请求数增加 npu-smi 调用
     containers_task = container_manager.list_containers(running_only=True)
-    npu_task = container_manager.get_npu_status()
-    containers, npu_status = await asyncio.gather(containers_task, npu_task)
-    return {"vllm_running": vllm_running, "current_container": current_container, "containers": containers, "npu_status": npu_status}
+    snapshot_task = npu_monitor.get_snapshot()
+    containers, snapshot = await asyncio.gather(containers_task, snapshot_task)
+    return {"vllm_running": vllm_running, "current_container": current_container, "containers": containers,
+            "npu_status": list(snapshot.npus), "npu_status_age": round(snapshot.age, 3)}
 
 @app.get("/api/models")
 async def list_models():
@@ -104,6 +199,33 @@ async def download_model(model_id: str, source: str = "modelscope", cache_dir: O
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/api/models/prewarm")
+async def prewarm_model(path: str):
+    """Read a model's weight files into the host page cache (see WeightPrewarmer)"""
+    try:
+        return weight_prewarmer.submit(path).to_dict()
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+@app.get("/api/models/prewarm")
+async def list_prewarm_jobs():
+    return {"jobs": weight_prewarmer.list_jobs()}
+
+@app.get("/api/models/prewarm/{job_id}")
+async def get_prewarm_job(job_id: str):
+    job = weight_prewarmer.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Prewarm job not found")
+    return job.to_dict()
+
+@app.get("/api/models/residency")
+async def get_model_residency(path: str):
+    """Fraction of each weight file resident in the page cache (mincore)"""
+    try:
+        return await weight_prewarmer.residency(path)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
 @app.get("/api/containers")
 async def list_containers(keyword: Optional[str] = None, running_only: bool = False):
     """List containers with optional filters
@@ -147,10 +269,100 @@ async def delete_container(container_name: str):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+async def prepare_container(image: str, container_name: Optional[str] = None) -> Tuple[str, bool]:
+    """A container of ``image`` to start vLLM in: from the warm pool, else newly created
+
+    Returns (container name, taken from the pool).
+    """
+    pooled = await container_pool.acquire(image, container_name)
+    if pooled:
+        return pooled, True
+    container_name = container_name or f"vllm-{uuid.uuid4().hex[:8]}"
+    # 与池中容器相同，挂载全部 NPU，服务实际使用的卡由启动命令中的 ASCEND_RT_VISIBLE_DEVICES 选择
+    await container_manager.create_container(
+        ContainerConfig(container_name=container_name, image=image, npu_devices=container_pool.npu_devices()))
+    return container_name, False
+
+async def release_container(image: str, container_name: str, from_pool: bool) -> None:
+    """Give back a container from prepare_container: to the warm pool, or delete it"""
+    try:
+        if from_pool:
+            await container_pool.release(image, container_name)
+        else:
+            await container_manager.delete_container(container_name)
+    except Exception as e:
+        logger.warning(f"Failed to clean up container {container_name}: {e}")
+
+async def service_inflight(service) -> int:
+    """Requests still in flight at a service: gateway outstanding plus vLLM's running / waiting queues"""
+    upstream = gateway.upstreams.get(service.id)
+    pending = upstream.outstanding if upstream else 0
+    if await metrics_scraper.scrape(service):
+        latest = metrics_scraper.latest(service.id) or {}
+        pending += int((latest.get("running") or 0) + (latest.get("waiting") or 0))
+    return pending
+
+service_manager.inflight = service_inflight
+
+async def weight_page_cache(path: Optional[str], job=None) -> Dict[str, Any]:
+    """Page-cache state of the weights at spawn: the prewarm result, else the current residency"""
+    if job is not None:
+        await weight_prewarmer.wait(job)
+        info = job.to_dict()
+        return {"prewarmed": job.status == "completed", "resident": info["resident_after"],
+                "prewarm_seconds": info["elapsed"], "bytes_read": info["bytes_read"], "prewarmed_at": job.finished_at}
+    if path and os.path.exists(path):
+        try:
+            return {"prewarmed": False, "resident": (await weight_prewarmer.residency(path))["resident"]}
+        except OSError as e:
+            logger.debug(f"Residency check of {path} failed: {e}")
+    return {}
+
+rolling_restarter = RollingRestarter(service_manager, npu_monitor, prepare_container, release_container)
+
 @app.post("/api/vllm/start")
-async def start_vllm(config: VLLMConfig, container_name: str):
+async def start_vllm(config: VLLMConfig, container_name: Optional[str] = None, image: Optional[str] = None,
+                     prewarm: bool = False):
+    """Start vLLM in ``container_name``, or in a container of ``image``
+
+    With ``image`` an idle container is taken from the warm pool (renamed to
+    ``container_name`` if given); if the pool is empty a container is created.
+    ``container_name="host"`` runs a ``mock`` service on this machine when
+    host execution is enabled (PLAYGROUND_HOST_EXEC=1). With ``prewarm`` the
+    local weights are read into the page cache while the container is
+    prepared, and vLLM is spawned once they are resident.
+    """
     global vllm_running, current_container
+    requested_at = time.time()
+    from_pool = False
+    if not container_name and not image:
+        raise HTTPException(status_code=400, detail="container_name 或 image 至少指定一个")
+    if container_manager.is_host(container_name) and (image or not config.mock):
+        raise HTTPException(status_code=400, detail="主机上只能启动 mock 服务 (且不能指定 image)")
+    npu_claim = None
+    prepared = False
+    service = None
     try:
+        local_path = config.model_source.local_path
+        prewarm_job = None
+        if prewarm and local_path:
+            # 预热与容器准备并行，vLLM 进程启动前等待预热完成
+            try:
+                prewarm_job = weight_prewarmer.submit(local_path)
+            except OSError as e:
+                logger.warning(f"Prewarm of {local_path} skipped: {e}")
+        memory_mb = config.estimated_memory_mb
+        if memory_mb is None and config.model_source.local_path:
+            memory_mb = model_manager.estimate_memory_mb(config.model_source.local_path)
+        if config.npu_devices == "auto":
+            # 按实时占用、剩余 HBM 和拓扑自动选卡 (先于准备容器，无卡可用时不占用容器)
+            snapshot = await npu_monitor.refresh()
+            npu_claim, config.npu_devices = service_manager.claim_npus(
+                list(snapshot.npus), config.tensor_parallel_size, memory_mb or 0)
+        if image:
+            container_name, from_pool = await prepare_container(image, container_name)
+            prepared = True
+        page_cache = await weight_page_cache(local_path, prewarm_job)
         cmd = build_vllm_command(config)
         # 使用 service_manager 启动并跟踪服务
         model_name = config.model_source.local_path or config.model_source.model_id or "unknown"
@@ -159,33 +371,60 @@ async def start_vllm(config: VLLMConfig, container_name: str):
             command=cmd,
             model=model_name,
             port=config.port,
-            npu_devices=config.npu_devices
+            npu_devices=config.npu_devices,
+            from_pool=from_pool,
+            requested_at=requested_at,
+            memory_mb=memory_mb or 0,
+            image=image or "",
+            served_model_name=config.served_model_name,
+            page_cache=page_cache,
+            npu_claim=npu_claim
         )
         vllm_running = True
         current_container = container_name
-        return {"success": True, "command": cmd, "service_id": service.id}
+        return {"success": True, "command": cmd, "service_id": service.id, "npu_devices": config.npu_devices,
+                "container_name": container_name, "from_pool": from_pool, "page_cache": service.page_cache}
+    except NPUAllocationError as e:
+        raise HTTPException(status_code=409, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        # 启动失败时释放预留 (已转交给服务时为空操作)
+        if npu_claim:
+            service_manager.release_npus(npu_claim)
+        # 服务未能创建时归还 (池中取出的) 或删除 (新建的) 容器
+        if prepared and service is None:
+            await release_container(image, container_name, from_pool)
 
 @app.post("/api/vllm/stop")
-async def stop_vllm(service_id: str = None):
+async def stop_vllm(service_id: str = None, drain_timeout: Optional[float] = None, force: bool = False):
+    """Stop a service (all services without ``service_id``)
+
+    In-flight requests get up to ``drain_timeout`` seconds to finish before
+    SIGTERM; ``force`` skips the drain and kills at once.
+    """
     global vllm_running, current_container
     if service_id:
         # 停止指定服务
-        success = await service_manager.stop_service(service_id)
+        success = await service_manager.stop_service(service_id, drain_timeout=drain_timeout, force=force)
         if service_manager.get_running_count() == 0:
             vllm_running = False
             current_container = None
         return {"success": success}
     else:
-        # 兼容旧逻辑：停止所有服务
-        for service in service_manager.list_services():
-            if service["status"] == "running":
-                await service_manager.stop_service(service["id"])
+        # 兼容旧逻辑：停止所有服务 (并发排空)
+        await asyncio.gather(*(
+            service_manager.stop_service(service["id"], drain_timeout=drain_timeout, force=force)
+            for service in service_manager.list_services() if service["status"] in ("running", "draining")))
         vllm_running = False
         current_container = None
         return {"success": True}
 
+@app.get("/api/pool")
+async def get_pool_status():
+    """Warm container pool state and time to ready with / without the pool"""
+    return {"pool": container_pool.status(), "time_to_ready": service_manager.time_to_ready_stats()}
+
 @app.delete("/api/services/{service_id}")
 async def remove_service(service_id: str):
     """Remove a service from tracking"""
@@ -195,14 +434,49 @@ async def remove_service(service_id: str):
     return {"success": True}
 
 @app.get("/api/services")
-async def list_services():
-    """List all tracked services"""
-    await service_manager.refresh_status()
+async def list_services(refresh: bool = False):
+    """List all tracked services
+    
+    Returns the cached status (see ``last_probed`` of each entry) at once and
+    refreshes stale entries in the background; ``refresh=true`` waits for
+    the refresh.
+    """
+    if refresh:
+        await service_manager.refresh_status()
+    else:
+        service_manager.schedule_refresh()
     return {
         "services": service_manager.list_services(),
         "running_count": service_manager.get_running_count()
     }
 
+@app.get("/api/services/startup")
+async def get_startup_report():
+    """Time-to-ready breakdown (spawn / weight load / KV cache / warmup / ready) per service and image"""
+    return service_manager.startup_report()
+
+@app.post("/api/services/rolling-restart")
+async def start_rolling_restart(config: RollingRestartConfig):
+    """Replace the running replicas of a model one at a time with a new image and/or flags"""
+    try:
+        job = rolling_restarter.submit(config.model, config.image, config.flags, config.drain_timeout)
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return job.to_dict()
+
+@app.get("/api/services/rolling-restart")
+async def list_rolling_restarts():
+    return {"jobs": rolling_restarter.list_jobs()}
+
+@app.get("/api/services/rolling-restart/{job_id}")
+async def get_rolling_restart(job_id: str):
+    job = rolling_restarter.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
 @app.get("/api/services/{service_id}")
 async def get_service(service_id: str):
     """Get a specific service"""
@@ -211,6 +485,37 @@ async def get_service(service_id: str):
         raise HTTPException(status_code=404, detail="Service not found")
     return service
 
+@app.get("/api/services/{service_id}/metrics")
+async def get_service_metrics(service_id: str, since: Optional[float] = None, resolution: Optional[float] = None):
+    """Serving telemetry scraped from the service's /metrics
+
+    Args:
+        since: Unix timestamp, or negative seconds relative to now (default -600)
+        resolution: Bucket width in seconds (auto if omitted)
+    """
+    if not service_manager.get_service(service_id):
+        raise HTTPException(status_code=404, detail="Service not found")
+    return metrics_scraper.query(service_id, since=since, resolution=resolution)
+
+@app.get("/api/autoscaler")
+async def get_autoscaler():
+    """Scaling policies, current signals per model and recent scaling events"""
+    return autoscaler.status()
+
+@app.put("/api/autoscaler/{model}")
+async def set_scaling_policy(model: str, policy: ScalingPolicyConfig):
+    """Create or replace the scaling policy of a served model (not written to presets.json)"""
+    try:
+        return asdict(autoscaler.set_policy(model, policy.model_dump()))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.delete("/api/autoscaler/{model}")
+async def delete_scaling_policy(model: str):
+    if not autoscaler.remove_policy(model):
+        raise HTTPException(status_code=404, detail="Policy not found")
+    return {"success": True}
+
 @app.get("/api/vllm/logs")
 async def get_vllm_logs(lines: int = 100):
     if not current_container:
@@ -304,8 +609,11 @@ def build_vllm_command(config: VLLMConfig) -> str:
     else:
         model_path = config.model_source.local_path
     
-    cmd_parts = [f"vllm serve {model_path}", f"--served-model-name {config.served_model_name}",
-                 f"--host {config.host}", f"--port {config.port}",
+    # mock 服务可能在主机上运行: 参数逐个转义，不允许借 additional_args 等注入 shell
+    quote = shlex.quote if config.mock else str
+    vllm = quote(str(MOCK_VLLM)) if config.mock else "vllm"
+    cmd_parts = [f"{vllm} serve {quote(model_path)}", f"--served-model-name {quote(config.served_model_name)}",
+                 f"--host {quote(config.host)}", f"--port {config.port}",
                  f"--tensor-parallel-size {config.tensor_parallel_size}"]
     
     if config.max_model_len:
@@ -313,9 +621,10 @@ def build_vllm_command(config: VLLMConfig) -> str:
     if config.trust_remote_code:
         cmd_parts.append("--trust-remote-code")
     if config.dtype != "auto":
-        cmd_parts.append(f"--dtype {config.dtype}")
+        cmd_parts.append(f"--dtype {quote(config.dtype)}")
     if config.additional_args:
-        cmd_parts.append(config.additional_args)
+        cmd_parts.append(" ".join(shlex.quote(a) for a in shlex.split(config.additional_args))
+                         if config.mock else config.additional_args)
     
     vllm_cmd = " \\\n".join(cmd_parts)
     return " && ".join(env_vars) + " && " + vllm_cmd
@@ -334,27 +643,179 @@ async def get_running_vllm_services():
 
 @app.post("/api/vllm/kill")
 async def kill_vllm_service(container_name: str, pid: str = None):
-    """停止指定容器中的 vLLM 服务"""
+    """停止指定容器中的 vLLM 服务
+
+    ``pid`` is a host PID as listed by /api/vllm/running (usually an NPU
+    worker); it is mapped to the port of the vLLM server that owns it.
+    Tracked services on that port go through the graceful stop (drain,
+    SIGTERM, SIGKILL); an untracked server gets SIGTERM, then SIGKILL.
+    Without ``pid`` every vLLM server in the container is stopped. On the
+    host only a tracked service can be stopped.
+    """
+    host = container_manager.is_host(container_name)
+    if host and not pid:
+        raise HTTPException(status_code=400, detail="主机上停止服务必须指定 pid")
+    if pid and not pid.isdigit():
+        raise HTTPException(status_code=400, detail=f"无效的 pid: {pid}")
     try:
-        success = await container_manager.kill_vllm_service(container_name, pid)
-        return {"success": success}
+        active = [s for s in service_manager.services.values()
+                  if s.container_name == container_name and s.status in ("starting", "running", "draining")]
+        if not pid:
+            results = await asyncio.gather(*(service_manager.stop_service(s.id) for s in active))
+            success = await container_manager.kill_vllm_service(container_name) and all(results)
+            return {"success": success}
+        # 宿主机 PID 与容器内 PID 不在同一命名空间，按服务端口匹配
+        port = container_manager.find_vllm_port(int(pid))
+        tracked = [s for s in active if port is not None and s.port == port]
+        if tracked:
+            results = await asyncio.gather(*(service_manager.stop_service(s.id) for s in tracked))
+            return {"success": all(results)}
+        if host or port is None:
+            raise HTTPException(status_code=404, detail=f"找不到 PID {pid} 所属的 vLLM 服务")
+        server_pid = await container_manager.find_vllm_pid(container_name, port)
+        if server_pid is None:
+            raise HTTPException(status_code=404, detail=f"容器 {container_name} 中没有端口 {port} 上的 vLLM 服务")
+        return {"success": await container_manager.kill_vllm_service(container_name, str(server_pid))}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+def benchmark_image(config: BenchmarkConfig) -> Optional[str]:
+    """被测服务的镜像: 先按 URL 端口、再按服务名匹配已跟踪的服务"""
+    port = urlparse(config.url).port
+    services = [s for s in service_manager.services.values() if s.image]
+    match = next((s for s in services if s.port == port), None) or \
+        next((s for s in services if s.served_model_name == config.model_name), None)
+    return match.image if match else None
+
 @app.post("/api/benchmark/run")
-async def run_benchmark(config: BenchmarkConfig, container_name: Optional[str] = None):
+async def run_benchmark(config: BenchmarkConfig, container_name: Optional[str] = None, wait: bool = False):
+    """提交压测任务，立即返回任务状态；wait=true 时等待结束并返回结果 (旧行为)"""
     try:
-        if config.benchmark_type == "evalscope":
-            result = await benchmark_manager.run_evalscope(config, container_name)
-        else:
-            result = await benchmark_manager.run_vllm_bench(config, container_name)
-        return result
+        job = benchmark_manager.submit(config, container_name, benchmark_image(config))
+        if not wait:
+            return job.to_dict()
+        await benchmark_manager.wait(job)
+        if job.status == "cancelled":
+            raise HTTPException(status_code=409, detail="压测已取消")
+        return job.result or {"success": False, "error": job.error}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+def parse_time(value: Optional[str]) -> Optional[float]:
+    """ISO 日期/时间或 epoch 秒"""
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
 @app.get("/api/benchmark/results")
-async def get_benchmark_results():
-    return benchmark_manager.get_history()
+async def get_benchmark_results(page: int = 1, page_size: int = 50, model: Optional[str] = None,
+                                image: Optional[str] = None, template: Optional[str] = None,
+                                benchmark_type: Optional[str] = None, since: Optional[str] = None,
+                                until: Optional[str] = None):
+    """分页的历史结果 (仅汇总指标，新的在前)；since 含、until 不含"""
+    try:
+        since_ts, until_ts = parse_time(since), parse_time(until)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"时间格式错误: {e}")
+    return benchmark_manager.store.list(page, page_size, model, image, template, benchmark_type, since_ts, until_ts)
+
+@app.get("/api/benchmark/results/filters")
+async def get_benchmark_filters():
+    """历史中出现过的模型、镜像、模板、类型"""
+    return benchmark_manager.store.facets()
+
+@app.get("/api/benchmark/compare")
+async def compare_benchmarks(ids: str):
+    """逐项对比多次运行的汇总指标，ids 以逗号分隔 (第一个为基准)"""
+    run_ids = [i for i in ids.split(",") if i]
+    if len(run_ids) < 2:
+        raise HTTPException(status_code=400, detail="至少需要两个运行 ID")
+    result = benchmark_manager.store.compare(run_ids)
+    if not result:
+        raise HTTPException(status_code=404, detail="运行记录不存在")
+    return result
+
+@app.get("/api/benchmark/results/{run_id}")
+async def get_benchmark_result(run_id: str):
+    run = benchmark_manager.store.get(run_id)
+    if not run:
+        raise HTTPException(status_code=404, detail="运行记录不存在")
+    return run
+
+@app.get("/api/benchmark/results/{run_id}/samples")
+async def get_benchmark_samples(run_id: str):
+    """逐请求样本 (内置压测): 每列一个数组，NaN 记为 null"""
+    columns = benchmark_manager.store.samples(run_id)
+    if not columns:
+        raise HTTPException(status_code=404, detail="没有逐请求样本")
+    return {name: [None if isinstance(v, float) and v != v else v for v in column]
+            for name, column in columns.items()}
+
+@app.get("/api/benchmark/results/{run_id}/log")
+async def get_benchmark_log(run_id: str):
+    log = benchmark_manager.store.log(run_id)
+    if log is None:
+        raise HTTPException(status_code=404, detail="没有日志")
+    return PlainTextResponse(log)
+
+@app.delete("/api/benchmark/results/{run_id}")
+async def delete_benchmark_result(run_id: str):
+    if not benchmark_manager.store.delete(run_id):
+        raise HTTPException(status_code=404, detail="运行记录不存在")
+    return {"success": True}
+
+@app.get("/api/benchmark/jobs")
+async def list_benchmark_jobs():
+    return {"jobs": benchmark_manager.list_jobs()}
+
+@app.get("/api/benchmark/jobs/{job_id}")
+async def get_benchmark_job(job_id: str):
+    job = benchmark_manager.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="压测任务不存在")
+    return job.to_dict()
+
+@app.post("/api/benchmark/jobs/{job_id}/cancel")
+async def cancel_benchmark_job(job_id: str):
+    if not benchmark_manager.get(job_id):
+        raise HTTPException(status_code=404, detail="压测任务不存在")
+    return {"success": benchmark_manager.cancel(job_id)}
+
+@app.get("/api/benchmark/jobs/{job_id}/output")
+async def get_benchmark_output(job_id: str, offset: int = 0):
+    """压测控制台输出，从 offset 字节开始 (增量轮询时传上次的 next_offset)"""
+    output = benchmark_manager.read_output(job_id, max(0, offset))
+    if output is None:
+        raise HTTPException(status_code=404, detail="压测任务不存在")
+    return output
+
+@app.websocket("/ws/benchmark/{job_id}")
+async def websocket_benchmark_progress(websocket: WebSocket, job_id: str):
+    """推送压测进度 (完成请求数、滚动吞吐、滚动 p50/p99)，任务结束后关闭"""
+    await websocket.accept()
+    job = benchmark_manager.get(job_id)
+    if not job:
+        await websocket.close(code=4404)
+        return
+    queue = benchmark_manager.subscribe(job_id)
+    try:
+        state = job.to_dict()
+        await websocket.send_json(state)
+        while state["status"] not in ("completed", "error", "cancelled"):
+            state = await queue.get()
+            await websocket.send_json(state)
+        await websocket.close()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        benchmark_manager.unsubscribe(job_id, queue)
 
 @app.websocket("/ws/logs")
 async def websocket_logs(websocket: WebSocket):
@@ -370,30 +831,48 @@ async def websocket_logs(websocket: WebSocket):
 
 @app.get("/api/presets")
 async def get_presets():
-    presets_file = BASE_DIR / "config" / "presets.json"
-    if presets_file.exists():
-        with open(presets_file) as f:
-            return json.load(f)
-    return {"presets": []}
+    return load_presets() or {"presets": []}
 
 @app.post("/api/presets")
 async def save_preset(name: str, config: Dict[str, Any]):
-    presets_file = BASE_DIR / "config" / "presets.json"
-    presets = {"presets": []}
-    if presets_file.exists():
-        with open(presets_file) as f:
-            presets = json.load(f)
+    presets = load_presets() or {"presets": []}
+    presets.setdefault("presets", [])
     preset = {"name": name, "config": config, "created_at": datetime.now().isoformat()}
     presets["presets"] = [p for p in presets["presets"] if p["name"] != name]
     presets["presets"].append(preset)
-    with open(presets_file, "w") as f:
+    with open(PRESETS_FILE, "w") as f:
         json.dump(presets, f, indent=2)
     return {"success": True}
 
 @app.get("/api/npu/status")
 async def get_npu_status():
-    status = await container_manager.get_npu_status()
-    return {"npu_status": status}
+    snapshot = await npu_monitor.get_snapshot()
+    return snapshot.to_dict()
+
+@app.get("/api/npu/history")
+async def get_npu_history(request: Request, device: Optional[int] = None, since: Optional[float] = None,
+                          resolution: Optional[float] = None, metrics: Optional[str] = None,
+                          aggregates: Optional[str] = None):
+    """Downsampled NPU metrics history
+
+    Args:
+        device: NPU id (all devices if omitted)
+        since: Unix timestamp, or negative seconds relative to now (default -3600)
+        resolution: Bucket width in seconds (auto if omitted)
+        metrics: Comma separated subset of utilization,hbm_used,hbm_total,power,temperature
+        aggregates: Comma separated subset of min,max,avg (default all)
+    """
+    metric_list = [m.strip() for m in metrics.split(",")] if metrics else None
+    aggregate_list = [a.strip() for a in aggregates.split(",")] if aggregates else None
+    # 在事件循环内查询: 采样器也在事件循环内写入环形缓冲区，放到线程中会读到写了一半的数据
+    result = npu_monitor.history.query(device=device, since=since, resolution=resolution,
+                                       metrics=metric_list, aggregates=aggregate_list)
+    # 数值序列重复度高，gzip 后 24 h 全部指标也只有几 KB
+    body = json.dumps(result, separators=(",", ":")).encode()
+    if len(body) > 1024 and "gzip" in request.headers.get("accept-encoding", ""):
+        return Response(gzip.compress(body, 6), media_type="application/json",
+                        headers={"Content-Encoding": "gzip", "Vary": "Accept-Encoding"})
+    return Response(body, media_type="application/json")
 
 
 
@@ -408,7 +887,8 @@ class ChatRequest(BaseModel):
     temperature: float = 0.7
     max_tokens: int = 2048
     stream: bool = False
-    url: str = "http://localhost:8000"
+    url: Optional[str] = "http://localhost:8000"  # 为空时通过内置网关在运行中的服务间路由
+    routing: Optional[Literal["prefix", "least_outstanding", "round_robin"]] = None
 
 @app.post("/api/chat")
 async def chat_completion(request: ChatRequest):
@@ -416,7 +896,6 @@ async def chat_completion(request: ChatRequest):
     import httpx
     
     try:
-        api_url = f"{request.url.rstrip('/')}/v1/chat/completions"
         payload = {
             "model": request.model,
             "messages": [{"role": m.role, "content": m.content} for m in request.messages],
@@ -424,7 +903,25 @@ async def chat_completion(request: ChatRequest):
             "max_tokens": request.max_tokens,
             "stream": request.stream
         }
+        if not request.url:
+            # 网关路由: 前缀亲和 / 最少在途 / 轮询
+            try:
+                upstream, response, started, mode = await gateway.send(
+                    "/v1/chat/completions", payload, mode=request.routing)
+            except GatewayError as e:
+                raise HTTPException(status_code=e.status, detail=e.message)
+            if request.stream:
+                return gateway.streaming_response(upstream, response, started, mode,
+                                                  media_type=response.headers.get("content-type"))
+            try:
+                content = b"".join([chunk async for chunk in gateway.relay(upstream, response, started, mode)])
+            finally:
+                await gateway.release(upstream, response)
+            if response.status_code >= 400:
+                raise HTTPException(status_code=response.status_code, detail=content.decode(errors="replace"))
+            return json.loads(content)
         
+        api_url = f"{request.url.rstrip('/')}/v1/chat/completions"
         async with httpx.AsyncClient(timeout=120.0) as client:
             response = await client.post(api_url, json=payload)
             response.raise_for_status()
@@ -433,6 +930,8 @@ async def chat_completion(request: ChatRequest):
         raise HTTPException(status_code=503, detail=f"无法连接到 vLLM 服务: {request.url}")
     except httpx.HTTPStatusError as e:
         raise HTTPException(status_code=e.response.status_code, detail=str(e))
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -451,6 +950,26 @@ async def list_chat_models(url: str = "http://localhost:8000"):
         return {"data": [], "error": str(e)}
 
 
+# ==================== OpenAI 兼容网关 ====================
+@app.post("/v1/chat/completions")
+async def gateway_chat_completions(request: Request):
+    """按 model (served_model_name) 在运行中的副本间负载均衡"""
+    return await gateway.forward(request, "/v1/chat/completions")
+
+@app.post("/v1/completions")
+async def gateway_completions(request: Request):
+    return await gateway.forward(request, "/v1/completions")
+
+@app.get("/v1/models")
+async def gateway_models():
+    return gateway.models()
+
+@app.get("/api/gateway")
+async def gateway_status():
+    """网关上游状态 (在途请求数、失败与摘除情况)"""
+    return gateway.status()
+
+
 if __name__ == "__main__":
     import argparse
     parser = argparse.ArgumentParser(description="vLLM Ascend Playground")
@@ -465,42 +984,49 @@ if __name__ == "__main__":
 async def list_images():
     """列出本地镜像"""
     try:
-        output = await container_manager.run_command("docker images --format '{{json .}}'", check=False)
-        images = []
-        for line in output.strip().split('\n'):
-            if line:
-                try:
-                    import json
-                    data = json.loads(line)
-                    images.append({
-                        "id": data.get("ID", ""),
-                        "repository": data.get("Repository", ""),
-                        "tag": data.get("Tag", ""),
-                        "size": data.get("Size", ""),
-                        "created": data.get("CreatedAt", data.get("CreatedSince", ""))
-                    })
-                except:
-                    pass
+        images = await container_manager.list_images()
         return {"images": images}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/api/images/pull")
-async def pull_image(image: str):
-    """下载镜像"""
+async def pull_image(image: str, force: bool = False):
+    """下载镜像 (后台任务，立即返回 job_id)"""
+    if not container_manager.available:
+        raise HTTPException(status_code=503, detail="No container runtime available")
+    job = image_puller.submit(image, force=force)
+    return {"success": True, "job_id": job.id, "status": job.status, "message": job.message or f"已加入下载队列: {job.image}"}
+
+@app.get("/api/images/pull")
+async def list_pull_jobs():
+    """列出镜像下载任务"""
+    return {"jobs": image_puller.list_jobs()}
+
+@app.get("/api/images/pull/{job_id}")
+async def get_pull_job(job_id: str):
+    """获取镜像下载任务进度"""
+    job = image_puller.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Pull job not found")
+    return job.to_dict()
+
+@app.websocket("/ws/images/pull/{job_id}")
+async def websocket_pull_progress(websocket: WebSocket, job_id: str):
+    """推送镜像下载进度 (每层字节数)，任务结束后关闭"""
+    await websocket.accept()
+    job = image_puller.get(job_id)
+    if not job:
+        await websocket.close(code=4404)
+        return
+    queue = image_puller.subscribe(job_id)
     try:
-        # 使用后台任务执行 docker pull
-        import asyncio
-        process = await asyncio.create_subprocess_shell(
-            f"docker pull {image}",
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE
-        )
-        stdout, stderr = await process.communicate()
-        
-        if process.returncode == 0:
-            return {"success": True, "message": f"镜像 {image} 下载成功"}
-        else:
-            return {"success": False, "message": stderr.decode()}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        state = job.to_dict()
+        await websocket.send_json(state)
+        while state["status"] not in ("completed", "error"):
+            state = await queue.get()
+            await websocket.send_json(state)
+        await websocket.close()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        image_puller.unsubscribe(job_id, queue)
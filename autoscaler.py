@@ -0,0 +1,307 @@
+"""Queue-depth driven replica autoscaler"""
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from dataclasses import asdict, dataclass, fields
+from typing import Any, Deque, Dict, List, Optional
+
+from npu_allocator import NPUAllocationError
+from service_manager import retarget_command
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ScalingPolicy:
+    """Scaling thresholds of one served model
+
+    A replica is added when any "up" signal holds for ``up_sustain``
+    seconds and removed when every "down" signal holds for
+    ``down_sustain`` seconds. The gap between the up and down thresholds is
+    the hysteresis band; inside it nothing happens.
+    """
+    model: str
+    enabled: bool = True
+    min_replicas: int = 1
+    max_replicas: int = 4
+    # 扩容信号 (任一满足): 每副本平均排队数 / 最大 KV cache 使用率 / 最大 TTFT p95 (秒)
+    up_waiting: float = 4.0
+    up_kv_cache: float = 0.9
+    up_ttft_p95: Optional[float] = None
+    # 缩容信号 (全部满足): 每副本平均排队数 / 最大 KV cache 使用率 / 每副本平均运行数
+    down_waiting: float = 0.0
+    down_kv_cache: float = 0.3
+    down_running: float = 1.0
+    up_sustain: float = 30.0
+    down_sustain: float = 300.0
+    up_cooldown: float = 180.0
+    down_cooldown: float = 300.0
+    drain_timeout: float = 120.0
+
+    @classmethod
+    def from_dict(cls, model: str, data: Dict[str, Any]) -> "ScalingPolicy":
+        names = {f.name for f in fields(cls)}
+        policy = cls(model=model, **{k: v for k, v in data.items() if k in names and k != "model"})
+        if policy.min_replicas < 0 or policy.max_replicas < max(1, policy.min_replicas):
+            raise ValueError("需要 0 <= min_replicas <= max_replicas 且 max_replicas >= 1")
+        if policy.down_waiting >= policy.up_waiting or policy.down_kv_cache >= policy.up_kv_cache:
+            raise ValueError("缩容阈值必须低于扩容阈值")
+        return policy
+
+
+@dataclass
+class ScalingState:
+    """Control loop memory of one model"""
+    high_since: Optional[float] = None
+    low_since: Optional[float] = None
+    last_scale_up: float = 0.0
+    last_scale_down: float = 0.0
+    last_signals: Optional[Dict[str, Any]] = None
+    last_decision: str = ""
+
+
+class Autoscaler:
+    """Add or remove replicas of a model from its serving load
+
+    Every ``interval`` seconds the per-replica metrics of each model with a
+    policy (see MetricsScraper) are combined into one set of signals:
+    average waiting and running requests per replica, the highest KV cache
+    usage and the highest TTFT p95. Sustained load starts one more replica
+    through ``ServiceManager.start_service``. The new replica copies the
+    command of a running replica, with free NPUs from the allocator and a
+    free port. Sustained idleness stops the least busy replica through the
+    graceful ``ServiceManager.stop_service`` (no new requests, in-flight
+    ones finish within ``drain_timeout``).
+
+    Only one scaling action per model is in flight at a time. A replica
+    still starting counts towards the replica count but blocks further
+    scale-ups until it is ready. Failed scale-ups (e.g. no free NPUs)
+    also start the cooldown so they are not retried every tick.
+    """
+
+    DEFAULT_INTERVAL = 10.0
+    MAX_EVENTS = 200
+
+    def __init__(self, service_manager, metrics_scraper, gateway, npu_monitor,
+                 config: Optional[Dict[str, Any]] = None):
+        self.service_manager = service_manager
+        self.metrics = metrics_scraper
+        self.gateway = gateway
+        self.npu_monitor = npu_monitor
+        config = config or {}
+        self.interval = float(os.environ.get("AUTOSCALER_INTERVAL", config.get("interval", self.DEFAULT_INTERVAL)))
+        self.policies: Dict[str, ScalingPolicy] = {}
+        for model, data in (config.get("models") or {}).items():
+            try:
+                self.policies[model] = ScalingPolicy.from_dict(model, data)
+            except (TypeError, ValueError) as e:
+                logger.error(f"Invalid autoscaling policy for {model}: {e}")
+        self.states: Dict[str, ScalingState] = {}
+        self.events: Deque[Dict[str, Any]] = deque(maxlen=self.MAX_EVENTS)
+        self._actions: Dict[str, asyncio.Task] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task and not self._task.done():
+            return
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"Autoscaler started, interval={self.interval}s, policies={list(self.policies)}")
+
+    async def stop(self) -> None:
+        tasks = [t for t in [self._task, *self._actions.values()] if t]
+        for task in tasks:
+            task.cancel()
+        for task in tasks:
+            try:
+                await task
+            except (asyncio.CancelledError, Exception):
+                pass
+        self._task = None
+        self._actions.clear()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.step()
+            except Exception as e:
+                logger.error(f"Autoscaler error: {e}")
+            await asyncio.sleep(self.interval)
+
+    def set_policy(self, model: str, data: Dict[str, Any]) -> ScalingPolicy:
+        policy = self.policies[model] = ScalingPolicy.from_dict(model, data)
+        return policy
+
+    def remove_policy(self, model: str) -> bool:
+        self.states.pop(model, None)
+        return self.policies.pop(model, None) is not None
+
+    def replicas(self, model: str, statuses=("starting", "running")) -> List[Any]:
+        return [s for s in self.service_manager.services.values()
+                if s.status in statuses and model in (s.served_model_name, s.model)]
+
+    def signals(self, model: str) -> Optional[Dict[str, Any]]:
+        """Combined load of the running replicas, or None if no replica reported metrics"""
+        latest = [self.metrics.latest(s.id) for s in self.replicas(model, ("running",))]
+        latest = [m for m in latest if m and m.get("waiting") is not None]
+        if not latest:
+            return None
+        ttft = [m["ttft"]["p95"] for m in latest if m["ttft"]["p95"] is not None]
+        return {
+            "replicas_reporting": len(latest),
+            "waiting": round(sum(m["waiting"] for m in latest) / len(latest), 3),
+            "running": round(sum(m["running"] or 0 for m in latest) / len(latest), 3),
+            "kv_cache_usage": max((m["kv_cache_usage"] or 0) for m in latest),
+            "ttft_p95": max(ttft) if ttft else None,
+        }
+
+    def decide(self, policy: ScalingPolicy, state: ScalingState, replicas: int, starting: int,
+               signals: Optional[Dict[str, Any]], now: float) -> str:
+        """Return "up", "down" or "" for one model; updates the sustain timers in ``state``"""
+        if replicas < policy.min_replicas:
+            return "up" if not starting and now - state.last_scale_up >= policy.up_cooldown else ""
+        if replicas > policy.max_replicas:
+            return "down" if now - state.last_scale_down >= policy.down_cooldown else ""
+        if signals is None:
+            # 没有指标时不做判断，重新计时
+            state.high_since = state.low_since = None
+            return ""
+
+        high = (signals["waiting"] >= policy.up_waiting or signals["kv_cache_usage"] >= policy.up_kv_cache
+                or (policy.up_ttft_p95 is not None and signals["ttft_p95"] is not None
+                    and signals["ttft_p95"] >= policy.up_ttft_p95))
+        low = (signals["waiting"] <= policy.down_waiting and signals["kv_cache_usage"] <= policy.down_kv_cache
+               and signals["running"] <= policy.down_running)
+        state.high_since = (state.high_since or now) if high else None
+        state.low_since = (state.low_since or now) if low else None
+
+        if (high and now - state.high_since >= policy.up_sustain and replicas < policy.max_replicas
+                and not starting and now - state.last_scale_up >= policy.up_cooldown):
+            return "up"
+        if (low and now - state.low_since >= policy.down_sustain and replicas > policy.min_replicas
+                and now - state.last_scale_down >= policy.down_cooldown
+                and now - state.last_scale_up >= policy.up_cooldown):
+            return "down"
+        return ""
+
+    async def step(self, now: Optional[float] = None) -> None:
+        """Evaluate every enabled policy once"""
+        now = time.time() if now is None else now
+        for model, policy in list(self.policies.items()):
+            if not policy.enabled:
+                continue
+            state = self.states.setdefault(model, ScalingState())
+            action = self._actions.get(model)
+            if action is not None and not action.done():
+                continue
+            if self.replicas(model, ("draining",)):
+                # 有副本正在下线 (缩容或滚动重启)，等其完成再判断
+                continue
+            replicas = self.replicas(model)
+            starting = sum(s.status == "starting" for s in replicas)
+            signals = self.signals(model)
+            state.last_signals = signals
+            decision = self.decide(policy, state, len(replicas), starting, signals, now)
+            if not decision:
+                continue
+            state.last_decision = decision
+            if decision == "up":
+                state.last_scale_up = now
+                state.high_since = None
+                self._actions[model] = asyncio.create_task(self.scale_up(policy, signals))
+            else:
+                state.last_scale_down = now
+                state.low_since = None
+                self._actions[model] = asyncio.create_task(self.scale_down(policy, signals))
+
+    def _event(self, model: str, action: str, detail: str, signals: Optional[Dict[str, Any]] = None) -> None:
+        self.events.append({"time": time.time(), "model": model, "action": action, "detail": detail,
+                            "signals": signals})
+        logger.info(f"Autoscaler {model}: {action} {detail}")
+
+    async def scale_up(self, policy: ScalingPolicy, signals: Optional[Dict[str, Any]] = None):
+        """Start one more replica modelled on a running (or the latest) replica"""
+        candidates = self.replicas(policy.model, ("running",)) or [
+            s for s in self.service_manager.services.values()
+            if policy.model in (s.served_model_name, s.model) and s.command]
+        if not candidates:
+            self._event(policy.model, "up_failed", "没有可复制启动参数的副本", signals)
+            return None
+        template = candidates[-1]
+        if not template.npu_devices:
+            self._event(policy.model, "up_failed", f"副本 {template.id} 未记录 NPU 设备，无法确定卡数", signals)
+            return None
+        try:
+            snapshot = await self.npu_monitor.refresh()
+            claim, devices = self.service_manager.claim_npus(list(snapshot.npus), len(template.npu_devices))
+        except NPUAllocationError as e:
+            self._event(policy.model, "up_failed", str(e), signals)
+            return None
+        except Exception as e:
+            self._event(policy.model, "up_failed", f"NPU 状态获取失败: {e or type(e).__name__}", signals)
+            return None
+        try:
+            port = self.service_manager.free_port(template.port + 1)
+            command = retarget_command(template.command, devices, port)
+            service = await self.service_manager.start_service(
+                container_name=template.container_name,
+                command=command,
+                model=template.model,
+                port=port,
+                npu_devices=devices,
+                image=template.image,
+                served_model_name=template.served_model_name,
+                npu_claim=claim,
+            )
+        except Exception as e:
+            self._event(policy.model, "up_failed", str(e) or type(e).__name__, signals)
+            return None
+        finally:
+            self.service_manager.release_npus(claim)
+        self._event(policy.model, "up", f"service {service.id} port {port} NPU {devices}", signals)
+        return service
+
+    async def scale_down(self, policy: ScalingPolicy, signals: Optional[Dict[str, Any]] = None):
+        """Drain the least busy running replica and stop it"""
+        running = self.replicas(policy.model, ("running",))
+        if len(running) <= policy.min_replicas:
+            return None
+
+        def busy(service) -> float:
+            latest = self.metrics.latest(service.id) or {}
+            upstream = self.gateway.upstreams.get(service.id)
+            return ((latest.get("running") or 0) + (latest.get("waiting") or 0)
+                    + (upstream.outstanding if upstream else 0))
+
+        # 最空闲的副本，相同时先停最新启动的
+        victim = min(reversed(running), key=busy)
+        self._event(policy.model, "drain", f"service {victim.id}", signals)
+        # 网关不再向 draining 副本转发，在途请求完成 (最多 drain_timeout 秒) 后停止
+        try:
+            await self.service_manager.stop_service(victim.id, drain_timeout=policy.drain_timeout)
+        except Exception as e:
+            self._event(policy.model, "down_failed", f"service {victim.id}: {e or type(e).__name__}", signals)
+            return None
+        self._event(policy.model, "down", f"service {victim.id} stopped", signals)
+        return victim
+
+    def status(self) -> Dict[str, Any]:
+        models = {}
+        for model, policy in self.policies.items():
+            state = self.states.get(model, ScalingState())
+            replicas = self.replicas(model, ("starting", "running", "draining"))
+            action = self._actions.get(model)
+            models[model] = {
+                "policy": asdict(policy),
+                "replicas": {status: sum(s.status == status for s in replicas)
+                             for status in ("starting", "running", "draining")},
+                "signals": state.last_signals,
+                "high_since": state.high_since,
+                "low_since": state.low_since,
+                "last_scale_up": state.last_scale_up or None,
+                "last_scale_down": state.last_scale_down or None,
+                "last_decision": state.last_decision,
+                "action_in_progress": bool(action and not action.done()),
+            }
+        return {"interval": self.interval, "models": models, "events": list(self.events)[-50:]}
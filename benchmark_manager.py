@@ -1,32 +1,280 @@
-"""Benchmark Manager for EvalScope and vLLM Bench"""
+"""Benchmark Manager for EvalScope, vLLM Bench and the built-in load generator"""
 import asyncio
 import json
+import os
 import re
 import logging
+import shutil
+import signal
+import time
+import uuid
+from collections import deque
+from dataclasses import asdict, dataclass, field
 from datetime import datetime
-from typing import List, Dict, Any, Optional
+from pathlib import Path
+from typing import Any, Deque, Dict, List, Optional, Set, Tuple
+
+import evalscope_ingest
+from benchmark_store import BenchmarkStore
+from load_generator import LoadGenerator, LoadSpec
+from service_manager import utf8_boundary
 
 logger = logging.getLogger(__name__)
 
+# tqdm 进度条 "45/100 [" (evalscope / vllm bench 均使用)
+_TQDM_RE = re.compile(r"(\d+)/(\d+) \[")
+# 取消时在容器内中断对应的测试进程
+_CLI_PATTERNS = {"evalscope": "evalscope perf", "vllm_bench": "vllm bench serve"}
+# 结果中单独存放 (不进入历史列表) 的大字段
+_DETAIL_KEYS = ("evalscope",)
+
+
+@dataclass
+class BenchmarkJob:
+    """One benchmark run in the background"""
+    id: str
+    benchmark_type: str
+    config: Dict[str, Any]
+    container_name: Optional[str] = None
+    image: Optional[str] = None  # 被测服务的镜像
+    status: str = "queued"  # queued, running, completed, error, cancelled
+    error: str = ""
+    output_file: str = ""
+    completed: int = 0
+    failed: int = 0
+    total: Optional[int] = None
+    rolling_throughput: Optional[float] = None  # req/s
+    rolling_p50_ms: Optional[float] = None  # 端到端延迟 (仅内置压测)
+    rolling_p99_ms: Optional[float] = None
+    result: Optional[Dict[str, Any]] = None
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    # (时间, 已完成数)，用于外部工具的滚动吞吐
+    _history: Deque[Tuple[float, int]] = field(default_factory=lambda: deque(maxlen=64), repr=False)
+
+    @property
+    def done(self) -> bool:
+        return self.status in ("completed", "error", "cancelled")
+
+    def advance(self, completed: int, total: Optional[int], window: float) -> None:
+        """Record progress parsed from a CLI tool's progress bar"""
+        now = time.monotonic()
+        self.completed = completed
+        self.total = total or self.total
+        self._history.append((now, completed))
+        while len(self._history) > 2 and now - self._history[1][0] >= window:
+            self._history.popleft()
+        first_t, first_n = self._history[0]
+        if now > first_t:
+            self.rolling_throughput = round((completed - first_n) / (now - first_t), 3)
+
+    def to_dict(self) -> Dict[str, Any]:
+        elapsed = ((self.finished_at or time.time()) - self.started_at) if self.started_at else 0.0
+        return {
+            "id": self.id,
+            "benchmark_type": self.benchmark_type,
+            "config": self.config,
+            "container_name": self.container_name,
+            "image": self.image,
+            "status": self.status,
+            "error": self.error,
+            "completed": self.completed,
+            "failed": self.failed,
+            "total": self.total,
+            "progress": round(self.completed * 100 / self.total, 1) if self.total else None,
+            "elapsed": round(elapsed, 2),
+            "rolling_throughput": self.rolling_throughput,
+            "rolling_p50_ms": self.rolling_p50_ms,
+            "rolling_p99_ms": self.rolling_p99_ms,
+            "output_file": self.output_file,
+            "result": self.result,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
 class BenchmarkManager:
-    """Run and manage performance benchmarks"""
-    
-    def __init__(self):
-        self.history: List[Dict[str, Any]] = []
+    """Run and manage performance benchmarks
+
+    Runs are background jobs (``submit``): at most ``BENCHMARK_CONCURRENCY``
+    (default 1) run at a time so benchmarks do not skew each other, the
+    rest wait in order. The console output of each run is appended to
+    ``<BENCHMARK_LOG_DIR>/<job_id>.log`` as it is produced and moved into
+    the store (compressed) when the run ends, together with the summary
+    and, for the built-in load generator, the per-request samples. Progress
+    (completed requests, rolling throughput and, for the built-in load
+    generator, rolling p50/p99 latency) is pushed to subscribers at most
+    every ``PUBLISH_INTERVAL`` seconds.
+    """
+
+    PUBLISH_INTERVAL = 1.0
+    ROLLING_WINDOW = 10.0
+    MAX_FINISHED_JOBS = 50
+    KILL_TIMEOUT = 5.0
+
+    def __init__(self, store: Optional[BenchmarkStore] = None, log_dir: Optional[str] = None,
+                 max_concurrent: Optional[int] = None):
+        self.store = store
+        self.log_dir = Path(log_dir or os.environ.get("BENCHMARK_LOG_DIR")
+                            or Path(__file__).parent / "benchmark_logs")
+        self.max_concurrent = max_concurrent or int(os.environ.get("BENCHMARK_CONCURRENCY", "1"))
+        self.jobs: Dict[str, BenchmarkJob] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._generators: Dict[str, LoadGenerator] = {}
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    def submit(self, config, container_name: Optional[str] = None, image: Optional[str] = None) -> BenchmarkJob:
+        """Queue a benchmark run and return its job"""
+        job = BenchmarkJob(id=uuid.uuid4().hex[:8], benchmark_type=config.benchmark_type,
+                           config=config.model_dump(), container_name=container_name, image=image)
+        self.log_dir.mkdir(parents=True, exist_ok=True)
+        job.output_file = str(self.log_dir / f"{job.id}.log")
+        self.jobs[job.id] = job
+        self._prune()
+        self._tasks[job.id] = asyncio.create_task(self._run(job, config, container_name))
+        return job
+
+    async def wait(self, job: BenchmarkJob) -> BenchmarkJob:
+        task = self._tasks.get(job.id)
+        if task is not None:
+            # 任务被取消时不把取消传给等待方
+            await asyncio.wait({task})
+        return job
+
+    def cancel(self, job_id: str) -> bool:
+        task = self._tasks.get(job_id)
+        if task is None:
+            return False
+        task.cancel()
+        return True
+
+    def get(self, job_id: str) -> Optional[BenchmarkJob]:
+        return self.jobs.get(job_id)
+
+    def list_jobs(self) -> List[Dict[str, Any]]:
+        return [job.to_dict() for job in sorted(self.jobs.values(), key=lambda j: j.created_at, reverse=True)]
+
+    def read_output(self, job_id: str, offset: int = 0, limit: int = 256 * 1024) -> Optional[Dict[str, Any]]:
+        """Console output of a job or stored run from byte ``offset`` (for incremental polling)"""
+        job = self.jobs.get(job_id)
+        try:
+            if job is None:
+                raise FileNotFoundError(job_id)
+            with open(job.output_file, "rb") as f:
+                f.seek(offset)
+                data = f.read(limit)
+        except FileNotFoundError:
+            # 结束后日志已移入数据库
+            log = self.store.log(job_id) if self.store is not None else None
+            if job is None and log is None:
+                return None
+            data = (log or "").encode()[offset:offset + limit]
+        # 只返回完整的 UTF-8 字符，被截断的多字节字符留到下一次读取
+        data = data[:utf8_boundary(data)]
+        return {"offset": offset, "next_offset": offset + len(data), "text": data.decode(errors="replace"),
+                "done": job.done if job is not None else True}
+
+    async def close(self) -> None:
+        for task in self._tasks.values():
+            task.cancel()
+        await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+        self._tasks.clear()
+
+    def subscribe(self, job_id: str) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=1)
+        self._subscribers.setdefault(job_id, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, job_id: str, queue: asyncio.Queue) -> None:
+        subscribers = self._subscribers.get(job_id)
+        if subscribers:
+            subscribers.discard(queue)
+            if not subscribers:
+                del self._subscribers[job_id]
+
+    def _publish(self, job: BenchmarkJob) -> None:
+        generator = self._generators.get(job.id)
+        if generator is not None and generator.started is not None:
+            progress = generator.progress(self.ROLLING_WINDOW)
+            job.completed, job.failed, job.total = progress["completed"], progress["failed"], progress["total"]
+            job.rolling_throughput = progress["rolling_throughput"]
+            job.rolling_p50_ms, job.rolling_p99_ms = progress["rolling_p50_ms"], progress["rolling_p99_ms"]
+            if not job.done:
+                self._append_output(job, f"[{progress['elapsed']:.0f}s] {job.completed}/{job.total} completed, "
+                                         f"{job.failed} failed, {job.rolling_throughput} req/s, "
+                                         f"p50 {job.rolling_p50_ms} ms, p99 {job.rolling_p99_ms} ms\n")
+        state = job.to_dict()
+        for queue in self._subscribers.get(job.id, ()):
+            # 只保留最新状态，慢速客户端不会积压消息
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(state)
 
-    async def run_evalscope(self, config, container_name: Optional[str] = None) -> Dict[str, Any]:
+    async def _publish_loop(self, job: BenchmarkJob) -> None:
+        while True:
+            await asyncio.sleep(self.PUBLISH_INTERVAL)
+            self._publish(job)
+
+    @staticmethod
+    def _append_output(job: BenchmarkJob, text: str) -> None:
+        with open(job.output_file, "a") as f:
+            f.write(text)
+
+    async def _run(self, job: BenchmarkJob, config, container_name: Optional[str]) -> None:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrent)
+        publisher = None
+        try:
+            async with self._semaphore:
+                job.status = "running"
+                job.started_at = time.time()
+                self._publish(job)
+                publisher = asyncio.create_task(self._publish_loop(job))
+                if config.benchmark_type == "evalscope":
+                    result = await self.run_evalscope(config, container_name, job)
+                elif config.benchmark_type == "native":
+                    result = await self.run_native(config, job)
+                else:
+                    result = await self.run_vllm_bench(config, container_name, job)
+                job.result = await self._save(result, config, job)
+                job.status = "completed" if result.get("success") else "error"
+                job.error = result.get("error", "")
+        except asyncio.CancelledError:
+            job.status = "cancelled"
+            self._append_output(job, "\n[cancelled]\n")
+            await self._save_unfinished(job, config)
+        except Exception as e:
+            logger.error(f"Benchmark {job.id} failed: {e}")
+            job.status = "error"
+            job.error = str(e)
+            self._append_output(job, f"\n[error] {e}\n")
+            await self._save_unfinished(job, config)
+        finally:
+            if publisher is not None:
+                publisher.cancel()
+            job.finished_at = time.time()
+            self._publish(job)
+            self._tasks.pop(job.id, None)
+            self._generators.pop(job.id, None)
+
+    async def run_evalscope(self, config, container_name: Optional[str] = None,
+                            job: Optional[BenchmarkJob] = None) -> Dict[str, Any]:
         # 构建 evalscope perf 命令
         cmd = f"evalscope perf --url {config.url} --model {config.model_name} --api openai -n {config.number} --parallel {config.parallel} --dataset {config.dataset} --temperature {config.temperature} --stream"
-        
-        result = await self._run_benchmark(cmd, container_name)
+
+        result = await self._run_benchmark(cmd, container_name, job)
         parsed = self._parse_evalscope_output(result.get("output", ""))
         result.update(parsed)
+        await self._ingest_evalscope(result, config, container_name, job)
         result["benchmark_type"] = "evalscope"
         result["timestamp"] = datetime.now().isoformat()
-        self.history.append(result)
         return result
 
-    async def run_vllm_bench(self, config, container_name: Optional[str] = None) -> Dict[str, Any]:
+    async def run_vllm_bench(self, config, container_name: Optional[str] = None,
+                             job: Optional[BenchmarkJob] = None) -> Dict[str, Any]:
         cmd = f"""vllm bench serve \
             --base-url {config.url.replace('/v1/chat/completions', '')} \
             --model {config.model_name} \
@@ -35,33 +283,182 @@ class BenchmarkManager:
             --num-prompts {config.num_prompts} \
             --random-input-len {config.random_input_len} \
             --random-output-len {config.random_output_len}"""
-        
-        result = await self._run_benchmark(cmd, container_name)
+
+        result = await self._run_benchmark(cmd, container_name, job)
         parsed = self._parse_vllm_bench_output(result.get("output", ""))
         result.update(parsed)
         result["benchmark_type"] = "vllm_bench"
         result["timestamp"] = datetime.now().isoformat()
-        self.history.append(result)
         return result
 
-    async def _run_benchmark(self, cmd: str, container_name: Optional[str] = None) -> Dict[str, Any]:
+    async def run_native(self, config, job: Optional[BenchmarkJob] = None) -> Dict[str, Any]:
+        """Run the in-process load generator (no evalscope / vllm install needed)"""
+        spec = LoadSpec(
+            url=config.url,
+            model=config.model_name,
+            num_requests=config.num_prompts,
+            request_rate=config.request_rate,
+            arrival=config.arrival,
+            burst_size=config.burst_size,
+            max_concurrency=config.max_concurrency or None,
+            input_len=config.random_input_len,
+            output_len=config.random_output_len,
+            temperature=config.temperature,
+            seed=config.seed,
+        )
+        samples = None
+        try:
+            generator = LoadGenerator(spec)
+            if job is not None:
+                self._generators[job.id] = generator
+                self._append_output(job, f"native load: {json.dumps(asdict(spec))}\n")
+            summary = await generator.run()
+            samples = generator.samples.columns()
+            result = {"success": summary["completed"] > 0, **summary}
+            if not summary["completed"]:
+                result["error"] = next(iter(summary["errors"]), "no request completed")
+            if job is not None:
+                self._publish(job)
+                self._append_output(job, json.dumps(summary, indent=2) + "\n")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            result = {"success": False, "error": str(e)}
+        # 与其他测试类型相同的汇总字段 (延迟为端到端延迟，毫秒)
+        result.update({
+            "throughput": result.get("request_throughput"),
+            "avg_latency": result.get("mean_e2el_ms"),
+            "p50_latency": result.get("median_e2el_ms"),
+            "p95_latency": result.get("p95_e2el_ms"),
+            "p99_latency": result.get("p99_e2el_ms"),
+            "tokens_per_second": result.get("output_throughput"),
+            "config": asdict(spec),
+            "benchmark_type": "native",
+            "timestamp": datetime.now().isoformat(),
+        })
+        if samples is not None:
+            result["samples"] = samples
+        return result
+
+    async def _ingest_evalscope(self, result: Dict[str, Any], config, container_name: Optional[str],
+                                job: Optional[BenchmarkJob]) -> None:
+        """Attach distributions and error summary from evalscope's output directory to ``result``
+
+        Container runs have their output directory copied out with
+        ``docker cp`` first. Summary metrics missing from stdout are filled
+        in from the per-request records (latencies in ms, as for native runs).
+        """
+        output = result.get("output", "")
+        copied = None
         try:
             if container_name:
-                full_cmd = f"docker exec {container_name} bash -c '{cmd}'"
+                remote = evalscope_ingest.outputs_dir_from_log(output)
+                if not remote:
+                    return
+                if not remote.startswith("/"):
+                    workdir, _ = await self._shell(f"docker exec {container_name} pwd")
+                    remote = f"{workdir.strip()}/{remote}"
+                copied = self.log_dir / f"{job.id if job else uuid.uuid4().hex[:8]}-evalscope"
+                _, code = await self._shell(f"docker cp {container_name}:{remote} {copied}")
+                output_dir = copied if code == 0 else None
             else:
-                # 激活虚拟环境后运行命令
-                venv_activate = "source /data2/scd/scd/.venv/bin/activate"
-                full_cmd = f"bash -c '{venv_activate} && {cmd}'"
-            
+                since = job.started_at if job and job.started_at else 0.0
+                output_dir = evalscope_ingest.find_output_dir(output, config.model_name, since)
+            if output_dir is None or not output_dir.is_dir():
+                return
+            ingested = await asyncio.to_thread(evalscope_ingest.ingest, output_dir)
+        except Exception as e:
+            logger.warning(f"Failed to ingest evalscope output: {e}")
+            return
+        finally:
+            if copied is not None:
+                shutil.rmtree(copied, ignore_errors=True)
+        if copied is not None:
+            ingested["output_dir"] = f"{container_name}:{remote}"
+        columns = ingested.pop("columns")
+        if columns is not None:
+            result["samples"] = columns.columns()
+        result["evalscope"] = ingested
+        dist = ingested["distributions"]
+        if dist and dist["completed"]:
+            latency = dist["latency_ms"]
+            for key, value in (("throughput", dist["request_throughput"]), ("avg_latency", latency["mean"]),
+                               ("p50_latency", latency["p50"]), ("p95_latency", latency["p95"]),
+                               ("p99_latency", latency["p99"]), ("tokens_per_second", dist["output_throughput"])):
+                if result.get(key) is None:
+                    result[key] = value
+        if ingested["errors"]:
+            result["error_classes"] = {e["error_class"]: e["count"] for e in ingested["errors"]}
+
+    @staticmethod
+    async def _shell(cmd: str) -> Tuple[str, int]:
+        proc = await asyncio.create_subprocess_shell(
+            cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT)
+        stdout, _ = await proc.communicate()
+        return stdout.decode(errors="replace"), proc.returncode
+
+    async def _run_benchmark(self, cmd: str, container_name: Optional[str] = None,
+                             job: Optional[BenchmarkJob] = None) -> Dict[str, Any]:
+        """Run a benchmark CLI, streaming its output to the job's log file and progress"""
+        if container_name:
+            full_cmd = f"docker exec {container_name} bash -c '{cmd}'"
+        else:
+            # 激活虚拟环境后运行命令
+            venv_activate = "source /data2/scd/scd/.venv/bin/activate"
+            full_cmd = f"bash -c '{venv_activate} && {cmd}'"
+        chunks: List[bytes] = []
+        try:
+            # 独立进程组，取消时整组终止
             proc = await asyncio.create_subprocess_shell(
-                full_cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT
+                full_cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT, start_new_session=True
             )
-            stdout, _ = await proc.communicate()
-            output = stdout.decode()
-            
-            return {"success": proc.returncode == 0, "output": output, "raw_output": output}
         except Exception as e:
             return {"success": False, "error": str(e), "output": "", "raw_output": ""}
+        out = open(job.output_file, "ab") if job is not None else None
+        try:
+            while True:
+                chunk = await proc.stdout.read(64 * 1024)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+                if out is not None:
+                    out.write(chunk)
+                    out.flush()
+                    # tqdm 用 \r 刷新进度条，取本块中最后一个进度
+                    matches = _TQDM_RE.findall(chunk.decode(errors="replace"))
+                    if matches:
+                        done, total = matches[-1]
+                        job.advance(int(done), int(total), self.ROLLING_WINDOW)
+            await proc.wait()
+        except asyncio.CancelledError:
+            await self._terminate(proc, container_name, cmd)
+            raise
+        finally:
+            if out is not None:
+                out.close()
+        output = b"".join(chunks).decode(errors="replace")
+        return {"success": proc.returncode == 0, "output": output, "raw_output": output}
+
+    async def _terminate(self, proc: asyncio.subprocess.Process, container_name: Optional[str], cmd: str) -> None:
+        """Stop a cancelled benchmark: SIGTERM the process group, SIGKILL after KILL_TIMEOUT"""
+        if container_name:
+            # 终止 docker exec 客户端不会结束容器内的进程
+            pattern = next((p for p in _CLI_PATTERNS.values() if cmd.startswith(p)), None)
+            if pattern:
+                killer = await asyncio.create_subprocess_shell(
+                    f"docker exec {container_name} pkill -INT -f '{pattern}'",
+                    stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.DEVNULL)
+                await killer.wait()
+        for sig in (signal.SIGTERM, signal.SIGKILL):
+            try:
+                os.killpg(proc.pid, sig)
+            except ProcessLookupError:
+                return
+            try:
+                await asyncio.wait_for(proc.wait(), self.KILL_TIMEOUT)
+                return
+            except asyncio.TimeoutError:
+                continue
 
     def _parse_evalscope_output(self, output: str) -> Dict[str, Any]:
         result = {}
@@ -95,5 +492,44 @@ class BenchmarkManager:
                 result[key] = float(match.group(1))
         return result
 
-    def get_history(self) -> List[Dict[str, Any]]:
-        return self.history
+    async def _save_unfinished(self, job: BenchmarkJob, config) -> None:
+        """Persist a cancelled or failed run (with its log) so it shows up in the history"""
+        result = {"success": False, "status": job.status, "error": job.error or job.status,
+                  "benchmark_type": job.benchmark_type, "timestamp": datetime.now().isoformat()}
+        try:
+            job.result = await self._save(result, config, job)
+        except Exception as e:
+            logger.error(f"Failed to save benchmark {job.id}: {e}")
+
+    async def _save(self, result: Dict[str, Any], config, job: BenchmarkJob) -> Dict[str, Any]:
+        """Persist a finished run; returns the summary without logs or samples"""
+        samples = result.pop("samples", None)
+        details = {key: result.pop(key) for key in _DETAIL_KEYS if key in result}
+        log = result.pop("raw_output", None)
+        result.pop("output", None)
+        result.setdefault("status", "completed" if result.get("success") else "error")
+        result.update({
+            "id": job.id,
+            "created_at": job.created_at,
+            "model": config.model_name,
+            "image": job.image,
+            "template": config.template,
+            "container_name": job.container_name,
+            "log_size": os.path.getsize(job.output_file) if os.path.exists(job.output_file) else len(log or ""),
+        })
+        if self.store is not None:
+            try:
+                if os.path.exists(job.output_file):
+                    log = Path(job.output_file).read_text(errors="replace")
+                # 压缩日志不阻塞事件循环
+                await asyncio.to_thread(self.store.save, result, samples, log, details)
+                os.unlink(job.output_file)
+            except Exception as e:
+                logger.error(f"Failed to save benchmark {job.id}: {e}")
+        # 任务结果 (推送给前端) 含详细分布，历史列表中不含
+        return {**result, **details}
+
+    def _prune(self) -> None:
+        finished = sorted((j for j in self.jobs.values() if j.done), key=lambda j: j.created_at)
+        for job in finished[:max(0, len(finished) - self.MAX_FINISHED_JOBS)]:
+            del self.jobs[job.id]
@@ -0,0 +1,233 @@
+"""Durable benchmark results (SQLite): summaries, per-request samples, compressed logs"""
+import json
+import logging
+import math
+import os
+import sqlite3
+import threading
+import zlib
+from array import array
+from typing import Any, Dict, List, Optional, Sequence
+
+from service_store import DEFAULT_DB_PATH
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS benchmark_runs (
+    id TEXT PRIMARY KEY,
+    created_at REAL NOT NULL,
+    benchmark_type TEXT NOT NULL,
+    model TEXT,
+    image TEXT,
+    template TEXT,
+    success INTEGER NOT NULL,
+    summary TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_benchmark_runs_created ON benchmark_runs(created_at);
+CREATE INDEX IF NOT EXISTS idx_benchmark_runs_model ON benchmark_runs(model, created_at);
+CREATE INDEX IF NOT EXISTS idx_benchmark_runs_image ON benchmark_runs(image, created_at);
+CREATE INDEX IF NOT EXISTS idx_benchmark_runs_template ON benchmark_runs(template, created_at);
+CREATE TABLE IF NOT EXISTS benchmark_samples (
+    run_id TEXT NOT NULL,
+    name TEXT NOT NULL,
+    typecode TEXT NOT NULL,
+    data BLOB NOT NULL,
+    PRIMARY KEY (run_id, name)
+);
+CREATE TABLE IF NOT EXISTS benchmark_details (
+    run_id TEXT PRIMARY KEY,
+    data BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS benchmark_logs (
+    run_id TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    data BLOB NOT NULL
+);
+"""
+
+# 对比时越小越好的指标 (名称包含以下片段)
+_LOWER_IS_BETTER = ("latency", "ttft", "tpot", "itl", "e2el", "duration", "failed")
+# 对比表中排在前面的指标
+_KEY_METRICS = ("throughput", "tokens_per_second", "avg_latency", "p50_latency", "p95_latency", "p99_latency")
+
+
+class BenchmarkStore:
+    """Persist benchmark runs in separate tables so the history stays cheap to read
+
+    ``benchmark_runs`` holds one small row per run: the summary metrics as
+    JSON plus the filter columns (model, image, template, time), each with
+    an index ending in ``created_at`` so a filtered, newest-first page is an
+    index range scan. Large per-run details (distributions, error
+    summaries) are compressed JSON in ``benchmark_details`` and only merged
+    in by ``get``. Per-request samples live in ``benchmark_samples`` as one
+    zlib-compressed typed array per column, and the console log in
+    ``benchmark_logs`` compressed; both are only read when asked for.
+    Shares the database file (and WAL settings) with ServiceStore.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = str(path or os.environ.get("PLAYGROUND_DB") or DEFAULT_DB_PATH)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+
+    def save(self, run: Dict[str, Any], samples: Optional[Dict[str, array]] = None,
+             log: Optional[str] = None, details: Optional[Dict[str, Any]] = None) -> None:
+        """Insert or replace a run; ``run`` needs id, created_at and benchmark_type"""
+        row = (run["id"], run["created_at"], run["benchmark_type"], run.get("model"), run.get("image"),
+               run.get("template"), int(bool(run.get("success"))), json.dumps(run, ensure_ascii=False))
+        sample_rows = [(run["id"], name, column.typecode, zlib.compress(column.tobytes()))
+                       for name, column in (samples or {}).items()]
+        details_row = (run["id"], zlib.compress(json.dumps(details, ensure_ascii=False).encode())) if details else None
+        log_row = None
+        if log:
+            raw = log.encode()
+            log_row = (run["id"], len(raw), zlib.compress(raw, 6))
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO benchmark_runs "
+                    "(id, created_at, benchmark_type, model, image, template, success, summary) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)", row)
+                if sample_rows:
+                    self._conn.execute("DELETE FROM benchmark_samples WHERE run_id = ?", (run["id"],))
+                    self._conn.executemany(
+                        "INSERT INTO benchmark_samples (run_id, name, typecode, data) VALUES (?, ?, ?, ?)",
+                        sample_rows)
+                if details_row:
+                    self._conn.execute("INSERT OR REPLACE INTO benchmark_details (run_id, data) VALUES (?, ?)",
+                                       details_row)
+                if log_row:
+                    self._conn.execute("INSERT OR REPLACE INTO benchmark_logs (run_id, size, data) VALUES (?, ?, ?)",
+                                       log_row)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def list(self, page: int = 1, page_size: int = 50, model: Optional[str] = None, image: Optional[str] = None,
+             template: Optional[str] = None, benchmark_type: Optional[str] = None, since: Optional[float] = None,
+             until: Optional[float] = None) -> Dict[str, Any]:
+        """Newest-first page of run summaries matching all given filters"""
+        clauses, params = [], []
+        for column, value in (("model", model), ("image", image), ("template", template),
+                              ("benchmark_type", benchmark_type)):
+            if value:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        if since is not None:
+            clauses.append("created_at >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("created_at < ?")
+            params.append(until)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        page, page_size = max(1, page), max(1, min(page_size, 500))
+        with self._lock:
+            total = self._conn.execute(f"SELECT COUNT(*) FROM benchmark_runs {where}", params).fetchone()[0]
+            rows = self._conn.execute(
+                f"SELECT summary FROM benchmark_runs {where} ORDER BY created_at DESC LIMIT ? OFFSET ?",
+                (*params, page_size, (page - 1) * page_size)).fetchall()
+        return {"total": total, "page": page, "page_size": page_size, "runs": [json.loads(r[0]) for r in rows]}
+
+    def facets(self) -> Dict[str, List[str]]:
+        """Distinct filter values for the history page"""
+        result = {}
+        with self._lock:
+            for column in ("model", "image", "template", "benchmark_type"):
+                rows = self._conn.execute(
+                    f"SELECT DISTINCT {column} FROM benchmark_runs WHERE {column} IS NOT NULL ORDER BY 1").fetchall()
+                result[column] = [r[0] for r in rows]
+        return result
+
+    def get(self, run_id: str) -> Optional[Dict[str, Any]]:
+        """Summary of a run with its details merged in"""
+        with self._lock:
+            row = self._conn.execute("SELECT summary FROM benchmark_runs WHERE id = ?", (run_id,)).fetchone()
+            details = self._conn.execute("SELECT data FROM benchmark_details WHERE run_id = ?", (run_id,)).fetchone()
+        if not row:
+            return None
+        run = json.loads(row[0])
+        if details:
+            run.update(json.loads(zlib.decompress(details[0])))
+        return run
+
+    def get_many(self, run_ids: Sequence[str]) -> List[Dict[str, Any]]:
+        """Runs in the order of ``run_ids`` (unknown ids are skipped)"""
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT id, summary FROM benchmark_runs WHERE id IN ({','.join('?' * len(run_ids))})",
+                list(run_ids)).fetchall()
+        found = {run_id: json.loads(summary) for run_id, summary in rows}
+        return [found[i] for i in run_ids if i in found]
+
+    def samples(self, run_id: str, names: Optional[Sequence[str]] = None) -> Dict[str, array]:
+        query, params = "SELECT name, typecode, data FROM benchmark_samples WHERE run_id = ?", [run_id]
+        if names:
+            query += f" AND name IN ({','.join('?' * len(names))})"
+            params.extend(names)
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        columns = {}
+        for name, typecode, data in rows:
+            column = array(typecode)
+            column.frombytes(zlib.decompress(data))
+            columns[name] = column
+        return columns
+
+    def log(self, run_id: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT data FROM benchmark_logs WHERE run_id = ?", (run_id,)).fetchone()
+        return zlib.decompress(row[0]).decode(errors="replace") if row else None
+
+    def delete(self, run_id: str) -> bool:
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                deleted = self._conn.execute("DELETE FROM benchmark_runs WHERE id = ?", (run_id,)).rowcount
+                self._conn.execute("DELETE FROM benchmark_samples WHERE run_id = ?", (run_id,))
+                self._conn.execute("DELETE FROM benchmark_details WHERE run_id = ?", (run_id,))
+                self._conn.execute("DELETE FROM benchmark_logs WHERE run_id = ?", (run_id,))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return bool(deleted)
+
+    def compare(self, run_ids: Sequence[str]) -> Optional[Dict[str, Any]]:
+        """Line up the numeric summary metrics of several runs
+
+        For each metric: the value per run (None if that run lacks it), the
+        index of the best run and the change from the first run in percent.
+        """
+        runs = self.get_many(run_ids)
+        if not runs:
+            return None
+        names = []
+        for run in runs:
+            for key, value in run.items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool) and key not in names \
+                        and key != "created_at":
+                    names.append(key)
+        names.sort(key=lambda n: (_KEY_METRICS.index(n) if n in _KEY_METRICS else len(_KEY_METRICS), n))
+        metrics = []
+        for name in names:
+            values = [run.get(name) for run in runs]
+            present = [(v, i) for i, v in enumerate(values) if isinstance(v, (int, float)) and not math.isnan(v)]
+            lower = any(part in name for part in _LOWER_IS_BETTER)
+            best = (min(present) if lower else max(present))[1] if len(present) > 1 else None
+            base = values[0]
+            delta = [round((v - base) * 100 / base, 2) if isinstance(v, (int, float)) and base else None
+                     for v in values]
+            metrics.append({"metric": name, "values": values, "lower_is_better": lower, "best": best,
+                            "delta_pct": delta})
+        keys = ("id", "timestamp", "benchmark_type", "model", "image", "template", "success")
+        return {"runs": [{k: run.get(k) for k in keys} for run in runs], "metrics": metrics}
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
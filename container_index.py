@@ -0,0 +1,101 @@
+"""Container ID index and PID-to-container resolution"""
+import asyncio
+import logging
+import time
+from typing import Dict, Optional, Tuple
+
+import procfs
+
+logger = logging.getLogger(__name__)
+
+
+class ContainerIndex:
+    """Map container IDs to names with a single list call
+
+    The index is built from one container list call (or fed by the container
+    inventory) and rebuilt only when it is invalidated (container
+    created/removed) or when a lookup misses. PIDs are resolved by reading
+    ``/proc/<pid>/cgroup`` directly and cached by ``(pid, start_time)`` so a
+    reused PID is never mismatched.
+    """
+
+    # 未命中时重建索引的最小间隔，避免宿主机上的非容器进程反复触发 docker ps
+    MISS_REFRESH_INTERVAL = 10.0
+    MAX_PID_CACHE = 4096
+
+    def __init__(self, container_manager):
+        self.container_manager = container_manager
+        self._names: Dict[str, str] = {}  # full id -> name
+        self._pid_cache: Dict[Tuple[int, int], Optional[str]] = {}  # (pid, start_time) -> full id
+        self._built_at: float = 0.0
+        self._stale = True
+        self._lock: Optional[asyncio.Lock] = None
+
+    def invalidate(self) -> None:
+        """Mark the index stale so the next lookup rebuilds it"""
+        self._stale = True
+
+    def replace(self, names: Dict[str, str]) -> None:
+        """Replace the whole index (fed by the container inventory)"""
+        self._names = dict(names)
+        self._built_at = time.monotonic()
+        self._stale = False
+
+    def update(self, container_id: str, name: Optional[str]) -> None:
+        """Add, rename or (with name=None) remove a single entry"""
+        if name:
+            self._names[container_id] = name.lstrip("/")
+        else:
+            self._names.pop(container_id, None)
+
+    async def refresh(self) -> None:
+        """Rebuild the index from one runtime call"""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        built_before = self._built_at
+        async with self._lock:
+            if self._built_at != built_before:
+                return  # 等锁期间已有其他协程完成重建
+            names = await self.container_manager.list_container_names()
+            self._names = names
+            self._built_at = time.monotonic()
+            self._stale = False
+
+    async def name_for_id(self, container_id: str) -> Optional[str]:
+        """Resolve a (full or short) container ID to its name"""
+        if self._stale:
+            await self.refresh()
+        name = self._lookup(container_id)
+        if name is None and time.monotonic() - self._built_at > self.MISS_REFRESH_INTERVAL:
+            await self.refresh()
+            name = self._lookup(container_id)
+        return name
+
+    def _lookup(self, container_id: str) -> Optional[str]:
+        name = self._names.get(container_id)
+        if name is None and len(container_id) < 64:
+            for full_id, full_name in self._names.items():
+                if full_id.startswith(container_id):
+                    return full_name
+        return name
+
+    def container_id_for_pid(self, pid: int) -> Optional[str]:
+        """Full container ID of a host PID (cached by pid and start time)"""
+        start_time = procfs.read_start_time(pid)
+        if start_time is None:
+            return None
+        key = (pid, start_time)
+        if key in self._pid_cache:
+            return self._pid_cache[key]
+        if len(self._pid_cache) >= self.MAX_PID_CACHE:
+            self._pid_cache.clear()
+        container_id = procfs.read_container_id(pid)
+        self._pid_cache[key] = container_id
+        return container_id
+
+    async def container_for_pid(self, pid: int) -> Optional[str]:
+        """Container name of a host PID, or None for host processes"""
+        container_id = self.container_id_for_pid(int(pid))
+        if not container_id:
+            return None
+        return await self.name_for_id(container_id)
@@ -0,0 +1,166 @@
+"""In-memory container inventory kept current by the runtime event stream"""
+import asyncio
+import json
+import logging
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class ContainerInventory:
+    """Container list seeded once and then updated from ``events``
+
+    After the initial listing, every container event (create, start, die,
+    rename, destroy, ...) re-reads only the affected container, so
+    ``list()`` is an in-memory filter regardless of how often it is polled.
+    If the event stream drops, the inventory is marked unsynced (callers fall
+    back to a direct listing) and a full resync runs before resubscribing.
+    """
+
+    # 兜底全量同步间隔，同时刷新 "Up 2 hours" 这类随时间变化的状态文本
+    RESYNC_INTERVAL = 300.0
+    MAX_BACKOFF = 30.0
+    # 这些事件不改变容器列表，忽略以免 exec 探测产生额外查询
+    IGNORED_ACTIONS = ("exec_create", "exec_start", "exec_die", "health_status", "top", "attach",
+                       "resize", "copy", "export", "commit", "archive-path", "extract-to-dir")
+
+    def __init__(self, container_manager):
+        self.container_manager = container_manager
+        self._containers: Dict[str, Dict[str, Any]] = {}  # full id -> summary
+        self._ordered: Optional[List[Dict[str, Any]]] = None
+        self.synced = False
+        self.synced_at: float = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        """Start seeding and following the event stream"""
+        if self._task and not self._task.done():
+            return
+        if not self.container_manager.available:
+            return  # 无容器运行时，list_containers 直接返回空列表
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self.synced = False
+
+    def list(self, keyword: Optional[str] = None, running_only: bool = False) -> List[Dict[str, Any]]:
+        """Filtered copy of the inventory, newest first"""
+        if self._ordered is None:
+            self._ordered = sorted(self._containers.values(), key=lambda c: str(c.get("created", "")), reverse=True)
+        return self.container_manager._filter_containers(self._ordered, keyword, running_only)
+
+    def names(self) -> Dict[str, str]:
+        """Full container ID -> name"""
+        return {cid: c["name"] for cid, c in self._containers.items()}
+
+    async def touch(self, ref: str, removed: bool = False) -> None:
+        """Apply a change made through this process without waiting for its event
+
+        Args:
+            ref: Container name or (prefix of) ID
+            removed: The container was deleted
+        """
+        if not self.synced:
+            return
+        container_id = next((cid for cid, c in self._containers.items()
+                             if c["name"] == ref or cid.startswith(ref)), ref)
+        if removed:
+            self._remove(container_id)
+        else:
+            await self._apply(container_id, "touch")
+
+    async def resync(self) -> None:
+        """Replace the inventory with a full listing"""
+        containers = await self.container_manager.fetch_containers()
+        self._containers = dict(containers)
+        self._ordered = None
+        self.synced = True
+        self.synced_at = time.time()
+        self.container_manager.container_index.replace(self.names())
+
+    async def _run(self) -> None:
+        backoff = 1.0
+        while True:
+            since = time.time()
+            try:
+                await self.resync()
+                logger.info(f"Container inventory synced: {len(self._containers)} containers")
+                # since 覆盖同步期间产生的事件，重放是幂等的
+                await asyncio.wait_for(self._follow(since - 1), timeout=self.RESYNC_INTERVAL)
+                logger.warning("Container event stream ended, resyncing")
+            except asyncio.TimeoutError:
+                backoff = 1.0
+                continue
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Container event stream error: {e}, retry in {backoff:.0f}s")
+            self.synced = False
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, self.MAX_BACKOFF)
+
+    async def _follow(self, since: float) -> None:
+        async for event in self._events(since):
+            container_id = event.get("id") or event.get("Actor", {}).get("ID") or event.get("ID")
+            action = (event.get("Action") or event.get("status") or event.get("Status") or "").lower()
+            if not container_id or action.split(":")[0] in self.IGNORED_ACTIONS:
+                continue
+            await self._apply(container_id, action)
+
+    async def _events(self, since: float) -> AsyncIterator[Dict[str, Any]]:
+        """Container events from the REST API, or from the CLI as a fallback"""
+        cm = self.container_manager
+        if cm.api:
+            async for event in cm.api.stream_json("GET", "/events", params={
+                "since": int(since),
+                "filters": json.dumps({"type": ["container"]}),
+            }):
+                yield event
+            return
+        if not cm.runtime:
+            raise RuntimeError("No container runtime available")
+        proc = await asyncio.create_subprocess_exec(
+            cm.runtime, "events", "--since", str(int(since)), "--filter", "type=container",
+            "--format", "{{json .}}",
+            stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.DEVNULL,
+        )
+        try:
+            async for line in proc.stdout:
+                line = line.strip()
+                if line:
+                    try:
+                        yield json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+        finally:
+            if proc.returncode is None:
+                proc.kill()
+                await proc.wait()
+
+    async def _apply(self, container_id: str, action: str) -> None:
+        """Update one container after an event"""
+        if action == "destroy":
+            self._remove(container_id)
+            return
+        containers = await self.container_manager.fetch_containers(container_id=container_id)
+        if not containers:
+            self._remove(container_id)
+            return
+        for full_id, summary in containers:
+            self._containers[full_id] = summary
+            self.container_manager.container_index.update(full_id, summary["name"])
+        self._ordered = None
+
+    def _remove(self, container_id: str) -> None:
+        for full_id in [cid for cid in self._containers if cid.startswith(container_id)]:
+            del self._containers[full_id]
+            self.container_manager.container_index.update(full_id, None)
+        self._ordered = None
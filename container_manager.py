@@ -1,14 +1,43 @@
 """Ascend NPU Container Manager"""
 import asyncio
+import os
 import re
 import json
 import logging
 import subprocess
 import shutil
-from typing import List, Dict, Any, Optional
+import signal
+import time
+from datetime import datetime
+from typing import List, Dict, Any, AsyncIterator, Optional, Tuple
+
+import aiohttp
+
+import procfs
+from container_index import ContainerIndex
+from container_inventory import ContainerInventory
+from exec_session import ExecSessionError, ExecSessionManager
+from docker_api import DockerAPIClient, DockerAPIError, container_summary, find_socket, parse_size
+from npu_smi import NpuSmiInfo, parse_npu_smi
 
 logger = logging.getLogger(__name__)
 
+# Docker API 传输层错误时回退到 CLI
+API_FALLBACK_ERRORS = (aiohttp.ClientError, OSError, asyncio.TimeoutError)
+# 非幂等操作 (创建容器、exec) 只在请求未送达守护进程时 (连接失败) 回退，
+# 超时或连接中断时守护进程可能已执行，再走 CLI 会重复执行
+API_CONNECT_ERRORS = (aiohttp.ClientConnectorError, ConnectionRefusedError, FileNotFoundError)
+
+# pgrep -f 匹配 vllm serve API 进程本身 (argv[0] 为 vllm 或 python .../vllm)，
+# 不匹配命令行中恰好包含 "vllm serve" 的 bash -c 包装进程
+VLLM_SERVE_PATTERN = "^([^ ]*python[^ ]* )?[^ ]*vllm serve "
+
+# 伪容器名: 命令直接在 Playground 所在主机上执行 (仅用于无 NPU 环境下的 mock vLLM 服务)。
+# 默认关闭，需设置 PLAYGROUND_HOST_EXEC=1；关闭时 "host" 按普通容器名处理
+HOST_CONTAINER = "host"
+# 主机上只匹配 mock vLLM: 容器内进程在主机上同样可见，不能按 VLLM_SERVE_PATTERN 查找
+HOST_SERVE_PATTERN = "^([^ ]*python[^ ]* )?[^ ]*/mock/vllm serve "
+
 class AscendContainerManager:
     """Ascend NPU container lifecycle manager"""
     
@@ -25,9 +54,25 @@ class AscendContainerManager:
         "/data2/weights:/data2/weights",
         "/root/.cache/modelscope:/root/.cache/modelscope",
     ]
+    # 同一刷新周期内复用 npu-smi 解析结果
+    NPU_SMI_CACHE_TTL = 2.0
+    # vLLM 进程树向上查找的最大层数 (worker -> engine core -> api server)
+    VLLM_ANCESTOR_DEPTH = 6
     
     def __init__(self):
         self.runtime = self._detect_runtime()
+        self.api = self._detect_api()
+        self.container_index = ContainerIndex(self)
+        self.inventory = ContainerInventory(self)
+        self.sessions = ExecSessionManager(self.runtime)
+        self._npu_smi_cache: Optional[Tuple[float, NpuSmiInfo]] = None
+        self._npu_smi_inflight: Optional[asyncio.Future] = None
+        self._vllm_port_cache: Dict[Tuple[int, int], Optional[int]] = {}
+        self.host_exec = os.environ.get("PLAYGROUND_HOST_EXEC", "").lower() in ("1", "true", "yes")
+    
+    def is_host(self, container_name: Optional[str]) -> bool:
+        """Whether ``container_name`` means this host (HOST_CONTAINER with host execution enabled)"""
+        return self.host_exec and container_name == HOST_CONTAINER
     
     def _detect_runtime(self) -> Optional[str]:
         """Detect available container runtime"""
@@ -38,6 +83,29 @@ class AscendContainerManager:
         logger.warning("No container runtime found")
         return None
 
+    def _detect_api(self) -> Optional[DockerAPIClient]:
+        """Use the runtime REST API socket unless CONTAINER_BACKEND=cli"""
+        backend = os.environ.get("CONTAINER_BACKEND", "auto").lower()
+        if backend == "cli":
+            return None
+        socket_path = os.environ.get("CONTAINER_API_SOCKET") or find_socket()
+        if not socket_path:
+            if backend == "api":
+                logger.warning("CONTAINER_BACKEND=api but no runtime socket found, using CLI")
+            return None
+        logger.info(f"Using container API socket: {socket_path}")
+        return DockerAPIClient(socket_path)
+
+    @property
+    def available(self) -> bool:
+        return bool(self.api or self.runtime)
+
+    async def close(self) -> None:
+        """Release pooled API connections and exec sessions"""
+        await self.sessions.close_all()
+        if self.api:
+            await self.api.close()
+
     async def run_command(self, cmd: str, check: bool = True) -> str:
         """Run shell command async"""
         proc = await asyncio.create_subprocess_shell(
@@ -45,84 +113,250 @@ class AscendContainerManager:
         )
         stdout, stderr = await proc.communicate()
         if check and proc.returncode != 0:
-            raise Exception(f"Command failed: {stderr.decode()}")
-        return stdout.decode()
+            raise Exception(f"Command failed: {stderr.decode(errors='replace')}")
+        return stdout.decode(errors="replace")
 
     async def list_containers(self, keyword: Optional[str] = None, running_only: bool = False) -> List[Dict[str, Any]]:
         """List all containers with optional keyword filter
         
+        Served from the event-driven inventory when it is in sync, otherwise
+        queried from the runtime directly.
+        
         Args:
             keyword: Filter containers by name, image, or id (case-insensitive)
             running_only: Only return running containers
         """
-        if not self.runtime:
+        if not self.available:
             logger.warning("No container runtime available")
             return []
         
+        if self.inventory.synced:
+            return self.inventory.list(keyword, running_only)
+        
         try:
-            # List all containers without filtering by image
-            cmd = f'{self.runtime} ps -a --format "{{{{json .}}}}"'
-            output = await self.run_command(cmd, check=False)
-            
-            containers = []
-            for line in output.strip().split("\n"):
-                if not line or line.strip() == "":
-                    continue
-                try:
-                    data = json.loads(line)
-                    # Handle different JSON field names between docker versions
-                    container_id = data.get("ID", data.get("Id", ""))
-                    name = data.get("Names", data.get("Name", ""))
-                    image = data.get("Image", "")
-                    status = data.get("Status", data.get("State", ""))
-                    created = data.get("CreatedAt", data.get("Created", ""))
-                    is_running = "Up" in status or status == "running"
-                    
-                    # Apply running_only filter
-                    if running_only and not is_running:
-                        continue
-                    
-                    # Apply keyword filter (case-insensitive match on name, image, or id)
-                    if keyword:
-                        keyword_lower = keyword.lower()
-                        searchable = f"{name} {image} {container_id}".lower()
-                        if keyword_lower not in searchable:
-                            continue
-                    
-                    containers.append({
-                        "id": container_id,
-                        "name": name,
-                        "image": image,
-                        "status": status,
-                        "running": is_running,
-                        "created": created,
-                    })
-                except json.JSONDecodeError as e:
-                    logger.debug(f"Failed to parse container JSON: {line}, error: {e}")
-                    continue
-            
-            return containers
+            containers = [summary for _, summary in await self.fetch_containers()]
+            return self._filter_containers(containers, keyword, running_only)
         except Exception as e:
             logger.error(f"Error listing containers: {e}")
             return []
 
+    async def fetch_containers(self, container_id: Optional[str] = None) -> List[Tuple[str, Dict[str, Any]]]:
+        """Query the runtime for (full id, summary) of all containers or of one container"""
+        if self.api:
+            try:
+                filters = {"id": [container_id]} if container_id else None
+                return [(c["Id"], container_summary(c)) for c in await self.api.list_containers(all=True, filters=filters)]
+            except API_FALLBACK_ERRORS as e:
+                logger.warning(f"Container API unavailable, falling back to CLI: {e}")
+        if not self.runtime:
+            return []
+        
+        # List all containers without filtering by image
+        cmd = f'{self.runtime} ps -a --no-trunc --format "{{{{json .}}}}"'
+        if container_id:
+            cmd += f" --filter id={container_id}"
+        output = await self.run_command(cmd, check=False)
+        
+        containers = []
+        for line in output.strip().split("\n"):
+            if not line or line.strip() == "":
+                continue
+            try:
+                data = json.loads(line)
+                # Handle different JSON field names between docker versions
+                full_id = data.get("ID", data.get("Id", ""))
+                status = data.get("Status", data.get("State", ""))
+                names = data.get("Names", data.get("Name", ""))
+                if isinstance(names, list):
+                    names = names[0] if names else ""
+                containers.append((full_id, {
+                    "id": full_id[:12],
+                    "name": names.split(",")[0],
+                    "image": data.get("Image", ""),
+                    "status": status,
+                    "running": "Up" in status or status == "running",
+                    "created": data.get("CreatedAt", data.get("Created", "")),
+                }))
+            except json.JSONDecodeError as e:
+                logger.debug(f"Failed to parse container JSON: {line}, error: {e}")
+                continue
+        return containers
+
+    @staticmethod
+    def _filter_containers(containers: List[Dict[str, Any]], keyword: Optional[str] = None,
+                           running_only: bool = False) -> List[Dict[str, Any]]:
+        """Apply running_only and keyword (name, image or id, case-insensitive) filters"""
+        keyword_lower = keyword.lower() if keyword else None
+        result = []
+        for c in containers:
+            if running_only and not c["running"]:
+                continue
+            if keyword_lower and keyword_lower not in f"{c['name']} {c['image']} {c['id']}".lower():
+                continue
+            result.append(c)
+        return result
+
+    async def list_container_names(self) -> Dict[str, str]:
+        """Map full container IDs to names"""
+        if self.inventory.synced:
+            return self.inventory.names()
+        return {full_id: summary["name"] for full_id, summary in await self.fetch_containers()}
+
+    async def list_images(self) -> List[Dict[str, Any]]:
+        """List local images"""
+        if self.api:
+            try:
+                images = []
+                for data in await self.api.list_images():
+                    tags = data.get("RepoTags") or ["<none>:<none>"]
+                    for tag in tags:
+                        repository, _, version = tag.rpartition(":")
+                        images.append({
+                            "id": data.get("Id", "").replace("sha256:", "")[:12],
+                            "repository": repository,
+                            "tag": version,
+                            "size": _human_size(data.get("Size", 0)),
+                            "created": datetime.fromtimestamp(data.get("Created", 0)).strftime("%Y-%m-%d %H:%M:%S"),
+                        })
+                return images
+            except API_FALLBACK_ERRORS as e:
+                logger.warning(f"Container API unavailable, falling back to CLI: {e}")
+        if not self.runtime:
+            return []
+        output = await self.run_command(f"{self.runtime} images --format '{{{{json .}}}}'", check=False)
+        images = []
+        for line in output.strip().split('\n'):
+            if line:
+                try:
+                    data = json.loads(line)
+                    images.append({
+                        "id": data.get("ID", ""),
+                        "repository": data.get("Repository", ""),
+                        "tag": data.get("Tag", ""),
+                        "size": data.get("Size", ""),
+                        "created": data.get("CreatedAt", data.get("CreatedSince", ""))
+                    })
+                except json.JSONDecodeError:
+                    pass
+        return images
+
+    async def pull_image(self, image: str) -> AsyncIterator[Dict[str, Any]]:
+        """Pull an image, yielding Docker-style JSON progress events
+
+        The REST API streams per-layer ``progressDetail``; the CLI fallback
+        only yields one ``{"status": line}`` event per output line.
+        """
+        if not self.available:
+            raise Exception("No container runtime available")
+        if self.api:
+            try:
+                async for event in self.api.pull_image(image):
+                    if event.get("error"):
+                        raise Exception(event["error"])
+                    yield event
+                return
+            except API_FALLBACK_ERRORS as e:
+                if not self.runtime:
+                    raise
+                logger.warning(f"Container API unavailable, falling back to CLI: {e}")
+        proc = await asyncio.create_subprocess_exec(
+            self.runtime, "pull", image,
+            stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT,
+        )
+        tail: List[str] = []
+        try:
+            async for line in proc.stdout:
+                text = line.decode(errors="replace").strip()
+                if text:
+                    tail = (tail + [text])[-5:]
+                    yield {"status": text}
+            if await proc.wait() != 0:
+                raise Exception("\n".join(tail) or f"{self.runtime} pull {image} failed")
+        finally:
+            if proc.returncode is None:
+                proc.kill()
+                await proc.wait()
+
+    async def inspect_image(self, image: str) -> Optional[Dict[str, Any]]:
+        """Return {"id", "size", "created"} of a local image, or None if missing"""
+        if self.api:
+            try:
+                data = await self.api.inspect_image(image)
+                return {
+                    "id": data.get("Id", "").replace("sha256:", "")[:12],
+                    "size": _human_size(data.get("Size", 0)),
+                    "created": data.get("Created", ""),
+                }
+            except DockerAPIError as e:
+                if e.status == 404:
+                    return None
+                raise
+            except API_FALLBACK_ERRORS as e:
+                logger.warning(f"Container API unavailable, falling back to CLI: {e}")
+        if not self.runtime:
+            return None
+        output = await self.run_command(
+            f"{self.runtime} image inspect --format '{{{{json .}}}}' {image}", check=False)
+        try:
+            data = json.loads(output)
+        except json.JSONDecodeError:
+            return None
+        return {
+            "id": data.get("Id", "").replace("sha256:", "")[:12],
+            "size": _human_size(data.get("Size", 0)),
+            "created": data.get("Created", ""),
+        }
+
     async def create_container(self, config) -> str:
         """Create a new container"""
-        if not self.runtime:
+        if not self.available:
             raise Exception("No container runtime available")
         
-        npu_opts = " ".join([f"--device /dev/davinci{i}" for i in config.npu_devices])
-        mount_opts = " ".join([f"-v {m}" for m in self.ASCEND_MOUNTS + self.MODEL_MOUNTS])
-        
+        mounts = list(self.ASCEND_MOUNTS + self.MODEL_MOUNTS)
         if hasattr(config, 'mount_paths') and config.mount_paths:
             for src, dst in config.mount_paths.items():
-                mount_opts += f" -v {src}:{dst}"
+                mounts.append(f"{src}:{dst}")
+        devices = [f"/dev/davinci{i}" for i in config.npu_devices] + [
+            "/dev/davinci_manager", "/dev/devmm_svm", "/dev/hisi_hdc"]
+        
+        if self.api:
+            container_id = None
+            try:
+                container_id = await self.api.create_container(config.container_name, {
+                    "Image": config.image,
+                    "Cmd": ["sleep", "infinity"],
+                    "HostConfig": {
+                        "Devices": [{"PathOnHost": d, "PathInContainer": d, "CgroupPermissions": "rwm"}
+                                    for d in devices],
+                        "Binds": mounts,
+                        "ShmSize": parse_size(config.shm_size),
+                        "NetworkMode": "host",
+                    },
+                })
+            except DockerAPIError as e:
+                # 镜像不存在时交给 CLI (docker run 会自动拉取)
+                if e.status != 404 or not self.runtime:
+                    raise
+            except API_CONNECT_ERRORS as e:
+                logger.warning(f"Container API unavailable, falling back to CLI: {e}")
+            if container_id:
+                self.container_index.invalidate()
+                try:
+                    await self.api.start_container(container_id)
+                except BaseException:
+                    # 已创建但未能启动: 删除，避免同名容器阻塞下次创建
+                    try:
+                        await self.api.remove_container(container_id, force=True)
+                    except Exception as e:
+                        logger.warning(f"Failed to remove container {config.container_name} after start error: {e}")
+                    raise
+                await self.inventory.touch(container_id)
+                return container_id
         
+        device_opts = " ".join([f"--device {d}" for d in devices])
+        mount_opts = " ".join([f"-v {m}" for m in mounts])
         cmd = f"""{self.runtime} run -d --name {config.container_name} \
-            {npu_opts} \
-            --device /dev/davinci_manager \
-            --device /dev/devmm_svm \
-            --device /dev/hisi_hdc \
+            {device_opts} \
             {mount_opts} \
             --shm-size={config.shm_size} \
             --network host \
@@ -130,308 +364,451 @@ class AscendContainerManager:
             sleep infinity"""
         
         result = await self.run_command(cmd)
+        self.container_index.invalidate()
+        await self.inventory.touch(result.strip())
         return result.strip()
 
     async def start_container(self, container_name: str) -> None:
         """Start a container"""
-        if not self.runtime:
+        if not self.available:
             raise Exception("No container runtime available")
+        if self.api:
+            try:
+                await self.api.start_container(container_name)
+                await self.inventory.touch(container_name)
+                return
+            except API_FALLBACK_ERRORS as e:
+                logger.warning(f"Container API unavailable, falling back to CLI: {e}")
         await self.run_command(f"{self.runtime} start {container_name}")
+        await self.inventory.touch(container_name)
 
     async def stop_container(self, container_name: str) -> None:
         """Stop a container"""
-        if not self.runtime:
+        if not self.available:
             raise Exception("No container runtime available")
+        await self.sessions.close(container_name)
+        if self.api:
+            try:
+                await self.api.stop_container(container_name)
+                await self.inventory.touch(container_name)
+                return
+            except API_FALLBACK_ERRORS as e:
+                logger.warning(f"Container API unavailable, falling back to CLI: {e}")
         await self.run_command(f"{self.runtime} stop {container_name}")
+        await self.inventory.touch(container_name)
+
+    async def rename_container(self, container_name: str, new_name: str) -> None:
+        """Rename a container"""
+        if not self.available:
+            raise Exception("No container runtime available")
+        await self.sessions.close(container_name)
+        if self.api:
+            try:
+                await self.api.rename_container(container_name, new_name)
+                await self.inventory.touch(new_name)
+                self.container_index.invalidate()
+                return
+            except API_FALLBACK_ERRORS as e:
+                logger.warning(f"Container API unavailable, falling back to CLI: {e}")
+        await self.run_command(f"{self.runtime} rename {container_name} {new_name}")
+        await self.inventory.touch(new_name)
+        self.container_index.invalidate()
 
     async def delete_container(self, container_name: str) -> None:
         """Delete a container"""
-        if not self.runtime:
+        if not self.available:
             raise Exception("No container runtime available")
+        await self.sessions.close(container_name)
+        if self.api:
+            try:
+                await self.api.remove_container(container_name, force=True)
+                self.container_index.invalidate()
+                await self.inventory.touch(container_name, removed=True)
+                return
+            except API_FALLBACK_ERRORS as e:
+                logger.warning(f"Container API unavailable, falling back to CLI: {e}")
         await self.run_command(f"{self.runtime} rm -f {container_name}")
+        self.container_index.invalidate()
+        await self.inventory.touch(container_name, removed=True)
 
     async def exec_command(self, container_name: str, command: str, detach: bool = False) -> str:
         """Execute command in container"""
-        if not self.runtime:
+        if self.is_host(container_name):
+            return await self._exec_host(command, detach)
+        if not self.available:
             raise Exception("No container runtime available")
+        if self.api:
+            try:
+                exit_code, stdout, stderr = await self.api.exec(container_name, ["bash", "-c", command], detach=detach)
+                if not detach and exit_code != 0:
+                    raise Exception(f"Command failed: {stderr}")
+                return stdout
+            except API_CONNECT_ERRORS as e:
+                logger.warning(f"Container API unavailable, falling back to CLI: {e}")
         detach_flag = "-d" if detach else ""
         cmd = f'{self.runtime} exec {detach_flag} {container_name} bash -c "{command}"'
         return await self.run_command(cmd, check=not detach)
 
+    async def probe(self, container_name: str, command: str, timeout: float = 10.0) -> str:
+        """Run a short command over the container's persistent exec session
+        
+        Same contract as exec_command (stdout returned, exception on a
+        non-zero exit) but without a new exec per call. Falls back to
+        exec_command when there is no runtime CLI to hold a session.
+        """
+        if not self.runtime or self.is_host(container_name):
+            return await asyncio.wait_for(self.exec_command(container_name, command), timeout)
+        try:
+            exit_code, output = await self.sessions.run(container_name, command, timeout)
+        except ExecSessionError as e:
+            raise Exception(str(e))
+        if exit_code != 0:
+            raise Exception(f"Command failed: {output}")
+        return output
+
+    async def _exec_host(self, command: str, detach: bool = False) -> str:
+        """Run a command on this host for HOST_CONTAINER (detached: in its own session, output discarded)"""
+        if detach:
+            await asyncio.create_subprocess_exec(
+                "bash", "-c", command, stdin=asyncio.subprocess.DEVNULL, stdout=asyncio.subprocess.DEVNULL,
+                stderr=asyncio.subprocess.DEVNULL, start_new_session=True)
+            return ""
+        proc = await asyncio.create_subprocess_exec(
+            "bash", "-c", command, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE,
+            start_new_session=True)
+        try:
+            stdout, stderr = await proc.communicate()
+        except asyncio.CancelledError:
+            # probe 超时 (wait_for 取消) 时不留下仍在运行的命令
+            try:
+                os.killpg(proc.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+            await proc.wait()
+            raise
+        if proc.returncode != 0:
+            raise Exception(f"Command failed: {stderr.decode(errors='replace')}")
+        return stdout.decode(errors="replace")
+
     async def get_container_logs(self, container_name: str, lines: int = 100) -> str:
         """Get container logs"""
-        if not self.runtime:
+        if not self.available:
             return "No container runtime available"
         try:
+            if self.api:
+                try:
+                    return await self.api.container_logs(container_name, tail=lines)
+                except API_FALLBACK_ERRORS as e:
+                    logger.warning(f"Container API unavailable, falling back to CLI: {e}")
             return await self.run_command(f"{self.runtime} logs --tail {lines} {container_name} 2>&1", check=False)
         except Exception as e:
             return f"Error getting logs: {e}"
 
+    async def read_npu_smi(self, max_age: Optional[float] = None) -> Optional[NpuSmiInfo]:
+        """Run and parse ``npu-smi info`` once per refresh tick
+
+        Results younger than ``max_age`` seconds are reused and concurrent
+        callers share a single in-flight invocation. Returns None when
+        npu-smi is not installed.
+        """
+        if not shutil.which("npu-smi"):
+            return None
+        if max_age is None:
+            max_age = self.NPU_SMI_CACHE_TTL
+        cached = self._npu_smi_cache
+        if cached and time.monotonic() - cached[0] <= max_age:
+            return cached[1]
+        if self._npu_smi_inflight is None or self._npu_smi_inflight.done():
+            self._npu_smi_inflight = asyncio.ensure_future(self._run_npu_smi())
+        return await asyncio.shield(self._npu_smi_inflight)
+
+    async def _run_npu_smi(self) -> NpuSmiInfo:
+        output = await self.run_command("npu-smi info 2>/dev/null", check=False)
+        info = parse_npu_smi(output)
+        self._npu_smi_cache = (time.monotonic(), info)
+        return info
+
+    @staticmethod
+    def _mock_npu_status() -> List[Dict[str, Any]]:
+        return [{"id": i, "utilization": 0, "available": True, "occupied": False, "container": None, "process_id": None, "process_name": None, "hbm_used": 0, "hbm_total": 65536, "power": 0, "temperature": 0, "health": "Unknown"} for i in range(8)]
+
     async def get_npu_status(self) -> List[Dict[str, Any]]:
         """Get NPU status using npu-smi info"""
-        npus = []
         try:
-            # Check if npu-smi exists
-            if not shutil.which("npu-smi"):
+            info = await self.read_npu_smi()
+            if info is None or not info.chips:
                 # Return mock data for testing
-                return [{"id": i, "utilization": 0, "available": True, "occupied": False, "container": None, "process_id": None, "process_name": None, "hbm_used": 0, "hbm_total": 65536, "power": 0, "temperature": 0, "health": "Unknown"} for i in range(8)]
-            
-            # Get full npu-smi info output
-            result = await self.run_command("npu-smi info 2>/dev/null", check=False)
-            
-            # Parse NPU basic info and process info
-            npu_info = {}  # id -> {utilization, hbm_used, hbm_total, power, temp, health}
-            npu_processes = {}  # id -> {process_id, process_name, container}
-            
-            lines = result.split("\n")
-            in_process_section = False
-            current_npu_id = None
-            
-            for i, line in enumerate(lines):
-                # Detect process section
-                if "Process id" in line and "Process name" in line:
-                    in_process_section = True
-                    continue
-                
-                # Parse NPU basic info rows
-                if not in_process_section:
-                    # Match NPU info line: | 0     910B2C              | OK            | 89.5        43 ...
-                    if "|" in line and ("910B" in line or "310P" in line or "Ascend" in line):
-                        parts = [p.strip() for p in line.split("|")]
-                        if len(parts) >= 4:
-                            try:
-                                npu_part = parts[1].split()
-                                if npu_part and npu_part[0].isdigit():
-                                    npu_id = int(npu_part[0])
-                                    current_npu_id = npu_id
-                                    health = parts[2].strip()
-                                    power_temp = parts[3].split()
-                                    power = float(power_temp[0]) if power_temp else 0
-                                    temp = int(power_temp[1]) if len(power_temp) > 1 else 0
-                                    
-                                    npu_info[npu_id] = {"health": health, "power": power, "temperature": temp, "utilization": 0, "hbm_used": 0, "hbm_total": 65536}
-                            except (ValueError, IndexError):
-                                pass
-                    
-                    # Match Chip info line with AICore% and HBM
-                    elif "|" in line and "0000:" in line and current_npu_id is not None:
-                        parts = [p.strip() for p in line.split("|")]
-                        if len(parts) >= 4:
-                            try:
-                                metrics = parts[3].split()
-                                if metrics:
-                                    aicore = int(metrics[0])
-                                    npu_info[current_npu_id]["utilization"] = aicore
-                                    
-                                    # Find HBM usage - look for last "number/ number" pattern
-                                    full_metrics = parts[3]
-                                    # Pattern: "57369/ 65536" or "3413 / 65536"
-                                    hbm_match = re.findall(r'(\d+)\s*/\s*(\d+)', full_metrics)
-                                    if hbm_match:
-                                        # Take the last match (HBM is at the end)
-                                        hbm_used, hbm_total = hbm_match[-1]
-                                        npu_info[current_npu_id]["hbm_used"] = int(hbm_used)
-                                        npu_info[current_npu_id]["hbm_total"] = int(hbm_total)
-                            except (ValueError, IndexError):
-                                pass
-                else:
-                    # Parse process info
-                    if "|" in line and "No running processes" not in line and "===" not in line:
-                        parts = [p.strip() for p in line.split("|")]
-                        if len(parts) >= 5:
-                            try:
-                                npu_chip = parts[1].split()
-                                if npu_chip and npu_chip[0].isdigit():
-                                    npu_id = int(npu_chip[0])
-                                    process_id = parts[2].strip()
-                                    process_name = parts[3].strip()
-                                    
-                                    if process_id.isdigit():
-                                        npu_processes[npu_id] = {
-                                            "process_id": int(process_id),
-                                            "process_name": process_name,
-                                            "container": None
-                                        }
-                            except (ValueError, IndexError):
-                                pass
+                return self._mock_npu_status()
             
-            # Get container names for processes
-            for npu_id, proc_info in npu_processes.items():
+            # Get container names for processes (/proc 直读 + 容器 ID 索引，最多一次 docker ps)
+            containers: Dict[int, Optional[str]] = {}
+            for proc in info.processes:
                 try:
-                    pid = proc_info["process_id"]
-                    cgroup_cmd = f"cat /proc/{pid}/cgroup 2>/dev/null | grep -o -E '[0-9a-f]{{64,}}' | head -n 1"
-                    container_id = (await self.run_command(cgroup_cmd, check=False)).strip()
-                    
-                    if container_id and self.runtime:
-                        name_cmd = f"{self.runtime} inspect --format '{{{{.Name}}}}' {container_id} 2>/dev/null | sed 's#^/##'"
-                        container_name = (await self.run_command(name_cmd, check=False)).strip()
-                        if container_name:
-                            npu_processes[npu_id]["container"] = container_name
+                    containers[proc.pid] = await self.container_index.container_for_pid(proc.pid)
                 except Exception as e:
-                    logger.debug(f"Error getting container for NPU {npu_id}: {e}")
+                    logger.debug(f"Error getting container for NPU {proc.device_id}: {e}")
             
-            # Build final NPU list
-            for npu_id in sorted(npu_info.keys()):
-                info = npu_info[npu_id]
-                proc = npu_processes.get(npu_id, {})
-                
+            processes = info.processes_by_device()
+            npus = []
+            for chip in info.chips:
+                procs = processes.get(chip.device_id, [])
+                first = procs[0] if procs else None
                 npus.append({
-                    "id": npu_id,
-                    "utilization": info.get("utilization", 0),
-                    "available": info.get("health") in ["OK", "Warning"],
-                    "occupied": npu_id in npu_processes,
-                    "container": proc.get("container"),
-                    "process_id": proc.get("process_id"),
-                    "process_name": proc.get("process_name"),
-                    "hbm_used": info.get("hbm_used", 0),
-                    "hbm_total": info.get("hbm_total", 65536),
-                    "power": info.get("power", 0),
-                    "temperature": info.get("temperature", 0),
-                    "health": info.get("health", "Unknown")
+                    "id": chip.device_id,
+                    "npu_id": chip.npu_id,
+                    "chip_id": chip.chip_id,
+                    "name": chip.name,
+                    "utilization": chip.aicore,
+                    "available": chip.health in ["OK", "Warning"],
+                    "occupied": bool(procs),
+                    "container": containers.get(first.pid) if first else None,
+                    "process_id": first.pid if first else None,
+                    "process_name": first.name if first else None,
+                    "processes": [{"pid": p.pid, "name": p.name, "memory_mb": p.memory_mb,
+                                   "container": containers.get(p.pid)} for p in procs],
+                    "hbm_used": chip.hbm_used,
+                    "hbm_total": chip.hbm_total,
+                    "power": chip.power,
+                    "temperature": chip.temperature,
+                    "health": chip.health,
                 })
-            
-            if not npus:
-                return [{"id": i, "utilization": 0, "available": True, "occupied": False, "container": None, "process_id": None, "process_name": None, "hbm_used": 0, "hbm_total": 65536, "power": 0, "temperature": 0, "health": "Unknown"} for i in range(8)]
-            
             return npus
             
         except Exception as e:
             logger.error(f"Error getting NPU status: {e}")
-            return [{"id": i, "utilization": 0, "available": True, "occupied": False, "container": None, "process_id": None, "process_name": None, "hbm_used": 0, "hbm_total": 65536, "power": 0, "temperature": 0, "health": "Unknown"} for i in range(8)]
-
+            return self._mock_npu_status()
 
     async def _get_container_from_pid(self, pid: str) -> Optional[str]:
-        """根据 PID 获取容器名称 (参考 query_docker 实现)"""
+        """根据 PID 获取容器名称 (读取 /proc/<pid>/cgroup 并查询容器 ID 索引)"""
         try:
-            # 读取进程的 cgroup 信息获取容器 ID
-            cgroup_file = f"/proc/{pid}/cgroup"
-            cgroup_output = await self.run_command(f"cat {cgroup_file} 2>/dev/null", check=False)
-            
-            if not cgroup_output:
-                return None
-            
-            # 从 cgroup 中提取容器 ID
-            # 支持两种格式:
-            # 1. docker-abc123.scope (systemd cgroup v2)
-            # 2. /docker/abc123... (传统格式)
-            container_id = None
-            
-            # 尝试匹配 docker-xxx.scope 格式
-            match = re.search(r'docker-([a-f0-9]+)\.scope', cgroup_output)
-            if match:
-                container_id = match.group(1)[:12]
-            else:
-                # 尝试传统格式
-                for line in cgroup_output.split('\n'):
-                    if '/docker/' in line:
-                        parts = line.split('/docker/')
-                        if len(parts) > 1:
-                            container_id = parts[1].split('/')[0][:12]
-                            break
-            
-            if not container_id:
-                return None
-            
-            # 使用 docker inspect 获取容器名称
-            cmd = f"{self.runtime} inspect --format '{{{{.Name}}}}' {container_id} 2>/dev/null"
-            result = await self.run_command(cmd, check=False)
-            
-            if result:
-                # 去除开头的 / 
-                container_name = result.strip().lstrip('/')
-                return container_name if container_name else None
-            
-            return None
+            return await self.container_index.container_for_pid(int(pid))
         except Exception as e:
             logger.debug(f"Failed to get container from PID {pid}: {e}")
             return None
 
     async def get_running_vllm_services(self) -> List[Dict[str, Any]]:
         """检测所有容器中正在运行的 vLLM 服务"""
-        services = []
+        services: Dict[Tuple[str, Optional[int]], Dict[str, Any]] = {}
         
         try:
-            # 使用 query_docker 类似的逻辑获取 NPU 进程信息
-            npu_output = await self.run_command("npu-smi info", check=False)
+            # 与 NPU 状态共享同一次 npu-smi 解析结果
+            info = await self.read_npu_smi()
+            if info is None:
+                return []
+            
+            vllm_procs = []
+            for proc in info.processes:
+                if 'VLLM' not in proc.name.upper():
+                    continue
+                # 获取容器信息
+                container_name = await self._get_container_from_pid(str(proc.pid))
+                if container_name:
+                    vllm_procs.append((proc, container_name))
             
-            # 解析进程行
-            for line in npu_output.split('\n'):
-                # 匹配进程行格式: | NPU_ID  CHIP | PID | PROCESS_NAME | MEM |
-                match = re.match(r'\|\s*(\d+)\s+\d+\s*\|\s*(\d+)\s*\|\s*(\S*)\s*\|\s*(\d+)\s*\|', line)
-                if match:
-                    npu_id = int(match.group(1))
-                    pid = match.group(2)
-                    process_name = match.group(3)
-                    mem = match.group(4)
-                    
-                    # 获取容器信息
-                    container_name = await self._get_container_from_pid(pid)
-                    
-                    if container_name and 'VLLM' in process_name.upper():
-                        # 尝试获取 vLLM 端口
-                        port = await self._get_vllm_port(container_name)
-                        
-                        # 检查是否已存在相同容器的服务
-                        existing = next((s for s in services if s['container'] == container_name), None)
-                        if existing:
-                            if npu_id not in existing['npu_devices']:
-                                existing['npu_devices'].append(npu_id)
-                            existing['memory_mb'] += int(mem) if mem else 0
-                        else:
-                            services.append({
-                                'container': container_name,
-                                'pid': pid,
-                                'process_name': process_name,
-                                'npu_devices': [npu_id],
-                                'port': port,
-                                'memory_mb': int(mem) if mem else 0
-                            })
+            # 端口优先从宿主机 /proc 解析；不可见时按容器并发回退到 exec 探测
+            host_ports = {proc.pid: self.find_vllm_port(proc.pid) for proc, _ in vllm_procs}
+            fallback = sorted({c for proc, c in vllm_procs if host_ports[proc.pid] is None})
+            exec_ports = dict(zip(fallback, await asyncio.gather(*(self._get_vllm_port(c) for c in fallback))))
+            
+            for proc, container_name in vllm_procs:
+                port = host_ports[proc.pid] or exec_ports.get(container_name)
+                # 同一容器内可运行多个服务，按 (容器, 端口) 归并
+                key = (container_name, port)
+                existing = services.get(key)
+                if existing:
+                    if proc.device_id not in existing['npu_devices']:
+                        existing['npu_devices'].append(proc.device_id)
+                    existing['memory_mb'] += proc.memory_mb
+                else:
+                    services[key] = {
+                        'container': container_name,
+                        'pid': str(proc.pid),
+                        'process_name': proc.name,
+                        'npu_devices': [proc.device_id],
+                        'port': port,
+                        'memory_mb': proc.memory_mb
+                    }
         except Exception as e:
             logger.error(f"Failed to get running vLLM services: {e}")
         
-        return services
+        return list(services.values())
+    
+    async def scan_vllm_servers(self) -> Dict[Tuple[str, int], int]:
+        """Find ``vllm serve`` API servers in containers with one host /proc pass
+        
+        Returns (container name, port) -> PID of the server process inside
+        its container's PID namespace (the PID pgrep / kill see there, like
+        find_vllm_pid). Only processes visible from this host's /proc are
+        found.
+        """
+        candidates: Dict[Tuple[str, int], List[int]] = {}
+        for pid in procfs.list_pids():
+            argv = procfs.read_cmdline(pid)
+            if "serve" not in argv or not any(a.endswith("vllm") for a in argv[:argv.index("serve")]):
+                continue
+            container_name = await self.container_index.container_for_pid(pid)
+            if not container_name:
+                continue
+            candidates.setdefault((container_name, _port_from_argv(argv) or 8000), []).append(pid)
+        servers: Dict[Tuple[str, int], int] = {}
+        for key, pids in candidates.items():
+            # 子进程会继承命令行: 去掉父进程也在候选中的进程 (不依赖 PID 大小，PID 可能回绕)
+            matched = set(pids)
+            roots = [pid for pid in pids if procfs.read_ppid(pid) not in matched] or pids
+            root = min(roots, key=lambda pid: procfs.read_start_time(pid) or 0)
+            ns_pid = procfs.read_ns_pid(root)
+            if ns_pid is not None:
+                servers[key] = ns_pid
+        return servers
+    
+    def find_vllm_port(self, pid: int) -> Optional[int]:
+        """Find the API port of the vLLM server that owns an NPU process, via host /proc
+
+        NPU workers rename themselves (VLLM::Worker...), so the process tree is
+        walked up inside the same container looking for ``--port`` in the
+        command line, then for a listening socket held by any of those
+        processes. Results are cached by (pid, start time).
+        
+        Returns None when the process is not visible from this host.
+        """
+        start_time = procfs.read_start_time(pid)
+        if start_time is None:
+            return None
+        key = (pid, start_time)
+        if key in self._vllm_port_cache:
+            return self._vllm_port_cache[key]
+        
+        container_id = procfs.read_container_id(pid)
+        chain = []
+        port = None
+        serve_seen = False
+        current = pid
+        for _ in range(self.VLLM_ANCESTOR_DEPTH):
+            chain.append(current)
+            argv = procfs.read_cmdline(current)
+            port = _port_from_argv(argv)
+            if port:
+                break
+            serve_seen = serve_seen or ("serve" in argv and any("vllm" in a for a in argv))
+            parent = procfs.read_ppid(current)
+            if not parent or parent <= 1 or procfs.read_container_id(parent) != container_id:
+                break
+            current = parent
+        
+        if not port:
+            listening = procfs.listening_ports(pid)
+            for candidate in reversed(chain):
+                ports = sorted(listening[i] for i in procfs.socket_inodes(candidate) if i in listening)
+                if ports:
+                    port = ports[0]
+                    break
+        if not port and serve_seen:
+            port = 8000  # vllm serve 默认端口
+        
+        if len(self._vllm_port_cache) >= 1024:
+            self._vllm_port_cache.clear()
+        self._vllm_port_cache[key] = port
+        return port
     
     async def _get_vllm_port(self, container_name: str) -> int:
-        """获取容器中 vLLM 服务的端口"""
+        """获取容器中 vLLM 服务的端口 (宿主机 /proc 不可见时的回退方案，单次 exec)"""
         try:
-            # 方法1: 从进程命令行获取端口 (适用于 host 网络模式)
-            cmd = f"{self.runtime} exec {container_name} bash -c \"ps aux | grep 'vllm serve' | grep -v grep | head -1\""
-            result = await self.run_command(cmd, check=False)
+            cmd = "ps -eo args | grep '[v]llm serve' | head -1; echo '---'; ss -tln 2>/dev/null"
+            result = await self.exec_command(container_name, cmd)
+            args, _, sockets = result.partition('---')
             
-            port_match = re.search(r'--port\s+(\d+)', result)
+            # 方法1: 从进程命令行获取端口
+            port_match = re.search(r'--port[=\s]+(\d+)', args)
             if port_match:
                 return int(port_match.group(1))
             
-            # 方法2: 从 docker port 获取端口映射 (适用于 bridge 网络模式)
-            cmd = f"{self.runtime} port {container_name}"
-            result = await self.run_command(cmd, check=False)
-            
-            for line in result.split('\n'):
-                port_match = re.search(r'(\d+)/tcp\s*->\s*0\.0\.0\.0:(\d+)', line)
-                if port_match:
-                    return int(port_match.group(2))
-            
-            # 方法3: 检查常见端口
+            # 方法2: 检查常见端口是否在监听
+            listening = {int(m) for m in re.findall(r':(\d+)\s', sockets)}
             for port in [8000, 8001, 8002, 8003, 9000, 9001, 9002, 9003]:
-                check_cmd = f"{self.runtime} exec {container_name} ss -tlnp 2>/dev/null | grep :{port}"
-                result = await self.run_command(check_cmd, check=False)
-                if result and str(port) in result:
+                if port in listening:
                     return port
         except Exception:
             pass
         
         return 8000  # 默认端口
     
-    async def kill_vllm_service(self, container_name: str, pid: str = None) -> bool:
-        """停止容器中的 vLLM 服务"""
+    async def find_vllm_pid(self, container_name: str, port: Optional[int] = None) -> Optional[int]:
+        """PID of the ``vllm serve`` API server (on ``port``) in a container, or None
+
+        Forked workers inherit the command line, so the oldest match is the
+        API server.
+        """
+        pattern = self._serve_pattern(container_name) + (f".*--port[ =]{port}( |$)" if port else "")
+        output = await self.probe(container_name, f"pgrep -o -f '{pattern}' || true")
+        output = output.strip()
+        return int(output) if output.isdigit() else None
+
+    def _serve_pattern(self, container_name: str) -> str:
+        return HOST_SERVE_PATTERN if self.is_host(container_name) else VLLM_SERVE_PATTERN
+
+    async def terminate_process(self, container_name: str, pid: int, timeout: float = 30.0) -> bool:
+        """SIGTERM ``pid`` in a container, then SIGKILL it (and its children) after ``timeout``
+
+        Returns True if the process exited on SIGTERM.
+        """
+        await self.probe(container_name, f"kill -TERM {pid} 2>/dev/null || true")
+        alive_cmd = f"kill -0 {pid} 2>/dev/null && echo alive || echo gone"
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if "alive" not in await self.probe(container_name, alive_cmd):
+                return True
+            await asyncio.sleep(0.5)
+        logger.warning(f"PID {pid} in {container_name} ignored SIGTERM for {timeout}s, sending SIGKILL")
+        # 先杀子进程 (engine / worker)，避免孤儿进程继续占用 NPU
+        await self.probe(container_name, f"pkill -KILL -P {pid} 2>/dev/null; kill -KILL {pid} 2>/dev/null || true")
+        return False
+
+    async def kill_vllm_service(self, container_name: str, pid: str = None, timeout: float = 10.0) -> bool:
+        """停止容器中的 vLLM 服务: 先 SIGTERM，超时后 SIGKILL
+
+        Without ``pid`` every ``vllm serve`` API server in the container is
+        stopped (not every process whose command line mentions vllm). On the
+        host a ``pid`` is required: host-wide pgrep would also see the vLLM
+        servers inside every container.
+        """
+        if self.is_host(container_name) and not pid:
+            logger.error("Refusing to kill vLLM servers on the host without a pid")
+            return False
         try:
             if pid:
-                cmd = f"{self.runtime} exec {container_name} kill -9 {pid}"
+                pids = [int(pid)]
             else:
-                cmd = f"{self.runtime} exec {container_name} pkill -9 -f vllm"
-            
-            await self.run_command(cmd, check=False)
+                # 输出 "pid ppid"，只保留父进程不是 vllm serve 的 API 进程
+                output = await self.probe(
+                    container_name,
+                    f"for p in $(pgrep -f '{VLLM_SERVE_PATTERN}'); do "
+                    f"echo \"$p $(cut -d' ' -f4 /proc/$p/stat 2>/dev/null)\"; done")
+                pairs = [line.split() for line in output.splitlines() if len(line.split()) == 2]
+                matched = {a for a, _ in pairs}
+                pids = [int(a) for a, ppid in pairs if ppid not in matched]
+            await asyncio.gather(*(self.terminate_process(container_name, p, timeout) for p in pids))
             return True
         except Exception as e:
             logger.error(f"Failed to kill vLLM service: {e}")
             return False
+
+
+def _human_size(size: float) -> str:
+    for unit in ["B", "KB", "MB", "GB", "TB"]:
+        if size < 1000:
+            return f"{size:.1f}{unit}"
+        size /= 1000
+    return f"{size:.1f}PB"
+
+
+def _port_from_argv(argv: List[str]) -> Optional[int]:
+    """Value of --port / --port=N in a command line"""
+    for i, arg in enumerate(argv):
+        value = None
+        if arg == "--port" and i + 1 < len(argv):
+            value = argv[i + 1]
+        elif arg.startswith("--port="):
+            value = arg.split("=", 1)[1]
+        if value and value.isdigit():
+            return int(value)
+    return None
@@ -0,0 +1,189 @@
+"""Pre-warmed container pool for fast vLLM service start"""
+import asyncio
+import logging
+import os
+import re
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class PoolContainerConfig:
+    """Container settings used for pool members (same shape as ContainerConfig)"""
+    container_name: str
+    image: str
+    npu_devices: List[int]
+    mount_paths: Dict[str, str] = field(default_factory=dict)
+    shm_size: str = "60g"
+
+
+class WarmContainerPool:
+    """Keep N idle containers per image created, started and warmed up
+
+    Pool members are created with every NPU device of the host and the
+    standard Ascend mounts; the devices a service actually uses are selected
+    with ASCEND_RT_VISIBLE_DEVICES in its start command. After creation a
+    warm-up import of torch/torch_npu/vllm runs inside the container so the
+    page cache and __pycache__ are hot before the first ``vllm serve``.
+
+    Pool sizes come from ``warm_pool`` of each ``container_images`` entry in
+    presets.json (0 disables the pool for that image).
+    """
+
+    NAME_PREFIX = "vllm-warm"
+    WARMUP_COMMAND = "python -c 'import torch, torch_npu, vllm, vllm.entrypoints.openai.api_server' >/dev/null 2>&1; true"
+    WARMUP_TIMEOUT = 600
+
+    def __init__(self, container_manager, images: Optional[List[Dict[str, Any]]] = None):
+        self.container_manager = container_manager
+        self.sizes: Dict[str, int] = {img["image"]: int(img.get("warm_pool", 0)) for img in (images or [])}
+        self.idle: Dict[str, List[str]] = {image: [] for image in self.sizes}
+        self.warming: Dict[str, int] = {image: 0 for image in self.sizes}
+        self.warmup_seconds: Dict[str, float] = {}
+        self._tasks: List[asyncio.Task] = []
+
+    @property
+    def enabled(self) -> bool:
+        return any(size > 0 for size in self.sizes.values())
+
+    def _slug(self, image: str) -> str:
+        return re.sub(r"[^a-zA-Z0-9]+", "-", image.rsplit("/", 1)[-1]).strip("-").lower()
+
+    def npu_devices(self) -> List[int]:
+        """Every NPU device of the host (pool members and other service containers get all of them)"""
+        devices = [i for i, path in enumerate(self.container_manager.NPU_DEVICES) if os.path.exists(path)]
+        return devices or list(range(len(self.container_manager.NPU_DEVICES)))
+
+    async def start(self, in_use: Iterable[str] = ()) -> None:
+        """Adopt idle pool containers left from a previous run, then fill the pool
+
+        Containers in ``in_use`` (used by tracked services) are not adopted
+        even if they still carry a pool name.
+        """
+        if not self.enabled or not self.container_manager.available:
+            return
+        in_use = set(in_use)
+        for container in await self.container_manager.list_containers(keyword=self.NAME_PREFIX):
+            image, name = container["image"], container["name"]
+            if image in self.idle and container["running"] and name.startswith(self.NAME_PREFIX) \
+                    and name not in in_use:
+                self.idle[image].append(name)
+        for image in self.sizes:
+            self._schedule_fill(image)
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        self._tasks.clear()
+
+    def _schedule_fill(self, image: str) -> None:
+        self._tasks = [t for t in self._tasks if not t.done()]
+        self._tasks.append(asyncio.create_task(self._fill(image)))
+
+    async def _fill(self, image: str) -> None:
+        size = self.sizes.get(image, 0)
+        while len(self.idle[image]) + self.warming[image] < size:
+            self.warming[image] += 1
+            try:
+                name = await self._create(image)
+                self.idle[image].append(name)
+            except Exception as e:
+                logger.error(f"Failed to create warm container for {image}: {e}")
+                return
+            finally:
+                self.warming[image] -= 1
+
+    def _pool_name(self, image: str) -> str:
+        return f"{self.NAME_PREFIX}-{self._slug(image)}-{uuid.uuid4().hex[:6]}"
+
+    async def _create(self, image: str) -> str:
+        name = self._pool_name(image)
+        started = time.monotonic()
+        await self.container_manager.create_container(
+            PoolContainerConfig(container_name=name, image=image, npu_devices=self.npu_devices()))
+        try:
+            await asyncio.wait_for(
+                self.container_manager.exec_command(name, self.WARMUP_COMMAND), timeout=self.WARMUP_TIMEOUT)
+        except asyncio.TimeoutError:
+            logger.warning(f"Warm-up import timed out in {name}")
+        self.warmup_seconds[image] = round(time.monotonic() - started, 2)
+        logger.info(f"Warm container {name} ready in {self.warmup_seconds[image]}s")
+        return name
+
+    async def acquire(self, image: str, name: Optional[str] = None) -> Optional[str]:
+        """Take an idle container for ``image`` and refill the pool in the background
+
+        The container is always renamed on hand-out, so no container in use
+        keeps a pool name (start() adopts those as idle).
+
+        Args:
+            image: Container image
+            name: New container name (default: vllm-<random>)
+
+        Returns:
+            The container name, or None if no idle container is available
+        """
+        idle = self.idle.get(image)
+        if not idle:
+            return None
+        container_name = idle.pop(0)
+        name = name or f"vllm-{uuid.uuid4().hex[:8]}"
+        try:
+            await self.container_manager.rename_container(container_name, name)
+        except Exception:
+            await self._restore(image, container_name)
+            raise
+        self._schedule_fill(image)
+        return name
+
+    async def release(self, image: str, container_name: str) -> None:
+        """Take back a container handed out by acquire() whose service never started
+
+        It gets a pool name again and goes to the front of the idle list (the
+        pool may briefly hold one more than its size while a refill runs);
+        if it cannot be renamed it is removed.
+        """
+        if image not in self.idle:
+            await self.container_manager.delete_container(container_name)
+            return
+        pool_name = self._pool_name(image)
+        try:
+            await self.container_manager.rename_container(container_name, pool_name)
+        except Exception as e:
+            logger.warning(f"Cannot return {container_name} to the pool, removing it: {e}")
+            await self.container_manager.delete_container(container_name)
+            return
+        self.idle[image].insert(0, pool_name)
+
+    async def _restore(self, image: str, container_name: str) -> None:
+        """Return a container to the pool after a failed hand-out, or drop it if it is gone"""
+        try:
+            alive = any(c["name"] == container_name and c["running"]
+                        for c in await self.container_manager.list_containers(keyword=container_name))
+        except Exception as e:
+            logger.warning(f"Cannot check warm container {container_name}: {e}")
+            alive = False
+        if alive:
+            self.idle[image].insert(0, container_name)
+            return
+        logger.warning(f"Warm container {container_name} is gone, removing it from the pool")
+        try:
+            await self.container_manager.delete_container(container_name)
+        except Exception as e:
+            logger.debug(f"Removing {container_name} failed: {e}")
+        self._schedule_fill(image)
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            image: {
+                "size": size,
+                "idle": list(self.idle[image]),
+                "warming": self.warming[image],
+                "last_warmup_seconds": self.warmup_seconds.get(image),
+            }
+            for image, size in self.sizes.items()
+        }
@@ -0,0 +1,280 @@
+"""Async Docker Engine API client over the unix socket
+
+Podman exposes the same Docker-compatible REST API on its own socket, so the
+client works with both runtimes. A single ``aiohttp`` session with a pooled
+``UnixConnector`` is reused for every call, which avoids the fork + shell +
+CLI start-up cost of ``docker <cmd>`` on each request.
+"""
+import json
+import logging
+import os
+import re
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple, Union
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+STDOUT, STDERR = 1, 2
+
+
+class DockerAPIError(Exception):
+    """Error response from the Docker Engine API"""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(f"Docker API error {status}: {message}")
+        self.status = status
+        self.message = message
+
+
+def default_socket_paths() -> List[str]:
+    """Candidate runtime sockets in order of preference"""
+    paths = []
+    docker_host = os.environ.get("DOCKER_HOST", "")
+    if docker_host.startswith("unix://"):
+        paths.append(docker_host[len("unix://"):])
+    paths += [
+        "/var/run/docker.sock",
+        "/run/podman/podman.sock",
+        f"/run/user/{os.getuid()}/podman/podman.sock",
+    ]
+    return paths
+
+
+def find_socket() -> Optional[str]:
+    """Return the first existing runtime socket, if any"""
+    for path in default_socket_paths():
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def demux_stream(data: bytes) -> List[Tuple[int, bytes]]:
+    """Split a multiplexed attach/logs stream into (stream, payload) frames
+
+    Non-TTY streams are framed as an 8 byte header (stream type, 3 padding
+    bytes, big-endian payload size) followed by the payload.
+    """
+    frames = []
+    i = 0
+    n = len(data)
+    while i + 8 <= n and data[i] in (0, 1, 2) and data[i + 1:i + 4] == b"\x00\x00\x00":
+        size = int.from_bytes(data[i + 4:i + 8], "big")
+        frames.append((data[i] or STDOUT, data[i + 8:i + 8 + size]))
+        i += 8 + size
+    if i < n:
+        # 非多路复用输出 (TTY 模式) 原样返回
+        frames.append((STDOUT, data[i:]))
+    return frames
+
+
+def parse_size(value: str) -> int:
+    """Parse a docker size string such as '60g' into bytes"""
+    match = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*([bkmgt]?)b?\s*", str(value).lower())
+    if not match:
+        raise ValueError(f"Invalid size: {value}")
+    number, unit = match.groups()
+    scale = {"": 1, "b": 1, "k": 1024, "m": 1024 ** 2, "g": 1024 ** 3, "t": 1024 ** 4}[unit]
+    return int(float(number) * scale)
+
+
+def split_image_reference(image: str) -> Tuple[str, str]:
+    """Split 'repo[:tag|@digest]' into (repo, tag-or-digest), defaulting to 'latest'"""
+    if "@" in image:
+        repository, digest = image.split("@", 1)
+        return repository, digest
+    repository, sep, tag = image.rpartition(":")
+    # 冒号在最后一个 / 之前时是 registry 端口，不是 tag
+    if not sep or "/" in tag:
+        return image, "latest"
+    return repository, tag
+
+
+def container_summary(data: Dict[str, Any]) -> Dict[str, Any]:
+    """Convert a /containers/json entry to the format of list_containers()"""
+    names = data.get("Names") or []
+    state = data.get("State", "")
+    created = data.get("Created", "")
+    if isinstance(created, (int, float)):
+        created = datetime.fromtimestamp(created).strftime("%Y-%m-%d %H:%M:%S")
+    return {
+        "id": data.get("Id", "")[:12],
+        "name": names[0].lstrip("/") if names else "",
+        "image": data.get("Image", ""),
+        "status": data.get("Status", state),
+        "running": state == "running",
+        "created": created,
+    }
+
+
+class DockerAPIClient:
+    """Minimal Docker Engine API client with a persistent connection pool"""
+
+    BASE_URL = "http://docker"
+
+    def __init__(self, socket_path: str, pool_size: int = 32, timeout: float = 30.0):
+        self.socket_path = socket_path
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.api_version = os.environ.get("DOCKER_API_VERSION", "")
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    def _url(self, path: str) -> str:
+        prefix = f"/v{self.api_version.lstrip('v')}" if self.api_version else ""
+        return f"{self.BASE_URL}{prefix}{path}"
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        # 会话需在事件循环内创建，首次调用时延迟初始化
+        if self._session is None or self._session.closed:
+            connector = aiohttp.UnixConnector(path=self.socket_path, limit=self.pool_size,
+                                              keepalive_timeout=60)
+            self._session = aiohttp.ClientSession(
+                connector=connector, timeout=aiohttp.ClientTimeout(total=self.timeout)
+            )
+        return self._session
+
+    async def close(self) -> None:
+        if self._session and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    async def request(self, method: str, path: str, params: Optional[Dict[str, Any]] = None,
+                      body: Any = None, raw: bool = False,
+                      timeout: Union[float, aiohttp.ClientTimeout, None] = None) -> Any:
+        """Send a request and return decoded JSON (or bytes when raw=True)"""
+        kwargs: Dict[str, Any] = {"params": _encode_params(params)}
+        if body is not None:
+            kwargs["json"] = body
+        if isinstance(timeout, aiohttp.ClientTimeout):
+            kwargs["timeout"] = timeout
+        elif timeout is not None:
+            kwargs["timeout"] = aiohttp.ClientTimeout(total=timeout)
+        async with self.session.request(method, self._url(path), **kwargs) as resp:
+            data = await resp.read()
+            if resp.status >= 400:
+                raise DockerAPIError(resp.status, _error_message(data))
+            if raw:
+                return data
+            if not data:
+                return None
+            return json.loads(data)
+
+    async def stream_json(self, method: str, path: str, params: Optional[Dict[str, Any]] = None,
+                          body: Any = None) -> AsyncIterator[Dict[str, Any]]:
+        """Yield newline-delimited JSON objects from a streaming endpoint"""
+        kwargs: Dict[str, Any] = {"params": _encode_params(params),
+                                  "timeout": aiohttp.ClientTimeout(total=None, sock_connect=self.timeout)}
+        if body is not None:
+            kwargs["json"] = body
+        async with self.session.request(method, self._url(path), **kwargs) as resp:
+            if resp.status >= 400:
+                raise DockerAPIError(resp.status, _error_message(await resp.read()))
+            async for line in resp.content:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    logger.debug(f"Skipping non-JSON stream line: {line[:200]!r}")
+
+    # ---- 容器 ----
+
+    async def ping(self) -> bool:
+        try:
+            return (await self.request("GET", "/_ping", raw=True, timeout=2.0)).strip() == b"OK"
+        except Exception:
+            return False
+
+    async def list_containers(self, all: bool = True, filters: Optional[Dict[str, List[str]]] = None) -> List[Dict[str, Any]]:
+        params: Dict[str, Any] = {"all": all}
+        if filters:
+            params["filters"] = json.dumps(filters)
+        return await self.request("GET", "/containers/json", params=params)
+
+    async def inspect_container(self, container: str) -> Dict[str, Any]:
+        return await self.request("GET", f"/containers/{container}/json")
+
+    async def create_container(self, name: str, config: Dict[str, Any]) -> str:
+        result = await self.request("POST", "/containers/create", params={"name": name}, body=config)
+        return result["Id"]
+
+    async def start_container(self, container: str) -> None:
+        await self.request("POST", f"/containers/{container}/start")
+
+    async def stop_container(self, container: str, timeout: int = 10) -> None:
+        await self.request("POST", f"/containers/{container}/stop", params={"t": timeout},
+                           timeout=self.timeout + timeout)
+
+    async def rename_container(self, container: str, name: str) -> None:
+        await self.request("POST", f"/containers/{container}/rename", params={"name": name})
+
+    async def remove_container(self, container: str, force: bool = True) -> None:
+        await self.request("DELETE", f"/containers/{container}", params={"force": force})
+
+    async def container_logs(self, container: str, tail: int = 100) -> str:
+        data = await self.request("GET", f"/containers/{container}/logs", raw=True,
+                                  params={"stdout": True, "stderr": True, "tail": tail})
+        return b"".join(payload for _, payload in demux_stream(data)).decode(errors="replace")
+
+    async def exec(self, container: str, command: List[str], detach: bool = False,
+                   timeout: Optional[float] = None) -> Tuple[int, str, str]:
+        """Run a command in a container, returning (exit_code, stdout, stderr)
+
+        With detach=True the command is started in the background and
+        (0, "", "") is returned immediately. Otherwise the call waits for
+        the command to finish: only ``timeout`` (None = no limit) bounds it,
+        not the client's per-request timeout.
+        """
+        created = await self.request("POST", f"/containers/{container}/exec", body={
+            "AttachStdout": not detach,
+            "AttachStderr": not detach,
+            "Tty": False,
+            "Cmd": command,
+        })
+        exec_id = created["Id"]
+        data = await self.request("POST", f"/exec/{exec_id}/start", body={"Detach": detach, "Tty": False},
+                                  raw=True, timeout=aiohttp.ClientTimeout(total=timeout, sock_connect=self.timeout))
+        if detach:
+            return 0, "", ""
+        stdout, stderr = [], []
+        for stream, payload in demux_stream(data):
+            (stderr if stream == STDERR else stdout).append(payload)
+        info = await self.request("GET", f"/exec/{exec_id}/json")
+        exit_code = info.get("ExitCode")
+        return (exit_code if exit_code is not None else -1,
+                b"".join(stdout).decode(errors="replace"),
+                b"".join(stderr).decode(errors="replace"))
+
+    # ---- 镜像 ----
+
+    async def list_images(self) -> List[Dict[str, Any]]:
+        return await self.request("GET", "/images/json")
+
+    async def inspect_image(self, image: str) -> Dict[str, Any]:
+        return await self.request("GET", f"/images/{image}/json")
+
+    def pull_image(self, image: str) -> AsyncIterator[Dict[str, Any]]:
+        """Progress events of POST /images/create (one JSON object per line)"""
+        repository, tag = split_image_reference(image)
+        return self.stream_json("POST", "/images/create", params={"fromImage": repository, "tag": tag})
+
+
+def _encode_params(params: Optional[Dict[str, Any]]) -> Optional[Dict[str, str]]:
+    if not params:
+        return None
+    encoded = {}
+    for key, value in params.items():
+        if value is None:
+            continue
+        encoded[key] = ("1" if value else "0") if isinstance(value, bool) else str(value)
+    return encoded
+
+
+def _error_message(data: bytes) -> str:
+    try:
+        return json.loads(data).get("message", "") or data.decode(errors="replace")
+    except (ValueError, AttributeError):
+        return data.decode(errors="replace").strip()
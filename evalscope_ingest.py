@@ -0,0 +1,287 @@
+"""Ingest evalscope perf output directories: per-request records and failure logs"""
+import json
+import logging
+import math
+import re
+import sqlite3
+import time
+from array import array
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+from load_generator import percentiles
+
+logger = logging.getLogger(__name__)
+
+# evalscope 启动时打印的参数中包含最终输出目录 (带时间戳)
+_OUTPUTS_DIR_RE = re.compile(r'"outputs_dir":\s*"([^"]+)"')
+# 日志记录行: "2025-12-31 07:34:16 - evalscope - ERROR: ..."
+_RECORD_RE = re.compile(r"^(\d{4}-\d\d-\d\d \d\d:\d\d:\d\d)(?:,\d+)? - \S+ - (\w+): ?(.*)$")
+# traceback 末尾的异常行: "aiohttp.client_exceptions.ClientConnectorError: Cannot connect ..."
+_EXCEPTION_RE = re.compile(r"^([A-Za-z_][\w.]*)(?:: (.*))?$")
+
+# 逐请求数据库 (evalscope 写入 outputs_dir/benchmark_data.db 的 result 表)
+RESULT_TABLE = "result"
+FETCH_SIZE = 1000
+HISTOGRAM_BINS = 20
+MAX_SERIES_POINTS = 120
+EXAMPLE_LINES = 60
+
+
+def outputs_dir_from_log(output: str) -> Optional[str]:
+    """``outputs_dir`` as printed with the run arguments (may be relative to the working directory)"""
+    match = _OUTPUTS_DIR_RE.search(output)
+    return match.group(1) if match else None
+
+
+def find_output_dir(output: str, model: str, since: float, cwd: Optional[Path] = None) -> Optional[Path]:
+    """Output directory of the evalscope run that printed ``output``
+
+    Taken from the ``outputs_dir`` evalscope logs with its arguments; if the
+    log does not contain it, the newest ``outputs/<timestamp>/<model>``
+    under ``cwd`` modified after ``since``.
+    """
+    cwd = cwd or Path.cwd()
+    printed = outputs_dir_from_log(output)
+    if printed:
+        path = Path(printed)
+        return path if path.is_absolute() else cwd / path
+    candidates = [d for d in (cwd / "outputs").glob(f"*/{model}") if d.is_dir() and d.stat().st_mtime >= since]
+    return max(candidates, key=lambda d: d.stat().st_mtime, default=None)
+
+
+class RequestColumns:
+    """evalscope per-request records in columns (seconds, NaN = not recorded)"""
+
+    def __init__(self):
+        self.start = array("d")  # 相对第一个请求的发送时刻
+        self.end = array("d")  # 相对第一个请求的完成时刻
+        self.latency = array("d")
+        self.ttft = array("d")
+        self.tpot = array("d")
+        self.input_tokens = array("l")
+        self.output_tokens = array("l")
+        self.ok = array("b")
+        self.itl = array("d")  # 所有请求的相邻 chunk 间隔
+
+    def __len__(self) -> int:
+        return len(self.ok)
+
+    def columns(self) -> Dict[str, array]:
+        """Columns for BenchmarkStore, named like RequestSamples.columns()"""
+        return {"sent": self.start, "finished": self.end, "e2e": self.latency, "ttft": self.ttft,
+                "tpot": self.tpot, "input_tokens": self.input_tokens, "output_tokens": self.output_tokens,
+                "ok": self.ok, "itl": self.itl}
+
+
+def _number(value: Any) -> float:
+    return float(value) if isinstance(value, (int, float)) else math.nan
+
+
+def read_requests(db_path: Path) -> RequestColumns:
+    """Stream the result table into columns without loading all rows at once"""
+    cols = RequestColumns()
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        # 各版本 evalscope 的列略有不同，只读取存在的列
+        names = {row[1] for row in conn.execute(f"PRAGMA table_info({RESULT_TABLE})")}
+        wanted = ["start_time", "completed_time", "latency", "first_chunk_latency", "time_per_output_token",
+                  "prompt_tokens", "completion_tokens", "success", "chunk_times"]
+        select = ", ".join(c if c in names else "NULL" for c in wanted)
+        order = " ORDER BY start_time" if "start_time" in names else ""
+        cursor = conn.execute(f"SELECT {select} FROM {RESULT_TABLE}{order}")
+        origin = None
+        while True:
+            rows = cursor.fetchmany(FETCH_SIZE)
+            if not rows:
+                break
+            for start, completed, latency, ttft, tpot, prompt, completion, success, chunk_times in rows:
+                start, latency = _number(start), _number(latency)
+                if origin is None and not math.isnan(start):
+                    origin = start
+                end = _number(completed)
+                if math.isnan(end):
+                    end = start + latency
+                base = origin if origin is not None else 0.0
+                cols.start.append(start - base)
+                cols.end.append(end - base)
+                cols.latency.append(latency)
+                cols.ttft.append(_number(ttft))
+                cols.tpot.append(_number(tpot))
+                cols.input_tokens.append(int(prompt or 0))
+                cols.output_tokens.append(int(completion or 0))
+                cols.ok.append(1 if success else 0)
+                if success and chunk_times:
+                    try:
+                        times = json.loads(chunk_times)
+                    except (TypeError, ValueError):
+                        times = []
+                    cols.itl.extend(b - a for a, b in zip(times, times[1:]))
+    finally:
+        conn.close()
+    return cols
+
+
+def histogram(values: Iterable[float], bins: int = HISTOGRAM_BINS) -> Dict[str, List[float]]:
+    """Equal-width histogram between the smallest and largest value"""
+    data = array("d", (v for v in values if not math.isnan(v)))
+    if not data:
+        return {"edges": [], "counts": []}
+    low, high = min(data), max(data)
+    width = (high - low) / bins or 1.0
+    counts = array("l", [0]) * bins
+    for v in data:
+        counts[min(int((v - low) / width), bins - 1)] += 1
+    return {"edges": [round(low + width * i, 6) for i in range(bins + 1)], "counts": counts.tolist()}
+
+
+def _distribution(values: Iterable[float], scale: float = 1.0) -> Dict[str, Any]:
+    data = array("d", (v * scale for v in values if not math.isnan(v)))
+    stats = {k: (round(v, 3) if v is not None else None) for k, v in percentiles(data, (50, 90, 95, 99)).items()}
+    stats["min"] = round(min(data), 3) if data else None
+    stats["max"] = round(max(data), 3) if data else None
+    stats["count"] = len(data)
+    stats["histogram"] = histogram(data)
+    return stats
+
+
+def time_series(cols: RequestColumns, max_points: int = MAX_SERIES_POINTS) -> Dict[str, Any]:
+    """Per-interval completions, failures, throughput and latency over the run (by completion time)"""
+    ends = [e for e in cols.end if not math.isnan(e)]
+    if not ends:
+        return {"interval": None, "t": []}
+    duration = max(ends)
+    interval = max(1.0, math.ceil(duration / max_points))
+    n = int(duration // interval) + 1
+    completed = array("l", [0]) * n
+    failed = array("l", [0]) * n
+    tokens = array("l", [0]) * n
+    latency_sum = array("d", [0.0]) * n
+    for end, ok, latency, out in zip(cols.end, cols.ok, cols.latency, cols.output_tokens):
+        if math.isnan(end):
+            continue
+        i = int(end // interval)
+        if ok:
+            completed[i] += 1
+            tokens[i] += out
+            latency_sum[i] += latency
+        else:
+            failed[i] += 1
+    return {
+        "interval": interval,
+        "t": [round(i * interval, 3) for i in range(n)],
+        "completed": completed.tolist(),
+        "failed": failed.tolist(),
+        "request_throughput": [round(c / interval, 3) for c in completed],
+        "output_throughput": [round(t / interval, 2) for t in tokens],
+        "mean_latency_ms": [round(s * 1000 / c, 2) if c else None for s, c in zip(latency_sum, completed)],
+    }
+
+
+def distributions(cols: RequestColumns) -> Dict[str, Any]:
+    """Latency / TTFT / TPOT / ITL / token-rate distributions of successful requests (times in ms)"""
+    ok = cols.ok
+    ends = [e for e in cols.end if not math.isnan(e)]
+    duration = max(ends) if ends else 0.0
+    completed = sum(ok)
+    output_tokens = sum(o for o, good in zip(cols.output_tokens, ok) if good)
+    rates = array("d", (o / lat for o, lat, good in zip(cols.output_tokens, cols.latency, ok)
+                        if good and lat > 0 and o > 0))
+    return {
+        "requests": len(cols),
+        "completed": completed,
+        "failed": len(cols) - completed,
+        "duration": round(duration, 3),
+        "request_throughput": round(completed / duration, 3) if duration > 0 else None,
+        "output_throughput": round(output_tokens / duration, 2) if duration > 0 else None,
+        "latency_ms": _distribution((v for v, good in zip(cols.latency, ok) if good), 1000),
+        "ttft_ms": _distribution((v for v, good in zip(cols.ttft, ok) if good), 1000),
+        "tpot_ms": _distribution((v for v, good in zip(cols.tpot, ok) if good), 1000),
+        "itl_ms": _distribution(cols.itl, 1000),
+        "output_tokens_per_s": _distribution(rates),
+        "input_tokens": _distribution(array("d", (t for t, good in zip(cols.input_tokens, ok) if good))),
+        "output_tokens": _distribution(array("d", (t for t, good in zip(cols.output_tokens, ok) if good))),
+        "time_series": time_series(cols),
+    }
+
+
+def summarize_errors(log_path: Path, limit: int = 20) -> List[Dict[str, Any]]:
+    """Group the tracebacks in an evalscope benchmark.log by final exception class
+
+    Each log record that carries a traceback counts once under the class
+    of its last exception (the one raised to evalscope), with the first
+    exception of the chain as root cause. Records logged as "Retrying..."
+    warnings are counted as retries, not failures. The first traceback of
+    each class is kept as an example.
+    """
+    groups: Dict[str, Dict[str, Any]] = {}
+
+    def flush(record: Optional[Dict[str, Any]]) -> None:
+        if not record or not record["exceptions"]:
+            return
+        cls, message = record["exceptions"][-1]
+        group = groups.get(cls)
+        if group is None:
+            group = groups[cls] = {"error_class": cls, "count": 0, "retries": 0,
+                                   "root_cause": record["exceptions"][0][0], "messages": Counter(),
+                                   "first_seen": record["time"], "last_seen": record["time"],
+                                   "example": "".join(record["lines"])}
+        if record["retry"]:
+            group["retries"] += 1
+        else:
+            group["count"] += 1
+        group["messages"][message[:200]] += 1
+        group["last_seen"] = record["time"]
+
+    record = None
+    with open(log_path, errors="replace") as f:
+        for line in f:
+            match = _RECORD_RE.match(line)
+            if match:
+                flush(record)
+                level, text = match.group(2), match.group(3)
+                record = {"time": match.group(1), "retry": level == "WARNING" and text.startswith("Retrying"),
+                          "traceback": "Traceback (most recent call last)" in text, "exceptions": [],
+                          "lines": [line]}
+                continue
+            if record is None:
+                continue
+            if len(record["lines"]) < EXAMPLE_LINES:
+                record["lines"].append(line)
+            if line.startswith("Traceback (most recent call last)"):
+                record["traceback"] = True
+            elif record["traceback"] and line[:1] not in ("", " ", "\t", "\n"):
+                exception = _EXCEPTION_RE.match(line.rstrip().rstrip(">"))
+                if exception:
+                    record["exceptions"].append((exception.group(1), exception.group(2) or ""))
+    flush(record)
+    ranked = sorted(groups.values(), key=lambda g: (g["count"], g["retries"]), reverse=True)[:limit]
+    for group in ranked:
+        group["messages"] = [{"message": m, "count": c} for m, c in group["messages"].most_common(3)]
+    return ranked
+
+
+def ingest(output_dir: Path) -> Dict[str, Any]:
+    """Distributions and error summary of one evalscope output directory
+
+    Returns ``{"output_dir", "distributions", "errors", "columns"}``;
+    ``columns`` (RequestColumns) is None when the directory has no
+    per-request database, e.g. when the run was interrupted before
+    evalscope wrote it.
+    """
+    started = time.perf_counter()
+    result: Dict[str, Any] = {"output_dir": str(output_dir), "distributions": None, "errors": [], "columns": None}
+    db = next((p for p in sorted(output_dir.glob("*.db"))), None)
+    if db is not None:
+        try:
+            cols = read_requests(db)
+            result["columns"] = cols
+            result["distributions"] = distributions(cols)
+        except sqlite3.Error as e:
+            logger.warning(f"Cannot read evalscope results {db}: {e}")
+    log = output_dir / "benchmark.log"
+    if log.exists():
+        result["errors"] = summarize_errors(log)
+    logger.info(f"Ingested evalscope output {output_dir} in {time.perf_counter() - started:.2f}s")
+    return result
@@ -0,0 +1,137 @@
+"""Long-lived shell sessions for cheap in-container probes"""
+import asyncio
+import logging
+import time
+import uuid
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class ExecSessionError(Exception):
+    """The session died or a command did not finish in time"""
+
+
+class ExecSession:
+    """One ``<runtime> exec -i <container> bash`` kept open for many commands
+
+    Each command is written to the shell's stdin as
+
+        ( <command> ) 2>&1 </dev/null; printf '\\n<marker> %d\\n' $?
+
+    and its output is read up to the marker line, so a probe costs a pipe
+    write and a subshell fork inside the container instead of a new exec
+    through the runtime daemon. The subshell keeps ``cd``/``exit`` in one
+    command from leaking into the session. Commands run one at a time; a
+    timeout kills the session (its output would be out of sync) and the next
+    command starts a new one.
+    """
+
+    STREAM_LIMIT = 1024 * 1024
+
+    def __init__(self, runtime: str, container: str):
+        self.runtime = runtime
+        self.container = container
+        self.proc: Optional[asyncio.subprocess.Process] = None
+        self.last_used = time.monotonic()
+        self.commands = 0
+        self._lock = asyncio.Lock()
+
+    @property
+    def alive(self) -> bool:
+        return self.proc is not None and self.proc.returncode is None
+
+    async def _spawn(self) -> None:
+        self.proc = await asyncio.create_subprocess_exec(
+            self.runtime, "exec", "-i", self.container, "bash", "--noprofile", "--norc",
+            stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL, limit=self.STREAM_LIMIT,
+        )
+        logger.debug(f"Exec session started for {self.container} (pid {self.proc.pid})")
+
+    async def run(self, command: str, timeout: float = 10.0) -> Tuple[int, str]:
+        """Run a command, returning (exit_code, combined stdout/stderr)"""
+        async with self._lock:
+            self.last_used = time.monotonic()
+            if not self.alive:
+                await self._spawn()
+            marker = f"__PROBE_END_{uuid.uuid4().hex}__"
+            try:
+                self.proc.stdin.write(
+                    f"( {command}\n) 2>&1 </dev/null; printf '\\n{marker} %d\\n' $?\n".encode())
+                await self.proc.stdin.drain()
+                result = await asyncio.wait_for(self._read_until(marker), timeout)
+            except asyncio.TimeoutError:
+                await self.close()
+                raise ExecSessionError(f"Command timed out after {timeout}s in {self.container}")
+            except (BrokenPipeError, ConnectionResetError) as e:
+                await self.close()
+                raise ExecSessionError(f"Exec session for {self.container} died: {e}")
+            self.commands += 1
+            return result
+
+    async def _read_until(self, marker: str) -> Tuple[int, str]:
+        chunks = []
+        while True:
+            line = await self.proc.stdout.readline()
+            if not line:
+                await self.close()
+                raise ExecSessionError(f"Exec session for {self.container} closed")
+            text = line.decode(errors="replace")
+            if text.startswith(marker):
+                # 去掉 printf 为保证标记独占一行而输出的换行
+                output = "".join(chunks)[:-1]
+                return int(text.split()[1]), output
+            chunks.append(text)
+
+    async def close(self) -> None:
+        proc, self.proc = self.proc, None
+        if proc is None or proc.returncode is not None:
+            return
+        try:
+            proc.stdin.close()
+            proc.kill()
+        except ProcessLookupError:
+            pass
+        await proc.wait()
+
+
+class ExecSessionManager:
+    """Keep one ExecSession per container and reap idle ones"""
+
+    IDLE_TIMEOUT = 300
+
+    def __init__(self, runtime: Optional[str]):
+        self.runtime = runtime
+        self.sessions: Dict[str, ExecSession] = {}
+
+    async def run(self, container: str, command: str, timeout: float = 10.0) -> Tuple[int, str]:
+        """Run ``command`` in ``container`` over its session, respawning once if it died"""
+        await self._reap_idle()
+        session = self.sessions.get(container)
+        if session is None:
+            session = self.sessions[container] = ExecSession(self.runtime, container)
+        try:
+            return await session.run(command, timeout)
+        except ExecSessionError as e:
+            if session.commands == 0 or "timed out" in str(e):
+                raise
+            # 容器重启等原因导致会话断开，重建后重试一次
+            logger.info(f"{e}, respawning")
+            session.commands = 0
+            return await session.run(command, timeout)
+
+    async def close(self, container: str) -> None:
+        session = self.sessions.pop(container, None)
+        if session:
+            await session.close()
+
+    async def close_all(self) -> None:
+        for container in list(self.sessions):
+            await self.close(container)
+
+    async def _reap_idle(self) -> None:
+        now = time.monotonic()
+        for container, session in list(self.sessions.items()):
+            if now - session.last_used > self.IDLE_TIMEOUT and not session._lock.locked():
+                await self.close(container)
@@ -0,0 +1,292 @@
+"""OpenAI-compatible gateway that load-balances across vLLM replicas"""
+import json
+import logging
+import os
+import random
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+import httpx
+from fastapi import Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+
+from prefix_router import PrefixRouter, RoutingStats, render_prompt
+
+logger = logging.getLogger(__name__)
+
+# 不转发给上游的逐跳头部
+HOP_HEADERS = {"host", "content-length", "connection", "keep-alive", "transfer-encoding", "te", "upgrade",
+               "proxy-authorization", "proxy-connection", "trailer", "x-routing-mode"}
+
+ROUTING_MODES = ("prefix", "least_outstanding", "round_robin")
+
+
+class GatewayError(Exception):
+    """No replica could take the request"""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+@dataclass
+class Upstream:
+    """Routing state of one vLLM service"""
+    service_id: str
+    base_url: str
+    outstanding: int = 0
+    requests: int = 0
+    failures: int = 0  # 连续失败次数
+    ejected_until: float = 0.0
+    ejections: int = 0
+
+    @property
+    def ejected(self) -> bool:
+        return time.monotonic() < self.ejected_until
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "service_id": self.service_id,
+            "base_url": self.base_url,
+            "outstanding": self.outstanding,
+            "requests": self.requests,
+            "failures": self.failures,
+            "ejected": self.ejected,
+            "ejections": self.ejections,
+        }
+
+
+def openai_error(status: int, message: str, error_type: str = "invalid_request_error") -> JSONResponse:
+    return JSONResponse(status_code=status, content={"error": {"message": message, "type": error_type, "code": status}})
+
+
+class RelayResponse(StreamingResponse):
+    """StreamingResponse that runs ``on_close`` however the response ends
+
+    The body generator's own cleanup does not run if the client goes away
+    before the first chunk is sent, or if sending raises.
+    """
+
+    def __init__(self, content, on_close: Callable[[], Awaitable[None]], **kwargs):
+        super().__init__(content, **kwargs)
+        self.on_close = on_close
+
+    async def __call__(self, scope, receive, send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            await self.on_close()
+
+
+class Gateway:
+    """Route /v1 requests to running services of the requested model
+
+    Replica selection depends on the routing mode (``GATEWAY_ROUTING``, or
+    per request via the ``X-Routing-Mode`` header):
+
+    - ``prefix``: to the replica expected to hold the longest block-aligned
+      prefix of the prompt, within a load bound (see PrefixRouter); prompts
+      shorter than one block fall back to least outstanding
+    - ``least_outstanding``: fewest in-flight requests, ties at random
+    - ``round_robin``: in turn, for comparison
+
+    Prefix hit rate and TTFT are tracked per mode. Upstream connections are
+    kept alive in one pooled httpx client and streamed responses are relayed
+    chunk by chunk without decoding. A replica with ``EJECT_AFTER``
+    consecutive failures (connection errors or 5xx) is skipped for
+    ``EJECT_SECONDS``, doubling on repeated ejections up to
+    ``EJECT_MAX_SECONDS``; if every replica is ejected they are tried anyway
+    rather than failing the request.
+    """
+
+    EJECT_AFTER = 3
+    EJECT_SECONDS = 10.0
+    EJECT_MAX_SECONDS = 120.0
+    MAX_ATTEMPTS = 2
+
+    def __init__(self, service_manager):
+        self.service_manager = service_manager
+        self.upstreams: Dict[str, Upstream] = {}
+        self.mode = os.environ.get("GATEWAY_ROUTING", "prefix")
+        self.router = PrefixRouter()
+        self.stats: Dict[str, RoutingStats] = {mode: RoutingStats() for mode in ROUTING_MODES}
+        self._round_robin = 0
+        self._held: Set[httpx.Response] = set()  # send() 返回、尚未 release() 的响应
+        self._http: Optional[httpx.AsyncClient] = None
+
+    @property
+    def http(self) -> httpx.AsyncClient:
+        if self._http is None or self._http.is_closed:
+            self._http = httpx.AsyncClient(
+                timeout=httpx.Timeout(None, connect=2.0),
+                limits=httpx.Limits(max_connections=1024, max_keepalive_connections=256),
+            )
+        return self._http
+
+    async def close(self) -> None:
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+    def replicas(self, model: str) -> List[Upstream]:
+        """Upstreams of the running services that serve ``model``"""
+        replicas = []
+        for service in self.service_manager.services.values():
+            if service.status != "running" or model not in (service.served_model_name, service.model):
+                continue
+            upstream = self.upstreams.get(service.id)
+            base_url = f"http://127.0.0.1:{service.port}"
+            if upstream is None or upstream.base_url != base_url:
+                upstream = self.upstreams[service.id] = Upstream(service.id, base_url)
+            replicas.append(upstream)
+        return replicas
+
+    def pick(self, model: str, exclude: Set[str] = frozenset(), mode: str = "least_outstanding",
+             hashes: Optional[List[int]] = None) -> Optional[Upstream]:
+        replicas = [u for u in self.replicas(model) if u.service_id not in exclude]
+        healthy = [u for u in replicas if not u.ejected] or replicas
+        if not healthy:
+            return None
+        if mode == "round_robin":
+            healthy.sort(key=lambda u: u.service_id)
+            self._round_robin += 1
+            return healthy[self._round_robin % len(healthy)]
+        if mode == "prefix" and hashes:
+            by_id = {u.service_id: u for u in healthy}
+            return by_id[self.router.choose(hashes, {i: u.outstanding for i, u in by_id.items()})]
+        least = min(u.outstanding for u in healthy)
+        return random.choice([u for u in healthy if u.outstanding == least])
+
+    def _record(self, upstream: Upstream, ok: bool) -> None:
+        if ok:
+            upstream.failures = 0
+            upstream.ejections = 0
+            return
+        upstream.failures += 1
+        if upstream.failures >= self.EJECT_AFTER:
+            seconds = min(self.EJECT_MAX_SECONDS, self.EJECT_SECONDS * 2 ** upstream.ejections)
+            upstream.ejected_until = time.monotonic() + seconds
+            upstream.ejections += 1
+            upstream.failures = 0
+            logger.warning(f"Gateway ejected service {upstream.service_id} for {seconds:.0f}s")
+
+    def models(self) -> Dict[str, Any]:
+        """/v1/models: one entry per served model name with its replica count"""
+        counts: Dict[str, int] = {}
+        for service in self.service_manager.services.values():
+            if service.status == "running":
+                name = service.served_model_name or service.model
+                counts[name] = counts.get(name, 0) + 1
+        return {"object": "list", "data": [
+            {"id": name, "object": "model", "owned_by": "vllm-ascend-playground", "replicas": n}
+            for name, n in sorted(counts.items())
+        ]}
+
+    def status(self) -> Dict[str, Any]:
+        live = set(self.service_manager.services)
+        for service_id in list(self.upstreams):
+            if service_id not in live:
+                del self.upstreams[service_id]
+        return {
+            "mode": self.mode,
+            "upstreams": [u.to_dict() for u in self.upstreams.values()],
+            "routing": {mode: stats.to_dict() for mode, stats in self.stats.items()},
+        }
+
+    async def forward(self, request: Request, path: str) -> Response:
+        """Proxy one OpenAI API request to a replica chosen by the routing mode"""
+        body = await request.body()
+        try:
+            payload = json.loads(body)
+            model = payload.get("model")
+        except (ValueError, AttributeError):
+            return openai_error(400, "Request body must be a JSON object")
+        if not model:
+            return openai_error(400, "Missing 'model'")
+        headers = {k: v for k, v in request.headers.items() if k.lower() not in HOP_HEADERS}
+        try:
+            upstream, response, started, mode = await self.send(
+                path, payload, body, headers, request.headers.get("x-routing-mode"))
+        except GatewayError as e:
+            error_type = "not_found_error" if e.status == 404 else "service_unavailable"
+            return openai_error(e.status, e.message, error_type)
+        return self.streaming_response(
+            upstream, response, started, mode,
+            headers={k: v for k, v in response.headers.items() if k.lower() not in HOP_HEADERS},
+        )
+
+    def streaming_response(self, upstream: Upstream, response: httpx.Response, started: float, mode: str,
+                           **kwargs) -> RelayResponse:
+        """Client response relaying an upstream response from ``send()``"""
+        return RelayResponse(self.relay(upstream, response, started, mode),
+                             on_close=lambda: self.release(upstream, response),
+                             status_code=response.status_code, **kwargs)
+
+    async def send(self, path: str, payload: Dict[str, Any], body: Optional[bytes] = None,
+                   headers: Optional[Dict[str, str]] = None,
+                   mode: Optional[str] = None) -> Tuple[Upstream, httpx.Response, float, str]:
+        """Send a request to a replica and return (upstream, streaming response, start time, mode)
+
+        The caller must consume the response through ``relay()`` or
+        ``streaming_response()``, or hand it to ``release()``, to free the
+        replica's outstanding slot.
+        """
+        mode = mode if mode in ROUTING_MODES else self.mode
+        model = payload["model"]
+        body = body if body is not None else json.dumps(payload).encode()
+        hashes = self.router.block_hashes(render_prompt(payload))
+
+        tried: Set[str] = set()
+        last_error = f"No running service serves model '{model}'"
+        while len(tried) < self.MAX_ATTEMPTS:
+            upstream = self.pick(model, tried, mode, hashes)
+            if upstream is None:
+                break
+            if not tried:
+                self.stats[mode].record_route(len(hashes), self.router.matched_blocks(hashes, upstream.service_id))
+            # 所有模式都记录前缀去向，命中率按同一口径比较
+            self.router.record(hashes, upstream.service_id)
+            tried.add(upstream.service_id)
+            upstream.outstanding += 1
+            upstream.requests += 1
+            started = time.perf_counter()
+            try:
+                upstream_request = self.http.build_request("POST", f"{upstream.base_url}{path}", content=body,
+                                                           headers=headers or {"content-type": "application/json"})
+                response = await self.http.send(upstream_request, stream=True)
+            except httpx.HTTPError as e:
+                # 连接失败时请求尚未发出任何数据，可以换一个副本重试
+                upstream.outstanding -= 1
+                self._record(upstream, False)
+                last_error = f"Upstream {upstream.service_id} unavailable: {e}"
+                continue
+            self._record(upstream, response.status_code < 500)
+            self._held.add(response)
+            return upstream, response, started, mode
+        raise GatewayError(404 if not tried else 503, last_error)
+
+    async def relay(self, upstream: Upstream, response: httpx.Response, started: float, mode: str):
+        """Yield the raw response chunks, recording TTFT of streamed responses"""
+        streaming = response.headers.get("content-type", "").startswith("text/event-stream")
+        first = True
+        try:
+            async for chunk in response.aiter_raw():
+                if first and streaming:
+                    self.stats[mode].record_ttft(time.perf_counter() - started)
+                first = False
+                yield chunk
+        except httpx.HTTPError as e:
+            self._record(upstream, False)
+            logger.warning(f"Upstream {upstream.service_id} broke off a response: {e}")
+        finally:
+            await self.release(upstream, response)
+
+    async def release(self, upstream: Upstream, response: httpx.Response) -> None:
+        """Free the outstanding slot taken by ``send()`` and close the upstream response; idempotent"""
+        if response not in self._held:
+            return
+        self._held.discard(response)
+        upstream.outstanding -= 1
+        await response.aclose()
@@ -0,0 +1,186 @@
+"""Background image pull jobs with per-layer progress"""
+import asyncio
+import logging
+import os
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Set
+
+from docker_api import split_image_reference
+
+logger = logging.getLogger(__name__)
+
+# 这些状态表示该层已下载完毕
+LAYER_DONE = ("Download complete", "Pull complete", "Already exists", "Verifying Checksum", "Extracting")
+
+
+@dataclass
+class PullJob:
+    """One image pull, shared by every request for the same reference"""
+    id: str
+    image: str
+    status: str = "queued"  # queued, pulling, completed, error
+    message: str = ""
+    error: str = ""
+    layers: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    cached: bool = False
+    image_info: Optional[Dict[str, Any]] = None
+
+    @property
+    def done(self) -> bool:
+        return self.status in ("completed", "error")
+
+    def apply(self, event: Dict[str, Any]) -> None:
+        """Fold one Docker JSON progress event into the layer table"""
+        status = event.get("status", "")
+        layer_id = event.get("id")
+        if not layer_id or "progressDetail" not in event:
+            # 镜像级别的消息 (Pulling from ..., Digest: ..., Status: ...)
+            self.message = f"{layer_id}: {status}" if layer_id else status
+            return
+        layer = self.layers.setdefault(layer_id, {"status": "", "current": 0, "total": 0})
+        layer["status"] = status
+        detail = event.get("progressDetail") or {}
+        if status == "Downloading":
+            layer["current"] = detail.get("current", layer["current"])
+            layer["total"] = detail.get("total", layer["total"]) or layer["total"]
+        elif status in LAYER_DONE and layer["total"]:
+            layer["current"] = layer["total"]
+
+    def to_dict(self) -> Dict[str, Any]:
+        current = sum(layer["current"] for layer in self.layers.values())
+        total = sum(layer["total"] for layer in self.layers.values())
+        done = sum(1 for layer in self.layers.values() if layer["status"] in ("Pull complete", "Already exists"))
+        return {
+            "id": self.id,
+            "image": self.image,
+            "status": self.status,
+            "message": self.message,
+            "error": self.error,
+            "layers": self.layers,
+            "layers_done": done,
+            "layers_total": len(self.layers),
+            "bytes_current": current,
+            "bytes_total": total,
+            "progress": 100.0 if self.status == "completed" else round(current * 100 / total, 1) if total else 0.0,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "cached": self.cached,
+            "image_info": self.image_info,
+        }
+
+
+class ImagePuller:
+    """Queue image pulls in the background
+
+    Requests for an image that is already queued or pulling join the existing
+    job, and at most ``max_concurrent`` pulls run at a time. Progress comes
+    from the runtime's JSON progress stream and is pushed to subscribers
+    (WebSocket clients) at most every ``PUBLISH_INTERVAL`` seconds. Images
+    pulled successfully are remembered, so pulling them again returns a
+    completed job at once unless ``force`` is set.
+    """
+
+    PUBLISH_INTERVAL = 0.25
+    MAX_FINISHED_JOBS = 50
+
+    def __init__(self, container_manager, max_concurrent: Optional[int] = None):
+        self.container_manager = container_manager
+        self.max_concurrent = max_concurrent or int(os.environ.get("IMAGE_PULL_CONCURRENCY", "2"))
+        self.jobs: Dict[str, PullJob] = {}
+        self.completed: Dict[str, Dict[str, Any]] = {}
+        self._active: Dict[str, str] = {}
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+        self._last_publish: Dict[str, float] = {}
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    @staticmethod
+    def normalize(image: str) -> str:
+        repository, tag = split_image_reference(image.strip())
+        return f"{repository}@{tag}" if tag.startswith("sha256:") else f"{repository}:{tag}"
+
+    def submit(self, image: str, force: bool = False) -> PullJob:
+        """Queue a pull and return its job (an existing one for the same image)"""
+        image = self.normalize(image)
+        if image in self._active:
+            return self.jobs[self._active[image]]
+
+        job = PullJob(id=uuid.uuid4().hex[:8], image=image)
+        self.jobs[job.id] = job
+        self._prune()
+        if image in self.completed and not force:
+            job.status = "completed"
+            job.cached = True
+            job.image_info = self.completed[image]
+            job.message = f"镜像 {image} 已下载"
+            job.finished_at = time.time()
+            return job
+
+        self._active[image] = job.id
+        asyncio.create_task(self._run(job))
+        return job
+
+    def get(self, job_id: str) -> Optional[PullJob]:
+        return self.jobs.get(job_id)
+
+    def list_jobs(self) -> List[Dict[str, Any]]:
+        return [job.to_dict() for job in sorted(self.jobs.values(), key=lambda j: j.created_at, reverse=True)]
+
+    def subscribe(self, job_id: str) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=1)
+        self._subscribers.setdefault(job_id, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, job_id: str, queue: asyncio.Queue) -> None:
+        subscribers = self._subscribers.get(job_id)
+        if subscribers:
+            subscribers.discard(queue)
+            if not subscribers:
+                del self._subscribers[job_id]
+
+    def _publish(self, job: PullJob, force: bool = False) -> None:
+        now = time.monotonic()
+        if not force and now - self._last_publish.get(job.id, 0.0) < self.PUBLISH_INTERVAL:
+            return
+        self._last_publish[job.id] = now
+        state = job.to_dict()
+        for queue in self._subscribers.get(job.id, ()):
+            # 只保留最新状态，慢速客户端不会积压消息
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(state)
+
+    async def _run(self, job: PullJob) -> None:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrent)
+        try:
+            async with self._semaphore:
+                job.status = "pulling"
+                job.started_at = time.time()
+                self._publish(job, force=True)
+                async for event in self.container_manager.pull_image(job.image):
+                    job.apply(event)
+                    self._publish(job)
+                job.image_info = await self.container_manager.inspect_image(job.image)
+                self.completed[job.image] = job.image_info or {}
+                job.status = "completed"
+                job.message = f"镜像 {job.image} 下载成功"
+        except Exception as e:
+            logger.error(f"Image pull {job.image} failed: {e}")
+            job.status = "error"
+            job.error = str(e)
+        finally:
+            job.finished_at = time.time()
+            self._active.pop(job.image, None)
+            self._last_publish.pop(job.id, None)
+            self._publish(job, force=True)
+
+    def _prune(self) -> None:
+        finished = sorted((j for j in self.jobs.values() if j.done), key=lambda j: j.created_at)
+        for job in finished[:max(0, len(finished) - self.MAX_FINISHED_JOBS)]:
+            del self.jobs[job.id]
@@ -0,0 +1,310 @@
+"""In-process open-loop load generator for OpenAI-compatible endpoints"""
+import asyncio
+import json
+import logging
+import math
+import random
+import time
+from array import array
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+ARRIVALS = ("poisson", "constant", "burst")
+PERCENTILES = (50, 90, 95, 99)
+
+# 随机提示词用的常见英文短词，大多数 tokenizer 中一个词约一个 token
+_WORDS = ("time year people way day man thing woman life child world school state family student group "
+          "country problem hand part place case week company system program question work government number "
+          "night point home water room mother area money story fact month lot right study book eye job word "
+          "business issue side kind head house service friend father power hour game line end member law car "
+          "city community name president team minute idea kid body information back parent face others level "
+          "office door health person art war history party result change morning reason research girl guy "
+          "moment air teacher force education").split()
+
+
+@dataclass
+class LoadSpec:
+    """What to send and when"""
+    url: str
+    model: str
+    num_requests: int = 100
+    request_rate: float = 1.0  # 平均每秒请求数，<= 0 表示全部立即发出
+    arrival: str = "poisson"  # poisson, constant, burst
+    burst_size: int = 8  # burst: 每批请求数，批间隔 burst_size / request_rate
+    max_concurrency: Optional[int] = None  # 在途请求上限，None 不限
+    input_len: int = 1024
+    output_len: int = 128
+    temperature: float = 0.0
+    ignore_eos: bool = True  # vLLM 扩展参数: 固定生成 output_len 个 token
+    seed: Optional[int] = None
+    timeout: float = 600.0
+
+
+def arrival_offsets(spec: LoadSpec, rng: random.Random) -> array:
+    """Send time of each request in seconds from the start of the run"""
+    n, rate = spec.num_requests, spec.request_rate
+    if rate <= 0 or math.isinf(rate):
+        return array("d", [0.0]) * n
+    offsets = array("d")
+    t = 0.0
+    if spec.arrival == "poisson":
+        for _ in range(n):
+            offsets.append(t)
+            t += rng.expovariate(rate)
+    elif spec.arrival == "constant":
+        offsets.extend(i / rate for i in range(n))
+    elif spec.arrival == "burst":
+        size = max(1, spec.burst_size)
+        offsets.extend((i // size) * size / rate for i in range(n))
+    else:
+        raise ValueError(f"未知的到达过程: {spec.arrival} (可选 {', '.join(ARRIVALS)})")
+    return offsets
+
+
+def random_prompt(rng: random.Random, tokens: int) -> str:
+    return " ".join(rng.choices(_WORDS, k=max(1, tokens)))
+
+
+def percentiles(values: Iterable[float], qs: Sequence[float] = PERCENTILES) -> Dict[str, Optional[float]]:
+    """mean / median / pXX of ``values`` with linear interpolation between ranks (numpy default)"""
+    ordered = sorted(v for v in values if not math.isnan(v))
+    stats: Dict[str, Optional[float]] = {"mean": None, "median": None, **{f"p{q:g}": None for q in qs}}
+    if not ordered:
+        return stats
+    last = len(ordered) - 1
+
+    def rank(q: float) -> float:
+        pos = q / 100 * last
+        low = int(pos)
+        high = min(low + 1, last)
+        return ordered[low] + (ordered[high] - ordered[low]) * (pos - low)
+
+    stats["mean"] = math.fsum(ordered) / len(ordered)
+    stats["median"] = rank(50)
+    for q in qs:
+        stats[f"p{q:g}"] = rank(q)
+    return stats
+
+
+class RequestSamples:
+    """Per-request measurements in columns (one array per metric, NaN = not measured)"""
+
+    def __init__(self, n: int):
+        nan = array("d", [math.nan]) * n
+        self.sent = array("d", nan)  # 相对开始时间的发送时刻 (s)
+        self.ttft = array("d", nan)  # 首 token 时间 (s)
+        self.e2e = array("d", nan)  # 端到端延迟 (s)
+        self.input_tokens = array("l", [0]) * n
+        self.output_tokens = array("l", [0]) * n
+        self.ok = array("b", [0]) * n
+        self.itl = array("d")  # 所有请求的相邻 token 间隔 (s)
+        self.errors: Counter = Counter()
+
+    def __len__(self) -> int:
+        return len(self.ok)
+
+    def columns(self) -> Dict[str, array]:
+        """Per-request columns for storage (``itl`` is per token, not per request)"""
+        return {"sent": self.sent, "ttft": self.ttft, "e2e": self.e2e, "input_tokens": self.input_tokens,
+                "output_tokens": self.output_tokens, "ok": self.ok, "itl": self.itl}
+
+    def tpot(self) -> array:
+        """Time per output token after the first, per successful request"""
+        return array("d", ((e - t) / (o - 1) for e, t, o, ok in zip(self.e2e, self.ttft, self.output_tokens, self.ok)
+                           if ok and o > 1))
+
+    def summary(self, duration: float) -> Dict[str, Any]:
+        """Aggregate metrics in the units of ``vllm bench serve`` (latencies in ms)"""
+        ok = self.ok
+        completed = sum(ok)
+        input_tokens = sum(t for t, good in zip(self.input_tokens, ok) if good)
+        output_tokens = sum(t for t, good in zip(self.output_tokens, ok) if good)
+        result: Dict[str, Any] = {
+            "completed": completed,
+            "failed": len(ok) - completed,
+            "duration": round(duration, 3),
+            "total_input_tokens": input_tokens,
+            "total_output_tokens": output_tokens,
+            "request_throughput": round(completed / duration, 3) if duration > 0 else None,
+            "output_throughput": round(output_tokens / duration, 2) if duration > 0 else None,
+            "total_token_throughput": round((input_tokens + output_tokens) / duration, 2) if duration > 0 else None,
+            "errors": dict(self.errors.most_common(10)),
+        }
+        columns = {
+            "ttft": (t for t, good in zip(self.ttft, ok) if good),
+            "tpot": self.tpot(),
+            "itl": self.itl,
+            "e2el": (e for e, good in zip(self.e2e, ok) if good),
+        }
+        for name, values in columns.items():
+            for stat, value in percentiles(values).items():
+                result[f"{stat}_{name}_ms"] = round(value * 1000, 2) if value is not None else None
+        return result
+
+
+class LoadGenerator:
+    """Send requests on an arrival schedule and measure every streamed response
+
+    Requests are issued at precomputed offsets (Poisson, constant or burst
+    arrivals) whether or not earlier requests have finished, i.e. open
+    loop; ``max_concurrency`` optionally caps the requests in flight, as in
+    ``vllm bench serve``. Every request streams (SSE) and the arrival time
+    of each content chunk is recorded, giving TTFT, inter-token latency,
+    TPOT and end-to-end latency. Token counts come from the final usage
+    chunk (``stream_options.include_usage``), or the number of content
+    chunks if the server sends none.
+
+    ``completed`` / ``failed`` count finished requests while the run is in
+    progress.
+    """
+
+    def __init__(self, spec: LoadSpec, http: Optional[httpx.AsyncClient] = None):
+        if spec.arrival not in ARRIVALS:
+            raise ValueError(f"未知的到达过程: {spec.arrival} (可选 {', '.join(ARRIVALS)})")
+        self.spec = spec
+        self.samples = RequestSamples(spec.num_requests)
+        self.completed = 0
+        self.failed = 0
+        self.finished = array("l")  # 按完成顺序的请求序号 (含失败)
+        self.finished_at = array("d")  # 对应的完成时刻 (相对开始时间，秒)
+        self.started: Optional[float] = None
+        self.duration = 0.0
+        self._http = http
+        self._chat = not spec.url.rstrip("/").endswith("/v1/completions")
+
+    def progress(self, window: float = 10.0) -> Dict[str, Any]:
+        """Counts so far plus throughput and latency of the requests finished in the last ``window`` seconds"""
+        s = self.samples
+        elapsed = time.perf_counter() - self.started if self.started else 0.0
+        since = elapsed - window
+        e2e, done = [], 0
+        # 从最近完成的请求往前扫描，只看窗口内的部分
+        for n in range(len(self.finished) - 1, -1, -1):
+            if self.finished_at[n] < since:
+                break
+            i = self.finished[n]
+            done += 1
+            if s.ok[i]:
+                e2e.append(s.e2e[i])
+        stats = percentiles(e2e, (50, 99))
+        span = min(window, elapsed)
+        return {
+            "total": self.spec.num_requests,
+            "completed": self.completed,
+            "failed": self.failed,
+            "elapsed": round(elapsed, 2),
+            "rolling_throughput": round(done / span, 3) if span > 0 else None,
+            "rolling_p50_ms": round(stats["p50"] * 1000, 2) if stats["p50"] is not None else None,
+            "rolling_p99_ms": round(stats["p99"] * 1000, 2) if stats["p99"] is not None else None,
+        }
+
+    def payload(self, prompt: str) -> Dict[str, Any]:
+        spec = self.spec
+        body: Dict[str, Any] = {
+            "model": spec.model,
+            "max_tokens": spec.output_len,
+            "temperature": spec.temperature,
+            "stream": True,
+            "stream_options": {"include_usage": True},
+        }
+        if spec.ignore_eos:
+            body["ignore_eos"] = True
+        if self._chat:
+            body["messages"] = [{"role": "user", "content": prompt}]
+        else:
+            body["prompt"] = prompt
+        return body
+
+    async def run(self) -> Dict[str, Any]:
+        """Run the whole load and return the summary (see RequestSamples.summary)"""
+        spec = self.spec
+        rng = random.Random(spec.seed)
+        offsets = arrival_offsets(spec, rng)
+        prompts = [random_prompt(rng, spec.input_len) for _ in range(spec.num_requests)]
+        limit = spec.max_concurrency or spec.num_requests
+        semaphore = asyncio.Semaphore(limit) if spec.max_concurrency else None
+        http = self._http or httpx.AsyncClient(
+            timeout=httpx.Timeout(spec.timeout, connect=5.0),
+            limits=httpx.Limits(max_connections=limit, max_keepalive_connections=limit))
+        self.started = time.perf_counter()
+        tasks: List[asyncio.Task] = []
+        try:
+            for i, offset in enumerate(offsets):
+                delay = self.started + offset - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                tasks.append(asyncio.create_task(self._send(http, i, prompts[i], semaphore)))
+            await asyncio.gather(*tasks)
+        finally:
+            # 被取消时不留下未完成的请求
+            for task in tasks:
+                task.cancel()
+            self.duration = time.perf_counter() - self.started
+            if self._http is None:
+                await http.aclose()
+        return self.samples.summary(self.duration)
+
+    async def _send(self, http: httpx.AsyncClient, i: int, prompt: str,
+                    semaphore: Optional[asyncio.Semaphore]) -> None:
+        if semaphore is None:
+            return await self._request(http, i, prompt)
+        async with semaphore:
+            return await self._request(http, i, prompt)
+
+    async def _request(self, http: httpx.AsyncClient, i: int, prompt: str) -> None:
+        s = self.samples
+        start = time.perf_counter()
+        s.sent[i] = start - self.started
+        chunks = 0
+        last = start
+        itl = array("d")
+        usage = None
+        try:
+            async with http.stream("POST", self.spec.url, json=self.payload(prompt)) as response:
+                if response.status_code != 200:
+                    await response.aread()
+                    raise RuntimeError(f"HTTP {response.status_code}: {response.text[:200]}")
+                async for line in response.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    data = line[5:].strip()
+                    if data == "[DONE]":
+                        break
+                    event = json.loads(data)
+                    if event.get("error"):
+                        raise RuntimeError(str(event["error"].get("message", event["error"]))
+                                           if isinstance(event["error"], dict) else str(event["error"]))
+                    usage = event.get("usage") or usage
+                    choices = event.get("choices") or []
+                    if not choices:
+                        continue
+                    delta = choices[0].get("delta") or {}
+                    text = delta.get("content") or delta.get("reasoning_content") or choices[0].get("text")
+                    if not text:
+                        continue
+                    now = time.perf_counter()
+                    if chunks == 0:
+                        s.ttft[i] = now - start
+                    else:
+                        itl.append(now - last)
+                    last = now
+                    chunks += 1
+            if chunks == 0:
+                raise RuntimeError("响应中没有生成内容")
+            s.e2e[i] = time.perf_counter() - start
+            s.output_tokens[i] = (usage or {}).get("completion_tokens") or chunks
+            s.input_tokens[i] = (usage or {}).get("prompt_tokens") or self.spec.input_len
+            s.itl.extend(itl)
+            s.ok[i] = 1
+            self.completed += 1
+        except Exception as e:
+            s.errors[f"{type(e).__name__}: {e}"[:200]] += 1
+            self.failed += 1
+        finally:
+            self.finished.append(i)
+            self.finished_at.append(time.perf_counter() - self.started)
@@ -0,0 +1,336 @@
+"""Mock vLLM OpenAI-compatible server for offline benchmarking and tests
+
+Speaks the subset of the vLLM API the playground uses (/v1/chat/completions,
+/v1/completions, /v1/models, /health, /metrics) with a simple timing model
+instead of a real engine, so the chat, benchmark, readiness, metrics and
+routing paths can run without NPUs. Accepts the ``vllm serve`` command
+line (unknown vLLM flags are ignored); ``scripts/mock/vllm`` is a drop-in
+``vllm`` executable.
+"""
+import argparse
+import asyncio
+import bisect
+import json
+import logging
+import random
+import signal
+import sys
+import time
+import uuid
+from contextlib import aclosing
+from dataclasses import dataclass, fields
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence, Tuple
+
+from aiohttp import web
+
+from prefix_router import CHARS_PER_TOKEN, render_prompt
+
+logger = logging.getLogger(__name__)
+
+# 与 vLLM 相同的直方图桶 (秒)
+TTFT_BUCKETS = (0.001, 0.005, 0.01, 0.02, 0.04, 0.06, 0.08, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 7.5, 10.0,
+                20.0, 40.0, 80.0, 160.0, 640.0, 2560.0)
+ITL_BUCKETS = (0.01, 0.025, 0.05, 0.075, 0.1, 0.15, 0.2, 0.3, 0.4, 0.5, 0.75, 1.0, 2.5, 5.0, 7.5, 10.0, 20.0,
+               40.0, 80.0)
+E2E_BUCKETS = (0.3, 0.5, 0.8, 1.0, 1.5, 2.0, 2.5, 5.0, 10.0, 15.0, 20.0, 30.0, 40.0, 50.0, 60.0, 120.0, 240.0,
+               480.0, 960.0, 1920.0, 7680.0)
+
+_WORDS = ("the of and to in is that it for on with as was at by be this from or have an are not but had his they "
+          "you were her she which their all there been one has would what if more when will about who up its "
+          "out so said into than them some could these two may then do first any my now such like our over").split()
+
+
+@dataclass
+class MockConfig:
+    """Timing model and fault injection of the mock engine"""
+    model: str = "mock-model"
+    served_model_name: str = ""
+    max_model_len: int = 32768
+    prefill_ms_per_token: float = 0.05  # 预填充每个输入 token 的耗时 (毫秒)
+    decode_tps: float = 50.0  # 单个序列的解码速度 (token/s)
+    slowdown: float = 0.02  # 每多一个并发序列，预填充和解码步长增加的比例
+    kv_cache_tokens: int = 65536  # KV cache 容量: 请求按 输入 + max_tokens 预留，容量不足时排队
+    default_max_tokens: int = 256
+    error_rate: float = 0.0  # 直接返回 500 的请求比例
+    abort_rate: float = 0.0  # 输出到一半时断开连接的请求比例
+    startup_seconds: float = 0.0  # 模拟启动耗时 (权重加载 / KV cache / 图编译)，按 vLLM 格式打印日志
+    seed: Optional[int] = None
+
+    @property
+    def name(self) -> str:
+        return self.served_model_name or self.model
+
+
+class _Histogram:
+    def __init__(self, bounds: Sequence[float]):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+    def render(self, name: str, labels: str) -> List[str]:
+        lines = [f"# TYPE {name} histogram"]
+        cumulative = 0
+        for bound, count in zip(self.bounds + (float("inf"),), self.counts):
+            cumulative += count
+            le = "+Inf" if bound == float("inf") else repr(float(bound))
+            lines.append(f'{name}_bucket{{le="{le}",{labels}}} {cumulative}')
+        lines.append(f"{name}_sum{{{labels}}} {self.sum}")
+        lines.append(f"{name}_count{{{labels}}} {cumulative}")
+        return lines
+
+
+class MockEngine:
+    """Queueing and timing model of one vLLM instance
+
+    A request first reserves ``prompt + max_tokens`` tokens of KV cache;
+    while the cache is full it waits (counted in ``num_requests_waiting``)
+    and is admitted first come, first served. Prefill takes
+    ``prefill_ms_per_token`` per input token and each decode step
+    ``1 / decode_tps``, both stretched by ``1 + slowdown * (running - 1)``
+    to mimic batching contention.
+    """
+
+    def __init__(self, config: MockConfig):
+        self.config = config
+        self.rng = random.Random(config.seed)
+        self.running = 0
+        self.kv_used = 0
+        self._queue: List[Tuple[int, asyncio.Future]] = []  # (预留 token 数, 放行信号)
+        self.counters = {"prompt_tokens": 0, "generation_tokens": 0, "request_success": 0}
+        self.histograms = {
+            "time_to_first_token_seconds": _Histogram(TTFT_BUCKETS),
+            "inter_token_latency_seconds": _Histogram(ITL_BUCKETS),
+            "e2e_request_latency_seconds": _Histogram(E2E_BUCKETS),
+        }
+
+    @property
+    def waiting(self) -> int:
+        return len(self._queue)
+
+    def contention(self) -> float:
+        return 1.0 + self.config.slowdown * max(0, self.running - 1)
+
+    async def _admit(self, tokens: int) -> None:
+        if not self._queue and self.kv_used + tokens <= self.config.kv_cache_tokens:
+            self.kv_used += tokens
+            self.running += 1
+            return
+        entry = (tokens, asyncio.get_running_loop().create_future())
+        self._queue.append(entry)
+        try:
+            await entry[1]
+        except asyncio.CancelledError:
+            if entry in self._queue:
+                self._queue.remove(entry)
+            elif not entry[1].cancelled():
+                self._release(tokens)  # 已放行但调用方已取消
+            raise
+
+    def _release(self, tokens: int) -> None:
+        self.kv_used -= tokens
+        self.running -= 1
+        # 按到达顺序放行，队首放不下时后面的也等待
+        while self._queue and self.kv_used + self._queue[0][0] <= self.config.kv_cache_tokens:
+            tokens, admitted = self._queue.pop(0)
+            self.kv_used += tokens
+            self.running += 1
+            admitted.set_result(None)
+
+    async def generate(self, prompt_tokens: int, max_tokens: int) -> AsyncIterator[str]:
+        """Yield output tokens with the modelled timing"""
+        reserved = prompt_tokens + max_tokens
+        started = time.perf_counter()
+        await self._admit(reserved)
+        try:
+            await asyncio.sleep(prompt_tokens * self.config.prefill_ms_per_token / 1000 * self.contention())
+            self.counters["prompt_tokens"] += prompt_tokens
+            last = None
+            for i in range(max_tokens):
+                if i:
+                    await asyncio.sleep(self.contention() / self.config.decode_tps)
+                now = time.perf_counter()
+                if last is None:
+                    self.histograms["time_to_first_token_seconds"].observe(now - started)
+                else:
+                    self.histograms["inter_token_latency_seconds"].observe(now - last)
+                last = now
+                self.counters["generation_tokens"] += 1
+                yield " " + self.rng.choice(_WORDS)
+            self.counters["request_success"] += 1
+            self.histograms["e2e_request_latency_seconds"].observe(time.perf_counter() - started)
+        finally:
+            self._release(reserved)
+
+    def metrics(self) -> str:
+        """Prometheus text exposition with vLLM metric names"""
+        labels = f'engine="0",model_name="{self.config.name}"'
+        lines = []
+        for name, value in (("num_requests_running", self.running), ("num_requests_waiting", self.waiting),
+                            ("kv_cache_usage_perc", self.kv_used / self.config.kv_cache_tokens)):
+            lines += [f"# TYPE vllm:{name} gauge", f"vllm:{name}{{{labels}}} {float(value)}"]
+        for name, value in (*self.counters.items(), ("num_preemptions", 0)):
+            lines += [f"# TYPE vllm:{name} counter", f"vllm:{name}_total{{{labels}}} {float(value)}"]
+        for name, histogram in self.histograms.items():
+            lines += histogram.render(f"vllm:{name}", labels)
+        return "\n".join(lines) + "\n"
+
+
+def _error(status: int, message: str, error_type: str) -> web.Response:
+    return web.json_response({"object": "error", "message": message, "type": error_type, "param": None,
+                              "code": status}, status=status)
+
+
+def create_app(config: MockConfig) -> web.Application:
+    """aiohttp application serving the mock API (usable in-process in tests)"""
+    engine = MockEngine(config)
+    app = web.Application()
+    app["engine"] = engine
+
+    async def health(request: web.Request) -> web.Response:
+        return web.Response()
+
+    async def models(request: web.Request) -> web.Response:
+        return web.json_response({"object": "list", "data": [{
+            "id": config.name, "object": "model", "created": int(time.time()), "owned_by": "vllm",
+            "root": config.model, "parent": None, "max_model_len": config.max_model_len}]})
+
+    async def metrics(request: web.Request) -> web.Response:
+        return web.Response(text=engine.metrics(), content_type="text/plain")
+
+    async def completions(request: web.Request) -> web.StreamResponse:
+        chat = request.path.endswith("/chat/completions")
+        try:
+            body = await request.json()
+        except ValueError:
+            return _error(400, "Request body must be JSON", "BadRequestError")
+        if body.get("model") not in (config.name, config.model):
+            return _error(404, f"The model `{body.get('model')}` does not exist.", "NotFoundError")
+        prompt_tokens = max(1, len(render_prompt(body)) // CHARS_PER_TOKEN)
+        max_tokens = int(body.get("max_tokens") or body.get("max_completion_tokens") or config.default_max_tokens)
+        if prompt_tokens + max_tokens > min(config.max_model_len, config.kv_cache_tokens):
+            return _error(400, f"This model's maximum context length is {config.max_model_len} tokens. "
+                               f"However, you requested {prompt_tokens + max_tokens} tokens.", "BadRequestError")
+        if engine.rng.random() < config.error_rate:
+            return _error(500, "Injected failure", "InternalServerError")
+        abort_at = max_tokens // 2 if engine.rng.random() < config.abort_rate else None
+
+        request_id = f"{'chatcmpl' if chat else 'cmpl'}-{uuid.uuid4().hex}"
+        created = int(time.time())
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": max_tokens,
+                 "total_tokens": prompt_tokens + max_tokens}
+
+        def choice(text: Optional[str], finish_reason: Optional[str] = None, first: bool = False) -> Dict[str, Any]:
+            if not chat:
+                return {"index": 0, "text": text or "", "logprobs": None, "finish_reason": finish_reason}
+            delta = {"role": "assistant", "content": ""} if first else ({"content": text} if text else {})
+            return {"index": 0, "delta": delta, "logprobs": None, "finish_reason": finish_reason}
+
+        if not body.get("stream"):
+            async with aclosing(engine.generate(prompt_tokens, max_tokens)) as tokens:
+                text = "".join([token async for token in tokens])
+            message = ({"message": {"role": "assistant", "content": text}, "index": 0, "finish_reason": "length"}
+                       if chat else {"text": text, "index": 0, "logprobs": None, "finish_reason": "length"})
+            return web.json_response({"id": request_id, "object": "chat.completion" if chat else "text_completion",
+                                      "created": created, "model": config.name, "choices": [message],
+                                      "usage": usage})
+
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache"})
+        await response.prepare(request)
+        obj = "chat.completion.chunk" if chat else "text_completion"
+
+        async def send(choices: List[Dict[str, Any]], **extra: Any) -> None:
+            event = {"id": request_id, "object": obj, "created": created, "model": config.name,
+                     "choices": choices, **extra}
+            await response.write(f"data: {json.dumps(event)}\n\n".encode())
+
+        if chat:
+            await send([choice(None, first=True)])
+        # 客户端断开时立即释放 KV cache 预留
+        async with aclosing(engine.generate(prompt_tokens, max_tokens)) as tokens:
+            generated = 0
+            async for token in tokens:
+                if generated == abort_at:
+                    # 模拟服务端中途断开: 不发送结束标记直接关闭连接
+                    request.transport.close()
+                    return response
+                await send([choice(token)])
+                generated += 1
+        await send([choice(None, "length")])
+        if (body.get("stream_options") or {}).get("include_usage"):
+            await send([], usage=usage)
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        return response
+
+    app.router.add_get("/health", health)
+    app.router.add_get("/v1/models", models)
+    app.router.add_get("/metrics", metrics)
+    app.router.add_post("/v1/chat/completions", completions)
+    app.router.add_post("/v1/completions", completions)
+    return app
+
+
+def parse_args(argv: Optional[Sequence[str]] = None) -> argparse.Namespace:
+    """Parse a ``vllm serve`` command line; vLLM flags the mock does not model are ignored"""
+    parser = argparse.ArgumentParser(prog="vllm", description="Mock vLLM OpenAI-compatible server")
+    sub = parser.add_subparsers(dest="command", required=True)
+    serve = sub.add_parser("serve")
+    serve.add_argument("model", nargs="?", default=MockConfig.model)
+    serve.add_argument("--served-model-name", nargs="+", default=None)
+    serve.add_argument("--host", default="0.0.0.0")
+    serve.add_argument("--port", type=int, default=8000)
+    serve.add_argument("--max-model-len", type=int, default=MockConfig.max_model_len)
+    for f in fields(MockConfig):
+        if f.name in ("model", "served_model_name", "max_model_len"):
+            continue
+        kind = float if f.type is float else int
+        serve.add_argument(f"--mock-{f.name.replace('_', '-')}", dest=f.name, type=kind, default=f.default)
+    # 子命令由顶层解析器校验: 只接受 ``serve``
+    args, unknown = parser.parse_known_args(list(sys.argv[1:] if argv is None else argv))
+    if unknown:
+        logger.info(f"Ignoring vLLM arguments not modelled by the mock: {' '.join(unknown)}")
+    return args
+
+
+async def serve(config: MockConfig, host: str, port: int) -> None:
+    """Print vLLM-style startup logs, serve until SIGTERM / SIGINT, then finish in-flight requests"""
+    phases = config.startup_seconds
+    print("INFO vLLM API server version mock", flush=True)
+    print(f"INFO non-default args: {{'model': '{config.model}', 'port': {port}}}", flush=True)
+    await asyncio.sleep(phases * 0.5)
+    print(f"INFO Loading weights took {phases * 0.5:.2f} seconds", flush=True)
+    await asyncio.sleep(phases * 0.2)
+    print(f"INFO KV cache size: {config.kv_cache_tokens} tokens", flush=True)
+    await asyncio.sleep(phases * 0.3)
+    print(f"INFO Graph capturing finished in {phases * 0.3:.2f} secs", flush=True)
+
+    runner = web.AppRunner(create_app(config), access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    print(f"INFO Uvicorn running on http://{host}:{port} (Press CTRL+C to quit)", flush=True)
+    print("INFO Application startup complete.", flush=True)
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set)
+    await stop.wait()
+    print("INFO Shutting down", flush=True)
+    await runner.cleanup()
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    logging.basicConfig(level=logging.INFO, format="INFO %(message)s")
+    args = parse_args(argv)
+    names = {f.name for f in fields(MockConfig)}
+    config = MockConfig(**{k: v for k, v in vars(args).items() if k in names})
+    config.served_model_name = (args.served_model_name or [""])[0]
+    asyncio.run(serve(config, args.host, args.port))
+
+
+if __name__ == "__main__":
+    main()
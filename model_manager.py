@@ -107,6 +107,18 @@ class ModelManager:
         else:
             raise Exception(f"Unsupported source: {source}")
 
+    WEIGHT_SUFFIXES = (".safetensors", ".bin", ".pt", ".pth", ".gguf")
+    # 权重之外的激活/运行时开销系数 (KV cache 由 vLLM 按剩余显存分配，不计入)
+    MEMORY_OVERHEAD = 1.2
+
+    def estimate_memory_mb(self, model_path: str) -> int:
+        """Estimate the NPU memory footprint of a local model from its weight files"""
+        path = Path(model_path)
+        if not path.is_dir():
+            return 0
+        size = sum(f.stat().st_size for f in path.iterdir() if f.is_file() and f.suffix in self.WEIGHT_SUFFIXES)
+        return int(size / 1024 / 1024 * self.MEMORY_OVERHEAD)
+
     def _human_readable_size(self, size: int) -> str:
         for unit in ["B", "KB", "MB", "GB", "TB"]:
             if size < 1024:
@@ -0,0 +1,118 @@
+"""Topology- and HBM-aware NPU placement for vLLM services"""
+import logging
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+
+class NPUAllocationError(Exception):
+    """No set of free NPUs satisfies the request"""
+
+
+class NPUAllocator:
+    """Pick NPU devices for a new service and reserve them until it stops
+
+    Devices are grouped into modules by the topology description (devices in
+    one module share the fast interconnect). A tensor-parallel group is
+    placed, in order of preference, on:
+
+    1. a contiguous, size-aligned window inside one module
+    2. any contiguous window inside one module
+    3. any free devices inside one module
+    4. free devices across modules (logged as a warning)
+
+    Among equally good candidates the module with the fewest free devices is
+    used (best fit, keeps large groups available) and ties go to the window
+    with the most free HBM.
+    """
+
+    def __init__(self, topology: Optional[Dict[str, Any]] = None):
+        self.groups: List[List[int]] = [list(g) for g in (topology or {}).get("groups", [])]
+        self.reservations: Dict[str, List[int]] = {}
+
+    def reserved(self) -> Set[int]:
+        return {d for devices in self.reservations.values() for d in devices}
+
+    def reserve(self, owner: str, devices: Iterable[int]) -> None:
+        self.reservations[owner] = sorted(devices)
+
+    def release(self, owner: str) -> None:
+        self.reservations.pop(owner, None)
+
+    def transfer(self, owner: str, new_owner: str) -> bool:
+        """Move the reservation of ``owner`` to ``new_owner``; False if ``owner`` holds none"""
+        if owner not in self.reservations:
+            return False
+        self.reservations[new_owner] = self.reservations.pop(owner)
+        return True
+
+    def claim(self, owner: str, npus: List[Dict[str, Any]], tp_size: int, memory_mb: int = 0) -> List[int]:
+        """allocate() and reserve the result for ``owner`` in one synchronous step
+
+        Concurrent starts can then not pick the same devices while one of
+        them is still awaiting its container or command.
+        """
+        devices = self.allocate(npus, tp_size, memory_mb)
+        self.reserve(owner, devices)
+        return devices
+
+    def free_devices(self, npus: List[Dict[str, Any]], memory_per_device: int = 0) -> Dict[int, int]:
+        """Free device id -> free HBM (MB) from get_npu_status() data"""
+        reserved = self.reserved()
+        free = {}
+        for npu in npus:
+            device = npu["id"]
+            if device in reserved or npu.get("occupied") or not npu.get("available", True):
+                continue
+            free_hbm = max(0, npu.get("hbm_total", 0) - npu.get("hbm_used", 0))
+            if free_hbm < memory_per_device:
+                continue
+            free[device] = free_hbm
+        return free
+
+    def allocate(self, npus: List[Dict[str, Any]], tp_size: int, memory_mb: int = 0) -> List[int]:
+        """Choose ``tp_size`` devices (not yet reserved)
+
+        Args:
+            npus: Live NPU status (see AscendContainerManager.get_npu_status)
+            tp_size: Number of devices (tensor parallel size)
+            memory_mb: Estimated total memory footprint of the model
+        """
+        if tp_size < 1:
+            raise NPUAllocationError(f"Invalid tensor parallel size: {tp_size}")
+        per_device = -(-memory_mb // tp_size) if memory_mb else 0
+        free = self.free_devices(npus, per_device)
+        if len(free) < tp_size:
+            raise NPUAllocationError(
+                f"需要 {tp_size} 张空闲 NPU (每卡 {per_device} MB)，当前仅 {len(free)} 张满足条件")
+
+        groups = self.groups or [sorted(npu["id"] for npu in npus)]
+        best = None
+        for group in groups:
+            group_free = [d for d in group if d in free]
+            if len(group_free) < tp_size:
+                continue
+            for candidate, rank in self._candidates(group, group_free, tp_size):
+                score = (rank, len(group_free), -sum(free[d] for d in candidate), candidate[0])
+                if best is None or score < best[0]:
+                    best = (score, candidate)
+        if best:
+            return best[1]
+
+        # 单个模块内放不下，跨模块分配
+        devices = sorted(free, key=lambda d: (-free[d], d))[:tp_size]
+        logger.warning(f"NPU allocation for TP={tp_size} crosses module boundary: {sorted(devices)}")
+        return sorted(devices)
+
+    @staticmethod
+    def _candidates(group: List[int], group_free: List[int], tp_size: int):
+        """Yield (devices, rank) for placements inside one module, lower rank is better"""
+        free_set = set(group_free)
+        found_contiguous = False
+        for start in range(len(group) - tp_size + 1):
+            window = group[start:start + tp_size]
+            if all(d in free_set for d in window):
+                found_contiguous = True
+                yield window, 0 if start % tp_size == 0 else 1
+        if not found_contiguous:
+            yield group_free[:tp_size], 2
@@ -0,0 +1,276 @@
+"""Fixed-memory NPU metrics history"""
+import logging
+import math
+import os
+import time
+from array import array
+from typing import Any, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# metric name -> (array typecode, npu status field)
+METRICS = {
+    "utilization": ("B", "utilization"),   # AICore %, 0-100
+    "hbm_used": ("I", "hbm_used"),         # MB
+    "hbm_total": ("I", "hbm_total"),       # MB
+    "power": ("f", "power"),               # W
+    "temperature": ("h", "temperature"),   # C
+}
+
+
+class _Ring:
+    """Fixed-capacity ring of rows ordered by ``timestamps``"""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.size = 0
+        self.head = 0  # 下一次写入的位置
+        self.timestamps = array("d", bytes(8 * capacity))
+
+    def _advance(self) -> int:
+        i = self.head
+        self.head = (i + 1) % self.capacity
+        if self.size < self.capacity:
+            self.size += 1
+        return i
+
+    def _physical(self, logical: int) -> int:
+        """Map logical index (0 = oldest) to array position"""
+        return (self.head - self.size + logical) % self.capacity
+
+    def _first_at_or_after(self, since: float) -> int:
+        """Binary search the oldest logical index whose timestamp >= since"""
+        lo, hi = 0, self.size
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.timestamps[self._physical(mid)] < since:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+
+class CoarseRing(_Ring):
+    """Pre-aggregated min/max/sum/count of one device per ``width`` seconds
+
+    ``timestamps`` holds bucket starts (multiples of ``width``); the newest
+    bucket is updated in place until a sample falls into the next one.
+    """
+
+    def __init__(self, width: float, capacity: int):
+        super().__init__(capacity)
+        self.width = width
+        self.counts = array("I", bytes(4 * capacity))
+        self.mins = {name: array("f", bytes(4 * capacity)) for name in METRICS}
+        self.maxs = {name: array("f", bytes(4 * capacity)) for name in METRICS}
+        self.sums = {name: array("d", bytes(8 * capacity)) for name in METRICS}
+
+    def add(self, ts: float, values: Dict[str, float]) -> None:
+        start = ts // self.width * self.width
+        last = (self.head - 1) % self.capacity
+        if self.size and self.timestamps[last] == start:
+            self.counts[last] += 1
+            for name, v in values.items():
+                if v < self.mins[name][last]:
+                    self.mins[name][last] = v
+                if v > self.maxs[name][last]:
+                    self.maxs[name][last] = v
+                self.sums[name][last] += v
+            return
+        i = self._advance()
+        self.timestamps[i] = start
+        self.counts[i] = 1
+        for name, v in values.items():
+            self.mins[name][i] = self.maxs[name][i] = self.sums[name][i] = v
+
+    @property
+    def nbytes(self) -> int:
+        return self.capacity * (8 + 4 + len(METRICS) * (4 + 4 + 8))
+
+
+class DeviceRing(_Ring):
+    """Ring buffer of samples for one NPU device, backed by typed arrays
+
+    Next to the raw samples it keeps one CoarseRing per ``tiers`` width, so
+    a long window at a coarse resolution reads a few hundred pre-aggregated
+    buckets instead of every sample.
+    """
+
+    def __init__(self, capacity: int, tiers: Iterable[CoarseRing] = ()):
+        super().__init__(capacity)
+        self.columns = {name: array(code, [0] * capacity) for name, (code, _) in METRICS.items()}
+        self.tiers = sorted(tiers, key=lambda tier: tier.width)
+
+    def append(self, ts: float, npu: Dict[str, Any]) -> None:
+        i = self._advance()
+        self.timestamps[i] = ts
+        for name, (code, field) in METRICS.items():
+            value = npu.get(field) or 0
+            try:
+                self.columns[name][i] = value if code == "f" else int(value)
+            except (OverflowError, TypeError, ValueError):
+                self.columns[name][i] = 0
+        if self.tiers:
+            values = {name: column[i] for name, column in self.columns.items()}
+            for tier in self.tiers:
+                tier.add(ts, values)
+
+    def downsample(self, since: float, resolution: float, metrics: Iterable[str]) -> Dict[int, List[float]]:
+        """Aggregate the window from ``since`` into buckets of ``resolution`` seconds
+
+        Buckets are aligned to multiples of ``resolution`` and keyed by
+        their index (start // resolution). Each value is a flat list with
+        min, max, sum per metric followed by the sample count. Reads the
+        coarsest tier whose width fits into ``resolution``, else the raw
+        samples. A tier is only used when ``resolution`` is a whole multiple
+        of its width, so that no tier bucket straddles two result buckets.
+        """
+        metrics = list(metrics)
+        source = None
+        for tier in self.tiers:
+            if tier.width <= resolution and resolution % tier.width == 0:
+                source = tier
+        buckets: Dict[int, List[float]] = {}
+        if source is None:
+            columns = [self.columns[m] for m in metrics]
+            for logical in range(self._first_at_or_after(since), self.size):
+                p = self._physical(logical)
+                key = int(self.timestamps[p] // resolution)
+                acc = buckets.get(key)
+                if acc is None:
+                    acc = buckets[key] = [v for column in columns for v in (column[p], column[p], 0.0)] + [0]
+                for j, column in enumerate(columns):
+                    v = column[p]
+                    if v < acc[3 * j]:
+                        acc[3 * j] = v
+                    if v > acc[3 * j + 1]:
+                        acc[3 * j + 1] = v
+                    acc[3 * j + 2] += v
+                acc[-1] += 1
+            return buckets
+        mins = [source.mins[m] for m in metrics]
+        maxs = [source.maxs[m] for m in metrics]
+        sums = [source.sums[m] for m in metrics]
+        for logical in range(source._first_at_or_after(since // source.width * source.width), source.size):
+            p = source._physical(logical)
+            key = int(source.timestamps[p] // resolution)
+            acc = buckets.get(key)
+            if acc is None:
+                acc = buckets[key] = [v for j in range(len(metrics)) for v in (mins[j][p], maxs[j][p], 0.0)] + [0]
+            for j in range(len(metrics)):
+                if mins[j][p] < acc[3 * j]:
+                    acc[3 * j] = mins[j][p]
+                if maxs[j][p] > acc[3 * j + 1]:
+                    acc[3 * j + 1] = maxs[j][p]
+                acc[3 * j + 2] += sums[j][p]
+            acc[-1] += source.counts[p]
+        return buckets
+
+    @property
+    def nbytes(self) -> int:
+        total = self.timestamps.itemsize * self.capacity
+        for col in self.columns.values():
+            total += col.itemsize * self.capacity
+        return total + sum(tier.nbytes for tier in self.tiers)
+
+
+class NPUHistory:
+    """Per-device metrics history with server-side downsampling"""
+
+    DEFAULT_RETENTION = 24 * 3600
+    MAX_BUCKETS = 120
+    # 显式指定 resolution 时桶数上限
+    BUCKET_LIMIT = 1000
+    # 预聚合层的桶宽 (秒)
+    TIER_WIDTHS = (60, 600)
+    AGGREGATES = ("min", "max", "avg")
+
+    def __init__(self, sample_interval: float, retention: Optional[float] = None):
+        if retention is None:
+            retention = float(os.environ.get("NPU_HISTORY_SECONDS", self.DEFAULT_RETENTION))
+        self.retention = retention
+        self.sample_interval = sample_interval
+        self.capacity = max(1, int(retention / sample_interval) + 1)
+        self.rings: Dict[int, DeviceRing] = {}
+
+    def _new_ring(self) -> DeviceRing:
+        tiers = [CoarseRing(width, int(self.retention // width) + 2)
+                 for width in self.TIER_WIDTHS if width > self.sample_interval]
+        return DeviceRing(self.capacity, tiers)
+
+    def record(self, ts: float, npus: Iterable[Dict[str, Any]]) -> None:
+        """Append one sample for every device in an NPU status list"""
+        for npu in npus:
+            device = npu.get("id")
+            if device is None:
+                continue
+            ring = self.rings.get(device)
+            if ring is None:
+                ring = self.rings[device] = self._new_ring()
+                logger.debug(f"NPU history ring for device {device}: {ring.nbytes} bytes")
+            ring.append(ts, npu)
+
+    def query(self, device: Optional[int] = None, since: Optional[float] = None,
+              resolution: Optional[float] = None, metrics: Optional[List[str]] = None,
+              aggregates: Optional[List[str]] = None) -> Dict[str, Any]:
+        """Return downsampled history
+
+        All devices share one time axis ``t`` (bucket starts, aligned to
+        multiples of the resolution); a device's series hold None for
+        buckets without samples.
+
+        Args:
+            device: NPU id, or None for all devices
+            since: Unix timestamp; negative values are relative to now (default: -3600)
+            resolution: Bucket width in seconds (default: window / MAX_BUCKETS,
+                at least window / BUCKET_LIMIT)
+            metrics: Subset of METRICS to return (default: all)
+            aggregates: Subset of min, max, avg to return (default: all)
+        """
+        now = time.time()
+        if since is None:
+            since = -3600
+        if since <= 0:
+            since = now + since
+        since = max(since, now - self.retention)
+        window = now - since
+        if not resolution or resolution <= 0:
+            resolution = window / self.MAX_BUCKETS
+            # 自动分辨率向上取整到预聚合层桶宽的整数倍，才能读预聚合层
+            for width in sorted(self.TIER_WIDTHS, reverse=True):
+                if resolution >= width:
+                    resolution = math.ceil(resolution / width) * width
+                    break
+        resolution = max(1.0, resolution, window / self.BUCKET_LIMIT)
+        metrics = [m for m in (metrics or METRICS) if m in METRICS]
+        aggregates = [a for a in (aggregates or self.AGGREGATES) if a in self.AGGREGATES]
+
+        devices = [device] if device is not None else sorted(self.rings)
+        first = int(since // resolution)
+        per_device = []
+        keys = set()
+        for dev in devices:
+            ring = self.rings.get(dev)
+            if ring is None:
+                continue
+            buckets = {k: acc for k, acc in ring.downsample(since, resolution, metrics).items() if k >= first}
+            keys.update(buckets)
+            per_device.append((dev, buckets))
+        keys = sorted(keys)
+
+        result = []
+        for dev, buckets in per_device:
+            rows = [buckets.get(k) for k in keys]
+            entry: Dict[str, Any] = {"device": dev}
+            for j, m in enumerate(metrics):
+                series = {}
+                if "min" in aggregates:
+                    series["min"] = [round(acc[3 * j], 1) if acc else None for acc in rows]
+                if "max" in aggregates:
+                    series["max"] = [round(acc[3 * j + 1], 1) if acc else None for acc in rows]
+                if "avg" in aggregates:
+                    series["avg"] = [round(acc[3 * j + 2] / acc[-1], 1) if acc else None for acc in rows]
+                entry[m] = series
+            result.append(entry)
+        return {"since": since, "until": now, "resolution": resolution,
+                "t": [round(k * resolution, 3) for k in keys], "devices": result}
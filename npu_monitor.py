@@ -0,0 +1,111 @@
+"""Background NPU telemetry sampler"""
+import asyncio
+import logging
+import os
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
+
+from npu_history import NPUHistory
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class NPUSnapshot:
+    """Immutable NPU status snapshot shared by all readers"""
+    npus: Tuple[Dict[str, Any], ...]
+    sampled_at: float
+    duration: float = 0.0
+
+    @property
+    def age(self) -> float:
+        """Seconds since the snapshot was taken"""
+        return max(0.0, time.time() - self.sampled_at)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "npu_status": list(self.npus),
+            "sampled_at": self.sampled_at,
+            "age": round(self.age, 3),
+            "sample_duration": round(self.duration, 3),
+        }
+
+
+class NPUMonitor:
+    """Refresh NPU status on a fixed interval so that readers never hit npu-smi
+
+    A single background task calls ``container_manager.get_npu_status()`` every
+    ``interval`` seconds and publishes the result as an ``NPUSnapshot``. Readers
+    only swap a reference, so the number of dashboard viewers does not change
+    the load on the host. Every sample is also appended to ``history``.
+    """
+
+    DEFAULT_INTERVAL = 5.0
+
+    def __init__(self, container_manager, interval: Optional[float] = None):
+        self.container_manager = container_manager
+        if interval is None:
+            interval = float(os.environ.get("NPU_SAMPLE_INTERVAL", self.DEFAULT_INTERVAL))
+        self.interval = max(0.5, interval)
+        self.history = NPUHistory(self.interval)
+        self._snapshot: Optional[NPUSnapshot] = None
+        self._task: Optional[asyncio.Task] = None
+        self._refresh_lock: Optional[asyncio.Lock] = None
+
+    def start(self) -> None:
+        """Start the sampler task (call from the running event loop)"""
+        if self._task and not self._task.done():
+            return
+        self._refresh_lock = asyncio.Lock()
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"NPU monitor started, interval={self.interval}s")
+
+    async def stop(self) -> None:
+        """Stop the sampler task"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            started = time.monotonic()
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.error(f"NPU sampler error: {e}")
+            elapsed = time.monotonic() - started
+            await asyncio.sleep(max(0.0, self.interval - elapsed))
+
+    async def refresh(self) -> NPUSnapshot:
+        """Take a new sample and publish it"""
+        if self._refresh_lock is None:
+            self._refresh_lock = asyncio.Lock()
+        async with self._refresh_lock:
+            started = time.monotonic()
+            npus = await self.container_manager.get_npu_status()
+            snapshot = NPUSnapshot(
+                npus=tuple(npus),
+                sampled_at=time.time(),
+                duration=time.monotonic() - started,
+            )
+            self._snapshot = snapshot
+            self.history.record(snapshot.sampled_at, snapshot.npus)
+            return snapshot
+
+    async def get_snapshot(self) -> NPUSnapshot:
+        """Return the latest snapshot, sampling once if none exists yet"""
+        snapshot = self._snapshot
+        if snapshot is not None:
+            return snapshot
+        # 首次请求早于采样任务完成时，与采样任务共享同一次 npu-smi 调用
+        if self._refresh_lock is not None and self._refresh_lock.locked():
+            async with self._refresh_lock:
+                pass
+            if self._snapshot is not None:
+                return self._snapshot
+        return await self.refresh()
@@ -0,0 +1,154 @@
+"""Single-pass parser for ``npu-smi info`` output
+
+Rows are classified by a table of compiled patterns per section instead of
+by board name, so 910B, 910C (two chips per NPU) and 310P layouts share one
+code path::
+
+    | NPU   Name                | Health        | Power(W)    Temp(C)           Hugepages-Usage(page)|
+    | Chip                      | Bus-Id        | AICore(%)   Memory-Usage(MB)  HBM-Usage(MB)        |
+    | 0     910B3               | OK            | 93.8        40                0    / 0             |
+    | 0                         | 0000:C1:00.0  | 0           0    / 0          3161 / 65536         |
+    ...
+    | NPU     Chip              | Process id    | Process name             | Process memory(MB)      |
+    | 0       0                 | 2318145       | python3.10               | 60010                   |
+"""
+import re
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Pattern, Tuple
+
+
+@dataclass
+class NpuChip:
+    """One chip row with the values of the NPU row above it"""
+    device_id: int          # 逻辑设备号，对应 /dev/davinci{device_id}
+    npu_id: int
+    chip_id: int
+    name: str
+    health: str
+    power: float
+    temperature: int
+    bus_id: str = ""
+    aicore: int = 0
+    memory_used: int = 0    # MB
+    memory_total: int = 0   # MB
+    hbm_used: int = 0       # MB, 310P 无 HBM 时为板载内存
+    hbm_total: int = 0      # MB
+
+
+@dataclass
+class NpuProcess:
+    """One process row"""
+    npu_id: int
+    chip_id: int
+    device_id: int
+    pid: int
+    name: str
+    memory_mb: int
+
+
+@dataclass
+class NpuSmiInfo:
+    """Parsed ``npu-smi info`` output"""
+    version: str = ""
+    chips: List[NpuChip] = field(default_factory=list)
+    processes: List[NpuProcess] = field(default_factory=list)
+
+    def processes_by_device(self) -> Dict[int, List[NpuProcess]]:
+        result: Dict[int, List[NpuProcess]] = {}
+        for proc in self.processes:
+            result.setdefault(proc.device_id, []).append(proc)
+        return result
+
+
+_USAGE = re.compile(r"(\d+)\s*/\s*(\d+)")
+_VERSION = re.compile(r"npu-smi\s+(\S+)")
+
+
+def _number(text: str, cast: Callable = float, default=0):
+    try:
+        return cast(text)
+    except ValueError:
+        return default  # "NA" / "-"
+
+
+class _Parser:
+    def __init__(self):
+        self.info = NpuSmiInfo()
+        self.pending: Optional[Tuple[int, str, str, float, int]] = None
+        self.device_map: Dict[Tuple[int, int], int] = {}
+
+    def npu_row(self, m):
+        self.pending = (int(m.group(1)), m.group(2), m.group(3).strip(),
+                        _number(m.group(4)), _number(m.group(5), int))
+
+    def chip_row(self, m):
+        # NPU 行一直有效到下一个 NPU 行: 910C/A3 和 300I Duo 的一个 NPU 行下有两个 chip 行
+        if self.pending is None:
+            return
+        npu_id, name, health, power, temp = self.pending
+        chip_id = int(m.group(1))
+        usages = _USAGE.findall(m.group(5))
+        chip = NpuChip(device_id=len(self.info.chips), npu_id=npu_id, chip_id=chip_id, name=name,
+                       health=health, power=power, temperature=temp, bus_id=m.group(3),
+                       aicore=_number(m.group(4), int))
+        if usages:
+            # 910B/910C: Memory-Usage + HBM-Usage; 310P: 仅 Memory-Usage
+            chip.hbm_used, chip.hbm_total = (int(v) for v in usages[-1])
+            if len(usages) > 1:
+                chip.memory_used, chip.memory_total = (int(v) for v in usages[0])
+            else:
+                chip.memory_used, chip.memory_total = chip.hbm_used, chip.hbm_total
+        self.device_map[(npu_id, chip_id)] = chip.device_id
+        self.info.chips.append(chip)
+
+    def process_row(self, m):
+        npu_id, chip_id = int(m.group(1)), int(m.group(2))
+        device_id = self.device_map.get((npu_id, chip_id), self.device_map.get((npu_id, 0), npu_id))
+        self.info.processes.append(NpuProcess(npu_id=npu_id, chip_id=chip_id, device_id=device_id,
+                                              pid=int(m.group(3)), name=m.group(4).strip(),
+                                              memory_mb=_number(m.group(5), int)))
+
+
+# section -> [(pattern, handler)]，每行按顺序匹配第一个规则
+_RULES: Dict[str, List[Tuple[Pattern, Callable]]] = {
+    "chips": [
+        # | 0     910B3               | OK            | 93.8        40      ...
+        (re.compile(r"^\|\s*(\d+)\s+([A-Za-z0-9][\w.-]*)\s*\|\s*([A-Za-z][\w ]*?)\s*\|\s*(\S+)\s+(\S+)"),
+         _Parser.npu_row),
+        # | 0                         | 0000:C1:00.0  | 0           0    / 0          3161 / 65536  |
+        # | 1     1                   | 0000:9F:00.0  | ...   (910C: chip id + phy id)
+        (re.compile(r"^\|\s*(\d+)(?:\s+(\d+))?\s*\|\s*([0-9A-Fa-f]{4}:[0-9A-Fa-f]{2}:[0-9A-Fa-f]{2}\.\d)\s*\|"
+                    r"\s*(\S+)(.*)\|"),
+         _Parser.chip_row),
+    ],
+    "processes": [
+        # | 0       0                 | 2318145       | python3.10               | 60010   |
+        (re.compile(r"^\|\s*(\d+)\s+(\d+)\s*\|\s*(\d+)\s*\|\s*([^|]*?)\s*\|\s*(\d+)\s*\|"),
+         _Parser.process_row),
+    ],
+}
+
+
+def parse_npu_smi(output: str) -> NpuSmiInfo:
+    """Parse a full ``npu-smi info`` output in one pass"""
+    parser = _Parser()
+    section = "chips"
+    rules = _RULES[section]
+    for line in output.splitlines():
+        if not line.startswith("|"):
+            continue
+        if "Process id" in line:
+            section = "processes"
+            rules = _RULES[section]
+            continue
+        if not parser.info.version and "npu-smi" in line:
+            m = _VERSION.search(line)
+            if m:
+                parser.info.version = m.group(1)
+            continue
+        for pattern, handler in rules:
+            m = pattern.match(line)
+            if m:
+                handler(parser, m)
+                break
+    return parser.info
@@ -0,0 +1,164 @@
+"""Prefix-affinity replica selection (consistent hashing with bounded load)"""
+import bisect
+import hashlib
+import math
+import os
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, List, Optional, Sequence, Tuple
+
+# 无 tokenizer 时按字符数近似 token 数
+CHARS_PER_TOKEN = 4
+
+
+def _hash(data: str) -> int:
+    return int.from_bytes(hashlib.blake2b(data.encode(), digest_size=8).digest(), "big")
+
+
+def render_prompt(body: Dict[str, Any]) -> str:
+    """Flatten a chat/completions request into the text the prefix cache sees"""
+    if "messages" in body:
+        parts = []
+        for message in body.get("messages") or []:
+            content = message.get("content", "")
+            if isinstance(content, list):
+                content = "".join(p.get("text", "") for p in content if isinstance(p, dict))
+            parts.append(f"<|{message.get('role', '')}|>\n{content}\n")
+        return "".join(parts)
+    prompt = body.get("prompt", "")
+    return prompt if isinstance(prompt, str) else str(prompt)
+
+
+class PrefixRouter:
+    """Send requests to the replica most likely to hold their prompt prefix
+
+    A prompt is cut into KV-cache-block sized pieces and each block-aligned
+    prefix gets a cumulative hash (like vLLM's block hashes), so a growing
+    conversation keeps the hashes of its earlier turns.
+
+    The router remembers which replica each prefix hash was sent to (LRU).
+    A request goes to the replica holding its longest known prefix, unless
+    that replica is over the load bound ``ceil(load_factor * (total + 1) /
+    replicas)``. New prefixes are placed by consistent hashing of the first
+    block on a ring with ``VNODES`` virtual nodes per replica, walking
+    clockwise past replicas over the bound, so a hot system prompt spills
+    over to neighbours instead of piling onto one replica.
+    """
+
+    VNODES = 64
+    MAX_ENTRIES = 200000
+
+    def __init__(self, block_tokens: Optional[int] = None, max_blocks: int = 256, load_factor: float = 1.25):
+        # vllm-ascend 默认 block_size 为 128
+        self.block_tokens = block_tokens or int(os.environ.get("PREFIX_BLOCK_TOKENS", "128"))
+        self.max_blocks = max_blocks
+        self.load_factor = load_factor
+        self._held: "OrderedDict[Tuple[int, str], None]" = OrderedDict()
+        self._ring: List[Tuple[int, str]] = []
+        self._ring_keys: List[int] = []
+        self._members: Tuple[str, ...] = ()
+
+    def block_hashes(self, prompt: str) -> List[int]:
+        """Cumulative hash of every whole leading block (empty if shorter than one block)"""
+        block_chars = self.block_tokens * CHARS_PER_TOKEN
+        digest = hashlib.blake2b(digest_size=8)
+        hashes = []
+        for i in range(min(len(prompt) // block_chars, self.max_blocks)):
+            digest.update(prompt[i * block_chars:(i + 1) * block_chars].encode())
+            hashes.append(int.from_bytes(digest.digest(), "big"))
+        return hashes
+
+    def matched_blocks(self, hashes: List[int], replica: str) -> int:
+        """Number of leading blocks the replica is expected to have cached"""
+        for i in range(len(hashes) - 1, -1, -1):
+            if (hashes[i], replica) in self._held:
+                return i + 1
+        return 0
+
+    def record(self, hashes: List[int], replica: str) -> None:
+        for h in hashes:
+            entry = (h, replica)
+            if entry in self._held:
+                self._held.move_to_end(entry)
+            else:
+                self._held[entry] = None
+        while len(self._held) > self.MAX_ENTRIES:
+            self._held.popitem(last=False)
+
+    def _rebuild(self, members: Tuple[str, ...]) -> None:
+        self._members = members
+        self._ring = sorted((_hash(f"{member}#{i}"), member) for member in members for i in range(self.VNODES))
+        self._ring_keys = [h for h, _ in self._ring]
+
+    def choose(self, hashes: List[int], load: Dict[str, int]) -> str:
+        """Pick a replica id given the prompt's block hashes and outstanding requests per replica"""
+        members = tuple(sorted(load))
+        limit = math.ceil(self.load_factor * (sum(load.values()) + 1) / len(members))
+
+        best, best_matched = None, 0
+        for member in members:
+            if load[member] >= limit:
+                continue
+            matched = self.matched_blocks(hashes, member)
+            if matched > best_matched:
+                best, best_matched = member, matched
+        if best is not None:
+            return best
+
+        if members != self._members:
+            self._rebuild(members)
+        start = bisect.bisect(self._ring_keys, hashes[0])
+        seen = set()
+        for i in range(len(self._ring)):
+            member = self._ring[(start + i) % len(self._ring)][1]
+            if member in seen:
+                continue
+            if load[member] < limit:
+                return member
+            seen.add(member)
+            if len(seen) == len(members):
+                break
+        return min(members, key=lambda m: load[m])
+
+
+class RoutingStats:
+    """Per-mode prefix cache hit rate and TTFT samples
+
+    The hit rate is block based: the share of prompt blocks that the chosen
+    replica is expected to have cached from earlier requests (see
+    PrefixRouter.matched_blocks), computed the same way for every mode.
+    """
+
+    MAX_SAMPLES = 2000
+
+    def __init__(self):
+        self.requests = 0
+        self.blocks = 0
+        self.matched = 0
+        self.ttft: Deque[float] = deque(maxlen=self.MAX_SAMPLES)
+
+    def record_route(self, blocks: int, matched: int) -> None:
+        self.requests += 1
+        self.blocks += blocks
+        self.matched += matched
+
+    def record_ttft(self, seconds: float) -> None:
+        self.ttft.append(seconds)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "prompt_blocks": self.blocks,
+            "cached_blocks": self.matched,
+            "hit_rate": round(self.matched / self.blocks, 4) if self.blocks else None,
+            "ttft_samples": len(self.ttft),
+            "ttft_mean": round(sum(self.ttft) / len(self.ttft), 4) if self.ttft else None,
+            "ttft_p50": _percentile(self.ttft, 50),
+            "ttft_p95": _percentile(self.ttft, 95),
+        }
+
+
+def _percentile(values: Sequence[float], pct: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))], 4)
@@ -0,0 +1,138 @@
+"""Helpers for reading process information from /proc on the host"""
+import os
+import re
+from typing import Dict, List, Optional, Set
+
+# 容器 ID 统一匹配 64 位十六进制，兼容以下 cgroup 路径:
+#   /docker/<id>                       (cgroup v1)
+#   /system.slice/docker-<id>.scope    (systemd, cgroup v2)
+#   /machine.slice/libpod-<id>.scope   (podman)
+#   /kubepods/.../cri-containerd-<id>.scope
+CONTAINER_ID_RE = re.compile(r"[0-9a-f]{64}")
+
+PROC_ROOT = "/proc"
+TCP_LISTEN = "0A"
+
+
+def read_text(path: str) -> Optional[str]:
+    """Read a small /proc file, returning None if the process is gone"""
+    try:
+        with open(path, "r", errors="replace") as f:
+            return f.read()
+    except (FileNotFoundError, ProcessLookupError, PermissionError, OSError):
+        return None
+
+
+def list_pids() -> List[int]:
+    """PIDs of all processes visible in /proc"""
+    try:
+        return [int(name) for name in os.listdir(PROC_ROOT) if name.isdigit()]
+    except OSError:
+        return []
+
+
+def read_start_time(pid: int) -> Optional[int]:
+    """Process start time in clock ticks since boot (field 22 of /proc/<pid>/stat)
+
+    Together with the PID it uniquely identifies a process, so it is used as
+    the cache key to survive PID reuse.
+    """
+    stat = read_text(f"{PROC_ROOT}/{pid}/stat")
+    if not stat:
+        return None
+    # comm 字段可能包含空格和括号，从最后一个 ')' 之后开始切分
+    rest = stat[stat.rfind(")") + 2:].split()
+    try:
+        return int(rest[19])
+    except (IndexError, ValueError):
+        return None
+
+
+def read_container_id(pid: int) -> Optional[str]:
+    """Full container ID from /proc/<pid>/cgroup, or None for host processes"""
+    cgroup = read_text(f"{PROC_ROOT}/{pid}/cgroup")
+    if not cgroup:
+        return None
+    match = CONTAINER_ID_RE.search(cgroup)
+    return match.group(0) if match else None
+
+
+def read_cmdline(pid: int) -> List[str]:
+    """argv of a process ([] if gone or a kernel thread)"""
+    try:
+        with open(f"{PROC_ROOT}/{pid}/cmdline", "rb") as f:
+            raw = f.read()
+    except OSError:
+        return []
+    return [arg.decode(errors="replace") for arg in raw.split(b"\0") if arg]
+
+
+def read_ppid(pid: int) -> Optional[int]:
+    """Parent PID (field 4 of /proc/<pid>/stat)"""
+    stat = read_text(f"{PROC_ROOT}/{pid}/stat")
+    if not stat:
+        return None
+    rest = stat[stat.rfind(")") + 2:].split()
+    try:
+        return int(rest[1])
+    except (IndexError, ValueError):
+        return None
+
+
+def read_ns_pid(pid: int) -> Optional[int]:
+    """PID in the process's own (innermost) PID namespace, from NSpid in /proc/<pid>/status
+
+    For a process in a container this is the PID seen inside the container
+    (what pgrep / kill there use); for a host process it is ``pid`` itself.
+    """
+    status = read_text(f"{PROC_ROOT}/{pid}/status")
+    if not status:
+        return None
+    for line in status.splitlines():
+        if line.startswith("NSpid:"):
+            try:
+                return int(line.split()[-1])
+            except (IndexError, ValueError):
+                return None
+    return pid  # 内核过旧 (无 NSpid)，视为宿主机进程
+
+
+def socket_inodes(pid: int) -> Set[int]:
+    """Inodes of the sockets held open by a process"""
+    inodes = set()
+    fd_dir = f"{PROC_ROOT}/{pid}/fd"
+    try:
+        fds = os.listdir(fd_dir)
+    except OSError:
+        return inodes
+    for fd in fds:
+        try:
+            target = os.readlink(f"{fd_dir}/{fd}")
+        except OSError:
+            continue
+        if target.startswith("socket:["):
+            inodes.add(int(target[8:-1]))
+    return inodes
+
+
+def listening_ports(pid: int) -> Dict[int, int]:
+    """Listening TCP sockets in the network namespace of a process: inode -> port
+
+    Reads /proc/<pid>/net/tcp{,6}, which is the host table for host-network
+    containers and the container's own table otherwise.
+    """
+    ports: Dict[int, int] = {}
+    for name in ("tcp", "tcp6"):
+        table = read_text(f"{PROC_ROOT}/{pid}/net/{name}")
+        if not table:
+            continue
+        for line in table.splitlines()[1:]:
+            fields = line.split()
+            # sl local_address rem_address st tx_queue:rx_queue tr:tm->when retrnsmt uid timeout inode
+            if len(fields) < 10 or fields[3] != TCP_LISTEN:
+                continue
+            try:
+                ports[int(fields[9])] = int(fields[1].rsplit(":", 1)[1], 16)
+            except (IndexError, ValueError):
+                continue
+    return ports
@@ -0,0 +1,266 @@
+"""Rolling restart of a model's replicas (new image or flags, one replica at a time)"""
+import asyncio
+import logging
+import shlex
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from npu_allocator import NPUAllocationError
+from service_manager import retarget_command
+
+logger = logging.getLogger(__name__)
+
+
+def rewrite_flags(command: str, changes: Dict[str, Optional[str]]) -> str:
+    """Set, replace or remove ``vllm serve`` flags of a start command
+
+    ``changes`` maps a flag to its new value: a string sets ``--flag value``,
+    an empty string a bare switch (``--enforce-eager``) and None removes
+    the flag.
+    """
+    env, sep, serve = command.rpartition(" && ")
+    tokens = shlex.split(serve.replace("\\\n", " "))
+    groups: List[List[str]] = [[]]
+    for token in tokens:
+        if token.startswith("--"):
+            groups.append([token])
+        else:
+            groups[-1].append(token)
+    head, options = groups[0], groups[1:]
+
+    for flag, value in changes.items():
+        flag = flag if flag.startswith("--") else f"--{flag}"
+        replacement = None if value is None else [flag] + ([value] if value != "" else [])
+        index = next((i for i, g in enumerate(options) if g[0].split("=", 1)[0] == flag), None)
+        if index is None:
+            if replacement:
+                options.append(replacement)
+        elif replacement is None:
+            del options[index]
+        else:
+            options[index] = replacement
+
+    serve = " \\\n".join(" ".join(shlex.quote(t) for t in group) for group in [head] + options)
+    return env + sep + serve
+
+
+def tensor_parallel_size(command: str, default: int) -> int:
+    """``--tensor-parallel-size`` (or ``-tp``) of a ``vllm serve`` command, ``default`` if absent"""
+    tokens = shlex.split(command.rpartition(" && ")[2].replace("\\\n", " "))
+    for i, token in enumerate(tokens):
+        flag, _, value = token.partition("=")
+        if flag in ("--tensor-parallel-size", "-tp"):
+            value = value or (tokens[i + 1] if i + 1 < len(tokens) else "")
+            if value.isdigit() and int(value) > 0:
+                return int(value)
+    return default
+
+
+@dataclass
+class RestartJob:
+    """Progress of one rolling restart"""
+    id: str
+    model: str
+    image: Optional[str] = None
+    flags: Dict[str, Optional[str]] = field(default_factory=dict)
+    status: str = "running"  # running, completed, error
+    error: str = ""
+    total: int = 0
+    replaced: List[Dict[str, Any]] = field(default_factory=list)
+    current: Optional[str] = None
+    log: List[str] = field(default_factory=list)
+    created_at: float = field(default_factory=time.time)
+    finished_at: Optional[float] = None
+
+    def note(self, message: str) -> None:
+        self.log.append(f"{time.strftime('%H:%M:%S')} {message}")
+        logger.info(f"Rolling restart {self.id} ({self.model}): {message}")
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "model": self.model,
+            "image": self.image,
+            "flags": self.flags,
+            "status": self.status,
+            "error": self.error,
+            "total": self.total,
+            "done": len(self.replaced),
+            "replaced": self.replaced,
+            "current": self.current,
+            "log": self.log,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class RollingRestarter:
+    """Replace the running replicas of a model one at a time
+
+    For each old replica a new one is started first (surge) on free NPUs
+    and a new port, with the new image and/or flags. Only after it is
+    ready is the old replica stopped gracefully (see
+    ServiceManager.stop_service), so serving capacity never drops below the
+    original replica count. If no NPUs are free the old replica is stopped
+    first and its NPUs reused, which costs one replica of capacity while
+    the new one starts.
+
+    A replacement that fails to become ready aborts the job; the old
+    replicas not yet replaced keep running. One job per model at a time.
+    """
+
+    MAX_FINISHED_JOBS = 20
+    READY_POLL = 1.0
+
+    def __init__(self, service_manager, npu_monitor,
+                 prepare_container: Callable[[str], Awaitable[Tuple[str, bool]]],
+                 release_container: Callable[[str, str, bool], Awaitable[None]]):
+        """``prepare_container(image)`` returns (container name, taken from the warm pool);
+        ``release_container(image, name, from_pool)`` returns it to the pool or deletes it
+        """
+        self.service_manager = service_manager
+        self.npu_monitor = npu_monitor
+        self.prepare_container = prepare_container
+        self.release_container = release_container
+        self.jobs: Dict[str, RestartJob] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    def submit(self, model: str, image: Optional[str] = None, flags: Optional[Dict[str, Optional[str]]] = None,
+               drain_timeout: Optional[float] = None) -> RestartJob:
+        for job in self.jobs.values():
+            if job.model == model and job.status == "running":
+                raise ValueError(f"模型 {model} 已有进行中的滚动重启 ({job.id})")
+        replicas = self._replicas(model)
+        if not replicas:
+            raise LookupError(f"没有运行中的 {model} 副本")
+        job = RestartJob(id=uuid.uuid4().hex[:8], model=model, image=image or None, flags=flags or {},
+                         total=len(replicas))
+        self.jobs[job.id] = job
+        self._prune()
+        self._tasks[job.id] = asyncio.create_task(self._run(job, [s.id for s in replicas], drain_timeout))
+        return job
+
+    def get(self, job_id: str) -> Optional[RestartJob]:
+        return self.jobs.get(job_id)
+
+    def list_jobs(self) -> List[Dict[str, Any]]:
+        return [job.to_dict() for job in sorted(self.jobs.values(), key=lambda j: j.created_at, reverse=True)]
+
+    async def close(self) -> None:
+        for task in self._tasks.values():
+            task.cancel()
+        await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+        self._tasks.clear()
+
+    def _replicas(self, model: str) -> List[Any]:
+        return [s for s in self.service_manager.services.values()
+                if s.status == "running" and model in (s.served_model_name, s.model)]
+
+    async def _run(self, job: RestartJob, service_ids: List[str], drain_timeout: Optional[float]) -> None:
+        try:
+            for service_id in service_ids:
+                old = self.service_manager.services.get(service_id)
+                if old is None or old.status != "running":
+                    job.note(f"跳过 {service_id} (已不在运行)")
+                    continue
+                job.current = service_id
+                new = await self._replace(job, old, drain_timeout)
+                job.replaced.append({"old": old.id, "new": new.id, "port": new.port, "npu_devices": new.npu_devices})
+            job.status = "completed"
+            job.note("完成")
+        except asyncio.CancelledError:
+            job.status, job.error = "error", "cancelled"
+            raise
+        except Exception as e:
+            job.status, job.error = "error", str(e)
+            job.note(f"中止: {e}")
+        finally:
+            job.current = None
+            job.finished_at = time.time()
+            self._tasks.pop(job.id, None)
+
+    async def _replace(self, job: RestartJob, old, drain_timeout: Optional[float]):
+        command = rewrite_flags(old.command, job.flags) if job.flags else old.command
+        # --tensor-parallel-size 可能被 flags 修改，卡数以新命令为准
+        tp = tensor_parallel_size(command, len(old.npu_devices))
+        image = job.image or old.image
+        container_name, from_pool, prepared = old.container_name, False, False
+        if job.image and job.image != old.image:
+            container_name, from_pool = await self.prepare_container(job.image)
+            prepared = True
+            job.note(f"{old.id}: 新容器 {container_name} ({job.image})")
+
+        new = None
+        try:
+            surge, claim = True, None
+            try:
+                snapshot = await self.npu_monitor.refresh()
+                claim, devices = self.service_manager.claim_npus(list(snapshot.npus), tp)
+                port = self.service_manager.free_port(old.port + 1)
+            except NPUAllocationError:
+                # 没有空闲 NPU 时先停旧副本，释放出的 NPU 和端口给新副本，期间少一个副本
+                surge = False
+                job.note(f"{old.id}: 无空闲 NPU，先停止旧副本")
+                await self.service_manager.stop_service(old.id, drain_timeout=drain_timeout)
+                snapshot = await self.npu_monitor.refresh()
+                claim, devices = self.service_manager.claim_npus(list(snapshot.npus), tp)
+                port = old.port
+
+            try:
+                new = await self.service_manager.start_service(
+                    container_name=container_name,
+                    command=retarget_command(command, devices, port),
+                    model=old.model,
+                    port=port,
+                    npu_devices=devices,
+                    from_pool=from_pool,
+                    image=image,
+                    served_model_name=old.served_model_name,
+                    npu_claim=claim,
+                )
+            finally:
+                self.service_manager.release_npus(claim)
+            job.note(f"{old.id}: 启动新副本 {new.id} (端口 {port}, NPU {devices})")
+            while new.status == "starting":
+                await asyncio.sleep(self.READY_POLL)
+            if new.status != "running":
+                raise RuntimeError(f"新副本 {new.id} 未就绪 ({new.status}): {new.error_message or ''}".rstrip(": "))
+        except BaseException:
+            if prepared:
+                await self._discard_container(job, new, image, container_name, from_pool)
+            raise
+        job.note(f"{old.id}: 新副本 {new.id} 就绪 ({new.time_to_ready}s)")
+
+        if surge:
+            await self.service_manager.stop_service(old.id, drain_timeout=drain_timeout)
+            job.note(f"{old.id}: 旧副本已停止")
+        if prepared and not self._container_in_use(old.container_name):
+            # 换镜像后旧容器不再有服务使用
+            await self.release_container(old.image, old.container_name, False)
+            job.note(f"{old.id}: 已删除旧容器 {old.container_name}")
+        return new
+
+    async def _discard_container(self, job: RestartJob, new, image: str, container_name: str,
+                                 from_pool: bool) -> None:
+        """Give back the container prepared for a replacement that failed"""
+        if new is not None:
+            # 新副本已在容器内启动过，容器不再干净，停止服务后直接删除
+            if new.status in ("starting", "running"):
+                try:
+                    await self.service_manager.stop_service(new.id)
+                except Exception as e:
+                    logger.warning(f"Failed to stop replacement {new.id}: {e}")
+            from_pool = False
+        await self.release_container(image, container_name, from_pool)
+        job.note(f"已{'归还' if from_pool else '删除'}新容器 {container_name}")
+
+    def _container_in_use(self, container_name: str) -> bool:
+        return any(s.container_name == container_name and s.status in ("starting", "running", "draining")
+                   for s in self.service_manager.services.values())
+
+    def _prune(self) -> None:
+        finished = sorted((j for j in self.jobs.values() if j.status != "running"), key=lambda j: j.created_at)
+        for job in finished[:max(0, len(finished) - self.MAX_FINISHED_JOBS)]:
+            del self.jobs[job.id]
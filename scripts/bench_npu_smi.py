@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""Micro-benchmark and sanity check for the npu-smi parser
+
+Usage: python scripts/bench_npu_smi.py [--iterations N]
+
+Fixtures follow the npu-smi info table layout of 910B (one chip per NPU),
+910C (one NPU row above two chip rows) and 310P boards with 8 and 16
+devices, half of them running a process. For each fixture the parsed
+chip/process counts are checked before timing. Golden outputs with their
+expected parses are in tests/fixtures/npu_smi (python -m pytest tests).
+"""
+import argparse
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from npu_smi import parse_npu_smi  # noqa: E402
+
+SEP = "+" + "-" * 27 + "+" + "-" * 15 + "+" + "-" * 52 + "+"
+EQ = "+" + "=" * 27 + "+" + "=" * 15 + "+" + "=" * 52 + "+"
+
+
+def _910b(devices: int) -> str:
+    lines = [SEP, "| npu-smi 24.1.rc2                 Version: 24.1.rc2" + " " * 44 + "|", SEP,
+             "| NPU   Name                | Health        | Power(W)    Temp(C)           Hugepages-Usage(page)|",
+             "| Chip                      | Bus-Id        | AICore(%)   Memory-Usage(MB)  HBM-Usage(MB)        |",
+             EQ]
+    for i in range(devices):
+        lines += [f"| {i:<5} 910B3               | OK            | {90 + i:.1f}        {40 + i:<17} 0    / 0             |",
+                  f"| 0                         | 0000:{0xC1 + i:02X}:00.0  | {i * 5:<11} 0    / 0          {3161 + i * 1000:<5}/ 65536         |",
+                  EQ]
+    return "\n".join(lines + _processes(devices, chips_per_npu=1))
+
+
+def _910c(devices: int) -> str:
+    lines = [SEP, "| npu-smi 24.1.rc3                 Version: 24.1.rc3" + " " * 44 + "|", SEP,
+             "| NPU   Name                | Health        | Power(W)    Temp(C)           Hugepages-Usage(page)|",
+             "| Chip  Phy-ID              | Bus-Id        | AICore(%)   Memory-Usage(MB)  HBM-Usage(MB)        |",
+             EQ]
+    for d in range(devices):
+        npu, chip = divmod(d, 2)
+        if chip == 0:
+            lines.append(f"| {npu:<5} Ascend910           | OK            | {170 + d:<11.1f} {36 + npu % 4:<17} 0    / 0             |")
+        lines.append(f"| {chip:<5} {d:<19} | 0000:{0x9D + d:02X}:00.0  | {d:<11} 0    / 0          {3393 + d:<5}/ 65536         |")
+        if chip == 1:
+            lines.append(EQ)
+    return "\n".join(lines + _processes(devices, chips_per_npu=2))
+
+
+def _310p(devices: int) -> str:
+    lines = [SEP, "| npu-smi 23.0.0                   Version: 23.0.0" + " " * 46 + "|", SEP,
+             "| NPU     Name              | Health        | Power(W)     Temp(C)           Hugepages-Usage(page)|",
+             "| Chip    Device            | Bus-Id        | AICore(%)    Memory-Usage(MB)                      |",
+             EQ]
+    for d in range(devices):
+        lines += [f"| {d:<7} 310P3             | OK            | NA           {45 + d:<17} 0     / 0             |",
+                  f"| 0       {d:<17} | 0000:{0x82 + d:02X}:00.0  | 0            {1782 + d:<5}/ 44280                      |",
+                  EQ]
+    return "\n".join(lines + _processes(devices, chips_per_npu=1))
+
+
+def _processes(devices: int, chips_per_npu: int):
+    lines = ["| NPU     Chip              | Process id    | Process name             | Process memory(MB)      |", EQ]
+    for d in range(devices):
+        npu, chip = divmod(d, chips_per_npu)
+        if d % 2 == 0:
+            lines.append(f"| {npu:<7} {chip:<17} | {2318145 + d:<13} | VLLM::Worker_TP{d:<10}| {60010 + d:<23} |")
+        else:
+            lines.append(f"| No running processes found in NPU {npu:<60}|")
+        lines.append(EQ)
+    return lines
+
+
+FIXTURES = {
+    f"{name}x{n}": (builder(n), n)
+    for name, builder in (("910B", _910b), ("910C", _910c), ("310P", _310p))
+    for n in (8, 16)
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    print(f"{'fixture':<10} {'chips':>5} {'procs':>5} {'us/parse':>10}")
+    for name, (output, devices) in FIXTURES.items():
+        info = parse_npu_smi(output)
+        assert len(info.chips) == devices, (name, len(info.chips))
+        assert [c.device_id for c in info.chips] == list(range(devices)), name
+        assert len(info.processes) == devices // 2, (name, len(info.processes))
+        assert all(p.device_id % 2 == 0 for p in info.processes), name
+        assert all(c.hbm_total in (65536, 44280) for c in info.chips), name
+        seconds = timeit.timeit(lambda: parse_npu_smi(output), number=args.iterations)
+        print(f"{name:<10} {len(info.chips):>5} {len(info.processes):>5} {seconds / args.iterations * 1e6:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""Compare gateway routing modes on a prefix-heavy chat workload
+
+Usage: python scripts/bench_prefix_routing.py [--replicas N] [--conversations N] [--turns N]
+
+Starts N local mock replicas that simulate vLLM's prefix cache: each keeps an
+LRU of prompt block hashes and delays the first streamed token by
+``BASE_TTFT + PER_BLOCK * uncached blocks``. Conversations share a few system
+prompts and grow turn by turn. Every routing mode replays the same workload
+through the gateway and reports the gateway's estimated hit rate, the replicas'
+actual block cache hit rate and client-side TTFT.
+"""
+import argparse
+import asyncio
+import hashlib
+import random
+import sys
+import time
+from collections import OrderedDict
+from pathlib import Path
+from types import SimpleNamespace
+
+from aiohttp import web
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from gateway import ROUTING_MODES, Gateway  # noqa: E402
+from prefix_router import CHARS_PER_TOKEN, render_prompt  # noqa: E402
+from service_manager import VLLMService  # noqa: E402
+
+BASE_PORT = 18950
+BASE_TTFT = 0.01
+PER_BLOCK = 0.004
+CACHE_BLOCKS = 256
+
+
+class MockReplica:
+    def __init__(self, block_chars: int):
+        self.block_chars = block_chars
+        self.cache: "OrderedDict[str, None]" = OrderedDict()
+        self.blocks = 0
+        self.cached_blocks = 0
+
+    async def chat(self, request: web.Request) -> web.StreamResponse:
+        prompt = render_prompt(await request.json())
+        uncached = 0
+        digest = hashlib.blake2b(digest_size=8)
+        for i in range(len(prompt) // self.block_chars):
+            digest.update(prompt[i * self.block_chars:(i + 1) * self.block_chars].encode())
+            block = digest.hexdigest()
+            self.blocks += 1
+            if block in self.cache:
+                self.cached_blocks += 1
+                self.cache.move_to_end(block)
+            else:
+                uncached += 1
+                self.cache[block] = None
+                if len(self.cache) > CACHE_BLOCKS:
+                    self.cache.popitem(last=False)
+        await asyncio.sleep(BASE_TTFT + PER_BLOCK * uncached)
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        for i in range(4):
+            await response.write(f'data: {{"choices": [{{"delta": {{"content": "t{i} "}}}}]}}\n\n'.encode())
+            await asyncio.sleep(0.002)
+        await response.write(b"data: [DONE]\n\n")
+        return response
+
+
+def build_workload(conversations: int, turns: int, block_chars: int):
+    rng = random.Random(0)
+    systems = [f"System prompt {k}: " + "policy text " * (block_chars * 3 // 12) for k in range(4)]
+    convs = []
+    for c in range(conversations):
+        messages = [{"role": "system", "content": systems[c % len(systems)]}]
+        history = []
+        for t in range(turns):
+            messages = messages + [{"role": "user", "content": f"conv {c} turn {t} " + "question " * rng.randint(20, 60)}]
+            history.append(list(messages))
+            messages = messages + [{"role": "assistant", "content": "answer " * rng.randint(20, 60)}]
+        convs.append(history)
+    return convs
+
+
+async def run_mode(gateway: Gateway, mode: str, workload, concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+    ttfts = []
+
+    async def conversation(turns):
+        for messages in turns:
+            async with semaphore:
+                started = time.perf_counter()
+                upstream, response, sent, used = await gateway.send(
+                    "/v1/chat/completions", {"model": "mock", "messages": messages, "stream": True}, mode=mode)
+                first = True
+                async for _ in gateway.relay(upstream, response, sent, used):
+                    if first:
+                        ttfts.append(time.perf_counter() - started)
+                        first = False
+
+    await asyncio.gather(*(conversation(turns) for turns in workload))
+    return sorted(ttfts)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--replicas", type=int, default=4)
+    parser.add_argument("--conversations", type=int, default=32)
+    parser.add_argument("--turns", type=int, default=6)
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args()
+
+    services = {}
+    print(f"{'mode':<18} {'est hit':>7} {'blk hit':>8} {'ttft p50':>9} {'ttft p95':>9} {'mean':>7}")
+    for mode in ROUTING_MODES:
+        gateway = Gateway(SimpleNamespace(services=services))
+        block_chars = gateway.router.block_tokens * CHARS_PER_TOKEN
+        replicas, runners = [], []
+        services.clear()
+        for i in range(args.replicas):
+            replica = MockReplica(block_chars)
+            app = web.Application()
+            app.router.add_post("/v1/chat/completions", replica.chat)
+            runner = web.AppRunner(app)
+            await runner.setup()
+            await web.TCPSite(runner, "127.0.0.1", BASE_PORT + i).start()
+            replicas.append(replica)
+            runners.append(runner)
+            services[f"r{i}"] = VLLMService(id=f"r{i}", container_name="mock", model="mock", port=BASE_PORT + i,
+                                            npu_devices=[i], served_model_name="mock", status="running")
+        try:
+            ttfts = await run_mode(gateway, mode, build_workload(args.conversations, args.turns, block_chars),
+                                   args.concurrency)
+        finally:
+            await gateway.close()
+            for runner in runners:
+                await runner.cleanup()
+        stats = gateway.stats[mode].to_dict()
+        block_hit = sum(r.cached_blocks for r in replicas) / max(1, sum(r.blocks for r in replicas))
+        print(f"{mode:<18} {stats['hit_rate']:>7.1%} {block_hit:>8.1%} {ttfts[len(ttfts) // 2] * 1000:>7.1f}ms "
+              f"{ttfts[int(len(ttfts) * 0.95)] * 1000:>7.1f}ms {sum(ttfts) / len(ttfts) * 1000:>5.1f}ms")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
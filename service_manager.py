@@ -1,13 +1,44 @@
 """Service Manager for managing multiple vLLM services"""
 import asyncio
+import base64
 import logging
+import re
+import socket
+import time
 import uuid
 from datetime import datetime
-from typing import Dict, List, Any, Optional
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
 from dataclasses import dataclass, field, asdict
 
+import httpx
+
+from npu_allocator import NPUAllocator
+from service_store import ServiceStore
+from vllm_startup import StartupTimeline
+
 logger = logging.getLogger(__name__)
 
+
+def utf8_boundary(data: bytes) -> int:
+    """Length of ``data`` without a trailing incomplete UTF-8 sequence"""
+    for back in range(1, min(4, len(data)) + 1):
+        byte = data[-back]
+        if byte < 0x80:
+            break
+        if byte >= 0xC0:
+            # 多字节字符的首字节: 后续字节不足时截掉这个字符
+            need = 2 if byte < 0xE0 else 3 if byte < 0xF0 else 4
+            return len(data) - back if back < need else len(data)
+    return len(data)
+
+
+def retarget_command(command: str, npu_devices: List[int], port: int) -> str:
+    """Point a vLLM start command (see build_vllm_command) at other NPUs and another port"""
+    devices = ",".join(map(str, npu_devices))
+    command = re.sub(r"ASCEND_RT_VISIBLE_DEVICES=[\d,]+", f"ASCEND_RT_VISIBLE_DEVICES={devices}", command)
+    return re.sub(r"--port[ =]\d+", f"--port {port}", command)
+
+
 @dataclass
 class VLLMService:
     """Represents a running vLLM service"""
@@ -16,11 +47,22 @@ class VLLMService:
     model: str
     port: int
     npu_devices: List[int]
+    served_model_name: str = ""  # 网关按该名称路由
     status: str = "starting"  # starting, running, stopped, error
     start_time: str = ""
     command: str = ""
-    pid: Optional[int] = None
+    pid: Optional[int] = None  # 容器 PID 命名空间内的 API 进程 PID (容器内 pgrep / kill 使用)
     error_message: str = ""
+    from_pool: bool = False  # 容器取自预热池
+    requested_at: float = 0.0  # 启动请求时间 (epoch)
+    time_to_ready: Optional[float] = None  # 请求到 /v1/models 可用的秒数
+    image: str = ""
+    log_file: str = ""  # 容器内 vLLM 输出日志
+    startup_timeout: float = 0.0
+    startup_milestones: Dict[str, float] = field(default_factory=dict)  # 里程碑 -> 请求后秒数
+    startup_phases: Dict[str, float] = field(default_factory=dict)  # 阶段 -> 耗时秒数
+    page_cache: Dict[str, Any] = field(default_factory=dict)  # 启动时权重的 page cache 驻留率 / 预热结果
+    last_probed: Optional[float] = None  # 最近一次状态探测时间 (epoch)
     
     def to_dict(self):
         return asdict(self)
@@ -29,13 +71,137 @@ class VLLMService:
 class ServiceManager:
     """Manage multiple vLLM services"""
     
-    def __init__(self, container_manager):
+    # 就绪探测间隔: 从 POLL_MIN 开始，无进展时按 POLL_BACKOFF 增长到 POLL_MAX
+    POLL_MIN = 0.5
+    POLL_MAX = 5.0
+    POLL_BACKOFF = 1.5
+    PROCESS_CHECK_INTERVAL = 10.0
+    LOG_CHUNK = 256 * 1024
+    # 运行中服务的状态探测结果缓存 STATUS_TTL 秒，最多 STATUS_CONCURRENCY 个并发探测
+    STATUS_TTL = 5.0
+    STATUS_CONCURRENCY = 8
+    DEFAULT_STARTUP_TIMEOUT = {"base": 180, "per_gb": 4, "max": 3600}
+    # 优雅停止: 等待在途请求最多 DRAIN_TIMEOUT 秒，SIGTERM 后最多等待 TERM_TIMEOUT 秒再 SIGKILL
+    DRAIN_TIMEOUT = 60.0
+    DRAIN_POLL = 1.0
+    TERM_TIMEOUT = 30.0
+    # 启动时权重驻留率不低于该值视为热启动 (startup_report)
+    WARM_RESIDENT = 0.9
+    
+    def __init__(self, container_manager, allocator: Optional[NPUAllocator] = None,
+                 startup_timeout: Optional[Dict[str, float]] = None, store: Optional[ServiceStore] = None):
         self.container_manager = container_manager
         self.services: Dict[str, VLLMService] = {}
+        self.store = store
+        # 服务占用的 NPU 在停止前一直保留，避免自动分配选中同一张卡
+        self.allocator = allocator or NPUAllocator()
+        self.startup_timeout = {**self.DEFAULT_STARTUP_TIMEOUT, **(startup_timeout or {})}
+        self._http: Optional[httpx.AsyncClient] = None
+        self._log_offsets: Dict[str, int] = {}
+        self._refresh_inflight: Optional[asyncio.Future] = None
+        self._refresh_task: Optional[asyncio.Task] = None
+        # 返回服务在途请求数 (网关 + vLLM 队列)，由应用注入；未设置时不等待
+        self.inflight: Optional[Callable[[VLLMService], Awaitable[int]]] = None
+    
+    def start(self) -> None:
+        """Start the background status refresh loop"""
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self._refresh_loop())
+    
+    async def _refresh_loop(self) -> None:
+        while True:
+            try:
+                await self.refresh_status()
+            except Exception as e:
+                logger.error(f"Service status refresh failed: {e}")
+            await asyncio.sleep(self.STATUS_TTL)
+    
+    @property
+    def http(self) -> httpx.AsyncClient:
+        """Pooled client for readiness probes (created lazily inside the event loop)"""
+        if self._http is None or self._http.is_closed:
+            self._http = httpx.AsyncClient(timeout=httpx.Timeout(5.0, connect=1.0),
+                                           limits=httpx.Limits(max_keepalive_connections=32))
+        return self._http
+    
+    async def close(self) -> None:
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+            self._refresh_task = None
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+    
+    def startup_timeout_for(self, memory_mb: int = 0) -> float:
+        """Startup timeout in seconds for a model of the given size"""
+        cfg = self.startup_timeout
+        return min(cfg["max"], cfg["base"] + cfg["per_gb"] * memory_mb / 1024)
+    
+    def claim_npus(self, npus: List[Dict[str, Any]], tp_size: int, memory_mb: int = 0) -> Tuple[str, List[int]]:
+        """Pick free NPUs and reserve them at once under a provisional claim id
+        
+        Pass the claim to start_service, which moves the reservation to the
+        new service, and call release_npus(claim) when done either way (a
+        no-op once the claim was moved).
+        """
+        claim = f"claim-{uuid.uuid4().hex[:8]}"
+        return claim, self.allocator.claim(claim, npus, tp_size, memory_mb)
+    
+    def release_npus(self, claim: str) -> None:
+        self.allocator.release(claim)
+    
+    def _set_status(self, service: VLLMService, status: str, error_message: Optional[str] = None) -> None:
+        """Update status and release the NPU reservation once the service is down"""
+        service.status = status
+        if error_message is not None:
+            service.error_message = error_message
+        if status in ("stopped", "error"):
+            self.allocator.release(service.id)
+        self._persist(service)
+    
+    def _persist(self, service: VLLMService) -> None:
+        if self.store is None or service.id not in self.services:
+            return
+        try:
+            self.store.save(service.to_dict())
+        except Exception as e:
+            logger.error(f"Failed to persist service {service.id}: {e}")
+    
+    def _mark_running(self, service: VLLMService) -> None:
+        service.status = "running"
+        if service.time_to_ready is None and service.requested_at:
+            service.time_to_ready = round(time.time() - service.requested_at, 2)
+        logger.info(f"Service {service.id} is now running on port {service.port} "
+                    f"(time to ready {service.time_to_ready}s, pool={service.from_pool})")
+        self._persist(service)
+    
+    def time_to_ready_stats(self) -> Dict[str, Any]:
+        """Average time to ready of services started with and without the warm pool"""
+        stats = {}
+        for key, from_pool in (("pool", True), ("cold", False)):
+            samples = [s.time_to_ready for s in self.services.values()
+                       if s.from_pool == from_pool and s.time_to_ready is not None]
+            stats[key] = {
+                "count": len(samples),
+                "avg": round(sum(samples) / len(samples), 2) if samples else None,
+                "min": min(samples) if samples else None,
+                "max": max(samples) if samples else None,
+            }
+        return stats
     
     async def start_service(self, container_name: str, command: str, model: str, 
-                           port: int, npu_devices: List[int]) -> VLLMService:
-        """Start a new vLLM service"""
+                           port: int, npu_devices: List[int], from_pool: bool = False,
+                           requested_at: Optional[float] = None, memory_mb: int = 0,
+                           image: str = "", served_model_name: str = "",
+                           page_cache: Optional[Dict[str, Any]] = None,
+                           npu_claim: Optional[str] = None) -> VLLMService:
+        """Start a new vLLM service
+        
+        ``page_cache`` describes the weights' page-cache state at spawn (see
+        WeightPrewarmer); its ``prewarmed_at`` becomes the ``prewarmed``
+        startup milestone. ``npu_claim`` (see claim_npus) hands its NPU
+        reservation over to the service.
+        """
         service_id = str(uuid.uuid4())[:8]
         
         service = VLLMService(
@@ -44,16 +210,30 @@ class ServiceManager:
             model=model,
             port=port,
             npu_devices=npu_devices,
+            served_model_name=served_model_name,
             status="starting",
             start_time=datetime.now().isoformat(),
-            command=command
+            command=command,
+            from_pool=from_pool,
+            requested_at=requested_at or time.time(),
+            image=image or await self._container_image(container_name),
+            log_file=f"/tmp/vllm-{service_id}.log",
+            startup_timeout=self.startup_timeout_for(memory_mb),
+            page_cache=dict(page_cache or {})
         )
+        prewarmed_at = service.page_cache.pop("prewarmed_at", None)
+        if prewarmed_at:
+            service.startup_milestones["prewarmed"] = round(max(0.0, prewarmed_at - service.requested_at), 2)
         
         self.services[service_id] = service
+        if not npu_claim or not self.allocator.transfer(npu_claim, service_id):
+            self.allocator.reserve(service_id, npu_devices)
+        self._persist(service)
         
         try:
-            # 在容器内执行启动命令 (后台运行)
-            await self.container_manager.exec_command(container_name, command, detach=True)
+            # 在容器内执行启动命令 (后台运行)，输出写入日志文件供启动阶段分析
+            await self.container_manager.exec_command(
+                container_name, f"({command}) > {service.log_file} 2>&1", detach=True)
             # 保持 starting 状态，等待后续检测确认运行
             service.status = "starting"
             
@@ -61,28 +241,101 @@ class ServiceManager:
             asyncio.create_task(self._wait_for_service_ready(service))
             
         except Exception as e:
-            service.status = "error"
-            service.error_message = str(e)
+            self._set_status(service, "error", str(e))
             logger.error(f"Failed to start service {service_id}: {e}")
         
         return service
     
-    async def stop_service(self, service_id: str) -> bool:
-        """Stop a running vLLM service"""
+    async def stop_service(self, service_id: str, drain_timeout: Optional[float] = None,
+                           force: bool = False) -> bool:
+        """Stop a vLLM service without dropping in-flight requests
+        
+        The service is taken out of rotation (``draining``), in-flight
+        requests get up to ``drain_timeout`` seconds to finish, then the
+        tracked API server PID gets SIGTERM and, after TERM_TIMEOUT, SIGKILL.
+        ``force`` skips the drain and the grace period.
+        """
         if service_id not in self.services:
             return False
         
         service = self.services[service_id]
+        drained = signalled = False
         try:
-            # 使用端口号精确杀进程
-            kill_cmd = f"pkill -f 'vllm.*--port.*{service.port}' || kill -9 $(lsof -t -i:{service.port}) 2>/dev/null || true"
-            await self.container_manager.exec_command(service.container_name, kill_cmd)
-            service.status = "stopped"
+            if not force:
+                drained = self.mark_draining(service_id)
+                await self._drain(service, self.DRAIN_TIMEOUT if drain_timeout is None else drain_timeout)
+            pid = await self._resolve_pid(service)
+            if pid is not None:
+                signalled = True
+                await self.container_manager.terminate_process(
+                    service.container_name, pid, 0 if force else self.TERM_TIMEOUT)
+            self._set_status(service, "stopped")
             return True
         except Exception as e:
             logger.error(f"Failed to stop service {service_id}: {e}")
-            service.error_message = str(e)
+            # 不能停留在 draining: 网关不再转发、NPU 预留不释放、自动扩缩容跳过该模型
+            if signalled:
+                self._set_status(service, "error", f"Stop failed: {e}")
+            elif drained and service.status == "draining":
+                self._set_status(service, "running", f"Stop failed: {e}")
+            else:
+                service.error_message = str(e)
+            return False
+    
+    async def _drain(self, service: VLLMService, timeout: float) -> None:
+        """Wait until the service has no requests in flight, at most ``timeout`` seconds"""
+        if self.inflight is None or service.status != "draining":
+            return
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                pending = await self.inflight(service)
+            except Exception as e:
+                logger.debug(f"In-flight check of {service.id} failed: {e}")
+                pending = 0
+            if pending <= 0:
+                return
+            if time.monotonic() >= deadline:
+                logger.warning(f"Service {service.id} still has {pending} requests after {timeout}s drain")
+                return
+            await asyncio.sleep(self.DRAIN_POLL)
+    
+    async def _resolve_pid(self, service: VLLMService) -> Optional[int]:
+        """Current API server PID of the service (the tracked PID may be stale after a restart)"""
+        pid = await self.container_manager.find_vllm_pid(service.container_name, service.port)
+        if pid is not None and pid != service.pid:
+            service.pid = pid
+            self._persist(service)
+        return pid
+    
+    def free_port(self, start: int = 8000) -> int:
+        """A port not used by any tracked service that is not stopped, nor bound by anything else on the host"""
+        used = {s.port for s in self.services.values() if s.status not in ("stopped", "error")}
+        port = start
+        while port in used or self._port_in_use(port):
+            port += 1
+            if port > 65535:
+                raise RuntimeError(f"No free port at or above {start}")
+        return port
+    
+    @staticmethod
+    def _port_in_use(port: int) -> bool:
+        """Whether binding ``port`` fails on this host (service containers use the host network)"""
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            try:
+                sock.bind(("0.0.0.0", port))
+            except OSError:
+                return True
+        return False
+    
+    def mark_draining(self, service_id: str) -> bool:
+        """Take a running service out of rotation; the gateway only routes to running services"""
+        service = self.services.get(service_id)
+        if service is None or service.status != "running":
             return False
+        self._set_status(service, "draining")
+        return True
     
     async def remove_service(self, service_id: str) -> bool:
         """Remove a service from tracking (must be stopped first)"""
@@ -90,106 +343,258 @@ class ServiceManager:
             return False
         
         service = self.services[service_id]
-        if service.status == "running":
+        if service.status in ("running", "starting"):
             await self.stop_service(service_id)
         
         del self.services[service_id]
+        self._log_offsets.pop(service_id, None)
+        self.allocator.release(service_id)
+        if self.store is not None:
+            self.store.delete(service_id)
         return True
     
-    async def refresh_status(self) -> None:
-        """Refresh status of all services"""
-        for service in self.services.values():
-            if service.status in ["running", "starting"]:
+    async def restore(self) -> None:
+        """Reload persisted services and reconcile them with live vLLM servers
+        
+        Live servers are found in a single /proc scan; services not visible
+        there (e.g. the playground itself runs in a container) get one
+        concurrent /health probe. Live services keep their NPU reservations,
+        services that were starting resume their readiness watch, and the
+        rest are marked stopped. All status changes are written back in one
+        transaction.
+        """
+        if self.store is None:
+            return
+        started = time.monotonic()
+        names = set(VLLMService.__dataclass_fields__)
+        for data in self.store.load():
+            service = VLLMService(**{k: v for k, v in data.items() if k in names})
+            self.services[service.id] = service
+        active = [s for s in self.services.values() if s.status in ("starting", "running", "draining")]
+        if not active:
+            return
+        
+        live = await self.container_manager.scan_vllm_servers()
+        unseen = [s for s in active if (s.container_name, s.port) not in live]
+        answered = await asyncio.gather(*(self._http_alive(s.port) for s in unseen))
+        alive = {s.id for s, ok in zip(unseen, answered) if ok}
+        now = time.time()
+        for service in active:
+            pid = live.get((service.container_name, service.port))
+            if pid is None and service.id not in alive:
+                service.status = "stopped"
+                continue
+            service.pid = pid or service.pid
+            service.last_probed = now
+            if service.status == "draining":
+                # 重启前未完成的下线操作不再继续，恢复接收请求
+                service.status = "running"
+            self.allocator.reserve(service.id, service.npu_devices)
+            if service.status == "starting":
+                asyncio.create_task(self._wait_for_service_ready(service))
+        self.store.save_many(s.to_dict() for s in active)
+        logger.info(f"Restored {len(self.services)} services ({len(active)} active, "
+                    f"{sum(s.status != 'stopped' for s in active)} live) in {time.monotonic() - started:.3f}s")
+    
+    async def _http_alive(self, port: int) -> bool:
+        try:
+            response = await self.http.get(f"http://127.0.0.1:{port}/health", timeout=1.0)
+            return response.status_code == 200
+        except httpx.HTTPError:
+            return False
+    
+    def _stale_services(self, max_age: float) -> List[VLLMService]:
+        now = time.time()
+        # starting 状态由 _wait_for_service_ready 跟踪
+        return [s for s in self.services.values()
+                if s.status == "running" and (s.last_probed is None or now - s.last_probed > max_age)]
+    
+    async def refresh_status(self, max_age: Optional[float] = None) -> None:
+        """Probe running services whose status is older than ``max_age`` seconds
+        
+        Probes run concurrently (at most STATUS_CONCURRENCY at a time) and
+        concurrent callers share one in-flight refresh.
+        """
+        if self._refresh_inflight is None or self._refresh_inflight.done():
+            stale = self._stale_services(self.STATUS_TTL if max_age is None else max_age)
+            if not stale:
+                return
+            self._refresh_inflight = asyncio.ensure_future(self._probe_all(stale))
+        await asyncio.shield(self._refresh_inflight)
+    
+    def schedule_refresh(self) -> None:
+        """Start a refresh in the background if any status is stale, without waiting"""
+        if (self._refresh_inflight is None or self._refresh_inflight.done()) and self._stale_services(self.STATUS_TTL):
+            self._refresh_inflight = asyncio.ensure_future(self._probe_all(self._stale_services(self.STATUS_TTL)))
+    
+    async def _probe_all(self, services: List[VLLMService]) -> None:
+        semaphore = asyncio.Semaphore(self.STATUS_CONCURRENCY)
+        
+        async def probe(service: VLLMService) -> None:
+            async with semaphore:
                 await self._check_service_status(service)
+        
+        await asyncio.gather(*(probe(s) for s in services))
     
     async def _check_service_status(self, service: VLLMService) -> None:
-        """Check if a service is still running"""
+        """Check if a running service is still listening (marks it stopped otherwise)"""
         try:
             # 检查端口是否在监听
             check_cmd = f"ss -tlnp | grep ':{service.port}' || echo 'NOT_LISTENING'"
-            result = await self.container_manager.exec_command(service.container_name, check_cmd)
-            
-            if "NOT_LISTENING" in result:
-                if service.status == "running":
-                    service.status = "stopped"
-            else:
-                service.status = "running"
+            result = await self.container_manager.probe(service.container_name, check_cmd)
+            service.last_probed = time.time()
+            # 探测期间服务可能已开始排空或被停止，此时不覆盖其状态
+            if service.status == "running" and "NOT_LISTENING" in result:
+                self._set_status(service, "stopped")
                 
         except Exception as e:
             logger.error(f"Failed to check service status: {e}")
     
-    async def _wait_for_service_ready(self, service: VLLMService, max_wait: int = 120) -> None:
-        """Wait for service to be ready (port listening) or timeout"""
-        import time
-        start_time = time.time()
+    async def _wait_for_service_ready(self, service: VLLMService) -> None:
+        """Poll /health and /v1/models until the service answers
         
-        while time.time() - start_time < max_wait:
-            await asyncio.sleep(5)  # 每5秒检查一次
+        Startup phases are timed by tailing the service log between polls.
+        The poll interval starts at POLL_MIN and backs off while the log shows
+        no progress; the process itself is checked every
+        PROCESS_CHECK_INTERVAL seconds so a crashed start fails early.
+        """
+        timeline = StartupTimeline()
+        timeline.milestones.update(service.startup_milestones)
+        base_url = f"http://127.0.0.1:{service.port}"
+        deadline = service.requested_at + service.startup_timeout
+        interval = self.POLL_MIN
+        last_process_check = time.monotonic()
+        
+        while time.time() < deadline:
+            await asyncio.sleep(interval)
+            if service.status != "starting":
+                return  # 启动过程中已被停止或移除
             
-            try:
-                # 检查端口是否在监听
-                check_cmd = f"ss -tlnp 2>/dev/null | grep ':{service.port}' || netstat -tlnp 2>/dev/null | grep ':{service.port}'"
-                result = await self.container_manager.exec_command(service.container_name, check_cmd)
-                
-                if result and str(service.port) in result:
-                    service.status = "running"
-                    logger.info(f"Service {service.id} is now running on port {service.port}")
+            progressed = timeline.feed(await self._tail_log(service), time.time() - service.requested_at)
+            if await self._http_ready(base_url):
+                timeline.mark("ready", time.time() - service.requested_at)
+                self._record_startup(service, timeline)
+                self._mark_running(service)
+                asyncio.create_task(self._update_service_pid(service))
+                return
+            self._record_startup(service, timeline)
+            
+            # API server 已起来或日志有新进展时保持快速探测，否则退避
+            if progressed or "server_started" in timeline.milestones:
+                interval = self.POLL_MIN
+            else:
+                interval = min(interval * self.POLL_BACKOFF, self.POLL_MAX)
+            
+            if time.monotonic() - last_process_check >= self.PROCESS_CHECK_INTERVAL:
+                last_process_check = time.monotonic()
+                if not await self._process_alive(service):
+                    timeline.feed(await self._tail_log(service, final=True) + "\n",
+                                  time.time() - service.requested_at)
+                    self._record_startup(service, timeline)
+                    self._set_status(service, "error", timeline.last_error or "vLLM 进程已退出")
                     return
-                    
-            except Exception as e:
-                logger.debug(f"Check failed: {e}")
         
-        # 超时后检查进程是否还在
+        if service.status == "starting":
+            error_message = f"服务启动超时 ({service.startup_timeout:.0f}s)"
+            if timeline.last_error:
+                error_message += f": {timeline.last_error}"
+            self._set_status(service, "error", error_message)
+    
+    def _record_startup(self, service: VLLMService, timeline: StartupTimeline) -> None:
+        service.startup_milestones = dict(timeline.milestones)
+        service.startup_phases = timeline.breakdown()
+    
+    async def _http_ready(self, base_url: str) -> bool:
         try:
-            proc_cmd = f"pgrep -f 'vllm.*--port.*{service.port}'"
-            result = await self.container_manager.exec_command(service.container_name, proc_cmd)
-            if not result or not result.strip():
-                service.status = "error"
-                service.error_message = "服务启动超时或已退出"
-        except Exception:
-            service.status = "error"
-            service.error_message = "无法检测服务状态"
+            health = await self.http.get(f"{base_url}/health")
+            if health.status_code != 200:
+                return False
+            models = await self.http.get(f"{base_url}/v1/models")
+            return models.status_code == 200 and bool(models.json().get("data"))
+        except (httpx.HTTPError, ValueError):
+            return False
     
-    async def _wait_for_service_ready(self, service: VLLMService, max_wait: int = 120) -> None:
-        """Wait for service to be ready (port listening) or timeout"""
-        import time
-        start_time = time.time()
-        
-        while time.time() - start_time < max_wait:
-            await asyncio.sleep(5)  # 每5秒检查一次
-            
-            try:
-                # 检查端口是否在监听
-                check_cmd = f"ss -tlnp 2>/dev/null | grep ':{service.port}' || netstat -tlnp 2>/dev/null | grep ':{service.port}'"
-                result = await self.container_manager.exec_command(service.container_name, check_cmd)
-                
-                if result and str(service.port) in result:
-                    service.status = "running"
-                    logger.info(f"Service {service.id} is now running on port {service.port}")
-                    return
-                    
-            except Exception as e:
-                logger.debug(f"Check failed: {e}")
-        
-        # 超时后检查进程是否还在
+    async def _tail_log(self, service: VLLMService, final: bool = False) -> str:
+        """Return the complete log lines written since the previous call (``final``: also a partial last line)
+
+        The bytes travel base64-encoded, so the offset advances by exactly
+        the bytes consumed and a multi-byte character is never split.
+        """
+        offset = self._log_offsets.get(service.id, 0)
+        try:
+            encoded = await self.container_manager.probe(
+                service.container_name,
+                f"tail -c +{offset + 1} {service.log_file} 2>/dev/null | head -c {self.LOG_CHUNK} "
+                f"| base64 | tr -d '\\n'")
+            data = base64.b64decode(encoded.strip())
+        except Exception as e:
+            logger.debug(f"Failed to tail {service.log_file}: {e}")
+            return ""
+        if not final:
+            end = data.rfind(b"\n") + 1
+            if end == 0 and len(data) >= self.LOG_CHUNK:
+                # 超长的一行: 在最后一个完整的 UTF-8 字符处截断
+                end = utf8_boundary(data)
+            data = data[:end]
+        self._log_offsets[service.id] = offset + len(data)
+        return data.decode(errors="replace")
+
+    async def _process_alive(self, service: VLLMService) -> bool:
         try:
-            proc_cmd = f"pgrep -f 'vllm.*--port.*{service.port}'"
-            result = await self.container_manager.exec_command(service.container_name, proc_cmd)
-            if not result or not result.strip():
-                service.status = "error"
-                service.error_message = "服务启动超时或已退出"
+            result = await self.container_manager.probe(
+                service.container_name,
+                f"pgrep -f '[v]llm.*--port.*{service.port}' >/dev/null && echo ALIVE || echo DEAD")
         except Exception:
-            service.status = "error"
-            service.error_message = "无法检测服务状态"
+            return True  # 探测本身失败时不判定进程退出
+        return "DEAD" not in result
+    
+    async def _container_image(self, container_name: str) -> str:
+        try:
+            for container in await self.container_manager.list_containers(keyword=container_name):
+                if container["name"] == container_name:
+                    return container["image"]
+        except Exception as e:
+            logger.debug(f"Failed to look up image of {container_name}: {e}")
+        return ""
+    
+    def startup_report(self) -> Dict[str, Any]:
+        """Time-to-ready breakdown per service, averaged per image, and weight load time by page-cache state"""
+        services = [{
+            "id": s.id, "model": s.model, "image": s.image, "npu_count": len(s.npu_devices),
+            "from_pool": s.from_pool, "status": s.status, "time_to_ready": s.time_to_ready,
+            "startup_phases": s.startup_phases, "page_cache": s.page_cache,
+        } for s in self.services.values() if s.startup_phases]
+        by_image: Dict[str, Dict[str, List[float]]] = {}
+        for s in services:
+            if s["time_to_ready"] is None:
+                continue
+            phases = by_image.setdefault(s["image"], {})
+            for phase, seconds in {**s["startup_phases"], "total": s["time_to_ready"]}.items():
+                phases.setdefault(phase, []).append(seconds)
+        averages = {
+            image: {phase: round(sum(v) / len(v), 2) for phase, v in phases.items()}
+            for image, phases in by_image.items()
+        }
+        # 权重加载耗时按启动时 page cache 状态分组: 预热 / 本来已缓存 / 冷启动
+        weight_load: Dict[str, List[float]] = {"prewarmed": [], "warm": [], "cold": []}
+        for s in services:
+            seconds = s["startup_phases"].get("weight_load")
+            if seconds is None or not s["page_cache"]:
+                continue
+            cache = s["page_cache"]
+            group = ("prewarmed" if cache.get("prewarmed")
+                     else "warm" if (cache.get("resident") or 0) >= self.WARM_RESIDENT else "cold")
+            weight_load[group].append(seconds)
+        by_page_cache = {
+            group: {"count": len(v), "avg": round(sum(v) / len(v), 2) if v else None}
+            for group, v in weight_load.items()
+        }
+        return {"services": services, "by_image": averages, "weight_load_by_page_cache": by_page_cache}
     
     async def _update_service_pid(self, service: VLLMService) -> None:
-        """Try to get the PID of the vLLM process"""
+        """Record the PID of the vLLM API server process"""
         try:
-            await asyncio.sleep(2)  # 等待进程启动
-            pid_cmd = f"pgrep -f 'vllm.*--port.*{service.port}' | head -1"
-            result = await self.container_manager.exec_command(service.container_name, pid_cmd)
-            if result and result.strip().isdigit():
-                service.pid = int(result.strip())
+            await self._resolve_pid(service)
         except Exception:
             pass
     
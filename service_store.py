@@ -0,0 +1,85 @@
+"""Durable vLLM service registry (SQLite, write-ahead log)"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DB_PATH = Path(__file__).parent / "playground.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS services (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    container_name TEXT NOT NULL,
+    port INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_services_status ON services(status);
+"""
+
+
+class ServiceStore:
+    """Persist VLLMService records so that a restart keeps track of them
+
+    Each record is one row keyed by service id with the full dataclass as
+    JSON. WAL mode with synchronous=NORMAL keeps a write to a single small
+    transaction without an fsync per commit, so saving on every status change
+    does not block the event loop noticeably.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = str(path or os.environ.get("PLAYGROUND_DB") or DEFAULT_DB_PATH)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+
+    def load(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute("SELECT data FROM services ORDER BY updated_at").fetchall()
+        records = []
+        for (data,) in rows:
+            try:
+                records.append(json.loads(data))
+            except json.JSONDecodeError:
+                logger.warning("Skipping corrupt service record")
+        return records
+
+    def save(self, service: Dict[str, Any]) -> None:
+        self.save_many([service])
+
+    def save_many(self, services: Iterable[Dict[str, Any]]) -> None:
+        """Upsert records in one transaction"""
+        now = time.time()
+        rows = [(s["id"], s["status"], s["container_name"], s["port"], json.dumps(s, ensure_ascii=False), now)
+                for s in services]
+        if not rows:
+            return
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(
+                    "INSERT INTO services (id, status, container_name, port, data, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT(id) DO UPDATE SET "
+                    "status=excluded.status, container_name=excluded.container_name, port=excluded.port, "
+                    "data=excluded.data, updated_at=excluded.updated_at", rows)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def delete(self, service_id: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM services WHERE id = ?", (service_id,))
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
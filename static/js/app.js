@@ -5,6 +5,7 @@ let allServices = [];
 let allContainers = [];
 let allModels = { local: [], modelscope: [], popular: [] };
 let chatHistory = [];
+let npuChart = null;
 
 // Initialize application
 document.addEventListener('DOMContentLoaded', () => {
@@ -46,6 +47,14 @@ function initEventListeners() {
     // Forms
     bindSubmit('vllm-config-form', startVllm);
     bindSubmit('benchmark-form', runBenchmark);
+    bindClick('cancel-benchmark-btn', cancelBenchmark);
+    bindClick('btn-compare-benchmarks', compareBenchmarks);
+    bindClick('btn-history-prev', () => { if (historyPage > 1) { historyPage--; loadBenchmarkHistory(); } });
+    bindClick('btn-history-next', () => { historyPage++; loadBenchmarkHistory(); });
+    ['history-model', 'history-image', 'history-template', 'history-type', 'history-since', 'history-until'].forEach(id => {
+        const el = document.getElementById(id);
+        if (el) el.addEventListener('change', () => { historyPage = 1; loadBenchmarkHistory(); });
+    });
     bindSubmit('create-container-form', createContainer);
     bindSubmit('pull-image-form', pullImage);
     bindSubmit('download-model-form', downloadModel);
@@ -102,11 +111,13 @@ function initEventListeners() {
     const benchTypeSelect = document.getElementById('benchmark-type');
     if (benchTypeSelect) {
         benchTypeSelect.addEventListener('change', (e) => {
+            selectedBenchmarkTemplate = null;
             const isEval = e.target.value === 'evalscope';
             document.querySelector('.evalscope-params').style.display = isEval ? 'contents' : 'none'; // Assuming CSS handles .evalscope-params wrapping
             // Actually the HTML has id='evalscope-params' and id='vllm-bench-params'
             toggleDisplay('evalscope-params', isEval);
             toggleDisplay('vllm-bench-params', !isEval);
+            toggleDisplay('native-params', e.target.value === 'native');
         });
     }
 
@@ -220,14 +231,20 @@ function handleModelAction(button) {
     else if (action === 'download') downloadModelById(modelPath);
 }
 
-function handleBenchmarkAction(button) {
+async function handleBenchmarkAction(button) {
+    const runId = button.dataset.runId;
     if (button.dataset.action === 'view') {
         try {
-            const result = JSON.parse(button.dataset.result);
-            displayBenchmarkResults(result);
+            displayBenchmarkResults(await fetchApi(`/api/benchmark/results/${runId}`));
         } catch (error) {
-            console.error('Failed to parse benchmark result:', error);
+            console.error('Failed to load benchmark result:', error);
         }
+    } else if (button.dataset.action === 'delete') {
+        if (!confirm('确定删除该记录？')) return;
+        try {
+            await fetchApi(`/api/benchmark/results/${runId}`, { method: 'DELETE' });
+            loadBenchmarkHistory();
+        } catch (error) { console.error(error); }
     }
 }
 
@@ -273,7 +290,7 @@ function switchTab(tabId) {
     if (tabId === 'dashboard') { refreshServices(); refreshStatus(); }
     if (tabId === 'containers') refreshContainers();
     if (tabId === 'models') refreshModels();
-    if (tabId === 'benchmark') { loadBenchmarkHistory(); loadBenchmarkTemplates(); }
+    if (tabId === 'benchmark') { loadBenchmarkFilters(); loadBenchmarkHistory(); loadBenchmarkTemplates(); }
     if (tabId === 'vllm') { refreshServices(); refreshContainers(); } // Also refresh containers for the dropdown
 }
 
@@ -326,9 +343,17 @@ async function refreshStatus() {
     }
 }
 
-function startStatusPolling() { setInterval(refreshStatus, 5000); }
+function startStatusPolling() {
+    setInterval(refreshStatus, 5000);
+    setInterval(refreshNpuChart, 30000);
+}
 
 function initNpuSelector() {
+    bindChange('npu-auto', (e) => {
+        const selector = document.getElementById('npu-selector');
+        if (selector) selector.style.opacity = e.target.checked ? '0.4' : '1';
+        updateGeneratedCommand();
+    });
     const npuSelector = document.getElementById('npu-selector');
     const modalNpuSelector = document.getElementById('modal-npu-selector');
     if (!npuSelector || !modalNpuSelector) return;
@@ -369,7 +394,55 @@ function toggleNpu(id, element) {
     updateGeneratedCommand();
 }
 
-function initNpuChart() { updateNpuStatusGrid([]); }
+function initNpuChart() {
+    bindChange('npu-chart-metric', refreshNpuChart);
+    bindChange('npu-chart-window', refreshNpuChart);
+    refreshNpuChart();
+}
+
+async function refreshNpuChart() {
+    const canvas = document.getElementById('npu-history-chart');
+    if (!canvas || typeof Chart === 'undefined') return;
+    
+    const metric = document.getElementById('npu-chart-metric')?.value || 'utilization';
+    const windowSec = parseInt(document.getElementById('npu-chart-window')?.value || '3600');
+    
+    try {
+        // 服务端按桶降采样，图表只需每桶平均值
+        const data = await fetchApi(`/api/npu/history?since=-${windowSec}&metrics=${metric}&aggregates=avg`);
+        const devices = data.devices || [];
+        const times = data.t || [];
+        const datasets = devices.map((dev, idx) => ({
+            label: `NPU ${dev.device}`,
+            data: times.map((t, i) => ({ x: t * 1000, y: dev[metric].avg[i] })),
+            borderColor: `hsl(${(idx * 360 / Math.max(devices.length, 1)) | 0}, 70%, 55%)`,
+            borderWidth: 1.5,
+            pointRadius: 0,
+            tension: 0.2
+        }));
+        
+        if (!npuChart) {
+            npuChart = new Chart(canvas, {
+                type: 'line',
+                data: { datasets },
+                options: {
+                    animation: false,
+                    parsing: false,
+                    scales: {
+                        x: { type: 'linear', ticks: { callback: v => new Date(v).toLocaleTimeString() } },
+                        y: { beginAtZero: true }
+                    },
+                    plugins: { legend: { labels: { boxWidth: 12 } } }
+                }
+            });
+        } else {
+            npuChart.data.datasets = datasets;
+            npuChart.update();
+        }
+    } catch (error) {
+        console.error('Failed to refresh NPU chart:', error);
+    }
+}
 
 function updateNpuStatusGrid(npuData) {
     const container = document.getElementById('npu-status-grid');
@@ -543,13 +616,14 @@ async function pullImage(event) {
     
     try {
         const result = await fetchApi(`/api/images/pull?image=${encodeURIComponent(imageName)}`, { method: 'POST' });
-        if (result.success) {
-            showToast(result.message, 'success');
+        const job = await watchPullJob(result.job_id, progressDiv, statusText);
+        if (job.status === 'completed') {
+            showToast(job.message, 'success');
             statusText.textContent = '✅ 下载完成！';
             setTimeout(() => closeModal('pull-image-modal'), 2000);
         } else {
-            showToast(`下载失败: ${result.message}`, 'error');
-            statusText.textContent = `❌ 下载失败: ${result.message}`;
+            showToast(`下载失败: ${job.error}`, 'error');
+            statusText.textContent = `❌ 下载失败: ${job.error}`;
         }
     } catch (error) {
         showToast(`下载失败: ${error.message}`, 'error');
@@ -560,6 +634,51 @@ async function pullImage(event) {
     }
 }
 
+function renderPullProgress(job, progressDiv, statusText) {
+    progressDiv.querySelector('.progress-fill').style.width = `${job.progress}%`;
+    if (job.status === 'queued') {
+        statusText.textContent = `排队中: ${job.image}`;
+    } else if (job.status === 'pulling') {
+        const bytes = job.bytes_total ? ` (${formatBytes(job.bytes_current)} / ${formatBytes(job.bytes_total)})` : '';
+        statusText.textContent = `${job.progress}% · 层 ${job.layers_done}/${job.layers_total}${bytes}`;
+    }
+}
+
+function watchPullJob(jobId, progressDiv, statusText) {
+    // 通过 WebSocket 接收进度，连接失败时退回轮询
+    return new Promise((resolve) => {
+        const protocol = location.protocol === 'https:' ? 'wss' : 'ws';
+        const ws = new WebSocket(`${protocol}://${location.host}/ws/images/pull/${jobId}`);
+        let last = null;
+        ws.onmessage = (msg) => {
+            last = JSON.parse(msg.data);
+            renderPullProgress(last, progressDiv, statusText);
+            if (last.status === 'completed' || last.status === 'error') resolve(last);
+        };
+        ws.onclose = async () => {
+            if (last && (last.status === 'completed' || last.status === 'error')) return;
+            while (true) {
+                await new Promise(r => setTimeout(r, 2000));
+                try {
+                    last = await fetchApi(`/api/images/pull/${jobId}`);
+                } catch (error) {
+                    resolve({ status: 'error', error: error.message });
+                    return;
+                }
+                renderPullProgress(last, progressDiv, statusText);
+                if (last.status === 'completed' || last.status === 'error') { resolve(last); return; }
+            }
+        };
+    });
+}
+
+function formatBytes(bytes) {
+    const units = ['B', 'KB', 'MB', 'GB'];
+    let i = 0;
+    while (bytes >= 1024 && i < units.length - 1) { bytes /= 1024; i++; }
+    return `${bytes.toFixed(i ? 1 : 0)} ${units[i]}`;
+}
+
 // --- Models ---
 
 async function refreshModels() {
@@ -684,7 +803,8 @@ function updateGeneratedCommand() {
     const modelPath = sourceType === 'local' ? document.getElementById('local-model-path').value : document.getElementById('modelscope-model-id').value;
     
     let cmd = [];
-    if (selectedNpuDevices.length > 0) cmd.push(`export ASCEND_RT_VISIBLE_DEVICES=${selectedNpuDevices.join(',')}`);
+    if (document.getElementById('npu-auto')?.checked) cmd.push('export ASCEND_RT_VISIBLE_DEVICES=<auto>');
+    else if (selectedNpuDevices.length > 0) cmd.push(`export ASCEND_RT_VISIBLE_DEVICES=${selectedNpuDevices.join(',')}`);
     if (sourceType === 'modelscope') cmd.push('export VLLM_USE_MODELSCOPE="True"');
     
     let vllmCmd = `vllm serve ${modelPath || '<model_path>'}`;
@@ -730,7 +850,7 @@ async function startVllm(e) {
         max_model_len: document.getElementById('max-model-len').value ? parseInt(document.getElementById('max-model-len').value) : null,
         dtype: document.getElementById('dtype').value, 
         trust_remote_code: document.getElementById('trust-remote-code').checked, 
-        npu_devices: selectedNpuDevices, 
+        npu_devices: document.getElementById('npu-auto')?.checked ? 'auto' : selectedNpuDevices, 
         additional_args: document.getElementById('additional-args').value || null 
     };
     
@@ -738,7 +858,7 @@ async function startVllm(e) {
     
     try { 
         const result = await fetchApi(`/api/vllm/start?container_name=${containerName}`, { method: 'POST', body: JSON.stringify(config) });
-        if (result.service_id) showToast(`服务启动成功! ID: ${result.service_id}`, 'success');
+        if (result.service_id) showToast(`服务启动成功! ID: ${result.service_id}, NPU: ${(result.npu_devices || []).join(',')}`, 'success');
         else showToast('服务启动中...', 'success');
         
         await refreshServices();
@@ -851,14 +971,80 @@ async function runBenchmark(e) {
         config.num_prompts = parseInt(document.getElementById('bench-num-prompts').value); 
         config.random_input_len = parseInt(document.getElementById('bench-input-len').value); 
         config.random_output_len = parseInt(document.getElementById('bench-output-len').value); 
+        if (benchmarkType === 'native') {
+            config.arrival = document.getElementById('native-arrival').value;
+            config.burst_size = parseInt(document.getElementById('native-burst-size').value);
+        }
     }
+    if (selectedBenchmarkTemplate) config.template = selectedBenchmarkTemplate;
     
     showToast('Running benchmark...', 'success');
+    const progressDiv = document.getElementById('benchmark-progress');
+    const statusText = document.getElementById('benchmark-status');
     try { 
-        const result = await fetchApi('/api/benchmark/run', { method: 'POST', body: JSON.stringify(config) }); 
-        displayBenchmarkResults(result); 
+        const submitted = await fetchApi('/api/benchmark/run', { method: 'POST', body: JSON.stringify(config) }); 
+        currentBenchmarkJob = submitted.id;
+        progressDiv.style.display = 'block';
+        renderBenchmarkProgress(submitted, progressDiv, statusText);
+        const job = await watchBenchmarkJob(submitted.id, progressDiv, statusText);
+        if (job.status === 'cancelled') showToast('测试已取消', 'error');
+        else displayBenchmarkResults(job.result || { error: job.error }); 
+        loadBenchmarkFilters();
         loadBenchmarkHistory(); 
     } catch (error) { console.error(error); }
+    finally {
+        currentBenchmarkJob = null;
+        progressDiv.style.display = 'none';
+    }
+}
+
+let currentBenchmarkJob = null;
+
+async function cancelBenchmark() {
+    if (!currentBenchmarkJob) return;
+    try { await fetchApi(`/api/benchmark/jobs/${currentBenchmarkJob}/cancel`, { method: 'POST' }); }
+    catch (error) { showToast(`取消失败: ${error.message}`, 'error'); }
+}
+
+const BENCHMARK_DONE = ['completed', 'error', 'cancelled'];
+
+function renderBenchmarkProgress(job, progressDiv, statusText) {
+    progressDiv.querySelector('.progress-fill').style.width = `${job.progress || 0}%`;
+    if (job.status === 'queued') { statusText.textContent = '排队中...'; return; }
+    const parts = [`${job.completed}/${job.total ?? '?'} 完成`];
+    if (job.failed) parts.push(`${job.failed} 失败`);
+    if (job.rolling_throughput != null) parts.push(`${job.rolling_throughput} req/s`);
+    if (job.rolling_p50_ms != null) parts.push(`p50 ${job.rolling_p50_ms.toFixed(0)} ms`);
+    if (job.rolling_p99_ms != null) parts.push(`p99 ${job.rolling_p99_ms.toFixed(0)} ms`);
+    statusText.textContent = `${parts.join(' · ')} · ${job.elapsed.toFixed(0)}s`;
+}
+
+function watchBenchmarkJob(jobId, progressDiv, statusText) {
+    // 通过 WebSocket 接收进度，连接失败时退回轮询
+    return new Promise((resolve) => {
+        const protocol = location.protocol === 'https:' ? 'wss' : 'ws';
+        const ws = new WebSocket(`${protocol}://${location.host}/ws/benchmark/${jobId}`);
+        let last = null;
+        ws.onmessage = (msg) => {
+            last = JSON.parse(msg.data);
+            renderBenchmarkProgress(last, progressDiv, statusText);
+            if (BENCHMARK_DONE.includes(last.status)) resolve(last);
+        };
+        ws.onclose = async () => {
+            if (last && BENCHMARK_DONE.includes(last.status)) return;
+            while (true) {
+                await new Promise(r => setTimeout(r, 2000));
+                try {
+                    last = await fetchApi(`/api/benchmark/jobs/${jobId}`);
+                } catch (error) {
+                    resolve({ status: 'error', error: error.message });
+                    return;
+                }
+                renderBenchmarkProgress(last, progressDiv, statusText);
+                if (BENCHMARK_DONE.includes(last.status)) { resolve(last); return; }
+            }
+        };
+    });
 }
 
 function displayBenchmarkResults(result) {
@@ -876,44 +1062,142 @@ function displayBenchmarkResults(result) {
             <div class="stat-card"><div class="stat-info"><h3>P99 Latency</h3><div>${result.p99_latency ? result.p99_latency.toFixed(2) : 'N/A'} ms</div></div></div>
         </div>
     `;
+
+    if (result.evalscope) container.innerHTML += renderEvalscopeDetails(result.evalscope);
     
-    if (result.raw_output) {
+    if (result.id && result.log_size) {
+        // 日志只在展开时加载
         container.innerHTML += `
-            <details style="margin-top:16px;">
-                <summary style="cursor:pointer; color:var(--text-secondary);">Raw Output</summary>
-                <pre class="command-preview" style="margin-top:8px;">${result.raw_output}</pre>
+            <details id="benchmark-raw-output" style="margin-top:16px;">
+                <summary style="cursor:pointer; color:var(--text-secondary);">Raw Output (${formatBytes(result.log_size)})</summary>
+                <pre class="command-preview" style="margin-top:8px;">加载中...</pre>
             </details>
         `;
+        const details = document.getElementById('benchmark-raw-output');
+        details.addEventListener('toggle', async () => {
+            if (!details.open || details.dataset.loaded) return;
+            details.dataset.loaded = '1';
+            const response = await fetch(`${API_BASE}/api/benchmark/results/${result.id}/log`);
+            details.querySelector('pre').textContent = response.ok ? await response.text() : '日志不存在';
+        });
     }
 }
 
+let historyPage = 1;
+const HISTORY_PAGE_SIZE = 20;
+
+async function loadBenchmarkFilters() {
+    try {
+        const facets = await fetchApi('/api/benchmark/results/filters');
+        const fill = (id, values, label) => {
+            const select = document.getElementById(id);
+            if (!select) return;
+            const current = select.value;
+            select.innerHTML = `<option value="">${label}</option>` +
+                values.map(v => `<option value="${escapeHtml(v)}">${escapeHtml(v)}</option>`).join('');
+            select.value = values.includes(current) ? current : '';
+        };
+        fill('history-model', facets.model, '全部模型');
+        fill('history-image', facets.image, '全部镜像');
+        fill('history-template', facets.template, '全部模板');
+        fill('history-type', facets.benchmark_type, '全部类型');
+    } catch (error) { console.error('Failed to load benchmark filters:', error); }
+}
+
+function renderEvalscopeDetails(details) {
+    // evalscope 输出目录中的逐请求分布与失败汇总
+    let html = '';
+    const dist = details.distributions;
+    if (dist) {
+        const metrics = { latency_ms: '端到端延迟 (ms)', ttft_ms: 'TTFT (ms)', tpot_ms: 'TPOT (ms)', itl_ms: 'ITL (ms)', output_tokens_per_s: '单请求输出速度 (tok/s)' };
+        const fmt = v => v == null ? 'N/A' : v.toFixed(2);
+        const rows = Object.entries(metrics).filter(([key]) => dist[key]?.count).map(([key, label]) => {
+            const d = dist[key];
+            return `<tr><td>${label}</td><td>${fmt(d.mean)}</td><td>${fmt(d.p50)}</td><td>${fmt(d.p90)}</td><td>${fmt(d.p99)}</td><td>${fmt(d.max)}</td></tr>`;
+        }).join('');
+        html += `
+            <h4 style="margin-top:16px;">请求分布 (${dist.completed} 成功 / ${dist.failed} 失败，${dist.duration}s)</h4>
+            <table class="data-table"><thead><tr><th>指标</th><th>Mean</th><th>P50</th><th>P90</th><th>P99</th><th>Max</th></tr></thead><tbody>${rows}</tbody></table>
+        `;
+    }
+    if (details.errors && details.errors.length) {
+        const items = details.errors.map(e => `
+            <details style="margin-top:8px;">
+                <summary style="cursor:pointer;"><strong>${escapeHtml(e.error_class)}</strong> × ${e.count}${e.retries ? ` (重试 ${e.retries})` : ''} · 根因 ${escapeHtml(e.root_cause)} · ${escapeHtml(e.messages[0]?.message || '')}</summary>
+                <pre class="command-preview" style="margin-top:8px;">${escapeHtml(e.example)}</pre>
+            </details>`).join('');
+        html += `<h4 style="margin-top:16px; color: var(--danger-color);">失败汇总</h4>${items}`;
+    }
+    return html;
+}
+
 async function loadBenchmarkHistory() {
     try {
-        const data = await fetchApi('/api/benchmark/results');
+        const params = new URLSearchParams({ page: historyPage, page_size: HISTORY_PAGE_SIZE });
+        const filters = { model: 'history-model', image: 'history-image', template: 'history-template', benchmark_type: 'history-type' };
+        Object.entries(filters).forEach(([key, id]) => {
+            const value = document.getElementById(id)?.value;
+            if (value) params.set(key, value);
+        });
+        const since = document.getElementById('history-since')?.value;
+        const until = document.getElementById('history-until')?.value;
+        if (since) params.set('since', since);
+        // 结束日期包含当天
+        if (until) params.set('until', new Date(new Date(until).getTime() + 86400000).toISOString().slice(0, 10));
+
+        const data = await fetchApi(`/api/benchmark/results?${params}`);
         const tbody = document.getElementById('benchmark-history');
-        document.getElementById('benchmark-count').textContent = (data || []).length;
+        document.getElementById('benchmark-count').textContent = data.total;
+        const pages = Math.max(1, Math.ceil(data.total / data.page_size));
+        document.getElementById('history-page-info').textContent = `${data.page} / ${pages}`;
+        document.getElementById('btn-history-prev').disabled = data.page <= 1;
+        document.getElementById('btn-history-next').disabled = data.page >= pages;
         tbody.innerHTML = '';
         
-        if (!data || data.length === 0) { 
-            tbody.innerHTML = '<tr><td colspan="6" class="placeholder">No records</td></tr>'; 
+        if (!data.runs.length) { 
+            tbody.innerHTML = '<tr><td colspan="8" class="placeholder">No records</td></tr>'; 
             return; 
         }
         
-        data.slice().reverse().forEach(result => {
+        data.runs.forEach(result => {
             const tr = document.createElement('tr');
             tr.innerHTML = `
+                <td><input type="checkbox" class="benchmark-select" value="${result.id}"></td>
                 <td>${new Date(result.timestamp).toLocaleString()}</td>
-                <td>${result.benchmark_type}</td>
+                <td>${result.benchmark_type}${result.template ? ` · ${escapeHtml(result.template)}` : ''}</td>
+                <td>${escapeHtml(result.model || '')}</td>
                 <td>${result.throughput ? result.throughput.toFixed(2) : 'N/A'}</td>
                 <td>${result.avg_latency ? result.avg_latency.toFixed(2) : 'N/A'}</td>
                 <td>${result.p99_latency ? result.p99_latency.toFixed(2) : 'N/A'}</td>
-                <td><button class="btn btn-secondary" data-action="view" data-result='${JSON.stringify(result)}'>View</button></td>
+                <td>
+                    <button class="btn btn-secondary" data-action="view" data-run-id="${result.id}">View</button>
+                    <button class="btn btn-danger" data-action="delete" data-run-id="${result.id}">🗑</button>
+                </td>
             `;
             tbody.appendChild(tr);
         });
     } catch (error) { console.error('Failed to load benchmark history:', error); }
 }
 
+async function compareBenchmarks() {
+    const ids = [...document.querySelectorAll('.benchmark-select:checked')].map(el => el.value);
+    if (ids.length < 2) { showToast('请至少选择两条记录', 'error'); return; }
+    try {
+        const data = await fetchApi(`/api/benchmark/compare?ids=${ids.join(',')}`);
+        const fmt = v => typeof v === 'number' ? (Number.isInteger(v) ? v : v.toFixed(2)) : 'N/A';
+        const header = data.runs.map(r => `<th>${new Date(r.timestamp).toLocaleString()}<br>${escapeHtml(r.model || '')} · ${r.benchmark_type}</th>`).join('');
+        const rows = data.metrics.map(m => `
+            <tr>
+                <td>${m.metric}${m.lower_is_better ? ' ↓' : ' ↑'}</td>
+                ${m.values.map((v, i) => `<td style="${i === m.best ? 'color: var(--success-color); font-weight: 600;' : ''}">${fmt(v)}${i > 0 && m.delta_pct[i] != null ? ` <small>(${m.delta_pct[i] > 0 ? '+' : ''}${m.delta_pct[i]}%)</small>` : ''}</td>`).join('')}
+            </tr>`).join('');
+        document.getElementById('benchmark-compare').innerHTML = `
+            <h3 style="margin-top:16px;">运行对比 (以第一条为基准)</h3>
+            <table class="data-table"><thead><tr><th>指标</th>${header}</tr></thead><tbody>${rows}</tbody></table>
+        `;
+    } catch (error) { console.error(error); }
+}
+
 function loadBenchmarkTemplates() {
     const templates = [
         {name:'Quick Test',desc:'Fast validation',type:'evalscope',parallel:1,number:5},
@@ -934,12 +1218,16 @@ function loadBenchmarkTemplates() {
     });
 }
 
+let selectedBenchmarkTemplate = null;
+
 function applyTemplate(template) {
     document.getElementById('benchmark-type').value = template.type;
+    selectedBenchmarkTemplate = template.name;
     
     const isEval = template.type === 'evalscope';
     toggleDisplay('evalscope-params', isEval);
     toggleDisplay('vllm-bench-params', !isEval);
+    toggleDisplay('native-params', template.type === 'native');
     
     if (isEval) {
         if (template.parallel) document.getElementById('eval-parallel').value = template.parallel;
@@ -964,7 +1252,8 @@ async function sendChatMessage() {
     appendChatMessage('user', message);
     chatHistory.push({ role: 'user', content: message });
     
-    const url = document.getElementById('chat-url').value;
+    const url = document.getElementById('chat-url').value.trim();
+    const routing = document.getElementById('chat-routing').value;
     const model = document.getElementById('chat-model').value;
     const temperature = parseFloat(document.getElementById('chat-temperature').value);
     const maxTokens = parseInt(document.getElementById('chat-max-tokens').value);
@@ -977,7 +1266,8 @@ async function sendChatMessage() {
                 model: model,
                 temperature: temperature,
                 max_tokens: maxTokens,
-                url: url
+                url: url || null,
+                routing: routing
             })
         });
         
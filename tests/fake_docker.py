@@ -0,0 +1,250 @@
+"""In-memory fake of the Docker Engine API on a unix socket
+
+Implements the subset of endpoints DockerAPIClient uses (ping, containers,
+exec, images) so the API backend can be exercised without a container
+runtime. Exec commands are answered by ``exec_handler``; ``drop`` names
+endpoints whose connection is closed after the request was accepted, to
+simulate transport errors on the daemon side, e.g.
+``daemon.drop.add("POST /containers/{id}/start")``.
+
+Standalone: python tests/fake_docker.py /tmp/fake-docker.sock
+then start the playground with CONTAINER_API_SOCKET=/tmp/fake-docker.sock.
+"""
+import asyncio
+import json
+import sys
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from aiohttp import web
+
+STDOUT, STDERR = 1, 2
+
+ExecHandler = Callable[[str, List[str]], Awaitable[Tuple[int, str, str]]]
+
+
+def frame(stream: int, payload: bytes) -> bytes:
+    """One frame of a multiplexed (non-TTY) attach stream"""
+    return bytes([stream, 0, 0, 0]) + len(payload).to_bytes(4, "big") + payload
+
+
+async def echo_handler(container: str, cmd: List[str]) -> Tuple[int, str, str]:
+    """Default exec handler: ``bash -c "sleep N"`` sleeps, anything else echoes the command"""
+    script = cmd[-1] if cmd else ""
+    if script.startswith("sleep "):
+        await asyncio.sleep(float(script.split()[1]))
+        return 0, "", ""
+    if script.startswith("exit "):
+        return int(script.split()[1]), "", f"exit {script.split()[1]}\n"
+    return 0, script + "\n", ""
+
+
+class FakeDockerDaemon:
+    """Docker API fake serving on ``socket_path``; usable as an async context manager"""
+
+    def __init__(self, socket_path: str, exec_handler: ExecHandler = echo_handler):
+        self.socket_path = socket_path
+        self.exec_handler = exec_handler
+        self.containers: Dict[str, Dict[str, Any]] = {}
+        self.images: Dict[str, Dict[str, Any]] = {}
+        self.execs: Dict[str, Dict[str, Any]] = {}
+        self.requests: List[Tuple[str, str]] = []
+        self.drop: Set[str] = set()
+        self._runner: Optional[web.AppRunner] = None
+
+    # ---- 生命周期 ----
+
+    async def start(self) -> None:
+        app = web.Application()
+        app.middlewares.append(self._record)
+        app.router.add_get(r"/{version:(v[\d.]+/)?}_ping", self.ping)
+        for method, path, handler in (
+            ("GET", "/containers/json", self.list_containers),
+            ("POST", "/containers/create", self.create_container),
+            ("GET", "/containers/{id}/json", self.inspect_container),
+            ("POST", "/containers/{id}/start", self.start_container),
+            ("POST", "/containers/{id}/stop", self.stop_container),
+            ("POST", "/containers/{id}/rename", self.rename_container),
+            ("DELETE", "/containers/{id}", self.remove_container),
+            ("GET", "/containers/{id}/logs", self.container_logs),
+            ("POST", "/containers/{id}/exec", self.create_exec),
+            ("POST", "/exec/{id}/start", self.start_exec),
+            ("GET", "/exec/{id}/json", self.inspect_exec),
+            ("GET", "/images/json", self.list_images),
+            ("GET", "/images/{name:.+}/json", self.inspect_image),
+        ):
+            app.router.add_route(method, path, handler)
+            app.router.add_route(method, r"/{version:v[\d.]+}" + path, handler)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        await web.UnixSite(self._runner, self.socket_path).start()
+
+    async def stop(self) -> None:
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def __aenter__(self) -> "FakeDockerDaemon":
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.stop()
+
+    def count(self, method: str, suffix: str) -> int:
+        """Number of recorded requests whose path ends with ``suffix``"""
+        return sum(1 for m, p in self.requests if m == method and p.endswith(suffix))
+
+    def add_container(self, name: str, image: str = "fake:latest", running: bool = True) -> str:
+        container_id = uuid.uuid4().hex * 2
+        self.containers[container_id] = {"Id": container_id, "Names": [f"/{name}"], "Image": image,
+                                         "State": "running" if running else "exited",
+                                         "Status": "Up" if running else "Exited (0)",
+                                         "Created": int(time.time()), "Logs": b""}
+        return container_id
+
+    # ---- 内部 ----
+
+    @web.middleware
+    async def _record(self, request: web.Request, handler):
+        self.requests.append((request.method, request.path))
+        response = await handler(request)
+        route = request.match_info.route.resource.canonical.replace("/{version}", "", 1)
+        if f"{request.method} {route}" in self.drop:
+            # 请求已处理，模拟响应前连接中断
+            request.transport.close()
+        return response
+
+    def _find(self, ref: str) -> Dict[str, Any]:
+        for container in self.containers.values():
+            if container["Id"].startswith(ref) or f"/{ref}" in container["Names"]:
+                return container
+        raise web.HTTPNotFound(text=json.dumps({"message": f"No such container: {ref}"}),
+                               content_type="application/json")
+
+    # ---- 接口 ----
+
+    async def ping(self, request: web.Request) -> web.Response:
+        return web.Response(text="OK")
+
+    async def list_containers(self, request: web.Request) -> web.Response:
+        show_all = request.query.get("all") in ("1", "true")
+        filters = json.loads(request.query.get("filters", "{}") or "{}")
+        result = []
+        for container in self.containers.values():
+            if not show_all and container["State"] != "running":
+                continue
+            names = filters.get("name")
+            if names and not any(n in container["Names"][0] for n in names):
+                continue
+            result.append({k: v for k, v in container.items() if k != "Logs"})
+        return web.json_response(result)
+
+    async def create_container(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        name = request.query.get("name", "")
+        if body.get("Image") not in self.images and self.images:
+            raise web.HTTPNotFound(text=json.dumps({"message": f"No such image: {body.get('Image')}"}),
+                                   content_type="application/json")
+        if any(f"/{name}" in c["Names"] for c in self.containers.values()):
+            raise web.HTTPConflict(text=json.dumps({"message": f"Conflict. The container name \"/{name}\" is already in use"}),
+                                   content_type="application/json")
+        container_id = self.add_container(name, body.get("Image", ""), running=False)
+        self.containers[container_id]["Config"] = body
+        return web.json_response({"Id": container_id, "Warnings": []}, status=201)
+
+    async def inspect_container(self, request: web.Request) -> web.Response:
+        container = self._find(request.match_info["id"])
+        return web.json_response({"Id": container["Id"], "Name": container["Names"][0], "Image": container["Image"],
+                                  "State": {"Status": container["State"], "Running": container["State"] == "running"}})
+
+    async def start_container(self, request: web.Request) -> web.Response:
+        container = self._find(request.match_info["id"])
+        container["State"], container["Status"] = "running", "Up"
+        return web.Response(status=204)
+
+    async def stop_container(self, request: web.Request) -> web.Response:
+        container = self._find(request.match_info["id"])
+        container["State"], container["Status"] = "exited", "Exited (0)"
+        return web.Response(status=204)
+
+    async def rename_container(self, request: web.Request) -> web.Response:
+        container = self._find(request.match_info["id"])
+        container["Names"] = [f"/{request.query['name']}"]
+        return web.Response(status=204)
+
+    async def remove_container(self, request: web.Request) -> web.Response:
+        container = self._find(request.match_info["id"])
+        del self.containers[container["Id"]]
+        return web.Response(status=204)
+
+    async def container_logs(self, request: web.Request) -> web.Response:
+        container = self._find(request.match_info["id"])
+        return web.Response(body=frame(STDOUT, container["Logs"]) if container["Logs"] else b"")
+
+    async def create_exec(self, request: web.Request) -> web.Response:
+        container = self._find(request.match_info["id"])
+        if container["State"] != "running":
+            raise web.HTTPConflict(text=json.dumps({"message": "container is not running"}),
+                                   content_type="application/json")
+        exec_id = uuid.uuid4().hex
+        self.execs[exec_id] = {"container": container["Names"][0].lstrip("/"), "cmd": (await request.json())["Cmd"],
+                               "ExitCode": None, "Running": False}
+        return web.json_response({"Id": exec_id}, status=201)
+
+    async def start_exec(self, request: web.Request) -> web.Response:
+        exec_info = self.execs.get(request.match_info["id"])
+        if exec_info is None:
+            raise web.HTTPNotFound()
+        detach = (await request.json()).get("Detach", False)
+        exec_info["Running"] = True
+
+        async def run() -> Tuple[int, str, str]:
+            try:
+                result = await self.exec_handler(exec_info["container"], exec_info["cmd"])
+            finally:
+                exec_info["Running"] = False
+            exec_info["ExitCode"] = result[0]
+            return result
+
+        if detach:
+            asyncio.ensure_future(run())
+            return web.Response(status=200)
+        exit_code, stdout, stderr = await run()
+        body = b""
+        if stdout:
+            body += frame(STDOUT, stdout.encode())
+        if stderr:
+            body += frame(STDERR, stderr.encode())
+        return web.Response(body=body, content_type="application/vnd.docker.multiplexed-stream")
+
+    async def inspect_exec(self, request: web.Request) -> web.Response:
+        exec_info = self.execs.get(request.match_info["id"])
+        if exec_info is None:
+            raise web.HTTPNotFound()
+        return web.json_response({"ExitCode": exec_info["ExitCode"], "Running": exec_info["Running"]})
+
+    async def list_images(self, request: web.Request) -> web.Response:
+        return web.json_response(list(self.images.values()))
+
+    async def inspect_image(self, request: web.Request) -> web.Response:
+        image = self.images.get(request.match_info["name"])
+        if image is None:
+            raise web.HTTPNotFound(text=json.dumps({"message": "No such image"}), content_type="application/json")
+        return web.json_response(image)
+
+
+async def _serve(socket_path: str) -> None:
+    daemon = FakeDockerDaemon(socket_path)
+    daemon.add_container("fake-ascend")
+    async with daemon:
+        print(f"Fake Docker API listening on {socket_path}")
+        await asyncio.Event().wait()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(_serve(sys.argv[1] if len(sys.argv) > 1 else "/tmp/fake-docker.sock"))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,38 @@
+"""The mock vLLM server of mock_vllm.py on a free localhost port, for in-process tests"""
+import sys
+from pathlib import Path
+from typing import Optional
+
+from aiohttp import web
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from mock_vllm import MockConfig, MockEngine, create_app  # noqa: E402
+
+
+class MockServer:
+    """Serve ``create_app(config)``; usable as an async context manager"""
+
+    def __init__(self, config: MockConfig):
+        self.config = config
+        self.app = create_app(config)
+        self.url = ""
+        self._runner: Optional[web.AppRunner] = None
+
+    @property
+    def engine(self) -> MockEngine:
+        return self.app["engine"]
+
+    async def __aenter__(self) -> "MockServer":
+        self._runner = web.AppRunner(self.app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+        host, port = self._runner.addresses[0][:2]
+        self.url = f"http://{host}:{port}"
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
@@ -0,0 +1,122 @@
+"""Autoscaler.decide: hysteresis, sustain timers, cooldowns and replica bounds on synthetic signals"""
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from autoscaler import Autoscaler, ScalingPolicy, ScalingState  # noqa: E402
+
+HIGH = {"waiting": 6.0, "running": 8.0, "kv_cache_usage": 0.5, "ttft_p95": None}
+MIDDLE = {"waiting": 1.0, "running": 4.0, "kv_cache_usage": 0.5, "ttft_p95": None}
+LOW = {"waiting": 0.0, "running": 0.5, "kv_cache_usage": 0.1, "ttft_p95": None}
+
+
+def _policy(**overrides) -> ScalingPolicy:
+    return ScalingPolicy(**{"model": "m", "min_replicas": 1, "max_replicas": 3, "up_sustain": 30.0,
+                            "down_sustain": 300.0, "up_cooldown": 180.0, "down_cooldown": 300.0, **overrides})
+
+
+@pytest.fixture
+def scaler() -> Autoscaler:
+    return Autoscaler(SimpleNamespace(services={}), None, None, None, {})
+
+
+def _feed(scaler, policy, state, replicas, signals, start, end, step=10.0, starting=0):
+    """Call decide every ``step`` seconds in [start, end]; return (time, decision) of the non-empty ones"""
+    decisions = []
+    t = start
+    while t <= end:
+        decision = scaler.decide(policy, state, replicas, starting, signals, t)
+        if decision:
+            decisions.append((t, decision))
+        t += step
+    return decisions
+
+
+def test_scale_up_after_sustain(scaler):
+    policy, state = _policy(), ScalingState()
+    # 起点 1000: 冷却计时从 0 开始，已过
+    assert _feed(scaler, policy, state, 1, HIGH, 1000, 1020) == []
+    assert scaler.decide(policy, state, 1, 0, HIGH, 1030) == "up"
+    # 持续时间被中断后重新计时
+    state = ScalingState()
+    _feed(scaler, policy, state, 1, HIGH, 1000, 1020)
+    assert scaler.decide(policy, state, 1, 0, MIDDLE, 1025) == ""
+    assert state.high_since is None
+    assert _feed(scaler, policy, state, 1, HIGH, 1030, 1050) == []
+    assert scaler.decide(policy, state, 1, 0, HIGH, 1060) == "up"
+
+
+def test_hysteresis_band(scaler):
+    """Between the down and up thresholds nothing happens, however long it lasts"""
+    policy, state = _policy(), ScalingState()
+    assert _feed(scaler, policy, state, 2, MIDDLE, 1000, 5000) == []
+    assert state.high_since is None and state.low_since is None
+
+
+def test_kv_cache_and_ttft_signals(scaler):
+    policy = _policy(up_sustain=0.0, up_ttft_p95=2.0)
+    assert scaler.decide(policy, ScalingState(), 1, 0, {**MIDDLE, "kv_cache_usage": 0.95}, 1000) == "up"
+    assert scaler.decide(policy, ScalingState(), 1, 0, {**MIDDLE, "ttft_p95": 2.5}, 1000) == "up"
+    assert scaler.decide(_policy(up_sustain=0.0), ScalingState(), 1, 0, {**MIDDLE, "ttft_p95": 2.5}, 1000) == ""
+
+
+def test_scale_down_after_sustain(scaler):
+    policy, state = _policy(), ScalingState()
+    # 所有缩容信号同时满足才计时
+    assert _feed(scaler, policy, state, 2, {**LOW, "running": 2.0}, 1000, 2000) == []
+    assert _feed(scaler, policy, state, 2, LOW, 2000, 2290) == []
+    assert scaler.decide(policy, state, 2, 0, LOW, 2300) == "down"
+
+
+def test_cooldowns(scaler):
+    policy, state = _policy(), ScalingState(last_scale_up=1000.0)
+    # 扩容冷却内不再扩容
+    assert _feed(scaler, policy, state, 1, HIGH, 1010, 1170) == []
+    assert scaler.decide(policy, state, 1, 0, HIGH, 1180) == "up"
+
+    # 扩容冷却内也不缩容，缩容冷却内不缩容
+    state = ScalingState(last_scale_up=1000.0, last_scale_down=1100.0)
+    decisions = _feed(scaler, policy, state, 2, LOW, 1000, 2000)
+    assert decisions[0] == (1400.0, "down")
+    state = ScalingState(last_scale_down=2000.0)
+    assert _feed(scaler, policy, state, 2, LOW, 2000, 2290) == []
+    assert scaler.decide(policy, state, 2, 0, LOW, 2300) == "down"
+
+
+def test_starting_replica_blocks_scale_up(scaler):
+    policy, state = _policy(up_sustain=0.0), ScalingState()
+    assert scaler.decide(policy, state, 2, 1, HIGH, 1000) == ""
+    assert scaler.decide(policy, state, 2, 0, HIGH, 1010) == "up"
+
+
+def test_replica_bounds(scaler):
+    policy = _policy(up_sustain=0.0, down_sustain=0.0)
+    # 上下限内不越界
+    assert scaler.decide(policy, ScalingState(), 3, 0, HIGH, 1000) == ""
+    assert scaler.decide(policy, ScalingState(), 1, 0, LOW, 1000) == ""
+    # 低于下限或高于上限时直接调整 (仍受冷却和启动中副本限制)，不需要指标
+    assert scaler.decide(policy, ScalingState(), 0, 0, None, 1000) == "up"
+    assert scaler.decide(policy, ScalingState(), 0, 1, None, 1000) == ""
+    assert scaler.decide(policy, ScalingState(last_scale_up=990.0), 0, 0, None, 1000) == ""
+    assert scaler.decide(policy, ScalingState(), 4, 0, None, 1000) == "down"
+    assert scaler.decide(policy, ScalingState(last_scale_down=990.0), 4, 0, None, 1000) == ""
+
+
+def test_missing_signals_reset_timers(scaler):
+    policy, state = _policy(), ScalingState()
+    _feed(scaler, policy, state, 1, HIGH, 1000, 1020)
+    assert state.high_since == 1000
+    assert scaler.decide(policy, state, 1, 0, None, 1030) == ""
+    assert state.high_since is None
+
+
+def test_policy_validation():
+    with pytest.raises(ValueError):
+        ScalingPolicy.from_dict("m", {"min_replicas": 3, "max_replicas": 2})
+    with pytest.raises(ValueError):
+        ScalingPolicy.from_dict("m", {"up_waiting": 1.0, "down_waiting": 1.0})
+    assert ScalingPolicy.from_dict("m", {"max_replicas": 2, "unknown": 1}).max_replicas == 2
@@ -0,0 +1,120 @@
+"""DockerAPIClient and the API backend of AscendContainerManager against the fake daemon"""
+import asyncio
+import os
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from container_manager import API_CONNECT_ERRORS, AscendContainerManager  # noqa: E402
+from docker_api import DockerAPIClient  # noqa: E402
+from fake_docker import FakeDockerDaemon  # noqa: E402
+
+
+@pytest.fixture
+def socket_path(tmp_path):
+    return str(tmp_path / "docker.sock")
+
+
+def _manager(socket_path, monkeypatch, timeout=30.0):
+    monkeypatch.setenv("CONTAINER_API_SOCKET", socket_path)
+    monkeypatch.setenv("CONTAINER_BACKEND", "api")
+    manager = AscendContainerManager()
+    manager.api.timeout = timeout
+    # CLI 回退若被触发会在这里失败
+    manager.runtime = "false"
+    return manager
+
+
+def test_container_round_trip(socket_path):
+    async def run():
+        async with FakeDockerDaemon(socket_path) as daemon:
+            daemon.add_container("vllm-a")
+            client = DockerAPIClient(socket_path)
+            try:
+                assert await client.ping()
+                containers = await client.list_containers()
+                assert [c["Names"] for c in containers] == [["/vllm-a"]]
+                assert await client.exec("vllm-a", ["bash", "-c", "echo hi"]) == (0, "echo hi\n", "")
+                assert await client.exec("vllm-a", ["bash", "-c", "exit 3"]) == (3, "", "exit 3\n")
+                await client.rename_container("vllm-a", "vllm-b")
+                await client.stop_container("vllm-b")
+                assert (await client.inspect_container("vllm-b"))["State"]["Running"] is False
+            finally:
+                await client.close()
+
+    asyncio.run(run())
+
+
+def test_exec_outlives_request_timeout(socket_path):
+    """A long exec is bounded only by the caller, not by the client's per-request timeout"""
+    async def run():
+        async with FakeDockerDaemon(socket_path) as daemon:
+            daemon.add_container("warm")
+            client = DockerAPIClient(socket_path, timeout=0.2)
+            try:
+                assert await client.exec("warm", ["bash", "-c", "sleep 0.5"]) == (0, "", "")
+                with pytest.raises(asyncio.TimeoutError):
+                    await client.exec("warm", ["bash", "-c", "sleep 5"], timeout=0.3)
+            finally:
+                await client.close()
+
+    asyncio.run(run())
+
+
+def test_exec_command_runs_once(socket_path, monkeypatch):
+    """exec_command does not re-run a slow command through the CLI"""
+    async def run():
+        async with FakeDockerDaemon(socket_path) as daemon:
+            daemon.add_container("warm")
+            manager = _manager(socket_path, monkeypatch, timeout=0.2)
+            try:
+                assert await manager.exec_command("warm", "sleep 0.5") == ""
+                assert daemon.count("POST", "/start") == 1
+                daemon.drop.add("POST /exec/{id}/start")
+                with pytest.raises(Exception):
+                    await manager.exec_command("warm", "echo once")
+                assert daemon.count("POST", "/start") == 2
+            finally:
+                await manager.api.close()
+
+    asyncio.run(run())
+
+
+def test_create_container_start_failure_does_not_fall_back(socket_path, monkeypatch):
+    """A container created over the API but not started is removed, not re-created via the CLI"""
+    async def run():
+        async with FakeDockerDaemon(socket_path) as daemon:
+            manager = _manager(socket_path, monkeypatch)
+            daemon.drop.add("POST /containers/{id}/start")
+            config = SimpleNamespace(container_name="new", image="fake:latest", npu_devices=[0],
+                                     shm_size="1g", mount_paths={})
+            try:
+                with pytest.raises(Exception):
+                    await manager.create_container(config)
+                assert daemon.count("POST", "/containers/create") == 1
+                assert daemon.containers == {}
+                daemon.drop.clear()
+                container_id = await manager.create_container(config)
+                assert daemon.containers[container_id]["State"] == "running"
+            finally:
+                await manager.api.close()
+
+    asyncio.run(run())
+
+
+def test_unreachable_socket_is_a_connect_error(socket_path):
+    async def run():
+        client = DockerAPIClient(socket_path)
+        try:
+            with pytest.raises(API_CONNECT_ERRORS):
+                await client.exec("any", ["true"])
+        finally:
+            await client.close()
+
+    assert not os.path.exists(socket_path)
+    asyncio.run(run())
@@ -0,0 +1,156 @@
+"""Gateway replica selection, ejection and backoff"""
+import asyncio
+import json
+import socket
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import gateway as gateway_module  # noqa: E402
+from gateway import Gateway, GatewayError  # noqa: E402
+from mock_server import MockServer  # noqa: E402
+from mock_vllm import MockConfig  # noqa: E402
+
+
+def _gateway(*services) -> Gateway:
+    manager = SimpleNamespace(services={s.id: s for s in services})
+    return Gateway(manager)
+
+
+def _service(service_id: str, port: int, model: str = "m", status: str = "running"):
+    return SimpleNamespace(id=service_id, port=port, model=f"/models/{model}", served_model_name=model, status=status)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Fake monotonic clock of the gateway module (patches time.monotonic, so not under an event loop)"""
+    now = [1000.0]
+    monkeypatch.setattr(gateway_module.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_replicas_of_running_services():
+    gw = _gateway(_service("a", 8001), _service("b", 8002, status="starting"), _service("c", 8003, model="other"),
+                  _service("d", 8004, status="draining"))
+    assert [u.service_id for u in gw.replicas("m")] == ["a"]
+    assert [u.service_id for u in gw.replicas("/models/other")] == ["c"]
+    assert gw.pick("missing") is None
+
+
+def test_pick_least_outstanding():
+    gw = _gateway(_service("a", 8001), _service("b", 8002), _service("c", 8003))
+    upstreams = {u.service_id: u for u in gw.replicas("m")}
+    upstreams["a"].outstanding, upstreams["b"].outstanding, upstreams["c"].outstanding = 3, 1, 1
+    picked = {gw.pick("m").service_id for _ in range(50)}
+    # 相同时随机
+    assert picked == {"b", "c"}
+    assert gw.pick("m", exclude={"b", "c"}).service_id == "a"
+    assert gw.pick("m", exclude={"a", "b", "c"}) is None
+
+
+def test_pick_round_robin():
+    gw = _gateway(_service("b", 8002), _service("a", 8001), _service("c", 8003))
+    assert [gw.pick("m", mode="round_robin").service_id for _ in range(6)] == ["b", "c", "a", "b", "c", "a"]
+
+
+def test_ejection_backoff(clock):
+    gw = _gateway(_service("a", 8001), _service("b", 8002))
+    a, b = gw.replicas("m")
+    for _ in range(Gateway.EJECT_AFTER - 1):
+        gw._record(a, False)
+    assert not a.ejected and a.failures == Gateway.EJECT_AFTER - 1
+    gw._record(a, False)
+    assert a.ejected and a.ejections == 1 and a.failures == 0
+    b.outstanding = 5
+    assert {gw.pick("m").service_id for _ in range(10)} == {"b"}
+
+    # 被摘除的副本在到期后恢复
+    clock[0] += Gateway.EJECT_SECONDS
+    assert not a.ejected and gw.pick("m").service_id == "a"
+
+    # 再次摘除时间加倍，直到上限
+    durations = []
+    for _ in range(6):
+        for _ in range(Gateway.EJECT_AFTER):
+            gw._record(a, False)
+        durations.append(a.ejected_until - clock[0])
+        clock[0] = a.ejected_until
+    assert durations == [20.0, 40.0, 80.0, 120.0, 120.0, 120.0]
+
+    # 一次成功清零
+    gw._record(a, True)
+    assert a.failures == 0 and a.ejections == 0
+
+
+def test_all_ejected_are_still_tried(clock):
+    gw = _gateway(_service("a", 8001), _service("b", 8002))
+    for upstream in gw.replicas("m"):
+        for _ in range(Gateway.EJECT_AFTER):
+            gw._record(upstream, False)
+        assert upstream.ejected
+    assert gw.pick("m") is not None
+
+
+def test_send_retries_another_replica():
+    """A connection error moves the request to another replica and counts as a failure"""
+    with socket.socket() as sock:
+        # 已关闭的端口: 连接被拒绝
+        sock.bind(("127.0.0.1", 0))
+        closed_port = sock.getsockname()[1]
+
+    async def run():
+        async with MockServer(MockConfig(model="m", decode_tps=1000.0)) as server:
+            gw = _gateway(_service("a", closed_port), _service("b", int(server.url.rsplit(":", 1)[1])))
+            a, b = gw.replicas("m")
+            b.outstanding = 1  # 先选中 a
+            try:
+                upstream, response, _, mode = await gw.send(
+                    "/v1/completions", {"model": "m", "prompt": "hi", "max_tokens": 2})
+                body = b"".join([chunk async for chunk in gw.relay(upstream, response, 0.0, mode)])
+                with pytest.raises(GatewayError) as error:
+                    await gw.send("/v1/completions", {"model": "missing", "prompt": "hi"})
+                return a, b, upstream, json.loads(body), error.value
+            finally:
+                await gw.close()
+
+    a, b, upstream, body, error = asyncio.run(run())
+    assert upstream is b and body["usage"]["completion_tokens"] == 2
+    assert a.failures == 1 and a.outstanding == 0 and a.requests == 1
+    assert b.outstanding == 1 and b.requests == 1
+    assert error.status == 404
+
+
+@pytest.mark.parametrize("spec_version", ["2.3", "2.4"])
+def test_client_disconnect_before_body_releases_slot(spec_version):
+    """The outstanding slot is freed and the upstream response closed even if the body never starts"""
+    async def run():
+        async with MockServer(MockConfig(model="m", decode_tps=1000.0)) as server:
+            gw = _gateway(_service("b", int(server.url.rsplit(":", 1)[1])))
+            try:
+                upstream, response, started, mode = await gw.send(
+                    "/v1/completions", {"model": "m", "prompt": "hi", "max_tokens": 2, "stream": True})
+                assert upstream.outstanding == 1
+                client_response = gw.streaming_response(upstream, response, started, mode)
+
+                async def receive():
+                    return {"type": "http.disconnect"}
+
+                async def send(message):
+                    raise OSError("client went away")
+
+                scope = {"type": "http", "asgi": {"spec_version": spec_version}}
+                with pytest.raises(Exception):
+                    await client_response(scope, receive, send)
+                # 重复释放无副作用
+                await gw.release(upstream, response)
+                return upstream, response
+            finally:
+                await gw.close()
+
+    upstream, response = asyncio.run(run())
+    assert upstream.outstanding == 0 and response.is_closed
@@ -0,0 +1,136 @@
+"""LoadGenerator against the in-process mock vLLM server"""
+import asyncio
+import math
+import random
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from load_generator import ARRIVALS, LoadGenerator, LoadSpec, arrival_offsets, percentiles  # noqa: E402
+from mock_server import MockServer  # noqa: E402
+from mock_vllm import MockConfig  # noqa: E402
+
+
+def _config(**overrides) -> MockConfig:
+    # 快速的计时模型，每个请求几十毫秒
+    return MockConfig(**{"prefill_ms_per_token": 0.01, "decode_tps": 400.0, "seed": 1, **overrides})
+
+
+def _spec(server: MockServer, **overrides) -> LoadSpec:
+    return LoadSpec(**{"url": f"{server.url}/v1/chat/completions", "model": "mock-model", "num_requests": 8,
+                       "request_rate": 200.0, "input_len": 16, "output_len": 8, "seed": 1, "timeout": 30.0,
+                       **overrides})
+
+
+def _run(config: MockConfig, **overrides):
+    async def run():
+        async with MockServer(config) as server:
+            generator = LoadGenerator(_spec(server, **overrides))
+            return generator, await generator.run()
+
+    return asyncio.run(run())
+
+
+def test_arrival_offsets():
+    rng = random.Random(0)
+    constant = arrival_offsets(LoadSpec(url="", model="", num_requests=4, request_rate=2.0, arrival="constant"), rng)
+    assert list(constant) == [0.0, 0.5, 1.0, 1.5]
+    burst = arrival_offsets(LoadSpec(url="", model="", num_requests=5, request_rate=2.0, arrival="burst",
+                                     burst_size=2), rng)
+    assert list(burst) == [0.0, 0.0, 1.0, 1.0, 2.0]
+    poisson = arrival_offsets(LoadSpec(url="", model="", num_requests=2000, request_rate=4.0), rng)
+    gaps = [b - a for a, b in zip(poisson, poisson[1:])]
+    assert poisson[0] == 0.0 and min(gaps) >= 0
+    assert sum(gaps) / len(gaps) == pytest.approx(0.25, rel=0.1)
+    assert list(arrival_offsets(LoadSpec(url="", model="", num_requests=3, request_rate=0), rng)) == [0.0] * 3
+    with pytest.raises(ValueError):
+        arrival_offsets(LoadSpec(url="", model="", num_requests=1, arrival="uniform"), rng)
+
+
+@pytest.mark.parametrize("arrival", ARRIVALS)
+def test_run_against_mock(arrival):
+    generator, summary = _run(_config(), arrival=arrival, burst_size=4)
+    assert summary["completed"] == 8 and summary["failed"] == 0, summary["errors"]
+    assert summary["total_output_tokens"] == 8 * 8
+    assert summary["total_input_tokens"] > 0
+    assert summary["p50_ttft_ms"] > 0 and summary["p99_e2el_ms"] >= summary["p50_e2el_ms"]
+    assert summary["mean_itl_ms"] > 0 and summary["mean_tpot_ms"] > 0
+    # 每个请求 8 个 token: 7 个 token 间隔
+    assert len(generator.samples.itl) == 8 * 7
+    assert sorted(generator.finished) == list(range(8))
+    assert all(not math.isnan(t) for t in generator.samples.sent)
+
+
+def test_completions_endpoint():
+    async def run():
+        async with MockServer(_config()) as server:
+            return await LoadGenerator(_spec(server, url=f"{server.url}/v1/completions", num_requests=3)).run()
+
+    summary = asyncio.run(run())
+    assert summary["completed"] == 3 and summary["total_output_tokens"] == 3 * 8
+
+
+@pytest.mark.parametrize("max_concurrency, bound", [(2, 2), (None, 8)])
+def test_max_concurrency(max_concurrency, bound):
+    async def run():
+        async with MockServer(_config(decode_tps=100.0)) as server:
+            peak = 0
+
+            async def watch():
+                nonlocal peak
+                while True:
+                    peak = max(peak, server.engine.running + server.engine.waiting)
+                    await asyncio.sleep(0.002)
+
+            watcher = asyncio.create_task(watch())
+            summary = await LoadGenerator(_spec(server, request_rate=0, max_concurrency=max_concurrency)).run()
+            watcher.cancel()
+            return summary, peak
+
+    summary, peak = asyncio.run(run())
+    assert summary["completed"] == 8
+    if max_concurrency:
+        assert peak <= bound
+    else:
+        assert peak == bound
+
+
+def test_injected_errors():
+    generator, summary = _run(_config(error_rate=1.0))
+    assert summary["completed"] == 0 and summary["failed"] == 8
+    assert generator.failed == 8
+    assert all(error.startswith("RuntimeError: HTTP 500") for error in summary["errors"])
+    assert summary["p50_ttft_ms"] is None and summary["request_throughput"] == 0
+
+
+def test_injected_aborts():
+    generator, summary = _run(_config(abort_rate=1.0))
+    assert summary["completed"] == 0 and summary["failed"] == 8
+    # 中途断开的请求已收到首 token，但不计入成功请求的延迟统计
+    assert all(not math.isnan(t) for t in generator.samples.ttft)
+    assert summary["p50_ttft_ms"] is None and summary["total_output_tokens"] == 0
+
+
+def test_partial_failures():
+    generator, summary = _run(_config(error_rate=0.5, seed=3), num_requests=16)
+    assert summary["completed"] + summary["failed"] == 16
+    assert 0 < summary["failed"] < 16
+    assert summary["total_output_tokens"] == summary["completed"] * 8
+    assert generator.progress()["completed"] == summary["completed"]
+
+
+def test_percentiles():
+    stats = percentiles([4.0, 1.0, 3.0, 2.0])
+    assert stats["mean"] == 2.5 and stats["median"] == 2.5
+    # numpy 默认 (linear): 位置 q / 100 * (n - 1)
+    assert stats["p90"] == pytest.approx(3.7)
+    assert stats["p95"] == pytest.approx(3.85)
+    assert stats["p99"] == pytest.approx(3.97)
+    assert stats["p50"] == 2.5
+    assert percentiles([5.0]) == {"mean": 5.0, "median": 5.0, "p50": 5.0, "p90": 5.0, "p95": 5.0, "p99": 5.0}
+    assert percentiles([1.0, math.nan, 3.0], (25,)) == {"mean": 2.0, "median": 2.0, "p25": 1.5}
+    assert set(percentiles([]).values()) == {None}
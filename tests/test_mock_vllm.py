@@ -0,0 +1,140 @@
+"""The mock vLLM server: KV cache queueing, fault injection, /metrics and the command line"""
+import asyncio
+import json
+import sys
+from pathlib import Path
+
+import httpx
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from mock_server import MockServer  # noqa: E402
+from mock_vllm import MockConfig, parse_args  # noqa: E402
+
+
+def _config(**overrides) -> MockConfig:
+    return MockConfig(**{"prefill_ms_per_token": 0.01, "decode_tps": 200.0, "seed": 1, **overrides})
+
+
+def _body(max_tokens: int = 8, stream: bool = True, **extra):
+    # 40 个字符约 10 个 token (CHARS_PER_TOKEN)
+    return {"model": "mock-model", "messages": [{"role": "user", "content": "x" * 40}], "max_tokens": max_tokens,
+            "stream": stream, **extra}
+
+
+async def _stream(http: httpx.AsyncClient, url: str, body) -> list:
+    """Data lines of a streamed completion"""
+    events = []
+    async with http.stream("POST", f"{url}/v1/chat/completions", json=body) as response:
+        assert response.status_code == 200
+        async for line in response.aiter_lines():
+            if line.startswith("data: "):
+                events.append(line[6:])
+    return events
+
+
+def _samples(text: str) -> dict:
+    """Prometheus text as {series (with labels): value}"""
+    return {line.rsplit(" ", 1)[0]: float(line.rsplit(" ", 1)[1])
+            for line in text.splitlines() if line and not line.startswith("#")}
+
+
+def test_kv_cache_queueing():
+    """Requests beyond the KV cache capacity wait, counted in num_requests_waiting, and run in order"""
+    async def run():
+        # 每个请求预留 10 + 20 个 token，容量只够一个
+        async with MockServer(_config(kv_cache_tokens=40, max_model_len=40)) as server, \
+                httpx.AsyncClient(timeout=10) as http:
+            tasks = [asyncio.create_task(_stream(http, server.url, _body(20))) for _ in range(3)]
+            waiting = []
+            while not all(t.done() for t in tasks):
+                metrics = _samples((await http.get(f"{server.url}/metrics")).text)
+                waiting.append(metrics['vllm:num_requests_waiting{engine="0",model_name="mock-model"}'])
+                await asyncio.sleep(0.01)
+            results = await asyncio.gather(*tasks)
+            too_long = await http.post(f"{server.url}/v1/chat/completions", json=_body(31))
+            return server.engine, waiting, results, too_long
+
+    engine, waiting, results, too_long = asyncio.run(run())
+    assert max(waiting) == 2.0
+    assert all(events[-1] == "[DONE]" for events in results)
+    assert engine.waiting == 0 and engine.running == 0 and engine.kv_used == 0
+    # 超过容量的请求直接拒绝，而不是永远排队
+    assert too_long.status_code == 400
+
+
+def test_error_rate():
+    async def run():
+        async with MockServer(_config(error_rate=1.0)) as server, httpx.AsyncClient(timeout=10) as http:
+            return await http.post(f"{server.url}/v1/chat/completions", json=_body())
+
+    response = asyncio.run(run())
+    assert response.status_code == 500
+    assert response.json()["type"] == "InternalServerError"
+
+
+def test_abort_rate():
+    """Aborted streams close the connection halfway, without a finish chunk or [DONE]"""
+    async def run():
+        async with MockServer(_config(abort_rate=1.0)) as server, httpx.AsyncClient(timeout=10) as http:
+            chunks = []
+            with pytest.raises(httpx.HTTPError):
+                async with http.stream("POST", f"{server.url}/v1/chat/completions", json=_body(8)) as response:
+                    async for line in response.aiter_lines():
+                        if line.startswith("data: "):
+                            chunks.append(json.loads(line[6:]))
+            # 中断后 KV cache 预留已释放
+            await asyncio.sleep(0.05)
+            return chunks, server.engine
+
+    chunks, engine = asyncio.run(run())
+    content = [c for c in chunks if c["choices"][0]["delta"].get("content")]
+    assert len(content) == 4
+    assert all(c["choices"][0]["finish_reason"] is None for c in chunks)
+    assert engine.running == 0 and engine.kv_used == 0
+
+
+def test_metrics_output():
+    async def run():
+        async with MockServer(_config(served_model_name="served")) as server, httpx.AsyncClient(timeout=10) as http:
+            body = _body(5, stream=False, model="served")
+            for _ in range(2):
+                assert (await http.post(f"{server.url}/v1/chat/completions", json=body)).status_code == 200
+            return (await http.get(f"{server.url}/metrics")).text
+
+    text = asyncio.run(run())
+    labels = 'engine="0",model_name="served"'
+    samples = _samples(text)
+    assert samples[f"vllm:num_requests_running{{{labels}}}"] == 0.0
+    assert samples[f"vllm:kv_cache_usage_perc{{{labels}}}"] == 0.0
+    assert samples[f"vllm:request_success_total{{{labels}}}"] == 2.0
+    assert samples[f"vllm:generation_tokens_total{{{labels}}}"] == 10.0
+    assert samples[f"vllm:prompt_tokens_total{{{labels}}}"] > 0
+    assert samples[f"vllm:num_preemptions_total{{{labels}}}"] == 0.0
+    assert "# TYPE vllm:time_to_first_token_seconds histogram" in text
+    # 直方图桶累计、+Inf 桶等于 _count
+    for name, count in (("time_to_first_token_seconds", 2), ("inter_token_latency_seconds", 8),
+                        ("e2e_request_latency_seconds", 2)):
+        buckets = [v for k, v in samples.items() if k.startswith(f"vllm:{name}_bucket{{")]
+        assert buckets == sorted(buckets)
+        assert buckets[-1] == samples[f"vllm:{name}_count{{{labels}}}"] == count
+        assert samples[f'vllm:{name}_bucket{{le="+Inf",{labels}}}'] == count
+        assert samples[f"vllm:{name}_sum{{{labels}}}"] > 0
+
+
+def test_parse_args():
+    args = parse_args(["serve", "Qwen/Qwen3-8B", "--served-model-name", "qwen", "--port", "8001",
+                       "--tensor-parallel-size", "2", "--enforce-eager", "--mock-decode-tps", "25",
+                       "--mock-kv-cache-tokens", "4096", "--mock-seed", "7"])
+    assert args.model == "Qwen/Qwen3-8B" and args.served_model_name == ["qwen"] and args.port == 8001
+    assert args.decode_tps == 25.0 and args.kv_cache_tokens == 4096 and args.seed == 7
+    assert args.error_rate == 0.0 and args.max_model_len == MockConfig.max_model_len
+    assert parse_args(["serve"]).model == MockConfig.model
+
+
+@pytest.mark.parametrize("argv", [["Qwen/Qwen3-8B", "--port", "8001"], []])
+def test_parse_args_requires_serve(argv):
+    with pytest.raises(SystemExit):
+        parse_args(argv)
@@ -0,0 +1,58 @@
+"""Golden tests: npu-smi info outputs of 910B, 910C and 310P boards and their parses
+
+Each ``fixtures/npu_smi/<board>_<devices>.txt`` has the expected
+``parse_npu_smi`` result (dataclasses as dicts) next to it in ``.json``.
+"""
+import json
+import sys
+from dataclasses import asdict
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from npu_smi import parse_npu_smi  # noqa: E402
+
+FIXTURES = Path(__file__).resolve().parent / "fixtures" / "npu_smi"
+
+
+def _load(name: str):
+    return parse_npu_smi((FIXTURES / f"{name}.txt").read_text())
+
+
+@pytest.mark.parametrize("name", sorted(p.stem for p in FIXTURES.glob("*.txt")))
+def test_golden(name):
+    expected = json.loads((FIXTURES / f"{name}.json").read_text())
+    assert asdict(_load(name)) == expected
+
+
+@pytest.mark.parametrize("name, devices", [("910b_8", 8), ("910b_16", 16), ("910c_16", 16),
+                                           ("310p_8", 8), ("310p_16", 16)])
+def test_one_chip_per_device(name, devices):
+    info = _load(name)
+    assert [c.device_id for c in info.chips] == list(range(devices))
+    assert len({c.bus_id for c in info.chips}) == (devices if name.startswith("910") else devices // 2)
+
+
+def test_910c_second_chip_keeps_npu_row():
+    """Both chips under one NPU row of an A3 board are parsed with that row's values"""
+    chips = _load("910c_16").chips
+    assert [(c.npu_id, c.chip_id) for c in chips[:4]] == [(0, 0), (0, 1), (1, 0), (1, 1)]
+    assert chips[3].power == chips[2].power == 172.5
+    assert chips[3].hbm_used == 62191
+
+
+def test_processes_map_to_devices():
+    assert [(p.pid, p.device_id) for p in _load("910c_16").processes] == [
+        (3001220, 2), (3001221, 3), (3001222, 4), (3001223, 5)]
+    assert [(p.pid, p.device_id) for p in _load("310p_8").processes] == [(44012, 0), (44013, 1)]
+    by_device = _load("910b_8").processes_by_device()
+    assert sorted(by_device) == [0, 1, 2, 3]
+    assert [p.pid for p in by_device[0]] == [1845397, 1845311]
+
+
+def test_310p_memory_without_hbm_column():
+    chip = _load("310p_8").chips[1]
+    assert (chip.memory_used, chip.memory_total) == (chip.hbm_used, chip.hbm_total) == (19205, 43693)
+    assert chip.power == 0  # NA
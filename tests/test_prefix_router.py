@@ -0,0 +1,90 @@
+"""PrefixRouter: block hashes, longest prefix within the load bound, consistent hash ring fallback"""
+import math
+import random
+import sys
+from collections import Counter
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from prefix_router import CHARS_PER_TOKEN, PrefixRouter  # noqa: E402
+
+BLOCK = 4 * CHARS_PER_TOKEN  # block_tokens=4 时一个块的字符数
+
+
+def _router(**kwargs) -> PrefixRouter:
+    return PrefixRouter(block_tokens=4, **kwargs)
+
+
+def _prompt(seed: int, blocks: int) -> str:
+    rng = random.Random(seed)
+    return "".join(rng.choice("abcdefgh") for _ in range(blocks * BLOCK))
+
+
+def test_block_hashes():
+    router = _router(max_blocks=3)
+    system = _prompt(0, 2)
+    hashes = router.block_hashes(system)
+    assert len(hashes) == 2 and len(set(hashes)) == 2
+    # 同一前缀的后续对话保留前面块的哈希，不足一个块的尾部不计
+    assert router.block_hashes(system + "x" * (BLOCK + 3))[:2] == hashes
+    assert len(router.block_hashes(system + "x" * (BLOCK + 3))) == 3
+    assert router.block_hashes(_prompt(1, 10))[:1] != hashes[:1]
+    assert router.block_hashes("x" * (BLOCK - 1)) == []
+    assert len(router.block_hashes(_prompt(2, 10))) == 3
+
+
+def test_choose_longest_prefix():
+    router = _router()
+    hashes = router.block_hashes(_prompt(0, 4))
+    router.record(hashes[:1], "a")
+    router.record(hashes[:3], "b")
+    assert router.matched_blocks(hashes, "a") == 1 and router.matched_blocks(hashes, "b") == 3
+    assert router.choose(hashes, {"a": 0, "b": 0, "c": 0}) == "b"
+    # 负载在上限内时仍按前缀选择: 总数 3，上限 ceil(1.25 * 4 / 3) = 2
+    assert router.choose(hashes, {"a": 1, "b": 1, "c": 1}) == "b"
+
+
+def test_choose_load_bound():
+    """A replica at ceil(load_factor * (total + 1) / replicas) is skipped despite holding the prefix"""
+    router = _router(load_factor=1.25)
+    hashes = router.block_hashes(_prompt(0, 4))
+    router.record(hashes, "b")
+    router.record(hashes[:2], "a")
+    # 总数 3: 上限 ceil(1.25 * 4 / 3) = 2
+    assert router.choose(hashes, {"a": 0, "b": 2, "c": 1}) == "a"
+    # 前缀持有者都超限时走哈希环，跳过超限副本: 总数 6，上限 ceil(1.25 * 7 / 3) = 3
+    assert router.choose(hashes, {"a": 3, "b": 3, "c": 0}) == "c"
+    # 全部达到上限 (load_factor < 1) 时选负载最低的
+    strict = _router(load_factor=0.5)
+    assert strict.choose(hashes, {"a": 3, "b": 1, "c": 2}) == "b"
+
+
+def test_ring_fallback_is_consistent():
+    """New prefixes spread over the ring; adding a replica moves only about its share of them"""
+    router = _router()
+    prompts = [router.block_hashes(_prompt(seed, 1)) for seed in range(600)]
+    three = {"a": 0, "b": 0, "c": 0}
+    placed = [router.choose(hashes, three) for hashes in prompts]
+    assert placed == [router.choose(hashes, three) for hashes in prompts]
+    counts = Counter(placed)
+    assert set(counts) == set(three) and min(counts.values()) > 100
+
+    moved = [old for hashes, old in zip(prompts, placed) if router.choose(hashes, {**three, "d": 0}) != old]
+    assert 60 < len(moved) < 300
+    # 移动的前缀都去了新副本
+    assert all(router.choose(hashes, {**three, "d": 0}) in (old, "d") for hashes, old in zip(prompts, placed))
+
+
+def test_hot_prefix_spills_over():
+    """One hot system prompt is spread over the replicas as their outstanding requests grow"""
+    router = _router()
+    hashes = router.block_hashes(_prompt(0, 2))
+    load = {"a": 0, "b": 0, "c": 0, "d": 0}
+    for _ in range(40):
+        replica = router.choose(hashes, load)
+        router.record(hashes, replica)
+        load[replica] += 1
+    # 每次选择时副本负载都低于当时的上限，最终不超过 ceil(1.25 * 40 / 4)
+    assert max(load.values()) <= math.ceil(1.25 * 40 / 4)
+    assert sum(1 for n in load.values() if n) >= 3
@@ -0,0 +1,125 @@
+"""Prometheus parsing and windowed rates / quantiles, with MockEngine.metrics() as the /metrics endpoint"""
+import asyncio
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+import httpx
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from mock_vllm import MockConfig, MockEngine  # noqa: E402
+from vllm_metrics import (COUNTERS, GAUGES, HISTOGRAMS, MetricsScraper, ServiceMetrics,  # noqa: E402
+                          histogram_quantile, parse_prometheus, reduce_sample)
+
+LABELS = {"engine": "0", "model_name": "mock-model"}
+
+
+def _engine(requests: int = 0, ttft=(), running: int = 0, kv_used: int = 0) -> MockEngine:
+    engine = MockEngine(MockConfig(kv_cache_tokens=1000))
+    engine.counters.update(request_success=requests, generation_tokens=10 * requests, prompt_tokens=20 * requests)
+    for value in ttft:
+        engine.histograms["time_to_first_token_seconds"].observe(value)
+    engine.running, engine.kv_used = running, kv_used
+    return engine
+
+
+def _index(mapping, key: str) -> int:
+    return list(mapping).index(key)
+
+
+def test_parse_prometheus():
+    text = _engine(requests=3, ttft=(0.003, 0.03), running=2, kv_used=250).metrics() + "\n".join([
+        "# HELP python_gc_objects_collected_total Objects collected during gc",
+        'python_gc_objects_collected_total{generation="0"} 123.0',
+        'vllm:cache_config_info{block_size="128",prefix="a \\"b\\" c"} 1.0',
+        "vllm:num_requests_swapped 0.0 1700000000000",
+        "vllm:broken_line",
+        "vllm:not_a_number abc",
+    ])
+    samples = parse_prometheus(text)
+    assert not any(name.startswith("python_") for name in samples)
+    assert samples["vllm:num_requests_running"] == [(LABELS, 2.0)]
+    assert samples["vllm:kv_cache_usage_perc"] == [(LABELS, 0.25)]
+    assert samples["vllm:request_success_total"] == [(LABELS, 3.0)]
+    # 带转义引号的标签值、值后的时间戳
+    assert samples["vllm:cache_config_info"] == [({"block_size": "128", "prefix": 'a \\"b\\" c'}, 1.0)]
+    assert samples["vllm:num_requests_swapped"] == [({}, 0.0)]
+    assert "vllm:broken_line" not in samples and "vllm:not_a_number" not in samples
+    buckets = samples["vllm:time_to_first_token_seconds_bucket"]
+    assert buckets[0] == ({"le": "0.001", **LABELS}, 0.0)
+    assert buckets[-1] == ({"le": "+Inf", **LABELS}, 2.0)
+
+
+def test_reduce_sample_sums_engines():
+    """Label sets (e.g. the engines of a data parallel server) are summed; KV cache usage takes the max"""
+    one = _engine(requests=3, ttft=(0.003,), running=1, kv_used=100).metrics()
+    two = _engine(requests=4, ttft=(0.03, 0.3), running=2, kv_used=500).metrics().replace('engine="0"', 'engine="1"')
+    sample = reduce_sample(parse_prometheus(one + two), ts=10.0)
+    assert sample.ts == 10.0
+    assert sample.gauges[_index(GAUGES, "running")] == 3.0
+    assert sample.gauges[_index(GAUGES, "kv_cache_usage")] == 0.5
+    assert sample.counters[_index(COUNTERS, "requests")] == 7.0
+    assert sample.counters[_index(COUNTERS, "generation_tokens")] == 70.0
+    bounds, counts = sample.histograms[_index(HISTOGRAMS, "ttft")]
+    assert list(bounds) == sorted(bounds) and bounds[-1] == float("inf")
+    assert counts[-1] == 3.0 and list(counts) == sorted(counts)
+    # 未导出的指标为 None
+    assert reduce_sample(parse_prometheus(""), 0.0).counters == (None,) * len(COUNTERS)
+
+
+def test_histogram_quantile():
+    bounds, counts = (0.1, 0.5, 1.0, float("inf")), (2.0, 6.0, 8.0, 10.0)
+    # 桶内线性插值: rank = q * total
+    assert histogram_quantile(0.1, bounds, counts) == pytest.approx(0.05)
+    assert histogram_quantile(0.5, bounds, counts) == pytest.approx(0.4)
+    assert histogram_quantile(0.7, bounds, counts) == pytest.approx(0.75)
+    # 落在 +Inf 桶时取最后一个有限边界
+    assert histogram_quantile(0.95, bounds, counts) == 1.0
+    assert histogram_quantile(0.5, bounds, (0.0, 0.0, 0.0, 0.0)) is None
+    assert histogram_quantile(0.5, (), ()) is None
+
+
+def _sample(ts: float, engine: MockEngine):
+    return reduce_sample(parse_prometheus(engine.metrics()), ts)
+
+
+def test_window_counter_reset():
+    """A restart inside the window only loses the increments before the reset"""
+    history = ServiceMetrics(capacity=10)
+    for ts, engine in ((0.0, _engine(10, ttft=[0.5] * 10)), (1.0, _engine(20, ttft=[0.5] * 20)),
+                       # 服务重启，计数器从零开始
+                       (2.0, _engine(5, ttft=[0.003] * 5)), (3.0, _engine(15, ttft=[0.003] * 15))):
+        history.append(_sample(ts, engine))
+    window = ServiceMetrics._window(list(history.samples))
+    # 10 + 5 + 10 个请求 / 3 秒
+    assert window["requests_per_s"] == pytest.approx(25 / 3, abs=1e-3)
+    assert window["generation_tokens_per_s"] == pytest.approx(250 / 3, abs=1e-2)
+    # 10 个 0.5 s 和 15 个 0.003 s 的 TTFT 合并
+    assert window["ttft"]["p50"] <= 0.005 < window["ttft"]["p95"] <= 0.5
+    latest = history.latest()
+    assert latest["ts"] == 3.0 and latest["requests_per_s"] == 10.0
+    assert latest["ttft"]["p99"] <= 0.005
+
+
+def test_scraper_against_mock_engine():
+    engine = _engine(requests=1, running=1, kv_used=100)
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        assert request.url.path == "/metrics"
+        return httpx.Response(200, text=engine.metrics())
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as http:
+            service = SimpleNamespace(id="s1", port=8001, status="running")
+            scraper = MetricsScraper(SimpleNamespace(http=http, services={"s1": service}), interval=1.0)
+            await scraper.scrape_all()
+            engine.counters["request_success"] = 4
+            await scraper.scrape_all()
+            return scraper.latest("s1"), scraper.services["s1"]
+
+    latest, history = asyncio.run(run())
+    assert len(history.samples) == 2 and history.last_error is None
+    assert latest["running"] == 1.0 and latest["kv_cache_usage"] == 0.1
+    assert latest["requests_per_s"] is not None and latest["requests_per_s"] > 0
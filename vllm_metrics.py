@@ -0,0 +1,396 @@
+"""vLLM /metrics scraper and per-service serving telemetry history"""
+import asyncio
+import logging
+import math
+import os
+import re
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Deque, Dict, Iterable, List, Optional, Tuple
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# 指标名 -> vLLM 导出名 (新版本在前，兼容旧版本命名)，多组 label 的样本会合并
+GAUGES = {
+    "running": ("vllm:num_requests_running",),
+    "waiting": ("vllm:num_requests_waiting",),
+    "kv_cache_usage": ("vllm:kv_cache_usage_perc", "vllm:gpu_cache_usage_perc"),  # 0-1
+}
+COUNTERS = {
+    "prompt_tokens": ("vllm:prompt_tokens_total",),
+    "generation_tokens": ("vllm:generation_tokens_total",),
+    "preemptions": ("vllm:num_preemptions_total", "vllm:num_preemptions"),
+    "requests": ("vllm:request_success_total",),
+}
+HISTOGRAMS = {
+    "ttft": ("vllm:time_to_first_token_seconds",),
+    "itl": ("vllm:inter_token_latency_seconds", "vllm:time_per_output_token_seconds"),
+    "e2e": ("vllm:e2e_request_latency_seconds",),
+}
+# 多个 engine 时 KV cache 使用率取最大值，其余求和
+MAX_GAUGES = {"kv_cache_usage"}
+QUANTILES = (0.5, 0.95, 0.99)
+
+_LABEL_RE = re.compile(r'(\w+)="((?:[^"\\]|\\.)*)"')
+# 同一服务每次抓取的 label 组合基本不变，缓存解析结果 (只读)
+_LABEL_CACHE: Dict[str, Dict[str, str]] = {}
+_LABEL_CACHE_MAX = 65536
+
+Histogram = Tuple[Tuple[float, ...], Tuple[float, ...]]  # (桶上界, 累计计数)
+
+
+def parse_prometheus(text: str, prefix: str = "vllm:") -> Dict[str, List[Tuple[Dict[str, str], float]]]:
+    """Parse Prometheus text exposition format into {name: [(labels, value)]}
+
+    Only samples whose name starts with ``prefix`` are parsed, so the
+    python_* / process_* series that vLLM also exports cost one
+    ``startswith`` per line. Timestamps after the value are ignored.
+    """
+    samples: Dict[str, List[Tuple[Dict[str, str], float]]] = {}
+    for line in text.splitlines():
+        if not line.startswith(prefix):
+            continue
+        brace = line.find("{")
+        if brace >= 0:
+            close = line.rfind("}")
+            name = line[:brace]
+            raw = line[brace + 1:close]
+            labels = _LABEL_CACHE.get(raw)
+            if labels is None:
+                labels = dict(_LABEL_RE.findall(raw))
+                if len(_LABEL_CACHE) < _LABEL_CACHE_MAX:
+                    _LABEL_CACHE[raw] = labels
+            rest = line[close + 1:].split()
+        else:
+            name, *rest = line.split()
+            labels = {}
+        if not rest:
+            continue
+        try:
+            value = float(rest[0])
+        except ValueError:
+            continue
+        samples.setdefault(name, []).append((labels, value))
+    return samples
+
+
+def _first_present(samples: Dict[str, list], names: Iterable[str], suffix: str = "") -> Optional[list]:
+    for name in names:
+        found = samples.get(name + suffix)
+        if found:
+            return found
+    return None
+
+
+def histogram_quantile(q: float, bounds: Tuple[float, ...], counts: Tuple[float, ...]) -> Optional[float]:
+    """Estimate a quantile from cumulative bucket counts (as PromQL histogram_quantile)"""
+    if not counts or counts[-1] <= 0:
+        return None
+    rank = q * counts[-1]
+    previous_bound, previous_count = 0.0, 0.0
+    for bound, count in zip(bounds, counts):
+        if count >= rank:
+            if math.isinf(bound):
+                return previous_bound
+            if count == previous_count:
+                return bound
+            return previous_bound + (bound - previous_bound) * (rank - previous_count) / (count - previous_count)
+        previous_bound, previous_count = bound, count
+    return previous_bound
+
+
+@dataclass(frozen=True)
+class MetricsSample:
+    """One scrape, reduced to the metrics the playground uses"""
+    ts: float
+    gauges: Tuple[Optional[float], ...]          # GAUGES 顺序
+    counters: Tuple[Optional[float], ...]        # COUNTERS 顺序
+    histograms: Tuple[Optional[Histogram], ...]  # HISTOGRAMS 顺序
+
+
+_BOUNDS_CACHE: Dict[Tuple[float, ...], Tuple[float, ...]] = {}
+
+
+def reduce_sample(samples: Dict[str, list], ts: float) -> MetricsSample:
+    """Sum label sets and keep only GAUGES / COUNTERS / HISTOGRAMS"""
+    gauges = []
+    for key, names in GAUGES.items():
+        found = _first_present(samples, names)
+        if found is None:
+            gauges.append(None)
+        else:
+            values = [v for _, v in found]
+            gauges.append(max(values) if key in MAX_GAUGES else sum(values))
+    counters = []
+    for names in COUNTERS.values():
+        found = _first_present(samples, names)
+        counters.append(None if found is None else sum(v for _, v in found))
+    histograms = []
+    for names in HISTOGRAMS.values():
+        found = _first_present(samples, names, "_bucket")
+        if found is None:
+            histograms.append(None)
+            continue
+        buckets: Dict[float, float] = {}
+        for labels, value in found:
+            try:
+                bound = float(labels.get("le", "+Inf"))
+            except ValueError:
+                continue
+            buckets[bound] = buckets.get(bound, 0.0) + value
+        bounds = tuple(sorted(buckets))
+        # 各样本的桶边界通常相同，共享同一个元组以节省内存
+        bounds = _BOUNDS_CACHE.setdefault(bounds, bounds)
+        histograms.append((bounds, tuple(buckets[b] for b in bounds)))
+    return MetricsSample(ts, tuple(gauges), tuple(counters), tuple(histograms))
+
+
+def _counter_delta(start: Optional[float], end: Optional[float]) -> Optional[float]:
+    if end is None:
+        return None
+    if start is None or end < start:
+        # 服务重启后计数器从零开始
+        return end
+    return end - start
+
+
+def _histogram_delta(start: Optional[Histogram], end: Optional[Histogram]) -> Optional[Histogram]:
+    if end is None:
+        return None
+    if start is None or start[0] is not end[0] or start[1][-1] > end[1][-1]:
+        return end
+    return end[0], tuple(e - s for s, e in zip(start[1], end[1]))
+
+
+def _quantiles(histogram: Optional[Histogram]) -> Dict[str, Optional[float]]:
+    result = {}
+    for q in QUANTILES:
+        value = histogram_quantile(q, *histogram) if histogram else None
+        result[f"p{int(q * 100)}"] = None if value is None else round(value, 4)
+    return result
+
+
+class ServiceMetrics:
+    """Bounded scrape history of one service"""
+
+    def __init__(self, capacity: int):
+        self.samples: Deque[MetricsSample] = deque(maxlen=capacity)
+        self.last_error: Optional[str] = None
+        self.last_scraped: Optional[float] = None
+
+    def append(self, sample: MetricsSample) -> None:
+        self.samples.append(sample)
+        self.last_scraped = sample.ts
+        self.last_error = None
+
+    @staticmethod
+    def _window(samples: List[MetricsSample]) -> Dict[str, Any]:
+        """Gauges at the last sample plus counter rates and latency quantiles since the first
+
+        Deltas are summed step by step so a counter reset (service restart)
+        inside the window only loses the increments before the reset.
+        """
+        end = samples[-1]
+        result: Dict[str, Any] = {
+            key: None if value is None else round(value, 4) for key, value in zip(GAUGES, end.gauges)
+        }
+        elapsed = end.ts - samples[0].ts
+        for i, key in enumerate(COUNTERS):
+            total = None
+            for start, step in zip(samples, samples[1:]):
+                delta = _counter_delta(start.counters[i], step.counters[i])
+                if delta is not None:
+                    total = (total or 0.0) + delta
+            result[f"{key}_per_s"] = round(total / elapsed, 3) if total is not None and elapsed > 0 else None
+        for i, key in enumerate(HISTOGRAMS):
+            if len(samples) == 1:
+                result[key] = _quantiles(end.histograms[i])
+                continue
+            merged: Optional[Histogram] = None
+            for start, step in zip(samples, samples[1:]):
+                delta = _histogram_delta(start.histograms[i], step.histograms[i])
+                if delta is None:
+                    continue
+                if merged is None or merged[0] is not delta[0]:
+                    merged = delta
+                else:
+                    merged = delta[0], tuple(a + b for a, b in zip(merged[1], delta[1]))
+            result[key] = _quantiles(merged)
+        return result
+
+    def latest(self) -> Optional[Dict[str, Any]]:
+        """Current gauges with rates / quantiles over the last scrape interval"""
+        if not self.samples:
+            return None
+        return {"ts": self.samples[-1].ts, **self._window(list(self.samples)[-2:])}
+
+    def query(self, since: float, resolution: float) -> Dict[str, Any]:
+        """Bucketed series since ``since``: gauge avg/max, counter rates and latency quantiles"""
+        series: Dict[str, List[Any]] = {"t": []}
+        for key in GAUGES:
+            series[key] = []
+            series[f"{key}_max"] = []
+        for key in COUNTERS:
+            series[f"{key}_per_s"] = []
+        for key in HISTOGRAMS:
+            for q in QUANTILES:
+                series[f"{key}_p{int(q * 100)}"] = []
+
+        baseline: List[MetricsSample] = []  # 上一个桶的最后一个样本，作为本桶速率的起点
+        in_window: List[MetricsSample] = []
+        bucket: List[MetricsSample] = []
+        current = None
+
+        def flush():
+            window = self._window(baseline + bucket)
+            series["t"].append(current)
+            for i, key in enumerate(GAUGES):
+                values = [s.gauges[i] for s in bucket if s.gauges[i] is not None]
+                series[key].append(round(sum(values) / len(values), 4) if values else None)
+                series[f"{key}_max"].append(round(max(values), 4) if values else None)
+            for key in COUNTERS:
+                series[f"{key}_per_s"].append(window[f"{key}_per_s"])
+            for key in HISTOGRAMS:
+                for name, value in window[key].items():
+                    series[f"{key}_{name}"].append(value)
+
+        for sample in self.samples:
+            if sample.ts < since:
+                baseline = [sample]
+                continue
+            if not in_window:
+                in_window = list(baseline)
+            in_window.append(sample)
+            key = since + ((sample.ts - since) // resolution) * resolution
+            if key != current:
+                if bucket:
+                    flush()
+                    baseline = bucket[-1:]
+                current, bucket = key, []
+            bucket.append(sample)
+        if not bucket:
+            return {"window": None, "series": series}
+        flush()
+        # 整个窗口的速率与分位数
+        return {"window": self._window(in_window), "series": series}
+
+
+class MetricsScraper:
+    """Scrape ``/metrics`` of every running vLLM service on a fixed interval
+
+    Scrapes run concurrently (at most ``CONCURRENCY`` at a time) over the
+    service manager's pooled HTTP client. Each service keeps at most
+    ``retention / interval`` reduced samples, so memory stays bounded no
+    matter how long a service runs; history of removed services is dropped.
+    """
+
+    DEFAULT_INTERVAL = 5.0
+    DEFAULT_RETENTION = 3600.0
+    MAX_BUCKETS = 120
+    CONCURRENCY = 8
+    TIMEOUT = 3.0
+
+    def __init__(self, service_manager, interval: Optional[float] = None, retention: Optional[float] = None):
+        self.service_manager = service_manager
+        if interval is None:
+            interval = float(os.environ.get("VLLM_METRICS_INTERVAL", self.DEFAULT_INTERVAL))
+        if retention is None:
+            retention = float(os.environ.get("VLLM_METRICS_RETENTION", self.DEFAULT_RETENTION))
+        self.interval = max(0.5, interval)
+        self.retention = retention
+        self.capacity = max(2, int(retention / self.interval) + 1)
+        self.services: Dict[str, ServiceMetrics] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task and not self._task.done():
+            return
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"vLLM metrics scraper started, interval={self.interval}s")
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            started = time.monotonic()
+            try:
+                await self.scrape_all()
+            except Exception as e:
+                logger.error(f"vLLM metrics scraper error: {e}")
+            await asyncio.sleep(max(0.0, self.interval - (time.monotonic() - started)))
+
+    async def scrape_all(self) -> None:
+        services = self.service_manager.services
+        for service_id in list(self.services):
+            if service_id not in services:
+                del self.services[service_id]
+        running = [s for s in services.values() if s.status in ("running", "draining")]
+        semaphore = asyncio.Semaphore(self.CONCURRENCY)
+
+        async def bounded(service):
+            async with semaphore:
+                await self.scrape(service)
+
+        await asyncio.gather(*(bounded(s) for s in running))
+
+    async def scrape(self, service) -> Optional[MetricsSample]:
+        metrics = self.services.get(service.id)
+        if metrics is None:
+            metrics = self.services[service.id] = ServiceMetrics(self.capacity)
+        try:
+            response = await self.service_manager.http.get(f"http://127.0.0.1:{service.port}/metrics",
+                                                           timeout=self.TIMEOUT)
+            response.raise_for_status()
+        except httpx.HTTPError as e:
+            metrics.last_error = str(e) or type(e).__name__
+            return None
+        sample = reduce_sample(parse_prometheus(response.text), time.time())
+        metrics.append(sample)
+        return sample
+
+    def latest(self, service_id: str) -> Optional[Dict[str, Any]]:
+        metrics = self.services.get(service_id)
+        return metrics.latest() if metrics else None
+
+    def query(self, service_id: str, since: Optional[float] = None,
+              resolution: Optional[float] = None) -> Dict[str, Any]:
+        """Latest values plus bucketed history of one service
+
+        Args:
+            since: Unix timestamp; negative values are relative to now (default: -600)
+            resolution: Bucket width in seconds (default: window / MAX_BUCKETS, at least the interval)
+        """
+        now = time.time()
+        if since is None:
+            since = -600
+        if since <= 0:
+            since = now + since
+        since = max(since, now - self.retention)
+        if not resolution or resolution <= 0:
+            resolution = max(self.interval, (now - since) / self.MAX_BUCKETS)
+        metrics = self.services.get(service_id)
+        result: Dict[str, Any] = {
+            "service_id": service_id,
+            "interval": self.interval,
+            "since": since,
+            "until": now,
+            "resolution": resolution,
+            "last_scraped": metrics.last_scraped if metrics else None,
+            "last_error": metrics.last_error if metrics else None,
+            "latest": metrics.latest() if metrics else None,
+        }
+        if metrics and metrics.samples:
+            result.update(metrics.query(since, resolution))
+        else:
+            result.update({"window": None, "series": None})
+        return result
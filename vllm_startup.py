@@ -0,0 +1,65 @@
+"""vLLM startup phase detection from the server log"""
+import re
+from typing import Dict, List, Optional, Pattern, Tuple
+
+# 按启动顺序排列的里程碑，每个里程碑结束一个阶段: (阶段名, 里程碑名, 日志匹配)
+# 阶段耗时 = 本里程碑时间 - 上一个已出现里程碑的时间; 没有日志匹配的里程碑由调用方 mark
+STARTUP_PHASES: List[Tuple[str, str, Optional[Pattern]]] = [
+    ("prewarm", "prewarmed", None),
+    ("spawn", "process_started",
+     re.compile(r"vLLM API server version|non-default args|Initializing a V\d+ LLM engine")),
+    ("weight_load", "weights_loaded",
+     re.compile(r"Loading (?:model )?weights took|Model loading took")),
+    ("kv_cache", "kv_cache_allocated",
+     re.compile(r"KV cache size|# (?:npu|gpu|NPU|GPU) blocks|Available KV cache memory|Maximum concurrency for")),
+    ("compile_warmup", "graph_captured",
+     re.compile(r"Graph capturing finished|init engine \(profile, create kv cache, warmup model\) took|"
+                r"Capturing .*graphs? .*took|warm ?up .*took", re.IGNORECASE)),
+    ("api_server", "server_started",
+     re.compile(r"Application startup complete|Uvicorn running on")),
+]
+
+ERROR_RE = re.compile(r"Traceback \(most recent call last\)|^\w*Error: |RuntimeError|out of memory", re.MULTILINE)
+
+
+class StartupTimeline:
+    """Collect milestone times (seconds since the start request) from log lines
+
+    Lines are fed incrementally as the log is tailed; the first match of each
+    milestone wins. ``first_ready`` is set by the HTTP readiness probe.
+    """
+
+    def __init__(self):
+        self.milestones: Dict[str, float] = {}
+        self.last_error: Optional[str] = None
+        self._partial = ""
+
+    def feed(self, text: str, elapsed: float) -> bool:
+        """Consume a chunk of log text, return True if a new milestone was reached"""
+        text = self._partial + text
+        lines = text.split("\n")
+        self._partial = lines.pop()
+        progressed = False
+        for line in lines:
+            if ERROR_RE.search(line):
+                self.last_error = line.strip()
+            for _, milestone, pattern in STARTUP_PHASES:
+                if pattern and milestone not in self.milestones and pattern.search(line):
+                    self.milestones[milestone] = round(elapsed, 2)
+                    progressed = True
+        return progressed
+
+    def mark(self, milestone: str, elapsed: float) -> None:
+        self.milestones.setdefault(milestone, round(elapsed, 2))
+
+    def breakdown(self) -> Dict[str, float]:
+        """Phase durations in seconds, for the milestones seen so far"""
+        phases = {}
+        previous = 0.0
+        for phase, milestone, _ in STARTUP_PHASES + [("first_ready", "ready", None)]:
+            at = self.milestones.get(milestone)
+            if at is None:
+                continue
+            phases[phase] = round(max(0.0, at - previous), 2)
+            previous = max(previous, at)
+        return phases
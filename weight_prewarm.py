@@ -0,0 +1,290 @@
+"""Page-cache prewarm of model weight files"""
+import asyncio
+import ctypes
+import ctypes.util
+import logging
+import mmap
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from model_manager import ModelManager
+
+logger = logging.getLogger(__name__)
+
+PAGE_SIZE = mmap.PAGESIZE
+READ_CHUNK = 16 * 1024 * 1024
+# mincore 每页一个字节，只有最低位有定义
+_LOW_BIT = bytes(b & 1 for b in range(256))
+
+_libc = None
+try:
+    _libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+    _libc.mmap.restype = ctypes.c_void_p
+    _libc.mmap.argtypes = [ctypes.c_void_p, ctypes.c_size_t, ctypes.c_int, ctypes.c_int, ctypes.c_int, ctypes.c_long]
+    _libc.munmap.argtypes = [ctypes.c_void_p, ctypes.c_size_t]
+    _libc.mincore.argtypes = [ctypes.c_void_p, ctypes.c_size_t, ctypes.POINTER(ctypes.c_ubyte)]
+except (OSError, AttributeError):
+    _libc = None
+
+
+def page_residency(path: str) -> Optional[bytes]:
+    """One byte per page of ``path``: 1 if the page is in the page cache (via mincore)
+
+    Returns None where mincore is not available.
+    """
+    if _libc is None:
+        return None
+    size = os.path.getsize(path)
+    if size == 0:
+        return b""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        addr = _libc.mmap(None, size, mmap.PROT_READ, mmap.MAP_SHARED, fd, 0)
+        if addr in (None, ctypes.c_void_p(-1).value):
+            return None
+        try:
+            pages = (size + PAGE_SIZE - 1) // PAGE_SIZE
+            vec = (ctypes.c_ubyte * pages)()
+            if _libc.mincore(addr, size, vec) != 0:
+                return None
+            return bytes(vec).translate(_LOW_BIT)
+        finally:
+            _libc.munmap(addr, size)
+    finally:
+        os.close(fd)
+
+
+def weight_files(model_path: str) -> List[Path]:
+    path = Path(model_path)
+    if path.is_file():
+        return [path]
+    if not path.is_dir():
+        raise FileNotFoundError(f"模型路径不存在: {model_path}")
+    return sorted(f for f in path.iterdir() if f.is_file() and f.suffix in ModelManager.WEIGHT_SUFFIXES)
+
+
+def residency_report(model_path: str) -> Dict[str, Any]:
+    """Resident fraction of every weight file of a model"""
+    shards = []
+    total = resident = 0
+    for f in weight_files(model_path):
+        vec = page_residency(str(f))
+        pages = len(vec) if vec is not None else 0
+        count = vec.count(1) if vec else 0
+        total += pages
+        resident += count
+        shards.append({"name": f.name, "size": f.stat().st_size,
+                       "resident": round(count / pages, 4) if vec else None})
+    return {"path": model_path, "shards": shards, "resident": round(resident / total, 4) if total else None}
+
+
+class _RateLimiter:
+    """Shared byte budget per second across reader threads (0 = unlimited)"""
+
+    def __init__(self, bytes_per_second: float):
+        self.rate = bytes_per_second
+        self._lock = threading.Lock()
+        self._next = time.monotonic()
+
+    def acquire(self, nbytes: int) -> None:
+        if self.rate <= 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + nbytes / self.rate
+        if start > now:
+            time.sleep(start - now)
+
+
+@dataclass
+class ShardProgress:
+    name: str
+    size: int
+    resident_before: Optional[float] = None
+    resident_after: Optional[float] = None
+    bytes_read: int = 0
+    status: str = "queued"  # queued, reading, done, error
+
+
+@dataclass
+class PrewarmJob:
+    """Prewarm of one model directory"""
+    id: str
+    path: str
+    status: str = "queued"  # queued, running, completed, error
+    error: str = ""
+    shards: List[ShardProgress] = field(default_factory=list)
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+    @property
+    def done(self) -> bool:
+        return self.status in ("completed", "error")
+
+    def _resident(self, attr: str) -> Optional[float]:
+        total = sum(s.size for s in self.shards)
+        known = [(s.size, getattr(s, attr)) for s in self.shards if getattr(s, attr) is not None]
+        if not total or len(known) != len(self.shards):
+            return None
+        return round(sum(size * fraction for size, fraction in known) / total, 4)
+
+    def to_dict(self) -> Dict[str, Any]:
+        total = sum(s.size for s in self.shards)
+        # 已在 page cache 中的部分不需要读取
+        to_read = sum(int(s.size * (1 - (s.resident_before or 0))) for s in self.shards)
+        read = sum(s.bytes_read for s in self.shards)
+        elapsed = ((self.finished_at or time.time()) - self.started_at) if self.started_at else 0.0
+        throughput = read / elapsed if elapsed > 0 else 0.0
+        return {
+            "id": self.id,
+            "path": self.path,
+            "status": self.status,
+            "error": self.error,
+            "bytes_total": total,
+            "bytes_to_read": to_read,
+            "bytes_read": read,
+            "progress": 100.0 if self.status == "completed" else round(min(read, to_read) * 100 / to_read, 1)
+            if to_read else 0.0,
+            "throughput_mbps": round(throughput / 1024 / 1024, 1),
+            "eta": round((to_read - read) / throughput, 1) if throughput and not self.done else None,
+            "resident_before": self._resident("resident_before"),
+            "resident_after": self._resident("resident_after"),
+            "elapsed": round(elapsed, 2),
+            "shards": [vars(s) for s in self.shards],
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class WeightPrewarmer:
+    """Pull model weights into the host page cache before ``vllm serve`` loads them
+
+    Each shard is read by one worker thread with large sequential reads
+    after POSIX_FADV_SEQUENTIAL / POSIX_FADV_WILLNEED hints. Ranges that
+    mincore reports as already resident are skipped, so prewarming a model
+    that is still cached costs only the residency check. Several shards are
+    read in parallel (``PREWARM_THREADS``, default 4). ``PREWARM_MAX_MBPS``
+    caps the combined read rate so a prewarm does not starve other I/O on
+    the weight disk.
+
+    Jobs are deduplicated by path: submitting a model that is already being
+    prewarmed returns the running job.
+    """
+
+    MAX_FINISHED_JOBS = 50
+
+    def __init__(self, max_workers: Optional[int] = None, max_mbps: Optional[float] = None):
+        self.max_workers = max_workers or int(os.environ.get("PREWARM_THREADS", "4"))
+        if max_mbps is None:
+            max_mbps = float(os.environ.get("PREWARM_MAX_MBPS", "0"))
+        self.limiter = _RateLimiter(max_mbps * 1024 * 1024)
+        self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="prewarm")
+        self.jobs: Dict[str, PrewarmJob] = {}
+        self._active: Dict[str, str] = {}
+        self._futures: Dict[str, asyncio.Future] = {}
+
+    def submit(self, model_path: str) -> PrewarmJob:
+        """Start prewarming a model directory (or return the running job for it)"""
+        key = os.path.realpath(model_path)
+        if key in self._active:
+            return self.jobs[self._active[key]]
+        files = weight_files(model_path)
+        job = PrewarmJob(id=uuid.uuid4().hex[:8], path=model_path,
+                         shards=[ShardProgress(f.name, f.stat().st_size) for f in files])
+        self.jobs[job.id] = job
+        self._active[key] = job.id
+        self._prune()
+        self._futures[job.id] = asyncio.ensure_future(self._run(job, key, files))
+        return job
+
+    async def wait(self, job: PrewarmJob) -> PrewarmJob:
+        future = self._futures.get(job.id)
+        if future is not None:
+            await asyncio.shield(future)
+        return job
+
+    async def residency(self, model_path: str) -> Dict[str, Any]:
+        return await asyncio.get_running_loop().run_in_executor(None, residency_report, model_path)
+
+    def get(self, job_id: str) -> Optional[PrewarmJob]:
+        return self.jobs.get(job_id)
+
+    def list_jobs(self) -> List[Dict[str, Any]]:
+        return [job.to_dict() for job in sorted(self.jobs.values(), key=lambda j: j.created_at, reverse=True)]
+
+    def close(self) -> None:
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    async def _run(self, job: PrewarmJob, key: str, files: List[Path]) -> None:
+        loop = asyncio.get_running_loop()
+        job.status = "running"
+        job.started_at = time.time()
+        try:
+            # 大文件先读，避免最后只剩一个线程在读大分片
+            order = sorted(zip(files, job.shards), key=lambda pair: pair[1].size, reverse=True)
+            await asyncio.gather(*(loop.run_in_executor(self.executor, self._read_shard, str(f), shard)
+                                   for f, shard in order))
+            job.status = "completed"
+        except Exception as e:
+            job.status = "error"
+            job.error = str(e)
+            logger.error(f"Prewarm of {job.path} failed: {e}")
+        finally:
+            job.finished_at = time.time()
+            self._active.pop(key, None)
+            self._futures.pop(job.id, None)
+        summary = job.to_dict()
+        logger.info(f"Prewarmed {job.path}: {summary['bytes_read'] / 1024 ** 3:.1f} GiB read in "
+                    f"{summary['elapsed']}s ({summary['throughput_mbps']} MB/s), "
+                    f"resident {summary['resident_before']} -> {summary['resident_after']}")
+
+    def _read_shard(self, path: str, shard: ShardProgress) -> None:
+        shard.status = "reading"
+        try:
+            resident = page_residency(path)
+            if resident is not None and resident:
+                shard.resident_before = round(resident.count(1) / len(resident), 4)
+            elif resident is not None:
+                shard.resident_before = 1.0
+            pages_per_chunk = READ_CHUNK // PAGE_SIZE
+            fd = os.open(path, os.O_RDONLY)
+            try:
+                if hasattr(os, "posix_fadvise"):
+                    os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+                    os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+                buf = bytearray(READ_CHUNK)
+                offset = 0
+                while offset < shard.size:
+                    if resident is not None:
+                        first = offset // PAGE_SIZE
+                        if 0 not in resident[first:first + pages_per_chunk]:
+                            offset += READ_CHUNK
+                            continue
+                    self.limiter.acquire(READ_CHUNK)
+                    n = os.preadv(fd, [buf], offset)
+                    if n <= 0:
+                        break
+                    shard.bytes_read += n
+                    offset += n
+            finally:
+                os.close(fd)
+            after = page_residency(path)
+            shard.resident_after = round(after.count(1) / len(after), 4) if after else (1.0 if after == b"" else None)
+            shard.status = "done"
+        except Exception:
+            shard.status = "error"
+            raise
+
+    def _prune(self) -> None:
+        finished = sorted((j for j in self.jobs.values() if j.done), key=lambda j: j.created_at)
+        for job in finished[:max(0, len(finished) - self.MAX_FINISHED_JOBS)]:
+            del self.jobs[job.id]